@@ -8,9 +8,14 @@ AIチャットボット関連のAPIエンドポイント（v1）
 """
 
 from typing import Optional, List
-from fastapi import APIRouter, HTTPException, Query, Depends
+from contextlib import nullcontext
+from fastapi import APIRouter, HTTPException, Query, Depends, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from ...core.config import settings
 from ...schemas import GiftItem
+from ...utils.http import format_sse_event
+from ...utils.profiling import profiling_session
 from ...services.ai_recommendation_service import AIRecommendationService
 from ...services.langchain_rag_service import LangChainRAGService
 from ...services.optimized_rag_service import OptimizedLangChainRAGService
@@ -65,7 +70,9 @@ class FastRecommendationResponse(BaseModel):
     search_metadata: Optional[dict] = None
     processing_steps: Optional[List[str]] = []
     performance: Optional[dict] = None
+    degraded_stages: Optional[List[str]] = []  # 時間予算超過でフォールバックした処理段
     reasoning: Optional[str] = None
+    profile: Optional[dict] = None  # X-Debug-Profile ヘッダー指定時のみ（タイミングツリー・スコア内訳）
 
 
 class RecommendationRequest(BaseModel):
@@ -86,7 +93,8 @@ class RecommendationResponse(BaseModel):
 @router.post("/fast-recommend", response_model=FastRecommendationResponse)
 async def get_fast_ai_recommendations(
     request: FastRecommendationRequest,
-    optimized_rag_service: OptimizedLangChainRAGService = Depends(get_optimized_rag_service)
+    optimized_rag_service: OptimizedLangChainRAGService = Depends(get_optimized_rag_service),
+    x_debug_profile: Optional[str] = Header(default=None)
 ):
     """
     Phase 3: 高速AIレコメンドエンドポイント
@@ -119,6 +127,8 @@ async def get_fast_ai_recommendations(
         request: 高速レコメンドリクエスト
             - user_input: ユーザーの自然言語での要望
             - max_recommendations: 推薦商品数（デフォルト: 3）
+        x_debug_profile: "1" 等を指定するとプロファイリングを有効化し、
+            レスポンスの profile にステージ別タイミングツリーと候補スコア内訳を含める
     
     Returns:
         FastRecommendationResponse: 高速レコメンド結果
@@ -127,18 +137,28 @@ async def get_fast_ai_recommendations(
             - user_intent: 抽出された意図情報
             - search_metadata: 検索メタデータ
             - processing_steps: 処理ステップ詳細
-            - performance: パフォーマンス指標
+            - degraded_stages: 時間予算（REQUEST_BUDGET_SECONDS）超過で定型応答に切り替えた処理段
+            - performance: パフォーマンス指標（latency_budget に予算の消費状況）
     """
     try:
         import time
         start_time = time.time()
         
-        # Phase 3最適化版で高速推薦処理実行
-        result = await optimized_rag_service.get_fast_recommendation(
-            user_input=request.user_input,
-            limit=request.max_recommendations,
-            structured_intent=request.structured_intent  # 構造化意図データを渡す
+        # デバッグヘッダー指定時のみプロファイリングを有効化
+        profiling_enabled = (
+            settings.enable_debug_profiling
+            and x_debug_profile is not None
+            and x_debug_profile.lower() not in ("", "0", "false", "off")
         )
+        session = profiling_session("fast_recommend") if profiling_enabled else nullcontext()
+        
+        with session as profiler:
+            # Phase 3最適化版で高速推薦処理実行
+            result = await optimized_rag_service.get_fast_recommendation(
+                user_input=request.user_input,
+                limit=request.max_recommendations,
+                structured_intent=request.structured_intent  # 構造化意図データを渡す
+            )
         
         total_processing_time = (time.time() - start_time) * 1000  # ミリ秒
         
@@ -150,11 +170,13 @@ async def get_fast_ai_recommendations(
             user_intent=result.get("user_intent", {}),
             search_metadata=result.get("search_metadata", {}),
             processing_steps=result.get("processing_steps", []),
+            degraded_stages=result.get("degraded_stages", []),
             performance={
                 **result.get("performance", {}),
                 "total_endpoint_time_ms": total_processing_time
             },
-            reasoning=result.get("reasoning", "Phase 3高速最適化レコメンド")
+            reasoning=result.get("reasoning", "Phase 3高速最適化レコメンド"),
+            profile=profiler.to_dict() if profiler is not None else None
         )
         
     except Exception as e:
@@ -164,6 +186,58 @@ async def get_fast_ai_recommendations(
         )
 
 
+@router.post("/fast-recommend/stream")
+async def stream_fast_ai_recommendations(
+    request: FastRecommendationRequest,
+    optimized_rag_service: OptimizedLangChainRAGService = Depends(get_optimized_rag_service)
+):
+    """
+    Phase 3: 高速AIレコメンドのストリーミング版（Server-Sent Events）
+    
+    概要:
+    /ai/fast-recommend と同じ処理を、結果が確定した順にイベントとして返します。
+    推薦商品は検索完了時点で届くため、体感待ち時間はLLM生成時間ではなく検索時間になります。
+    
+    使用例:
+    POST /ai/fast-recommend/stream
+    {
+        "user_input": "上司への結婚内祝いで5000円程度の上品な商品",
+        "max_recommendations": 3
+    }
+    
+    イベント:
+    - intent: {"user_intent": {...}, "tier": "rule" | "cache" | "llm" | "fallback" | "structured"}
+    - products: {"recommendations": [...], "search_metadata": {...}, "time_to_products_ms": 812.3}
+    - advice_delta: {"text": "..."}（アドバイス文の断片、複数回）
+    - product_reason: {"product_id": "...", "reason": "..."}（商品ごと、到着順）
+    - advice: {"text": "..."}（アドバイス全文）
+    - done: {"processing_steps": [...], "performance": {...}}
+    - error: {"detail": "..."}
+    
+    Parameters:
+        request: 高速レコメンドリクエスト（/ai/fast-recommend と同じ）
+    
+    Returns:
+        StreamingResponse: text/event-stream
+    """
+    async def event_stream():
+        async for event in optimized_rag_service.stream_fast_recommendation(
+            user_input=request.user_input,
+            limit=request.max_recommendations,
+            structured_intent=request.structured_intent
+        ):
+            yield format_sse_event(event["event"], event["data"])
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # リバースプロキシでのバッファリングを無効化
+        }
+    )
+
+
 @router.post("/recommend", response_model=RecommendationResponse)
 async def get_ai_recommendations(
     request: RecommendationRequest,
@@ -52,10 +52,92 @@ class Settings(BaseSettings):
     openai_api_key: Optional[str] = None  # 環境変数 OPENAI_API_KEY
     openai_model: str  # 環境変数 OPENAI_MODEL
     openai_max_tokens: int = 500  # 環境変数 OPENAI_MAX_TOKENS
+    openai_base_url: Optional[str] = None  # 環境変数 OPENAI_BASE_URL (空で公式API。scripts/fake_openai_server.py に向けると負荷試験用の疑似応答)
+    openai_timeout_seconds: float = 20.0  # 環境変数 OPENAI_TIMEOUT_SECONDS (1回の呼び出し全体)
+    openai_connect_timeout_seconds: float = 5.0  # 環境変数 OPENAI_CONNECT_TIMEOUT_SECONDS
+    openai_max_retries: int = 2  # 環境変数 OPENAI_MAX_RETRIES (接続エラー・429・5xx時の再試行回数)
+    openai_max_connections: int = 50  # 環境変数 OPENAI_MAX_CONNECTIONS (ワーカーあたりの同時接続数上限)
+    openai_max_keepalive_connections: int = 20  # 環境変数 OPENAI_MAX_KEEPALIVE_CONNECTIONS
+    product_reason_mode: str = "batch"  # 環境変数 PRODUCT_REASON_MODE (batch / parallel / sequential)
+    product_reason_concurrency: int = 3  # 環境変数 PRODUCT_REASON_CONCURRENCY (parallel時の同時実行数)
+    product_reason_store_path: Optional[str] = "data/cache/product_reasons.sqlite3"  # 環境変数 PRODUCT_REASON_STORE_PATH (scripts/precompute_product_reasons.py の出力、空で無効)
+    
+    # === LLM候補絞り込み設定 ===
+    # AIRecommendationService はLLMに渡す前に入力と関連する商品だけに絞り、商品テキストを圧縮する
+    llm_candidate_count: int = 10  # 環境変数 LLM_CANDIDATE_COUNT (プロンプトに含める最大商品数)
+    llm_product_token_budget: int = 1200  # 環境変数 LLM_PRODUCT_TOKEN_BUDGET (商品リスト全体の上限トークン数、tiktokenで計測)
+    llm_product_title_chars: int = 60  # 環境変数 LLM_PRODUCT_TITLE_CHARS
+    llm_product_description_chars: int = 80  # 環境変数 LLM_PRODUCT_DESCRIPTION_CHARS
+    
+    # === 商品データ読み込み設定 ===
+    # AIRecommendationService の商品データ（scripts/data の最新JSON）。新しいファイルは再起動無しでバックグラウンドで取り込む
+    product_data_poll_seconds: float = 30.0  # 環境変数 PRODUCT_DATA_POLL_SECONDS (データディレクトリの更新確認間隔、0で毎回確認)
+    # 同名の *.catalog（scripts/build_catalog_snapshot.py 等で作成）が元JSONと一致すれば、JSONを解析せずに mmap で読む
+    product_catalog_snapshot_enabled: bool = True  # 環境変数 PRODUCT_CATALOG_SNAPSHOT_ENABLED
+    
+    # === ベクトルストア設定 ===
+    # 独自形式（版ごとの vectors-<版>.npy を mmap + metadata.sqlite3）。旧形式（LangChainのpickle）は scripts/export_vector_store.py で変換する
+    vector_store_path: Optional[str] = None  # 環境変数 VECTOR_STORE_PATH (未指定ならリポジトリ直下の data/vector_store)
+    vector_store_poll_seconds: float = 30.0  # 環境変数 VECTOR_STORE_POLL_SECONDS (新しい版の確認間隔。見つかればバックグラウンドで読み込んで差し替える)
+    vector_store_release_grace_seconds: float = 60.0  # 環境変数 VECTOR_STORE_RELEASE_GRACE_SECONDS (差し替え後、実行中の検索のために古い版を残す時間)
+    vector_store_compact_ratio: float = 0.2  # 環境変数 VECTOR_STORE_COMPACT_RATIO (日次更新で論理削除した行の割合がこれを超えたら詰め直す)
+    embedding_cache_path: Optional[str] = "data/cache/embeddings.sqlite3"  # 環境変数 EMBEDDING_CACHE_PATH (モデル名+テキストのハッシュ→ベクトル。空で無効)
+    # 近似最近傍インデックス（flat / hnsw / ivf_flat / ivf_pq / sq8）。選び方は scripts/benchmark_vector_index.py で計測する
+    vector_index_type: str = "flat"  # 環境変数 VECTOR_INDEX_TYPE (flat は厳密検索。作成時に適用されるので変更後は日次更新か作り直しが必要)
+    vector_index_hnsw_m: int = 32  # 環境変数 VECTOR_INDEX_HNSW_M (HNSWの隣接数)
+    vector_index_ef_construction: int = 80  # 環境変数 VECTOR_INDEX_EF_CONSTRUCTION
+    vector_index_nlist: Optional[int] = None  # 環境変数 VECTOR_INDEX_NLIST (IVFのクラスタ数。未指定なら4√件数)
+    vector_index_pq_m: int = 16  # 環境変数 VECTOR_INDEX_PQ_M (IVF-PQの分割数。次元の約数)
+    vector_index_pq_nbits: int = 8  # 環境変数 VECTOR_INDEX_PQ_NBITS
+    vector_index_ef_search: int = 64  # 環境変数 VECTOR_INDEX_EF_SEARCH (HNSWの検索幅。検索時に適用)
+    vector_index_nprobe: int = 16  # 環境変数 VECTOR_INDEX_NPROBE (IVFで調べるクラスタ数。検索時に適用)
+    
+    # === 縮退モード設定 ===
+    # 検索エンジン障害時の最終フォールバック（FallbackRecommender）。起動時に商品データと索引を読み込んでおく
+    fallback_preload_enabled: bool = True  # 環境変数 FALLBACK_PRELOAD_ENABLED (falseなら初回のフォールバック時に読み込む)
     
     # === その他設定 ===
     timezone: str = "Asia/Tokyo"  # 環境変数 TIMEZONE
     enable_debug_logs: bool = False  # 環境変数 ENABLE_DEBUG_LOGS
+    
+    # === プロファイリング設定 ===
+    # X-Debug-Profile ヘッダー付きリクエストでのみ計測する。Falseでヘッダー自体を無視
+    # 内部のタイミング・スコア内訳を返すため、本番では有効にしない（開発・検証環境でのみ true にする）
+    enable_debug_profiling: bool = False  # 環境変数 ENABLE_DEBUG_PROFILING
+    
+    # === 共有キャッシュ設定 ===
+    # 同一ホストの全ワーカーで共有する第2層キャッシュ（アドバイス文・検索結果等）
+    # sqlite:///相対パス または redis://[:password@]host:port/db。空で無効（プロセス内のみ）
+    shared_cache_url: Optional[str] = "sqlite:///data/cache/shared_cache.sqlite3"  # 環境変数 SHARED_CACHE_URL
+    search_result_cache_ttl_seconds: int = 300  # 環境変数 SEARCH_RESULT_CACHE_TTL_SECONDS (0で検索結果をキャッシュしない)
+    
+    # === 選び方アドバイスキャッシュ設定 ===
+    # アドバイス文は相手プロフィール（用途・関係性・性別・年代）単位でキャッシュする
+    advice_cache_ttl_seconds: int = 86400  # 環境変数 ADVICE_CACHE_TTL_SECONDS
+    advice_cache_variants: int = 3  # 環境変数 ADVICE_CACHE_VARIANTS (プロフィールごとに保持する文面数)
+    advice_prewarm_enabled: bool = True  # 環境変数 ADVICE_PREWARM_ENABLED (起動時に主要な組み合わせを事前生成)
+    advice_prewarm_concurrency: int = 2  # 環境変数 ADVICE_PREWARM_CONCURRENCY
+    
+    # === レイテンシ予算設定 ===
+    # 1リクエストの持ち時間。各段の締め切りを超えたらルールベース意図・定型文に切り替える（0で無効）
+    request_budget_seconds: float = 3.0  # 環境変数 REQUEST_BUDGET_SECONDS
+    intent_stage_budget_ratio: float = 0.3  # 環境変数 INTENT_STAGE_BUDGET_RATIO (予算のうち意図抽出に割り当てる上限)
+    
+    # === 意図抽出設定 ===
+    # ルールベース抽出の信頼度がこの値以上ならLLMを呼ばない（1.0超でルールベース段を無効化）
+    intent_rule_confidence_threshold: float = 0.9  # 環境変数 INTENT_RULE_CONFIDENCE_THRESHOLD
+    
+    # === 意図抽出キャッシュ設定 ===
+    intent_cache_enabled: bool = True  # 環境変数 INTENT_CACHE_ENABLED
+    intent_cache_path: Optional[str] = "data/cache/intent_cache.sqlite3"  # 環境変数 INTENT_CACHE_PATH (空でメモリ層のみ)
+    intent_cache_max_entries: int = 1024  # 環境変数 INTENT_CACHE_MAX_ENTRIES (メモリ層の上限)
+    
+    # === リランカー設定 ===
+    # 未設定時は相手情報ヒューリスティックと同じ重みで再ランキング
+    reranker_model_path: Optional[str] = None  # 環境変数 RERANKER_MODEL_PATH (scripts/train_reranker.py の出力)
+    reranker_feature_log_path: Optional[str] = None  # 環境変数 RERANKER_FEATURE_LOG_PATH (学習データ収集用、JSONL)
+    # 学習済みモデル未設定時は、投入時に計算した affinity_* 属性でMeilisearchに並べ替えさせる（インデックスが未対応なら従来の再ランキング）
+    recipient_affinity_sort_enabled: bool = True  # 環境変数 RECIPIENT_AFFINITY_SORT_ENABLED
         
     class Config:
         """Pydantic設定"""
@@ -84,6 +166,16 @@ class Settings(BaseSettings):
         """AI機能（OpenAI）が有効かどうかを判定"""
         return self.openai_api_key is not None and len(self.openai_api_key.strip()) > 0
     
+    def get_vector_index_params(self) -> Dict[str, Optional[int]]:
+        """ベクトルストアのインデックス作成パラメータ（vector_store.build_ann_index に渡す形）"""
+        return {
+            "hnsw_m": self.vector_index_hnsw_m,
+            "ef_construction": self.vector_index_ef_construction,
+            "nlist": self.vector_index_nlist,
+            "pq_m": self.vector_index_pq_m,
+            "pq_nbits": self.vector_index_pq_nbits,
+        }
+    
     def validate_api_keys(self) -> Dict[str, bool]:
         """
         各APIキーの設定状況を検証
@@ -15,6 +15,9 @@ HAREGift - ハレの日ギフト検索API メインエントリーポイント
 - 将来の楽天API・LLM機能に対応した拡張可能設計
 """
 
+import asyncio
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -70,6 +73,52 @@ app.include_router(stats.router, tags=["レガシー対応"])
 app.include_router(ai.router, tags=["AIチャットボット レガシー対応"])
 
 
+@app.on_event("startup")
+async def prewarm_advice_cache():
+    """
+    起動時に主要な相手プロフィールの選び方アドバイスを事前生成
+    
+    起動を遅らせないようバックグラウンドタスクとして実行する。
+    AI機能が無効な場合・ADVICE_PREWARM_ENABLED=false の場合は何もしない。
+    """
+    if not (settings.advice_prewarm_enabled and settings.is_ai_enabled()):
+        return
+    
+    from .services.optimized_rag_service import OptimizedLangChainRAGService
+    
+    async def run():
+        try:
+            # サービス初期化（ベクトルストア読み込み）はブロッキングのため別スレッドで実行
+            service = await asyncio.to_thread(OptimizedLangChainRAGService)
+            await service.prewarm_advice_cache()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"アドバイス文の事前生成に失敗しました: {e}")
+    
+    app.state.advice_prewarm_task = asyncio.create_task(run())
+
+
+@app.on_event("startup")
+async def preload_fallback_recommender():
+    """
+    起動時に縮退モード推薦（検索エンジン障害時の最終フォールバック）の商品データを読み込む
+    
+    起動を遅らせないよう別スレッドで読み込む。FALLBACK_PRELOAD_ENABLED=false の場合は何もしない。
+    """
+    if not settings.fallback_preload_enabled:
+        return
+    
+    from .services.ai_recommendation_service import FallbackRecommender
+    
+    app.state.fallback_preload_task = asyncio.create_task(asyncio.to_thread(FallbackRecommender().preload))
+
+
+@app.on_event("shutdown")
+async def close_openai_client():
+    """共有のOpenAI非同期クライアントの接続プールを閉じる"""
+    from .services.openai_client import close_async_openai_client
+    await close_async_openai_client()
+
+
 @app.get("/")
 async def root():
     """
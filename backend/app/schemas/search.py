@@ -6,7 +6,7 @@
 - 複雑な検索パラメータを整理して管理しやすくします
 """
 
-from typing import List, Optional
+from typing import List, Optional, Union
 from pydantic import BaseModel
 from .item import GiftItem
 
@@ -40,7 +40,7 @@ class SearchParams(BaseModel):
     genre_group: Optional[str] = None   # ジャンルグループフィルタ（food, drink, home, catalog, craft）
     price_min: Optional[int] = None     # 最低価格（円）
     price_max: Optional[int] = None     # 最高価格（円）
-    sort: str = "updated_at:desc"       # ソート順（updated_at:desc等）
+    sort: Union[str, List[str]] = "updated_at:desc"  # ソート順（updated_at:desc等。複数条件はリストで優先順に指定）
     limit: int = 20                     # 取得件数（デフォルト20）
     offset: int = 0                     # オフセット（ページング用）
     exact_match: bool = False           # 完全一致検索フラグ（フレーズ検索モード）
\ No newline at end of file
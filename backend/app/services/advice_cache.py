@@ -0,0 +1,202 @@
+"""
+選び方アドバイスのキャッシュ
+
+このファイルの役割:
+- アドバイス文を相手プロフィールのバケット（用途・関係性・性別・年代）単位でキャッシュ
+- バケットごとに複数の文面（バリアント）を保持し、ヒット時はランダムに1つ返す
+- 起動時の事前生成（プリウォーム）対象となる主要な組み合わせを定義
+
+設計メモ:
+- アドバイスのプロンプトはプロフィール4項目のみに依存するため、ユーザー入力の文言や
+  商品件数はキーに含めない（同じ相手なら入力の言い回しが違ってもヒットする）
+- 有効期限（TTL）切れの文面は参照時に捨てる
+- バリアント数に満たないバケットは「補充が必要」と判定し、呼び出し側がバックグラウンドで追加生成する
+- 共有キャッシュ層（SHARED_CACHE_URL）があれば、他ワーカーが生成した文面も参照・合流する
+"""
+
+import logging
+import random
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..utils.shared_cache import SharedCacheBackend
+from .reason_store import UNKNOWN, profile_bucket
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+# プリウォーム対象（フロントエンドの用途・関係性の選択肢。性別・年代は未指定）
+PREWARM_OCCASIONS = [
+    "wedding_celebration", "birth_celebration", "new_home_celebration",
+    "mothers_day", "fathers_day", "respect_for_aged_day",
+]
+PREWARM_RELATIONSHIPS = ["boss", "同僚・同等関係", "友人・知人", "親族・家族", "取引先・顧客", UNKNOWN]
+
+
+def prewarm_buckets() -> List[str]:
+    """プリウォーム対象のバケット一覧"""
+    return [
+        profile_bucket({"occasion": occasion, "relationship": relationship})
+        for occasion in PREWARM_OCCASIONS
+        for relationship in PREWARM_RELATIONSHIPS
+    ]
+
+
+class AdviceCache:
+    """選び方アドバイスのキャッシュ（プロセス内シングルトン）"""
+
+    _instance = None
+    _instance_lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """シングルトンパターンで1つのインスタンスのみ生成"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(
+        self,
+        ttl_seconds: float = 86400,
+        variants: int = 3,
+        max_buckets: int = 2048,
+        shared: Optional[SharedCacheBackend] = None
+    ):
+        """
+        初期化
+
+        Args:
+            ttl_seconds: 文面の有効期限（秒）
+            variants: バケットごとに保持する文面数
+            max_buckets: 保持するバケット数の上限（超えたら最も使われていないものから削除）
+            shared: ワーカー間で共有するキャッシュ層（任意）
+        """
+        if hasattr(self, '_initialized'):
+            return
+
+        self.ttl_seconds = ttl_seconds
+        self.variants = max(variants, 1)
+        self.max_buckets = max_buckets
+        self.shared = shared
+        self._entries: "OrderedDict[str, List[Tuple[str, float]]]" = OrderedDict()
+        self._filling: set = set()
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+
+        self._initialized = True
+
+    def _live_variants(self, bucket: str) -> List[Tuple[str, float]]:
+        """有効期限内の文面（期限切れはここで捨てる。ロック内で呼ぶ）"""
+        entries = self._entries.get(bucket)
+        if not entries:
+            return []
+        now = time.time()
+        live = [(text, created_at) for text, created_at in entries if now - created_at < self.ttl_seconds]
+        if len(live) != len(entries):
+            if live:
+                self._entries[bucket] = live
+            else:
+                del self._entries[bucket]
+        return live
+
+    def _load_shared(self, bucket: str) -> List[Tuple[str, float]]:
+        """共有層の文面をプロセス内に取り込む（期限切れは除く）"""
+        if self.shared is None:
+            return []
+        stored = self.shared.get(f"advice:{bucket}") or []
+        now = time.time()
+        entries = [(text, created_at) for text, created_at in stored if now - created_at < self.ttl_seconds]
+        if entries:
+            with self._lock:
+                self._merge(bucket, entries)
+        return entries
+
+    def _merge(self, bucket: str, entries: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+        """文面をバケットに合流（重複除去・新しい順にバリアント数まで。ロック内で呼ぶ）"""
+        merged: Dict[str, float] = {}
+        for text, created_at in self._live_variants(bucket) + entries:
+            merged[text] = max(created_at, merged.get(text, 0.0))
+        live = sorted(merged.items(), key=lambda entry: entry[1])[-self.variants:]
+        self._entries[bucket] = live
+        self._entries.move_to_end(bucket)
+        while len(self._entries) > self.max_buckets:
+            self._entries.popitem(last=False)
+        return live
+
+    def get(self, bucket: str) -> Optional[str]:
+        """バケットの文面をランダムに1つ取得（無ければNone）"""
+        with self._lock:
+            has_local = bool(self._live_variants(bucket))
+        if not has_local:
+            self._load_shared(bucket)
+
+        with self._lock:
+            live = self._live_variants(bucket)
+            if not live:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(bucket)
+            self._stats["hits"] += 1
+            return random.choice(live)[0]
+
+    def contains(self, bucket: str) -> bool:
+        """有効な文面があるか（共有層も含む。統計に含めない）"""
+        with self._lock:
+            if self._live_variants(bucket):
+                return True
+        return bool(self._load_shared(bucket))
+
+    def add(self, bucket: str, text: str):
+        """文面を追加（バリアント数を超えたら最も古い文面を置き換える）"""
+        if not text:
+            return
+        # 他ワーカーが追加した文面と合流してから書き戻す
+        self._load_shared(bucket)
+        with self._lock:
+            live = self._merge(bucket, [(text, time.time())])
+            self._stats["stores"] += 1
+        if self.shared is not None:
+            self.shared.set(f"advice:{bucket}", [list(entry) for entry in live], self.ttl_seconds)
+
+    def claim_fill(self, bucket: str) -> bool:
+        """
+        バリアント補充の担当を取得
+
+        文面がバリアント数に満たず、他に補充中のリクエストが無い場合のみTrue。
+        Trueを受け取った呼び出し側は、生成後（失敗時も）release_fill を呼ぶ。
+        """
+        with self._lock:
+            if bucket in self._filling or len(self._live_variants(bucket)) >= self.variants:
+                return False
+            self._filling.add(bucket)
+            return True
+
+    def release_fill(self, bucket: str):
+        with self._lock:
+            self._filling.discard(bucket)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率等のメトリクス"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["buckets"] = len(self._entries)
+            stats["variants"] = sum(len(entries) for entries in self._entries.values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """全エントリとメトリクスをクリア（共有層の文面も削除）"""
+        with self._lock:
+            self._entries.clear()
+            self._filling.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+        if self.shared is not None:
+            try:
+                self.shared.clear("advice:")
+            except Exception as e:
+                logger.warning(f"共有キャッシュクリアエラー: {e}")
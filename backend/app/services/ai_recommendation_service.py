@@ -5,32 +5,225 @@ AI推薦サービス
 - ユーザー入力に基づく商品レコメンド処理
 - 最新の楽天商品データ（title, description）読み込み
 - LLMとのRAG連携による自然言語処理
+- プロンプト前の候補絞り込み（文字bigram検索＋occasion絞り込み）と商品テキストの圧縮
+- 商品データの索引（ID・occasion・genre_group）と、新しいデータファイルの無停止取り込み
 """
 
 import os
+import re
 import json
 import glob
-from typing import List, Dict, Any, Optional
+import math
+import time
+from collections import defaultdict
+from threading import Lock, Thread
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple
 from datetime import datetime
 import logging
 
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-
 from ..schemas import GiftItem
 from ..core.config import settings
+from .openai_client import OPENAI_AVAILABLE, get_async_openai_client
+from ..utils.keyword_matcher import KeywordMatcher
+from ..utils.tokens import count_tokens
+from ..utils.catalog_snapshot import CatalogRecords, field_values, open_fresh_catalog, snapshot_path_for
 
 
 # ログ設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 検索索引に含める説明文の文字数（長文の説明は冒頭のみで十分）
+INDEXED_DESCRIPTION_CHARS = 500
+
+_HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+_PROMOTION_PATTERN = re.compile(r"【[^】]*】|\[[^\]]*\]")
+_DECORATION_PATTERN = re.compile(r"[★☆◆◇■□●○▼▽▲△※♪◎]+")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# 相手の性別・年代・関係性ごとに優先する商品キーワード
+RECIPIENT_PREFERENCE_KEYWORDS: Dict[str, List[str]] = {
+    "male": ["男性", "メンズ", "紳士", "ビール", "ウイスキー", "ネクタイ", "革製品", "工具"],
+    "female": ["女性", "レディース", "婦人", "花", "化粧品", "アクセサリー", "スイーツ", "紅茶"],
+    "young": ["トレンド", "おしゃれ", "SNS", "可愛い", "カジュアル"],
+    "senior": ["健康", "高級", "伝統", "上品", "品格", "老舗", "和風"],
+    "formal": ["高級", "上品", "フォーマル", "品格", "老舗", "のし"],
+    "casual": ["カジュアル", "気軽", "おしゃれ", "トレンド", "可愛い"],
+}
+RECIPIENT_PREFERENCE_MATCHER = KeywordMatcher(RECIPIENT_PREFERENCE_KEYWORDS)
+
+
+def compact_text(text: str, max_chars: Optional[int] = None) -> str:
+    """
+    商品テキストをプロンプト用に圧縮
+
+    HTMLタグ・装飾記号・【送料無料】等の販促表記を除き、空白を詰めて max_chars 文字に切り詰める。
+    """
+    text = _HTML_TAG_PATTERN.sub(" ", text or "")
+    text = _PROMOTION_PATTERN.sub(" ", text)
+    text = _DECORATION_PATTERN.sub(" ", text)
+    text = _WHITESPACE_PATTERN.sub(" ", text).strip()
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars].rstrip() + "…"
+    return text
+
+
+def char_bigrams(text: str) -> Set[str]:
+    """空白を除いた小文字化済み文字列の文字bigram集合（1文字ならその文字のみ）"""
+    text = _WHITESPACE_PATTERN.sub("", (text or "").lower())
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+# Occasion推定マッピング（定義順が推定時の優先順）
+OCCASION_KEYWORDS: Dict[str, List[str]] = {
+    "wedding_celebration": [
+        "結婚", "結婚祝い", "ウェディング", "新婚", "結婚式", "婚礼", "夫婦", "新郎", "新婦",
+        "ブライダル", "結婚記念", "新生活", "二人", "カップル"
+    ],
+    "birth_celebration": [
+        "出産", "出産祝い", "赤ちゃん", "ベビー", "新生児", "誕生", "産まれた", "お子様",
+        "ママ", "パパ", "子ども", "子供", "初産", "新米ママ", "新米パパ"
+    ],
+    "new_home_celebration": [
+        "新築", "新築祝い", "新居", "引越し", "引っ越し", "新住所", "マイホーム", "一戸建て",
+        "新築住宅", "家", "住居", "新生活", "引越祝い"
+    ],
+    "mothers_day": [
+        "母の日", "お母さん", "ママ", "母親", "母", "お母様", "ぼしのひ"
+    ],
+    "fathers_day": [
+        "父の日", "お父さん", "パパ", "父親", "父", "お父様", "ちちのひ"
+    ],
+    "respect_for_aged_day": [
+        "敬老の日", "敬老", "おじいちゃん", "おばあちゃん", "祖父", "祖母",
+        "お年寄り", "シニア", "高齢", "祖父母", "長寿", "けいろうのひ"
+    ]
+}
+OCCASION_MATCHER = KeywordMatcher(OCCASION_KEYWORDS)
+
+DATA_FILE_PATTERN = "rakuten_uchiwai_products_*.json"
+
+
+class ProductSnapshot:
+    """
+    読み込み済み商品データのスナップショット（読み取り専用）
+    
+    読み込み時に商品ID・occasion・genre_group の索引を作り、検索用の文字bigram転置索引は初回利用時に作る。
+    再読み込み時は新しいスナップショットを作って参照ごと差し替えるため、利用側は取得したスナップショットを
+    ロック無しで使い続けてよい。
+    
+    products はJSONから読んだ dict のリスト、またはカタログスナップショットの CatalogRecords
+    （要素アクセス時に dict を組み立てる）。後者の場合、ID索引はスナップショット内の id_order を使う。
+    """
+    
+    def __init__(self, products: Sequence[Dict[str, Any]], manifest: Tuple[str, int, int, int]):
+        """
+        初期化（索引の構築）
+        
+        Args:
+            products: 商品データ
+            manifest: 読み込んだファイルの (パス, 更新時刻ns, サイズ, カタログスナップショットの更新時刻ns)
+        """
+        self.products = products
+        self.manifest = manifest
+        self.loaded_at = datetime.now()
+        
+        self._id_positions: Optional[Dict[str, int]] = None
+        if not isinstance(products, CatalogRecords):
+            self._id_positions = {}
+            for index, product_id in enumerate(field_values(products, "id")):
+                if product_id is not None:
+                    # 同じIDが複数あれば先頭の商品（従来の線形探索と同じ）
+                    self._id_positions.setdefault(product_id, index)
+        
+        by_occasion: Dict[str, List[int]] = defaultdict(list)
+        by_genre_group: Dict[str, List[int]] = defaultdict(list)
+        columns = zip(
+            field_values(products, "occasion"), field_values(products, "occasions"),
+            field_values(products, "title", ""), field_values(products, "genre_group"),
+        )
+        for index, (occasion, occasions, title, genre_group) in enumerate(columns):
+            for matched in self._product_occasions(occasion, occasions, title):
+                by_occasion[matched].append(index)
+            if genre_group:
+                by_genre_group[genre_group].append(index)
+        self.by_occasion = dict(by_occasion)
+        self.by_genre_group = dict(by_genre_group)
+        self._occasion_sets = {occasion: set(indexes) for occasion, indexes in self.by_occasion.items()}
+        
+        self._search_index: Optional[Tuple[Dict[str, List[int]], List[Set[str]]]] = None
+        self._search_index_lock = Lock()
+    
+    @property
+    def source_file(self) -> str:
+        """読み込んだデータファイルのパス"""
+        return self.manifest[0]
+    
+    @staticmethod
+    def _product_occasions(occasion: Optional[str], occasions: Optional[List[str]], title: str) -> List[str]:
+        """商品が該当するoccasion（付与済みのoccasion・occasions、または商品名のキーワード）"""
+        matched = [occasion] if occasion else []
+        matched.extend(occasions or [])
+        matched.extend(OCCASION_MATCHER.match_groups(title or ""))
+        return list(dict.fromkeys(matched))
+    
+    def get_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """商品IDで商品を取得（見つからない場合はNone）"""
+        if self._id_positions is not None:
+            position = self._id_positions.get(product_id)
+        else:
+            position = self.products.find_position(product_id)
+        return self.products[position] if position is not None else None
+    
+    def matches_occasion(self, index: int, occasion: str) -> bool:
+        """index番目の商品がoccasionに該当するか"""
+        return index in self._occasion_sets.get(occasion, ())
+    
+    def search_index(self) -> Tuple[Dict[str, List[int]], List[Set[str]]]:
+        """候補絞り込み用の文字bigram転置索引と、商品ごとの商品名bigram集合（初回のみ構築）"""
+        if self._search_index is None:
+            with self._search_index_lock:
+                if self._search_index is None:
+                    postings: Dict[str, List[int]] = defaultdict(list)
+                    title_bigrams: List[Set[str]] = []
+                    texts = zip(field_values(self.products, "title", ""), field_values(self.products, "description", ""))
+                    for index, (title, description) in enumerate(texts):
+                        title_grams = char_bigrams(compact_text(title))
+                        body_grams = char_bigrams(compact_text(description, INDEXED_DESCRIPTION_CHARS))
+                        for gram in title_grams | body_grams:
+                            postings[gram].append(index)
+                        title_bigrams.append(title_grams)
+                    self._search_index = (dict(postings), title_bigrams)
+                    logger.info(f"候補絞り込み用索引を構築しました: {len(self.products)} 件 / {len(postings)} bigram")
+        return self._search_index
+
+
+class _CatalogState:
+    """データディレクトリごとの共有状態（現在のスナップショットと更新確認の状況）"""
+    
+    def __init__(self):
+        self.lock = Lock()
+        self.snapshot: Optional[ProductSnapshot] = None
+        self.manifest: Optional[Tuple[str, int, int, int]] = None
+        self.checked_at = 0.0
+        self.reloading = False
+        self.failed_manifest: Optional[Tuple[str, int, int, int]] = None   # 読み込みに失敗した版（同じ版を繰り返し読み込まない）
+
 
 class ProductDataLoader:
-    """商品データローダー"""
+    """
+    商品データローダー
+    
+    読み込んだ商品データはデータディレクトリ単位でプロセス内に共有する（リクエストごとにローダーを
+    生成しても再読み込みしない）。product_data_poll_seconds ごとにディレクトリを確認し、新しい
+    データファイルがあればバックグラウンドで読み込んでスナップショットを差し替える。
+    差し替えが終わるまでは読み込み済みのスナップショットを返し続ける。
+    """
+    
+    _states: Dict[str, _CatalogState] = {}
+    _states_lock = Lock()
     
     def __init__(self, data_dir: str = None):
         """
@@ -45,35 +238,58 @@ class ProductDataLoader:
             self.data_dir = os.path.join(current_dir, "../../../scripts/data")
         else:
             self.data_dir = data_dir
-            
-        self.products_cache = None
-        self.last_load_time = None
-        
-        # Occasion推定マッピング
-        self.occasion_keywords = {
-            "wedding_celebration": [
-                "結婚", "結婚祝い", "ウェディング", "新婚", "結婚式", "婚礼", "夫婦", "新郎", "新婦",
-                "ブライダル", "結婚記念", "新生活", "二人", "カップル"
-            ],
-            "birth_celebration": [
-                "出産", "出産祝い", "赤ちゃん", "ベビー", "新生児", "誕生", "産まれた", "お子様",
-                "ママ", "パパ", "子ども", "子供", "初産", "新米ママ", "新米パパ"
-            ],
-            "new_home_celebration": [
-                "新築", "新築祝い", "新居", "引越し", "引っ越し", "新住所", "マイホーム", "一戸建て",
-                "新築住宅", "家", "住居", "新生活", "引越祝い"
-            ],
-            "mothers_day": [
-                "母の日", "お母さん", "ママ", "母親", "母", "お母様", "ぼしのひ"
-            ],
-            "fathers_day": [
-                "父の日", "お父さん", "パパ", "父親", "父", "お父様", "ちちのひ"
-            ],
-            "respect_for_aged_day": [
-                "敬老の日", "敬老", "おじいちゃん", "おばあちゃん", "祖父", "祖母",
-                "お年寄り", "シニア", "高齢", "祖父母", "長寿", "けいろうのひ"
-            ]
-        }
+        
+        self.occasion_keywords = OCCASION_KEYWORDS
+        self.occasion_matcher = OCCASION_MATCHER
+        
+        key = os.path.realpath(self.data_dir)
+        with self._states_lock:
+            self._state = self._states.setdefault(key, _CatalogState())
+    
+    @property
+    def products_cache(self) -> Optional[List[Dict[str, Any]]]:
+        """読み込み済みの商品データ（未読み込みならNone）"""
+        snapshot = self._state.snapshot
+        return snapshot.products if snapshot else None
+    
+    @property
+    def last_load_time(self) -> Optional[datetime]:
+        """現在のスナップショットの読み込み日時"""
+        snapshot = self._state.snapshot
+        return snapshot.loaded_at if snapshot else None
+    
+    def _scan_manifest(self) -> Tuple[str, int, int, int]:
+        """
+        データディレクトリを走査し、最新ファイルの (パス, 更新時刻ns, サイズ, カタログスナップショットの更新時刻ns) を返す
+        
+        カタログスナップショットはJSONの後に書き出されるため、その更新時刻も含めて変化を検知する（無ければ0）。
+        """
+        pattern = os.path.join(self.data_dir, DATA_FILE_PATTERN)
+        latest = None
+        for path in glob.glob(pattern):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # 走査中に削除されたファイル
+            if latest is None or stat.st_mtime_ns > latest[1]:
+                latest = (path, stat.st_mtime_ns, stat.st_size)
+        
+        if latest is None:
+            raise FileNotFoundError(f"商品データファイルが見つかりません: {pattern}")
+        try:
+            catalog_mtime_ns = os.stat(snapshot_path_for(latest[0])).st_mtime_ns
+        except OSError:
+            catalog_mtime_ns = 0
+        return (*latest, catalog_mtime_ns)
+    
+    def _current_manifest(self, refresh: bool = False) -> Tuple[str, int, int, int]:
+        """最新ファイルのマニフェスト（確認間隔内なら前回の走査結果を使う）"""
+        state = self._state
+        now = time.monotonic()
+        if refresh or state.manifest is None or now - state.checked_at >= settings.product_data_poll_seconds:
+            state.manifest = self._scan_manifest()
+            state.checked_at = now
+        return state.manifest
     
     def get_latest_data_file(self) -> str:
         """
@@ -85,18 +301,103 @@ class ProductDataLoader:
         Raises:
             FileNotFoundError: データファイルが見つからない場合
         """
-        pattern = os.path.join(self.data_dir, "rakuten_uchiwai_products_*.json")
-        files = glob.glob(pattern)
+        latest_file = self._current_manifest()[0]
+        logger.debug(f"最新データファイル: {latest_file}")
+        return latest_file
+    
+    def _read_snapshot(self, manifest: Tuple[str, int, int, int]) -> ProductSnapshot:
+        """
+        データファイルを読み込んでスナップショットを作る
         
-        if not files:
-            raise FileNotFoundError(f"商品データファイルが見つかりません: {pattern}")
+        同名の最新のカタログスナップショット（*.catalog）があれば、JSONを解析せずに mmap で開く。
+        """
+        catalog = open_fresh_catalog(manifest[0]) if settings.product_catalog_snapshot_enabled else None
+        if catalog is not None:
+            # title と description が存在する商品のみ（レコードは参照時に組み立てる）
+            valid_products = CatalogRecords(catalog, catalog.nonempty_indices("title", "description"))
+            snapshot = ProductSnapshot(valid_products, manifest)
+            logger.info(f"商品データを読み込みました: {len(valid_products)} 件 ({os.path.basename(catalog.path)})")
+            return snapshot
         
-        # ファイル名の日時部分でソート（最新を取得）
-        files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-        latest_file = files[0]
+        with open(manifest[0], 'r', encoding='utf-8') as f:
+            data = json.load(f)
         
-        logger.info(f"最新データファイル: {latest_file}")
-        return latest_file
+        # 商品データを取得（形式に応じて調整）
+        if isinstance(data, list):
+            products = data
+        elif isinstance(data, dict) and 'products' in data:
+            products = data['products']
+        else:
+            products = [data]  # 単一商品の場合
+        
+        # title と description が存在する商品のみフィルタ
+        valid_products = []
+        for product in products:
+            if ('title' in product and product['title'] and
+                'description' in product and product['description']):
+                valid_products.append(product)
+        
+        snapshot = ProductSnapshot(valid_products, manifest)
+        logger.info(f"商品データを読み込みました: {len(valid_products)} 件 ({os.path.basename(manifest[0])})")
+        return snapshot
+    
+    def _reload_in_background(self, manifest: Tuple[str, int, int, int]):
+        """新しいデータファイルを別スレッドで読み込み、完了後にスナップショットを差し替える"""
+        state = self._state
+        with state.lock:
+            if state.reloading or manifest == state.failed_manifest:
+                return
+            state.reloading = True
+        
+        def reload():
+            try:
+                snapshot = self._read_snapshot(manifest)
+                state.snapshot = snapshot
+                state.failed_manifest = None
+                logger.info(f"商品データを差し替えました: {os.path.basename(manifest[0])}")
+            except Exception as e:
+                state.failed_manifest = manifest
+                logger.error(
+                    f"商品データの再読み込みに失敗しました（読み込み済みのデータを使い続け、"
+                    f"データファイルが更新されるまで再試行しません）: {str(e)}"
+                )
+            finally:
+                state.reloading = False
+        
+        Thread(target=reload, name="product-data-reload", daemon=True).start()
+    
+    def get_snapshot(self, force_reload: bool = False) -> ProductSnapshot:
+        """
+        現在の商品データスナップショットを取得
+        
+        未読み込み・強制再読み込みの場合はその場で読み込む。読み込み済みで新しいデータファイルが
+        見つかった場合はバックグラウンドで読み込み、今回は読み込み済みのスナップショットを返す。
+        
+        Args:
+            force_reload: 強制再読み込みフラグ
+        """
+        state = self._state
+        snapshot = state.snapshot
+        if snapshot is not None and not force_reload:
+            try:
+                manifest = self._current_manifest()
+            except FileNotFoundError as e:
+                logger.warning(f"{str(e)}（読み込み済みのデータを使い続けます）")
+                return snapshot
+            if manifest != snapshot.manifest and manifest != state.failed_manifest:
+                self._reload_in_background(manifest)
+            return snapshot
+        
+        with state.lock:
+            if state.snapshot is not None and not force_reload:
+                return state.snapshot
+            try:
+                state.snapshot = self._read_snapshot(self._current_manifest(refresh=True))
+                state.failed_manifest = None
+            except Exception as e:
+                logger.error(f"商品データ読み込みエラー: {str(e)}")
+                raise
+            return state.snapshot
     
     def load_products_data(self, force_reload: bool = False) -> List[Dict[str, Any]]:
         """
@@ -108,45 +409,7 @@ class ProductDataLoader:
         Returns:
             商品データリスト
         """
-        # キャッシュが有効で強制再読み込みでなければキャッシュを使用
-        if (self.products_cache is not None and 
-            not force_reload and 
-            self.last_load_time is not None):
-            logger.info("キャッシュから商品データを返します")
-            return self.products_cache
-        
-        try:
-            latest_file = self.get_latest_data_file()
-            
-            with open(latest_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 商品データを取得（形式に応じて調整）
-            if isinstance(data, list):
-                products = data
-            elif isinstance(data, dict) and 'products' in data:
-                products = data['products']
-            else:
-                products = [data]  # 単一商品の場合
-            
-            # title と description が存在する商品のみフィルタ
-            valid_products = []
-            for product in products:
-                if ('title' in product and product['title'] and
-                    'description' in product and product['description']):
-                    valid_products.append(product)
-            
-            logger.info(f"商品データを読み込みました: {len(valid_products)} 件")
-            
-            # キャッシュに保存
-            self.products_cache = valid_products
-            self.last_load_time = datetime.now()
-            
-            return valid_products
-            
-        except Exception as e:
-            logger.error(f"商品データ読み込みエラー: {str(e)}")
-            raise
+        return self.get_snapshot(force_reload).products
     
     def estimate_occasion(self, user_input: str) -> str:
         """
@@ -158,19 +421,33 @@ class ProductDataLoader:
         Returns:
             推定されたoccasion（デフォルト: wedding_celebration）
         """
-        user_input_lower = user_input.lower()
-        
-        # 各occasionに対してキーワードマッチング
-        for occasion, keywords in self.occasion_keywords.items():
-            for keyword in keywords:
-                if keyword in user_input_lower:
-                    logger.info(f"Occasion推定: '{user_input}' -> {occasion} (キーワード: {keyword})")
-                    return occasion
+        occasion = self.detect_occasion(user_input)
+        if occasion:
+            return occasion
         
         # デフォルトは結婚祝い
         logger.info(f"Occasion推定: '{user_input}' -> wedding_celebration (デフォルト)")
         return "wedding_celebration"
     
+    def detect_occasion(self, user_input: str) -> Optional[str]:
+        """
+        ユーザー入力にoccasionのキーワードが含まれていれば返す
+        
+        Args:
+            user_input: ユーザーの入力文字列
+            
+        Returns:
+            検出したoccasion（該当なしの場合はNone。estimate_occasion と違い既定値を補わない）
+        """
+        # 全occasionのキーワードを1回の走査で照合し、定義順で最初にヒットしたoccasionを採用
+        matched = self.occasion_matcher.find(user_input)
+        for occasion in self.occasion_matcher.group_names:
+            if occasion in matched:
+                logger.info(f"Occasion推定: '{user_input}' -> {occasion} (キーワード: {matched[occasion][0]})")
+                return occasion
+        
+        return None
+    
     def get_products_for_llm(self, max_products: Optional[int] = 100) -> List[Dict[str, str]]:
         """
         LLM用に最適化された商品データを取得
@@ -186,17 +463,84 @@ class ProductDataLoader:
         # LLM用に必要な情報のみ抽出
         llm_products = []
         for i, product in enumerate(products[:max_products] if max_products else products):
-            llm_products.append({
-                "id": product.get("id", f"product_{i}"),
-                "title": product.get("title", ""),
-                "description": product.get("description", ""),
-                "price": product.get("price", 0),
-                "merchant": product.get("merchant", "")
-            })
+            llm_products.append(self._to_llm_product(product, i))
         
         logger.info(f"LLM用商品データを準備しました: {len(llm_products)} 件")
         return llm_products
     
+    def select_products_for_llm(self, user_input: str, max_products: int = 10) -> List[Dict[str, str]]:
+        """
+        ユーザー入力に関連する商品だけをLLM用に絞り込む
+        
+        文字bigramの転置索引でIDF重み付きスコアを付け（商品名の一致は2倍）、
+        入力からoccasionが検出できた場合はそのoccasionの商品を優先する。
+        商品名が実質同じ商品（販促表記違い等）は上位の1件のみ残す。
+        候補が max_products に満たない場合は、occasionの一致する商品→先頭の商品の順で補う。
+        
+        Args:
+            user_input: ユーザー入力
+            max_products: 最大商品数
+            
+        Returns:
+            LLM用商品データ（関連度順）
+        """
+        snapshot = self.get_snapshot()
+        products = snapshot.products
+        postings_index, title_bigrams = snapshot.search_index()
+        occasion = self.detect_occasion(user_input)
+        
+        scores: Dict[int, float] = defaultdict(float)
+        total = len(products)
+        for gram in char_bigrams(user_input):
+            postings = postings_index.get(gram)
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for index in postings:
+                scores[index] += idf * (2.0 if gram in title_bigrams[index] else 1.0)
+        
+        ranked = [index for index, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+        if occasion:
+            matched = [index for index in ranked if snapshot.matches_occasion(index, occasion)]
+            matched_set = set(matched)
+            ranked = matched + [index for index in ranked if index not in matched_set]
+        
+        def backfill():
+            if occasion:
+                yield from snapshot.by_occasion.get(occasion, [])
+            yield from range(total)
+        
+        selected: List[Dict[str, str]] = []
+        seen_ids: Set[str] = set()
+        seen_titles: Set[str] = set()
+        for index in (*ranked, *backfill()):
+            if len(selected) >= max_products:
+                break
+            product = products[index]
+            product_id = product.get("id", f"product_{index}")
+            title_key = compact_text(product.get("title", "")).lower()
+            if product_id in seen_ids or title_key in seen_titles:
+                continue
+            seen_ids.add(product_id)
+            seen_titles.add(title_key)
+            selected.append(self._to_llm_product(product, index))
+        
+        logger.info(
+            f"LLM用候補を絞り込みました: {len(selected)} 件 / 全 {total} 件 "
+            f"(occasion: {occasion or '未検出'}, 一致: {len(scores)} 件)"
+        )
+        return selected
+    
+    def _to_llm_product(self, product: Dict[str, Any], index: int) -> Dict[str, str]:
+        """LLM用に必要な項目のみ抽出"""
+        return {
+            "id": product.get("id", f"product_{index}"),
+            "title": product.get("title", ""),
+            "description": product.get("description", ""),
+            "price": product.get("price", 0),
+            "merchant": product.get("merchant", "")
+        }
+    
     def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
         """
         商品IDで特定の商品を取得
@@ -207,13 +551,33 @@ class ProductDataLoader:
         Returns:
             商品データ（見つからない場合はNone）
         """
-        products = self.load_products_data()
+        return self.get_snapshot().get_by_id(product_id)
+    
+    def get_products_by_occasion(self, occasion: str) -> List[Dict[str, Any]]:
+        """
+        occasionに該当する商品を取得（付与済みのoccasion・occasions、または商品名のキーワードで判定）
         
-        for product in products:
-            if product.get("id") == product_id:
-                return product
+        Args:
+            occasion: occasion名
+            
+        Returns:
+            商品データリスト（読み込み順）
+        """
+        snapshot = self.get_snapshot()
+        return [snapshot.products[index] for index in snapshot.by_occasion.get(occasion, [])]
+    
+    def get_products_by_genre_group(self, genre_group: str) -> List[Dict[str, Any]]:
+        """
+        genre_group に該当する商品を取得
         
-        return None
+        Args:
+            genre_group: ジャンルグループ（food, drink, home 等）
+            
+        Returns:
+            商品データリスト（読み込み順）
+        """
+        snapshot = self.get_snapshot()
+        return [snapshot.products[index] for index in snapshot.by_genre_group.get(genre_group, [])]
     
     def get_data_file_info(self) -> Dict[str, Any]:
         """
@@ -223,15 +587,18 @@ class ProductDataLoader:
             ファイル情報
         """
         try:
-            latest_file = self.get_latest_data_file()
-            file_stat = os.stat(latest_file)
+            latest_file, mtime_ns, file_size, _ = self._current_manifest()
+            snapshot = self._state.snapshot
             
             return {
                 "file_path": latest_file,
                 "file_name": os.path.basename(latest_file),
-                "file_size": file_stat.st_size,
-                "modified_time": datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
-                "products_count": len(self.load_products_data()) if self.products_cache else None
+                "file_size": file_size,
+                "modified_time": datetime.fromtimestamp(mtime_ns / 1e9).isoformat(),
+                "products_count": len(snapshot.products) if snapshot else None,
+                "loaded_file": snapshot.source_file if snapshot else None,
+                "loaded_time": snapshot.loaded_at.isoformat() if snapshot else None,
+                "catalog_snapshot": isinstance(snapshot.products, CatalogRecords) if snapshot else None,
             }
             
         except Exception as e:
@@ -241,16 +608,25 @@ class ProductDataLoader:
 class AIRecommendationService:
     """AI推薦サービス"""
     
-    def __init__(self):
-        """初期化"""
+    def __init__(self, openai_client: Optional[Any] = None):
+        """
+        初期化
+        
+        Args:
+            openai_client: 使用する AsyncOpenAI クライアント（未指定ならプロセス内で共有するクライアント）
+        """
         self.data_loader = ProductDataLoader()
         
-        # OpenAI API設定
+        # OpenAI API設定（クライアントは接続プールごと共有し、リクエストごとに作らない）
         self.llm_available = OPENAI_AVAILABLE and settings.is_ai_enabled()
-        if self.llm_available:
-            self.openai_client = openai.OpenAI(api_key=settings.openai_api_key)
-        else:
-            self.openai_client = None
+        self._openai_client = openai_client
+    
+    @property
+    def openai_client(self) -> Optional[Any]:
+        """AsyncOpenAI クライアント（AI機能が無効ならNone）"""
+        if self._openai_client is not None:
+            return self._openai_client
+        return get_async_openai_client() if self.llm_available else None
         
     async def get_recommendations(
         self, 
@@ -268,8 +644,10 @@ class AIRecommendationService:
             レコメンド結果
         """
         try:
-            # 商品データを取得
-            products_data = self.data_loader.get_products_for_llm(max_products=50)
+            # 入力に関連する商品のみに絞り込んでからLLMに渡す
+            products_data = self.data_loader.select_products_for_llm(
+                user_input, max_products=max(settings.llm_candidate_count, max_recommendations)
+            )
             
             if self.llm_available and self.openai_client:
                 # 実際のOpenAI API使用
@@ -313,8 +691,8 @@ class AIRecommendationService:
         Returns:
             (AIレスポンス文章, 選択された商品IDリスト)
         """
-        # 商品データを文字列形式に変換（LLMに送信するため）
-        products_text = self._format_products_for_llm(products_data)
+        # 商品データを文字列形式に変換（LLMに送信するため、トークン予算内に圧縮）
+        products_text = self._format_products_for_llm(products_data, settings.llm_product_token_budget)
         
         # プロンプト作成
         system_prompt = """あなたはハレの日ギフトの専門アドバイザーです。
@@ -343,7 +721,8 @@ class AIRecommendationService:
 """
 
         try:
-            response = self.openai_client.chat.completions.create(
+            # 非同期クライアントで呼び出し、応答待ちの間もイベントループを塞がない
+            response = await self.openai_client.chat.completions.create(
                 model=settings.openai_model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -367,27 +746,40 @@ class AIRecommendationService:
             logger.error(f"OpenAI API呼び出しエラー: {str(e)}")
             raise
     
-    def _format_products_for_llm(self, products_data: List[Dict[str, str]]) -> str:
+    def _format_products_for_llm(
+        self,
+        products_data: List[Dict[str, str]],
+        token_budget: Optional[int] = None
+    ) -> str:
         """
         商品データをLLM用テキスト形式に変換
         
+        1商品1行に圧縮し（販促表記・装飾記号を除去、説明文は冒頭のみ）、
+        先頭から順にトークン予算に収まる商品まで含める（最低1件は含める）。
+        
         Args:
-            products_data: 商品データリスト
+            products_data: 商品データリスト（関連度順）
+            token_budget: 商品リスト全体の上限トークン数（Noneなら無制限）
             
         Returns:
             フォーマットされた商品リスト文字列
         """
         formatted_products = []
+        used_tokens = 0
         for product in products_data:
-            formatted_product = f"""
-ID: {product.get('id', '')}
-商品名: {product.get('title', '')}
-価格: {product.get('price', 0)}円
-販売者: {product.get('merchant', '')}
-説明: {product.get('description', '')[:200]}...
-"""
+            formatted_product = (
+                f"ID: {product.get('id', '')} | "
+                f"{compact_text(product.get('title', ''), settings.llm_product_title_chars)} | "
+                f"{product.get('price', 0)}円 | "
+                f"{compact_text(product.get('description', ''), settings.llm_product_description_chars)}"
+            )
+            tokens = count_tokens(formatted_product, settings.openai_model)
+            if token_budget is not None and formatted_products and used_tokens + tokens > token_budget:
+                break
             formatted_products.append(formatted_product)
+            used_tokens += tokens
         
+        logger.info(f"LLM用商品リスト: {len(formatted_products)}/{len(products_data)} 件, {used_tokens} トークン")
         return "\n".join(formatted_products)
     
     def _convert_to_gift_items(
@@ -427,6 +819,7 @@ ID: {product.get('id', '')}
                     affiliate_url=product.get("affiliate_url", ""),
                     source=product.get("source", "rakuten"),
                     occasion=estimated_occasion,  # 推定したoccasion
+                    updated_at=product.get("updated_at", 0),
                     keywords=[]
                 )
                 selected_products.append(gift_item)
@@ -587,6 +980,7 @@ ID: {product.get('id', '')}
                     affiliate_url=product.get("affiliate_url", ""),
                     source=product.get("source", "rakuten"),
                     occasion=estimated_occasion,  # 推定したoccasion
+                    updated_at=product.get("updated_at", 0),
                     keywords=[]
                 )
                 selected.append(gift_item)
@@ -597,6 +991,8 @@ ID: {product.get('id', '')}
         """
         相手の関係・性別・年代に基づく商品最適化
         
+        性別→年代→関係性の順に優先度が上がる（関係性のキーワードスコアが最優先、同点なら年代、性別、元の順序）。
+        
         Args:
             products_data: 商品データリスト
             user_input: ユーザー入力
@@ -605,58 +1001,37 @@ ID: {product.get('id', '')}
             最適化された商品リスト
         """
         user_input_lower = user_input.lower()
-        optimized_products = products_data.copy()
+        groups = []
         
         # 性別に基づく最適化
         if "男性" in user_input_lower:
-            # 男性向け商品を優先
-            male_keywords = ["男性", "メンズ", "紳士", "ビール", "ウイスキー", "ネクタイ", "革製品", "工具"]
-            optimized_products.sort(key=lambda p: self._calculate_keyword_score(p, male_keywords), reverse=True)
-            
+            groups.append("male")
         elif "女性" in user_input_lower:
-            # 女性向け商品を優先
-            female_keywords = ["女性", "レディース", "婦人", "花", "化粧品", "アクセサリー", "スイーツ", "紅茶"]
-            optimized_products.sort(key=lambda p: self._calculate_keyword_score(p, female_keywords), reverse=True)
+            groups.append("female")
         
         # 年代に基づく最適化
         if "20代" in user_input_lower:
-            young_keywords = ["トレンド", "おしゃれ", "SNS", "可愛い", "カジュアル"]
-            optimized_products.sort(key=lambda p: self._calculate_keyword_score(p, young_keywords), reverse=True)
-            
+            groups.append("young")
         elif "60代" in user_input_lower or "70代" in user_input_lower or "シニア" in user_input_lower:
-            senior_keywords = ["健康", "高級", "伝統", "上品", "品格", "老舗", "和風"]
-            optimized_products.sort(key=lambda p: self._calculate_keyword_score(p, senior_keywords), reverse=True)
+            groups.append("senior")
         
         # 関係性に基づく最適化
         if "上司" in user_input_lower or "目上" in user_input_lower:
-            formal_keywords = ["高級", "上品", "フォーマル", "品格", "老舗", "のし"]
-            optimized_products.sort(key=lambda p: self._calculate_keyword_score(p, formal_keywords), reverse=True)
-            
+            groups.append("formal")
         elif "友人" in user_input_lower or "同僚" in user_input_lower:
-            casual_keywords = ["カジュアル", "気軽", "おしゃれ", "トレンド", "可愛い"]
-            optimized_products.sort(key=lambda p: self._calculate_keyword_score(p, casual_keywords), reverse=True)
+            groups.append("casual")
         
-        return optimized_products
-    
-    def _calculate_keyword_score(self, product: Dict[str, str], keywords: List[str]) -> int:
-        """
-        商品に対するキーワードスコア計算
+        if not groups:
+            return products_data.copy()
         
-        Args:
-            product: 商品データ
-            keywords: キーワードリスト
-            
-        Returns:
-            スコア
-        """
-        score = 0
-        product_text = (product.get("title", "") + " " + product.get("description", "")).lower()
+        # 商品ごとに1回の走査で全キーワード群のスコアを求め、後から適用した群ほど優先して並べる
+        def sort_key(product: Dict[str, str]) -> tuple:
+            counts = RECIPIENT_PREFERENCE_MATCHER.counts(
+                product.get("title", "") + " " + product.get("description", "")
+            )
+            return tuple(counts[group] for group in reversed(groups))
         
-        for keyword in keywords:
-            if keyword.lower() in product_text:
-                score += 1
-                
-        return score
+        return sorted(products_data, key=sort_key, reverse=True)
     
     async def health_check(self) -> Dict[str, Any]:
         """
@@ -674,8 +1049,8 @@ ID: {product.get('id', '')}
             if OPENAI_AVAILABLE and settings.is_ai_enabled():
                 try:
                     # 簡単なテストリクエスト
-                    test_response = self.openai_client.chat.completions.create(
-                        model="gpt-3.5-turbo",
+                    test_response = await self.openai_client.chat.completions.create(
+                        model=settings.openai_model,
                         messages=[{"role": "user", "content": "Hello"}],
                         max_tokens=10
                     )
@@ -701,4 +1076,74 @@ ID: {product.get('id', '')}
                 "llm_available": False,
                 "openai_status": "error",
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+
+
+class FallbackRecommender:
+    """
+    縮退モードの商品推薦（検索エンジン障害時の最終フォールバック、プロセス内で1つ）
+    
+    起動時に商品データ（カタログスナップショットがあればそちら）と候補絞り込み用索引を読み込んでおき、
+    フォールバック時はLLMを呼ばず、ローカルの候補絞り込みと相手情報による並べ替えだけで返す。
+    障害中のリクエスト内でファイルの読み込み・解析や外部APIの呼び出しを行わない。
+    """
+    
+    _instance = None
+    _instance_lock = Lock()
+    
+    def __new__(cls, *args, **kwargs):
+        """シングルトンパターンで1つのインスタンスのみ生成"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+    
+    def __init__(self):
+        """初期化（商品データの読み込みは preload で行う）"""
+        if hasattr(self, '_initialized'):
+            return
+        
+        self.service = AIRecommendationService()
+        # 縮退時は外部APIに依存しない（障害時にLLMの待ち時間を足さない）
+        self.service.llm_available = False
+        self.ready = False
+        self._initialized = True
+    
+    def preload(self) -> bool:
+        """
+        商品データと候補絞り込み用索引を読み込む（起動時に別スレッドで呼ぶ）
+        
+        Returns:
+            読み込めたかどうか
+        """
+        try:
+            started = time.perf_counter()
+            snapshot = self.service.data_loader.get_snapshot()
+            snapshot.search_index()
+            self.ready = True
+            logger.info(
+                f"フォールバック用商品データを読み込みました: {len(snapshot.products)} 件 "
+                f"({(time.perf_counter() - started) * 1000:.0f}ms)"
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"フォールバック用商品データを読み込めませんでした: {str(e)}")
+            return False
+    
+    async def recommend(self, user_input: str, limit: int) -> List[GiftItem]:
+        """
+        縮退モードで商品を推薦
+        
+        Args:
+            user_input: ユーザー入力
+            limit: 推薦商品数
+            
+        Returns:
+            GiftItemリスト
+        """
+        if not self.ready:
+            logger.warning("フォールバック用商品データが未読み込みのため、このリクエスト内で読み込みます")
+        recommendations = await self.service.get_recommendations(user_input, limit)
+        self.ready = True
+        return recommendations.get("recommendations", [])
@@ -0,0 +1,197 @@
+"""
+候補プールサイズの適応制御
+
+このファイルの役割:
+- ハイブリッド検索・フォールバック検索で取得する候補件数を動的に決定
+- 意図の「形」（用途/ジャンル/予算/相手情報の有無）ごとにローリング統計を保持
+- 広い検索（ヒット多・上位候補だけで決まる）では取得件数を減らし、
+  狭い検索（予算フィルタ等で多く脱落する・再ランキングで深い候補が選ばれる）では増やす
+
+統計の中身:
+- total_hits: フィルタ適用後のエンジン側総ヒット数（選択性の指標）の指数移動平均
+- survival: 取得した候補のうち、後段フィルタ（予算等）を通過した割合の指数移動平均
+- depth: 再ランキング後の上位limit件が元の候補列のどの深さから来たか（limit比）の指数移動平均
+"""
+
+import math
+import logging
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, Optional
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolStats:
+    """意図の形ごとのローリング統計"""
+    observations: int = 0
+    total_hits: float = 0.0
+    survival: float = 1.0
+    depth: float = 1.0
+
+
+class CandidatePoolController:
+    """候補プールサイズ制御（プロセス内シングルトン）"""
+
+    _instance = None
+    _instance_lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """シングルトンパターンで1つのインスタンスのみ生成"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(
+        self,
+        min_pool: int = 5,
+        max_pool: int = 100,
+        alpha: float = 0.2,
+        warmup_observations: int = 5,
+        base_factor: float = 2.0,
+        depth_headroom: float = 1.5,
+        min_survival: float = 0.1
+    ):
+        """
+        初期化
+
+        Args:
+            min_pool: 取得件数の下限
+            max_pool: 取得件数の上限
+            alpha: 指数移動平均の平滑化係数
+            warmup_observations: 統計を使い始めるまでの観測数（それまでは呼び出し側の既定値）
+            base_factor: limitに対する最低限の取得倍率
+            depth_headroom: 観測した再ランキング深さに掛ける余裕係数
+            min_survival: 生存率の下限（極端な過剰取得を防ぐ）
+        """
+        if hasattr(self, '_initialized'):
+            return
+
+        self.min_pool = min_pool
+        self.max_pool = max_pool
+        self.alpha = alpha
+        self.warmup_observations = warmup_observations
+        self.base_factor = base_factor
+        self.depth_headroom = depth_headroom
+        self.min_survival = min_survival
+
+        self._stats: Dict[str, PoolStats] = {}
+        self._lock = Lock()
+        self._initialized = True
+
+    @staticmethod
+    def has_recipient_info(user_intent: Dict[str, Any]) -> bool:
+        """相手情報による再ランキング対象か"""
+        return bool(
+            user_intent.get('relationship') or user_intent.get('gender') or user_intent.get('age_range')
+        )
+
+    @classmethod
+    def intent_shape(cls, user_intent: Dict[str, Any], genre_group: Optional[str] = None) -> str:
+        """
+        意図の形をキー化
+
+        値そのものではなく「どのフィルタが効いているか」でまとめることで、
+        少ない観測数でも統計が安定する。
+        """
+        occasion = user_intent.get('occasion')
+        has_occasion = bool(occasion) and occasion != 'unknown'
+        has_genre = bool(genre_group or user_intent.get('genre_group') or user_intent.get('keywords'))
+        has_price = bool(user_intent.get('budget_min') or user_intent.get('budget_max'))
+        has_recipient = cls.has_recipient_info(user_intent)
+
+        return f"o{int(has_occasion)}g{int(has_genre)}p{int(has_price)}r{int(has_recipient)}"
+
+    def recommend(self, user_intent: Dict[str, Any], limit: int, default: int) -> int:
+        """
+        取得すべき候補件数を決定
+
+        Args:
+            user_intent: ユーザー意図
+            limit: 最終的に必要な件数
+            default: 統計が溜まるまでの既定値（従来のハードコード値）
+
+        Returns:
+            候補プールサイズ
+        """
+        shape = self.intent_shape(user_intent)
+        with self._lock:
+            stats = self._stats.get(shape)
+            if stats is None or stats.observations < self.warmup_observations:
+                return default
+            total_hits = stats.total_hits
+            survival = stats.survival
+            depth = stats.depth
+
+        # 再ランキングで上位に来る候補の深さ（limit比）に余裕を持たせ、後段フィルタの脱落分を補う
+        factor = max(self.base_factor, depth * self.depth_headroom)
+        needed = limit * factor / max(survival, self.min_survival)
+        pool = math.ceil(needed)
+
+        # エンジン側の総ヒット数以上を要求しても結果は増えない
+        if total_hits > 0:
+            pool = min(pool, math.ceil(total_hits * 1.2))
+
+        return max(limit, self.min_pool, min(pool, self.max_pool))
+
+    def observe(
+        self,
+        user_intent: Dict[str, Any],
+        limit: int,
+        fetched: int,
+        survivors: int,
+        depth: int,
+        total_hits: Optional[int] = None
+    ):
+        """
+        検索結果を観測して統計を更新
+
+        Args:
+            user_intent: ユーザー意図
+            limit: 最終的に必要だった件数
+            fetched: 実際に取得した候補数
+            survivors: 後段フィルタ後に残った候補数
+            depth: 最終上位limit件のうち、元の候補列で最も深い位置（1始まり）
+            total_hits: エンジン側の総ヒット数（不明ならNone）
+        """
+        if fetched <= 0 or limit <= 0:
+            return
+
+        shape = self.intent_shape(user_intent)
+        survival = min(survivors / fetched, 1.0)
+        depth_ratio = max(depth, 1) / limit
+
+        with self._lock:
+            stats = self._stats.setdefault(shape, PoolStats())
+            if stats.observations == 0:
+                stats.survival = survival
+                stats.depth = depth_ratio
+                stats.total_hits = float(total_hits or 0)
+            else:
+                stats.survival += self.alpha * (survival - stats.survival)
+                stats.depth += self.alpha * (depth_ratio - stats.depth)
+                if total_hits is not None:
+                    stats.total_hits += self.alpha * (total_hits - stats.total_hits)
+            stats.observations += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """統計のスナップショット（ヘルスチェック・デバッグ用）"""
+        with self._lock:
+            return {
+                shape: {
+                    "observations": stats.observations,
+                    "total_hits": round(stats.total_hits, 1),
+                    "survival": round(stats.survival, 3),
+                    "depth": round(stats.depth, 2)
+                }
+                for shape, stats in self._stats.items()
+            }
+
+    def reset(self):
+        """統計をリセット"""
+        with self._lock:
+            self._stats.clear()
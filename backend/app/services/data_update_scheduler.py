@@ -12,7 +12,6 @@ from typing import Optional
 
 from .data_updater import DataUpdater
 from .search_service_fixed import MeilisearchService
-from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 
 # ログ設定
@@ -29,7 +28,7 @@ class DataUpdateScheduler:
     def __init__(
         self,
         meilisearch_service: Optional[MeilisearchService] = None,
-        vector_store: Optional[FAISS] = None,
+        vector_store_path: Optional[str] = None,
         embeddings: Optional[OpenAIEmbeddings] = None,
         update_time: str = "03:00"  # デフォルトは午前3時
     ):
@@ -38,13 +37,13 @@ class DataUpdateScheduler:
         
         Args:
             meilisearch_service: Meilisearchサービス
-            vector_store: FAISSベクトルストア
+            vector_store_path: ベクトルストアのディレクトリ（未指定なら設定値・既定の場所）
             embeddings: 埋め込みモデル
             update_time: 更新時刻（HH:MM形式）
         """
         self.data_updater = DataUpdater(
             meilisearch_service=meilisearch_service,
-            vector_store=vector_store,
+            vector_store_path=vector_store_path,
             embeddings=embeddings
         )
         self.update_time = update_time
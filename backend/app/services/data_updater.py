@@ -3,7 +3,7 @@
 
 このファイルの役割:
 - 最新のrakuten_uchiwai_products_*.jsonファイルを自動選択
-- ベクトルストア、Meilisearchの差分更新
+- ベクトルストア（商品IDをキーに追加・再ベクトル化・削除）、Meilisearchの差分更新
 - 壊れたレコードの検出・ログ出力
 - 日次実行のためのジョブ機能
 """
@@ -16,15 +16,39 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
+from ..core.config import settings
 from ..schemas import GiftItem
 from .search_service_fixed import MeilisearchService
-from langchain_community.vectorstores import FAISS
+from .embedding_cache import EmbeddingCache
+from .vector_store import DEFAULT_EMBEDDING_MODEL, default_vector_store_path, sync_vector_store
+from ..utils.catalog_snapshot import CatalogRecords, open_fresh_catalog
 from langchain_openai import OpenAIEmbeddings
 
 # ログ設定
 logger = logging.getLogger(__name__)
 
 
+def vector_store_item(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    商品レコードからベクトルストアの1件（sync_vector_store の items の要素）を作る
+    
+    日次更新と scripts/build_vector_store.py で同じテキストを埋め込む（テキストが同じなら埋め込みキャッシュが効く）
+    """
+    # 商品情報をテキスト化
+    text = f"{record['title']} {record.get('merchant', '')} {record.get('occasion', '')}"
+    try:
+        price = int(float(record['price']))
+    except (TypeError, ValueError):
+        price = None
+    return {
+        'product_id': record['id'],
+        'text': text,
+        'occasion': record.get('occasion', ''),
+        'price': price,
+        'title': record['title'],
+    }
+
+
 class DataUpdater:
     """データ自動更新サービス"""
     
@@ -32,7 +56,7 @@ class DataUpdater:
         self,
         data_dir: str = "scripts/data",
         meilisearch_service: Optional[MeilisearchService] = None,
-        vector_store: Optional[FAISS] = None,
+        vector_store_path: Optional[str] = None,
         embeddings: Optional[OpenAIEmbeddings] = None
     ):
         """
@@ -41,12 +65,12 @@ class DataUpdater:
         Args:
             data_dir: データファイルディレクトリ
             meilisearch_service: Meilisearchサービス
-            vector_store: FAISSベクトルストア
+            vector_store_path: ベクトルストアのディレクトリ（未指定なら設定値・既定の場所）
             embeddings: 埋め込みモデル
         """
         self.data_dir = Path(data_dir)
         self.meilisearch_service = meilisearch_service
-        self.vector_store = vector_store
+        self.vector_store_path = vector_store_path or settings.vector_store_path or default_vector_store_path()
         self.embeddings = embeddings
         
         # データ検証ルール
@@ -145,10 +169,15 @@ class DataUpdater:
         invalid_records = []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 最新のカタログスナップショットがあればJSONを解析せずに読む（レコードは検証時に1件ずつ組み立てる）
+            catalog = open_fresh_catalog(str(file_path))
+            if catalog is not None:
+                data = CatalogRecords(catalog)
+            else:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
             
-            logger.info(f"データファイル読み込み完了: {len(data)}件")
+            logger.info(f"データファイル読み込み完了: {len(data)}件{' (カタログスナップショット)' if catalog is not None else ''}")
             
             for i, record in enumerate(data):
                 is_valid, errors = self.validate_record(record)
@@ -238,63 +267,61 @@ class DataUpdater:
             logger.error(f"Meilisearch更新エラー: {e}")
             return False
     
-    def update_vector_store(self, records: List[Dict]) -> bool:
+    def update_vector_store(self, records: List[Dict]) -> Optional[Dict[str, Any]]:
         """
-        ベクトルストアの更新（差分処理）
+        ベクトルストアの更新（商品IDをキーにした差分処理）
+        
+        新しい商品の追加・テキストが変わった商品の再ベクトル化・一覧から消えた商品の削除を行い、
+        変わっていない商品はベクトル化しない。ベクトル化が必要なテキストも先に埋め込みキャッシュを引く
         
         Args:
-            records: 更新するレコード
+            records: 現在の全商品レコード
             
         Returns:
-            更新成功フラグ
+            更新結果（added, updated, deleted, unchanged, compacted, total, deleted_rows, embedding_cache）、失敗時はNone
         """
-        if not self.vector_store or not self.embeddings:
-            logger.warning("ベクトルストアまたは埋め込みモデルが設定されていません")
-            return False
+        if not self.embeddings:
+            logger.warning("埋め込みモデルが設定されていません")
+            return None
         
         try:
-            # 新規レコードのテキスト作成
-            texts = []
-            metadatas = []
+            items = [vector_store_item(record) for record in records]
             
-            for record in records:
-                # 商品情報をテキスト化
-                text = f"{record['title']} {record.get('merchant', '')} {record.get('occasion', '')}"
-                metadata = {
-                    'id': record['id'],
-                    'title': record['title'],
-                    'price': record['price'],
-                    'merchant': record['merchant'],
-                    'occasion': record.get('occasion', ''),
-                    'source': 'rakuten_uchiwai'
-                }
-                
-                texts.append(text)
-                metadatas.append(metadata)
-            
-            # バッチ処理でベクトル化・追加
-            batch_size = 100  # 埋め込みAPIの制限考慮
-            total_added = 0
+            embedding_model = getattr(self.embeddings, 'model', DEFAULT_EMBEDDING_MODEL)
+            embed_documents = self.embeddings.embed_documents
+            cache = EmbeddingCache(settings.embedding_cache_path) if settings.embedding_cache_path else None
+            if cache:
+                embed_documents = cache.cached_embedder(embed_documents, embedding_model)
             
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i + batch_size]
-                batch_metadatas = metadatas[i:i + batch_size]
-                
-                # ベクトルストアに追加
-                self.vector_store.add_texts(
-                    texts=batch_texts,
-                    metadatas=batch_metadatas
+            try:
+                changes = sync_vector_store(
+                    self.vector_store_path,
+                    items,
+                    embed_documents,
+                    embedding_model=embedding_model,
+                    batch_size=100,  # 埋め込みAPIの制限考慮
+                    compact_ratio=settings.vector_store_compact_ratio,
+                    index_type=settings.vector_index_type,
+                    index_params=settings.get_vector_index_params(),
                 )
-                
-                total_added += len(batch_texts)
-                logger.info(f"ベクトルストア更新: {total_added}/{len(texts)}件完了")
+            finally:
+                if cache:
+                    cache.close()
+            changes['embedding_cache'] = cache.get_stats() if cache else None
             
-            logger.info(f"ベクトルストア更新完了: {total_added}件")
-            return True
+            logger.info(
+                f"ベクトルストア更新完了: 追加 {changes['added']}件, 再ベクトル化 {changes['updated']}件, "
+                f"削除 {changes['deleted']}件, 変更なし {changes['unchanged']}件"
+                f"{' (詰め直し実施)' if changes['compacted'] else ''}"
+            )
+            if cache:
+                stats = changes['embedding_cache']
+                logger.info(f"埋め込みキャッシュ: ヒット {stats['hits']}件, API呼び出し {stats['embedded']}件")
+            return changes
             
         except Exception as e:
             logger.error(f"ベクトルストア更新エラー: {e}")
-            return False
+            return None
     
     async def run_daily_update(self) -> Dict[str, Any]:
         """
@@ -312,6 +339,7 @@ class DataUpdater:
             'invalid_records': 0,
             'meilisearch_updated': False,
             'vector_store_updated': False,
+            'vector_store_changes': None,
             'errors': []
         }
         
@@ -342,9 +370,11 @@ class DataUpdater:
                     summary['errors'].append("Meilisearch更新失敗")
             
             # Step 4: ベクトルストア更新
-            if self.vector_store:
-                vector_success = self.update_vector_store(valid_records)
+            if self.embeddings:
+                vector_changes = self.update_vector_store(valid_records)
+                vector_success = vector_changes is not None
                 summary['vector_store_updated'] = vector_success
+                summary['vector_store_changes'] = vector_changes
                 if not vector_success:
                     summary['errors'].append("ベクトルストア更新失敗")
             
@@ -0,0 +1,154 @@
+"""
+埋め込みベクトルのディスクキャッシュ
+
+このファイルの役割:
+- (埋め込みモデル名, 埋め込み元テキスト) のハッシュをキーに、ベクトルを SQLite に保存
+- ベクトルストアの日次差分更新・全件作り直しの前に必ずここを引き、ミスしたテキストだけを埋め込みAPIに送る
+
+設計メモ:
+- キーは sha256(モデル名 + 区切り + テキスト)。テキストが1文字でも変われば別キー、モデルが変われば全件ミス
+- ベクトルは float32 のバイト列で保存（ベクトルストアと同じ精度）
+- 1回の呼び出し内で同じテキストが重複していても埋め込みAPIには1回だけ送る
+- 書き込みはバッチ単位でコミットするため、途中で中断しても埋め込み済みの分は次回ヒットする
+"""
+
+import hashlib
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+# SQLite の変数上限（古いバージョンは999）を超えないよう、IN 句は分割して引く
+_QUERY_CHUNK_SIZE = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS embeddings ("
+    " key TEXT PRIMARY KEY,"
+    " model TEXT NOT NULL,"
+    " dimension INTEGER NOT NULL,"
+    " vector BLOB NOT NULL,"
+    " created_at REAL NOT NULL) WITHOUT ROWID",
+)
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    """キャッシュキー（モデル名と埋め込み元テキストのハッシュ）"""
+    return hashlib.sha256(f"{model}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """埋め込みベクトルのディスクキャッシュ（更新ジョブ・作り直しスクリプト用）"""
+
+    def __init__(self, path: str):
+        """
+        初期化（ファイルが無ければ作成）
+
+        Args:
+            path: キャッシュ（SQLite）のパス
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "embedded": 0}
+
+    def get_many(self, model: str, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        キャッシュ済みのベクトルを取得
+
+        Returns:
+            テキスト → ベクトル（ヒットしたテキストのみ）
+        """
+        keys = {embedding_cache_key(model, text): text for text in texts}
+        key_list = list(keys)
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(key_list), _QUERY_CHUNK_SIZE):
+                chunk = key_list[start:start + _QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, vector in rows:
+                    found[keys[key]] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Any):
+        """ベクトルをまとめて保存"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimension, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (embedding_cache_key(model, text), model, int(vector.shape[0]), vector.tobytes(), now)
+                    for text, vector in zip(texts, vectors)
+                ],
+            )
+            self._conn.commit()
+
+    def embed_documents(
+        self,
+        texts: Sequence[str],
+        embed_documents: Callable[[List[str]], List[List[float]]],
+        model: str,
+    ) -> np.ndarray:
+        """
+        キャッシュを引いてから、ミスしたテキストだけをベクトル化
+
+        Args:
+            texts: ベクトル化するテキスト
+            embed_documents: 埋め込みAPIを呼ぶ関数（OpenAIEmbeddings.embed_documents など）
+            model: 埋め込みモデル名（キャッシュキーに含める）
+
+        Returns:
+            (件数, 次元) の float32 ベクトル（texts と同じ順）
+        """
+        cached = self.get_many(model, texts)
+        missing = [text for text in dict.fromkeys(texts) if text not in cached]
+        if missing:
+            vectors = np.asarray(embed_documents(missing), dtype=np.float32)
+            self.put_many(model, missing, vectors)
+            cached.update(zip(missing, vectors))
+
+        missing_set = set(missing)
+        miss_count = sum(1 for text in texts if text in missing_set)
+        with self._lock:
+            self._stats["hits"] += len(texts) - miss_count
+            self._stats["misses"] += miss_count
+            self._stats["embedded"] += len(missing)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([cached[text] for text in texts])
+
+    def cached_embedder(
+        self,
+        embed_documents: Callable[[List[str]], List[List[float]]],
+        model: str,
+    ) -> Callable[[List[str]], np.ndarray]:
+        """embed_documents と同じ形で呼べる、キャッシュ経由の関数を返す"""
+        return lambda texts: self.embed_documents(texts, embed_documents, model)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率等のメトリクス"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
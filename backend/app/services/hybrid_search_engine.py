@@ -9,13 +9,14 @@ Phase 2: ハイブリッド検索システム
 
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime
 
 from ..schemas import GiftItem, SearchParams, SearchResponse
 from .search_service_fixed import MeilisearchService
-from langchain_community.vectorstores import FAISS
+from .vector_store import MmapVectorStore
 from ..core.config import settings
+from ..utils.profiling import span, record_scores, is_profiling
 
 # ログ設定
 logger = logging.getLogger(__name__)
@@ -79,16 +80,23 @@ def create_hybrid_result(product: GiftItem, score: float, sources: List[str]) ->
 class HybridSearchEngine:
     """ハイブリッド検索エンジン（Phase 2）"""
     
-    def __init__(self, meilisearch_service: MeilisearchService, vector_store: FAISS):
+    def __init__(
+        self,
+        meilisearch_service: MeilisearchService,
+        vector_store: Optional[MmapVectorStore] = None,
+        vector_store_provider: Optional[Callable[[], Optional[MmapVectorStore]]] = None
+    ):
         """
         初期化
         
         Args:
             meilisearch_service: Meilisearch検索サービス
-            vector_store: FAISSベクトルストア
+            vector_store: ベクトルストア（FAISSによる近傍検索）
+            vector_store_provider: 検索のたびに現在のベクトルストアを返す関数（版の差し替えに追従する場合）
         """
         self.meilisearch_service = meilisearch_service
-        self.vector_store = vector_store
+        self._vector_store = vector_store
+        self.vector_store_provider = vector_store_provider
         
         # 検索戦略の重み設定
         self.search_weights = {
@@ -99,12 +107,20 @@ class HybridSearchEngine:
         
         logger.info("ハイブリッド検索エンジン初期化完了")
     
+    @property
+    def vector_store(self) -> Optional[MmapVectorStore]:
+        """現在のベクトルストア（provider があれば最新の版）"""
+        if self.vector_store_provider is not None:
+            return self.vector_store_provider()
+        return self._vector_store
+    
     async def hybrid_search(
         self,
         query: str,
         user_intent: Dict[str, Any],
         limit: int = 10,
-        semantic_threshold: float = 0.7
+        semantic_threshold: float = 0.7,
+        candidate_limit: Optional[int] = None
     ) -> Tuple[List[GiftItem], Dict[str, Any]]:
         """
         ハイブリッド検索メイン実行
@@ -114,6 +130,7 @@ class HybridSearchEngine:
             user_intent: Phase 1で抽出された意図データ
             limit: 取得件数
             semantic_threshold: セマンティック検索の類似度閾値
+            candidate_limit: 各検索で取得する候補数（未指定時は limit * 2）
             
         Returns:
             (商品リスト, 検索メタデータ)
@@ -125,30 +142,43 @@ class HybridSearchEngine:
             "performance": {}
         }
         
+        if candidate_limit is None:
+            candidate_limit = limit * 2
+        
         try:
             # Step 1: 意図ベース構造化フィルター構築
-            structured_params = self._build_structured_filters(user_intent)
-            search_metadata["steps"].append(f"構造化フィルター: {structured_params.__dict__}")
+            with span("build_filters") as sp:
+                structured_params = self._build_structured_filters(user_intent)
+                if is_profiling():
+                    # フィルター内容の文字列化はプロファイリング時のみ行う
+                    sp.set(filters=structured_params.model_dump(exclude_none=True))
+            search_metadata["steps"].append("構造化フィルター構築")
             
             # Step 2: セマンティック検索実行
-            semantic_results = await self._semantic_search(query, limit * 2)
+            with span("semantic_search", k=candidate_limit):
+                semantic_results = await self._semantic_search(query, candidate_limit)
             search_metadata["steps"].append(f"セマンティック検索: {len(semantic_results)}件")
             
             # Step 3: 構造化検索実行
-            structured_results = await self._structured_search(structured_params, limit * 2)
+            with span("structured_search", limit=candidate_limit):
+                structured_results, structured_total_hits = await self._structured_search(
+                    structured_params, candidate_limit
+                )
             search_metadata["steps"].append(f"構造化検索: {len(structured_results)}件")
             
             # Step 4: 結果マージとスコアリング
-            merged_results = self._merge_and_score(
-                semantic_results,
-                structured_results,
-                user_intent,
-                query
-            )
+            with span("merge_and_score"):
+                merged_results = self._merge_and_score(
+                    semantic_results,
+                    structured_results,
+                    user_intent,
+                    query
+                )
             search_metadata["steps"].append(f"マージ・スコアリング: {len(merged_results)}件")
             
             # Step 5: 意図適合性フィルタリング
-            filtered_results = self._intent_compatibility_filter(merged_results, user_intent)
+            with span("intent_filter"):
+                filtered_results = self._intent_compatibility_filter(merged_results, user_intent)
             search_metadata["steps"].append(f"意図フィルタリング: {len(filtered_results)}件")
             
             # Step 6: 最終スコア順ソート
@@ -161,6 +191,10 @@ class HybridSearchEngine:
                 "total_time_ms": (end_time - start_time).total_seconds() * 1000,
                 "semantic_count": len(semantic_results),
                 "structured_count": len(structured_results),
+                "structured_total_hits": structured_total_hits,
+                "candidate_limit": candidate_limit,
+                "merged_count": len(merged_results),
+                "filtered_count": len(filtered_results),
                 "final_count": len(final_products)
             }
             
@@ -285,13 +319,19 @@ class HybridSearchEngine:
             スコア付き商品リスト
         """
         try:
+            # 検索の途中で版が差し替わっても、この検索は取得した版で最後まで行う
+            vector_store = self.vector_store
+            if vector_store is None:
+                return []
+            
             # ベクトル検索実行
-            docs_with_scores = self.vector_store.similarity_search_with_score(query, k=limit)
+            docs_with_scores = vector_store.similarity_search_with_score(query, k=limit)
             
             results = []
             for doc, score in docs_with_scores:
                 # スコア正規化（FAISSは距離なので、類似度に変換）
                 similarity = max(0, 1 - score / 2)  # 簡易正規化
+                record_scores(doc.metadata.get('product_id', ''), {"semantic_score": round(similarity, 4)})
                 
                 results.append({
                     'product_id': doc.metadata.get('product_id', ''),
@@ -308,7 +348,7 @@ class HybridSearchEngine:
             logger.error(f"セマンティック検索エラー: {str(e)}")
             return []
     
-    async def _structured_search(self, params: SearchParams, limit: int) -> List[Dict[str, Any]]:
+    async def _structured_search(self, params: SearchParams, limit: int) -> Tuple[List[Dict[str, Any]], int]:
         """
         構造化検索実行
         
@@ -317,7 +357,7 @@ class HybridSearchEngine:
             limit: 取得件数
             
         Returns:
-            スコア付き商品リスト
+            (スコア付き商品リスト, フィルタ適用後の総ヒット数)
         """
         try:
             params.limit = limit
@@ -327,6 +367,7 @@ class HybridSearchEngine:
             for item in search_result.hits:
                 # 構造化スコア計算（価格適合性、評価など）
                 structured_score = self._calculate_structured_score(item, params)
+                record_scores(item.id, {"structured_score": round(structured_score, 4)})
                 
                 results.append({
                     'product_id': item.id,
@@ -337,11 +378,11 @@ class HybridSearchEngine:
             
             if settings.enable_debug_logs:
                 logger.debug(f"構造化検索結果: {len(results)}件")
-            return results
+            return results, search_result.total
             
         except Exception as e:
             logger.error(f"構造化検索エラー: {str(e)}")
-            return []
+            return [], 0
     
     def _calculate_structured_score(self, item: GiftItem, params: SearchParams) -> float:
         """
@@ -453,6 +494,7 @@ class HybridSearchEngine:
                         score=1.0 - (i * 0.1),  # 順位ベーススコア
                         sources=['structured']
                     )
+                    record_scores(product.id, {"hybrid_score": hybrid_result['hybrid_score']})
                     results.append(hybrid_result)
                     logger.info(f"商品追加: {product.title[:30]}... - {product.price}円")
                     
@@ -687,6 +729,8 @@ class HybridSearchEngine:
                 }
             })
             
+            record_scores(product_id, final_results[-1]['score_breakdown'])
+            
             # ショップ件数をカウント
             merchant_count[merchant] = merchant_count.get(merchant, 0) + 1
         
@@ -0,0 +1,259 @@
+"""
+意図抽出キャッシュ
+
+このファイルの役割:
+- ユーザー入力を正規化（NFKC・空白・句読点）してキャッシュキーを生成
+- メモリ上の上限付きLRU層＋ローカルディスク（SQLite）層の2段キャッシュ
+  （ホストを跨いで共有する場合は、さらに共有キャッシュ層（Redis等）を併用できる）
+- プロンプトのハッシュでエントリをバージョン管理（プロンプト修正時は自動的に無効化）
+- ヒット率等のメトリクスを提供
+
+設計メモ:
+- 同一意図の再リクエストはメモリ層で完結する（辞書参照＋コピーのみ）
+- ディスク層はプロセス再起動後のウォームアップ用。ヒットしたエントリはメモリ層に昇格する
+- ディスク層の障害時はメモリ層のみで動作を継続する
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+import unicodedata
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from ..utils.cache import TTLCache
+from ..utils.shared_cache import SharedCacheBackend
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# 範囲・大小の記号（予算の下限／上限の向きを表すため、除去せず正規の記号にそろえる）
+_RANGE_MARKERS = {
+    **{ch: "~" for ch in "~〜～-‐‑–—―−"},
+    **{ch: "<" for ch in "<≤≦"},
+    **{ch: ">" for ch in ">≥≧"},
+}
+
+# 共有キャッシュ層に置く期間（プロンプトが変わればキーも変わるため、古いエントリは期限で消える）
+SHARED_TTL_SECONDS = 7 * 24 * 3600
+
+
+def normalize_intent_input(text: str) -> str:
+    """
+    キャッシュキー用にユーザー入力を正規化
+
+    - NFKC（全角英数・半角カナ・互換文字の統一）
+    - 英字の小文字化
+    - 範囲・大小の記号（〜 ～ ~ - < > 等）は「~」「<」「>」にそろえて残す
+      （「3000円〜」と「〜3000円」は下限と上限で意図が異なる）
+    - それ以外の句読点・記号類の除去（「:」「、」等はラベル・区切り表記の揺れ）
+    - 連続空白の1つへの圧縮と前後空白の除去
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(
+        f" {_RANGE_MARKERS[ch]} " if ch in _RANGE_MARKERS
+        else " " if unicodedata.category(ch).startswith(("P", "S"))
+        else ch
+        for ch in text
+    )
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def prompt_version(*parts: str) -> str:
+    """プロンプト（およびモデル名等）からバージョン文字列を生成"""
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+class IntentCache:
+    """意図抽出キャッシュ（プロセス内シングルトン）"""
+
+    _instance = None
+    _instance_lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """シングルトンパターンで1つのインスタンスのみ生成"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 1024,
+        shared: Optional[SharedCacheBackend] = None
+    ):
+        """
+        初期化
+
+        Args:
+            path: ディスク層（SQLite）のパス。Noneならメモリ層のみ
+            max_entries: メモリ層の最大エントリ数
+            shared: ディスク層の後に参照する共有キャッシュ層（任意）
+        """
+        if hasattr(self, '_initialized'):
+            return
+
+        self.path = path
+        self.max_entries = max_entries
+        self.shared = shared
+        self._memory = TTLCache(max_entries=max_entries)
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._purged_for: Optional[str] = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "disk_errors": 0}
+
+        if path:
+            self._open_disk(path)
+
+        self._initialized = True
+
+    def _open_disk(self, path: str):
+        """ディスク層を開く（失敗時はメモリ層のみで継続）"""
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS intent_cache ("
+                " key TEXT PRIMARY KEY,"
+                " version TEXT NOT NULL,"
+                " intent TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+            logger.info(f"✅ 意図キャッシュ（ディスク層）初期化完了: {path}")
+        except Exception as e:
+            logger.warning(f"意図キャッシュのディスク層を開けません（メモリ層のみで継続）: {e}")
+            self._conn = None
+
+    @staticmethod
+    def make_key(user_input: str, version: str) -> str:
+        """正規化済み入力とプロンプトバージョンからキーを生成"""
+        normalized = normalize_intent_input(user_input)
+        return f"{version}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+    def get(self, user_input: str, version: str) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュから意図を取得
+
+        Args:
+            user_input: ユーザー入力（正規化前）
+            version: プロンプトバージョン
+
+        Returns:
+            意図（呼び出し側で変更しても良いコピー）、無ければNone
+        """
+        key = self.make_key(user_input, version)
+
+        with self._lock:
+            intent = self._memory.get(key)
+            if intent is not None:
+                self._stats["memory_hits"] += 1
+                return copy.deepcopy(intent)
+
+            intent = self._disk_get(key)
+            if intent is not None:
+                self._memory.set(key, intent)
+                self._stats["disk_hits"] += 1
+                return copy.deepcopy(intent)
+
+        if self.shared is not None:
+            intent = self.shared.get(f"intent:{key}")
+            if intent is not None:
+                with self._lock:
+                    self._memory.set(key, intent)
+                    self._stats["shared_hits"] += 1
+                return copy.deepcopy(intent)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, user_input: str, version: str, intent: Dict[str, Any]):
+        """キャッシュに意図を保存（メモリ層・ディスク層・共有層）"""
+        key = self.make_key(user_input, version)
+        value = copy.deepcopy(intent)
+
+        with self._lock:
+            self._memory.set(key, value)
+            self._stats["stores"] += 1
+            self._disk_put(key, version, value)
+        if self.shared is not None:
+            self.shared.set(f"intent:{key}", value, SHARED_TTL_SECONDS)
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._conn is None:
+            return None
+        try:
+            row = self._conn.execute("SELECT intent FROM intent_cache WHERE key = ?", (key,)).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            self._stats["disk_errors"] += 1
+            logger.warning(f"意図キャッシュ読み込みエラー: {e}")
+            return None
+
+    def _disk_put(self, key: str, version: str, intent: Dict[str, Any]):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO intent_cache (key, version, intent, created_at) VALUES (?, ?, ?, ?)",
+                (key, version, json.dumps(intent, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+        except Exception as e:
+            self._stats["disk_errors"] += 1
+            logger.warning(f"意図キャッシュ書き込みエラー: {e}")
+
+    def purge_stale_versions(self, current_version: str) -> int:
+        """現在のプロンプトバージョン以外のエントリをディスク層から削除（バージョンごとに1回だけ実行）"""
+        if self._conn is None or self._purged_for == current_version:
+            return 0
+        with self._lock:
+            self._purged_for = current_version
+            try:
+                cursor = self._conn.execute("DELETE FROM intent_cache WHERE version != ?", (current_version,))
+                self._conn.commit()
+                if cursor.rowcount:
+                    logger.info(f"旧バージョンの意図キャッシュを削除: {cursor.rowcount}件")
+                return cursor.rowcount
+            except Exception as e:
+                self._stats["disk_errors"] += 1
+                logger.warning(f"意図キャッシュ削除エラー: {e}")
+                return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率等のメトリクス"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"] + stats["shared_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["disk_enabled"] = self._conn is not None
+        return stats
+
+    def clear(self):
+        """全エントリとメトリクスをクリア"""
+        with self._lock:
+            self._memory.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM intent_cache")
+                    self._conn.commit()
+                except Exception as e:
+                    logger.warning(f"意図キャッシュクリアエラー: {e}")
@@ -0,0 +1,106 @@
+"""
+OpenAI 非同期クライアントの共有
+
+このファイルの役割:
+- プロセス内で1つの AsyncOpenAI クライアント（httpx の接続プール）を共有し、リクエストごとの接続確立を避ける
+- タイムアウト・リトライ回数・接続数上限を設定値から適用
+- OPENAI_BASE_URL でローカルの疑似サーバー（scripts/fake_openai_server.py）に向け、
+  ネットワーク無しで負荷試験できるようにする
+
+設計メモ:
+- httpx の接続はイベントループに紐づくため、クライアントは生成時のイベントループでのみ使い回す
+  （通常はワーカーごとに1つ。テスト等でループが変わった場合は作り直す）
+- 終了時は close_async_openai_client() で接続プールを閉じる（main.py の shutdown フック）
+"""
+
+import asyncio
+import logging
+from threading import Lock
+from typing import Any, Optional
+
+import httpx
+
+try:
+    import openai
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+from ..core.config import settings
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+_client: Optional[Any] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_client_lock = Lock()
+
+
+def openai_timeout() -> httpx.Timeout:
+    """OpenAI API呼び出しのタイムアウト（接続は短め、全体は応答生成を待てる長さ）"""
+    return httpx.Timeout(settings.openai_timeout_seconds, connect=settings.openai_connect_timeout_seconds)
+
+
+def create_async_openai_client(
+    http_client: Optional[httpx.AsyncClient] = None,
+    max_retries: Optional[int] = None,
+) -> Any:
+    """
+    設定値から AsyncOpenAI クライアントを生成
+
+    Args:
+        http_client: 使用するHTTPクライアント（未指定なら接続数上限付きの接続プールを新規作成）
+        max_retries: SDKの再試行回数（未指定なら OPENAI_MAX_RETRIES。呼び出し側で再試行する場合は0）
+    """
+    if not OPENAI_AVAILABLE:
+        raise RuntimeError("openai パッケージがインストールされていません")
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive_connections,
+            ),
+            timeout=openai_timeout(),
+        )
+    return openai.AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url or None,
+        timeout=openai_timeout(),
+        max_retries=settings.openai_max_retries if max_retries is None else max_retries,
+        http_client=http_client,
+    )
+
+
+def get_async_openai_client() -> Optional[Any]:
+    """
+    共有の AsyncOpenAI クライアントを取得（AI機能が無効ならNone）
+
+    現在のイベントループで生成済みならそれを返し、無ければ生成する。
+    """
+    if not (OPENAI_AVAILABLE and settings.is_ai_enabled()):
+        return None
+
+    global _client, _client_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    with _client_lock:
+        if _client is None or (loop is not None and _client_loop is not loop):
+            _client = create_async_openai_client()
+            _client_loop = loop
+            logger.info(
+                f"OpenAI非同期クライアントを生成しました (base_url={settings.openai_base_url or 'default'}, "
+                f"timeout={settings.openai_timeout_seconds}s, max_retries={settings.openai_max_retries})"
+            )
+        return _client
+
+
+async def close_async_openai_client():
+    """共有クライアントの接続プールを閉じる"""
+    global _client, _client_loop
+    with _client_lock:
+        client, _client, _client_loop = _client, None, None
+    if client is not None:
+        await client.close()
@@ -10,25 +10,36 @@ Phase 3: パフォーマンス最適化版 LangChain RAGサービス
 import asyncio
 import json
 import logging
-import hashlib
 import time
 import os
-from typing import List, Dict, Any, Optional, Tuple
+import uuid
+import unicodedata
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
+from threading import Lock, Thread
 
 # LangChain imports
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
 
 from ..core.config import settings
 from ..schemas import GiftItem, SearchParams
+from ..utils.profiling import span, record_scores, is_profiling
+from ..utils.deadline import RequestBudget
+from ..utils.cache import TTLCache, make_cache_key
+from ..utils.shared_cache import TieredCache, get_shared_cache
 from .search_service_fixed import MeilisearchService
 from .hybrid_search_engine import HybridSearchEngine
+from .candidate_pool import CandidatePoolController
+from .reranker import CandidateReranker, affinity_sort
+from .intent_cache import IntentCache, prompt_version
+from .reason_store import ProductReasonStore, bucket_intent, profile_bucket
+from .advice_cache import AdviceCache, prewarm_buckets
+from .ai_recommendation_service import FallbackRecommender
+from .vector_store import MmapVectorStore, default_vector_store_path, load_vector_store, store_signature
 
 # ログ設定
 logger = logging.getLogger(__name__)
@@ -39,63 +50,157 @@ logger = logging.getLogger(__name__)
 
 
 class VectorStoreManager:
-    """ベクトルストアのシングルトン管理"""
+    """
+    ベクトルストアのシングルトン管理
+    
+    保存先の版（metadata.sqlite3）の変化を一定間隔で確認し、新しい版はバックグラウンドで読み込み・検証してから
+    差し替える。差し替え中も利用側は古い版で検索を続け、古い版は猶予時間の経過後に閉じる。
+    """
     
     _instance = None
     _vector_store = None
     _lock = Lock()
+    _signature = None          # 読み込み済みの版の識別子
+    _failed_signature = None   # 読み込み・検証に失敗した版（同じ版を繰り返し読み込まない）
+    _checked_at = 0.0
+    _reload_thread: Optional[Thread] = None
+    _retired: List[Tuple[float, MmapVectorStore]] = []  # (退役時刻, 古い版)
     
     @classmethod
-    def get_vector_store(cls) -> Optional[FAISS]:
-        """ベクトルストアを取得（シングルトン）"""
+    def get_vector_store(cls) -> Optional[MmapVectorStore]:
+        """ベクトルストアを取得（シングルトン。新しい版があればバックグラウンドで差し替える）"""
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = cls()
                     cls._instance._load_vector_store()
+        else:
+            cls._check_for_update()
         
         return cls._vector_store
     
+    @staticmethod
+    def _store_path() -> str:
+        return settings.vector_store_path or default_vector_store_path()
+    
+    @classmethod
+    def _open_store(cls) -> Tuple[Optional[MmapVectorStore], Optional[Tuple[int, int, int]]]:
+        """現在の版を開いて検証する（失敗時は (None, 版)）"""
+        vector_store_path = cls._store_path()
+        signature = store_signature(vector_store_path)
+        store = load_vector_store(vector_store_path)
+        if store is None:
+            return None, signature
+        try:
+            store.validate()
+        except Exception as e:
+            logger.error(f"ベクトルストアの検証に失敗しました（版 {store.version}）: {e}")
+            store.close()
+            return None, signature
+        # 検索クエリは保存時と同じ埋め込みモデルでベクトル化する
+        store.embeddings = OpenAIEmbeddings(model=store.embedding_model, api_key=settings.openai_api_key)
+        store.set_search_params(ef_search=settings.vector_index_ef_search, nprobe=settings.vector_index_nprobe)
+        return store, signature
+    
     def _load_vector_store(self):
-        """ベクトルストアを読み込み"""
+        """ベクトルストアを読み込み（ベクトル本体は mmap で開くだけで、unpickle は行わない）"""
         try:
             if not settings.is_ai_enabled():
                 logger.warning("OpenAI APIキーが未設定のため、ベクトルストアは読み込まれません")
                 VectorStoreManager._vector_store = None
                 return
-                
-            vector_store_path = os.path.join(
-                os.path.dirname(__file__), 
-                "../../../data/vector_store"
-            )
             
-            if os.path.exists(vector_store_path):
-                embeddings = OpenAIEmbeddings(api_key=settings.openai_api_key)
-                VectorStoreManager._vector_store = FAISS.load_local(
-                    vector_store_path, 
-                    embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                logger.info("✅ ベクトルストア読み込み完了（シングルトン）")
-            else:
-                logger.warning(f"ベクトルストアが見つかりません: {vector_store_path}")
-                VectorStoreManager._vector_store = None
+            store, signature = VectorStoreManager._open_store()
+            VectorStoreManager._vector_store = store
+            VectorStoreManager._signature = signature if store is not None else None
+            VectorStoreManager._failed_signature = signature if store is None else None
+            VectorStoreManager._checked_at = time.monotonic()
                 
         except Exception as e:
             logger.error(f"ベクトルストア読み込みエラー: {str(e)}")
             VectorStoreManager._vector_store = None
     
+    @classmethod
+    def _check_for_update(cls):
+        """一定間隔で保存先の版を確認し、変わっていればバックグラウンドで読み込む"""
+        now = time.monotonic()
+        if now - cls._checked_at < settings.vector_store_poll_seconds or not settings.is_ai_enabled():
+            return
+        cls._checked_at = now
+        cls._release_retired()
+        
+        signature = store_signature(cls._store_path())
+        if signature is None or signature in (cls._signature, cls._failed_signature):
+            return
+        with cls._lock:
+            if cls._reload_thread is not None and cls._reload_thread.is_alive():
+                return
+            cls._reload_thread = Thread(target=cls.reload, name="vector-store-reload", daemon=True)
+            cls._reload_thread.start()
+    
+    @classmethod
+    def reload(cls) -> bool:
+        """
+        現在の版を読み込み・検証して差し替える（失敗時は今の版を使い続ける）
+        
+        Returns:
+            差し替えたかどうか
+        """
+        try:
+            store, signature = cls._open_store()
+        except Exception as e:
+            logger.error(f"ベクトルストア再読み込みエラー: {str(e)}")
+            return False
+        if store is None:
+            cls._failed_signature = signature
+            return False
+        
+        with cls._lock:
+            previous = cls._vector_store
+            cls._vector_store = store
+            cls._signature = signature
+            cls._failed_signature = None
+            if previous is not None:
+                # 実行中の検索は古い版のまま終わるよう、すぐには閉じない
+                cls._retired.append((time.monotonic(), previous))
+        logger.info(
+            f"✅ ベクトルストアを差し替えました: 版 {previous.version if previous else '-'} → {store.version} "
+            f"({store.live_count} 件, {store.index_type})"
+        )
+        return True
+    
+    @classmethod
+    def _release_retired(cls, force: bool = False):
+        """猶予時間を過ぎた古い版を閉じる"""
+        now = time.monotonic()
+        with cls._lock:
+            expired = [store for retired_at, store in cls._retired
+                       if force or now - retired_at >= settings.vector_store_release_grace_seconds]
+            cls._retired = [(retired_at, store) for retired_at, store in cls._retired if store not in expired]
+        for store in expired:
+            store.close()
+            logger.info(f"古いベクトルストアを解放しました: 版 {store.version}")
+    
     @classmethod
     def cleanup(cls):
         """リソースクリーンアップ"""
+        cls._release_retired(force=True)
         with cls._lock:
+            if cls._vector_store is not None:
+                cls._vector_store.close()
             cls._vector_store = None
             cls._instance = None
+            cls._signature = None
+            cls._failed_signature = None
+            cls._checked_at = 0.0
 
 
 from functools import lru_cache
 from threading import Lock
 
+# バックグラウンドで実行中のタスク（アドバイス文の追加生成等。完了まで参照を保持する）
+_background_tasks: set = set()
+
 class PerformanceOptimizer:
     """パフォーマンス最適化ユーティリティ"""
     
@@ -114,9 +219,19 @@ class PerformanceOptimizer:
         if hasattr(self, '_initialized'):
             return
             
-        self.cache = {}
         self.cache_ttl = timedelta(minutes=30)  # 30分キャッシュ
         self.max_cache_size = 1000  # キャッシュサイズ制限
+        self.max_cache_bytes = 64 * 1024 * 1024  # 値の合計サイズ上限
+        # プロセス内キャッシュ＋ワーカー間共有キャッシュ（SHARED_CACHE_URL）
+        self.cache = TieredCache(
+            TTLCache(
+                max_entries=self.max_cache_size,
+                ttl_seconds=self.cache_ttl.total_seconds(),
+                max_bytes=self.max_cache_bytes
+            ),
+            get_shared_cache(settings.shared_cache_url),
+            namespace="optimizer"
+        )
         self._executor = None
         self._lock = Lock()
         self._initialized = True
@@ -130,32 +245,27 @@ class PerformanceOptimizer:
         return self._executor
     
     def get_cache_key(self, data: Any) -> str:
-        """キャッシュキー生成"""
-        return hashlib.md5(str(data).encode()).hexdigest()
+        """キャッシュキー生成（辞書のキー順に依存しない）"""
+        return make_cache_key(data)
     
     def get_cached(self, key: str) -> Optional[Any]:
-        """キャッシュから取得"""
-        if key in self.cache:
-            value, timestamp = self.cache[key]
-            if datetime.now() - timestamp < self.cache_ttl:
-                return value
-            else:
-                del self.cache[key]
-        return None
+        """キャッシュから取得（期限切れはNone）"""
+        return self.cache.get(key)
     
-    def set_cached(self, key: str, value: Any):
-        """キャッシュに保存（サイズ制限付き）"""
-        # キャッシュサイズ制限チェック
-        if len(self.cache) >= self.max_cache_size:
-            # 古いエントリを削除（LRU的に）
-            oldest_key = min(self.cache.keys(), 
-                           key=lambda k: self.cache[k][1])
-            del self.cache[oldest_key]
-            
-        self.cache[key] = (value, datetime.now())
+    def set_cached(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        """キャッシュに保存（件数・サイズ上限を超えたら最も使われていないものから追い出す）"""
+        self.cache.set(key, value, ttl_seconds)
     
     def clear_cache(self):
-        """キャッシュクリア"""
+        """このプロセスのキャッシュをクリア（共有層は他のワーカーも使っているため消さない）"""
+        self.cache.local.clear()
+    
+    def clear_shared_cache(self):
+        """
+        プロセス内キャッシュと共有層の optimizer 名前空間をクリア（管理操作）
+        
+        全ワーカーのキャッシュが消えるため、デストラクタ・終了処理からは呼ばない
+        """
         self.cache.clear()
         
     def cleanup(self):
@@ -173,10 +283,61 @@ class PerformanceOptimizer:
 class OptimizedUserIntentExtractor:
     """最適化版意図抽出器"""
     
+    # ルールベース抽出: 用途（先に一致したものを採用）
+    OCCASION_RULES = [
+        ("結婚祝い", "wedding_celebration"),
+        ("出産祝い", "birth_celebration"),
+        ("新築祝い", "new_home_celebration"),
+        ("母の日", "mothers_day"),
+        ("父の日", "fathers_day"),
+        ("敬老の日", "respect_for_aged_day"),
+    ]
+    
+    # ルールベース抽出: 相手
+    RELATIONSHIP_RULES = [
+        (("上司", "目上"), "boss"),
+        (("同僚",), "colleague"),
+        (("友人",), "friend"),
+        (("親族", "家族"), "family"),
+    ]
+    
+    # ルールベース抽出: 予算（パターン, 種別）
+    BUDGET_RULES = [
+        (r"(\d+)円?[〜~](\d+)円?", "range"),           # 3000円〜5000円
+        (r"予算:?\s*(\d+)円?[〜~](\d+)円?", "range"),  # 予算: 3000円〜5000円
+        (r"(\d+)円?\s*から\s*(\d+)円?", "range"),       # 3000円から5000円
+        (r"(\d+)\s*-\s*(\d+)円?", "range"),            # 3000-5000円
+        (r"(\d+)万円?\s*(?:以下|以内|まで)", "max_man"),  # 1万円以下
+        (r"(\d+)円\s*(?:以下|以内|まで)", "max"),        # 5000円以内
+        (r"予算(?:なし|指定なし|は問わない)", "none"),
+    ]
+    
+    # 項目以外の自由記述がこの文字数を超えたらLLMに回す
+    RULE_RESIDUE_LIMIT = 6
+    
+    # 抽出段階ごとの件数（プロセス全体）
+    _tier_counts = {"rule": 0, "cache": 0, "llm": 0, "fallback": 0}
+    _tier_lock = Lock()
+    
     def __init__(self, llm: ChatOpenAI, optimizer: PerformanceOptimizer):
         self.llm = llm
         self.optimizer = optimizer
         self._setup_optimized_prompt()
+        
+        # 意図抽出キャッシュ（プロンプト変更時はバージョン不一致で自動的に無効化）
+        self.prompt_version = prompt_version(
+            "".join(message.prompt.template for message in self.intent_prompt.messages),
+            settings.openai_model
+        )
+        # ディスク層（SQLite）は同一ホストのワーカー間で共有済みのため、共有層はホストを跨ぐ場合のみ使う
+        shared_cache = get_shared_cache(settings.shared_cache_url)
+        self.cache = IntentCache(
+            path=settings.intent_cache_path,
+            max_entries=settings.intent_cache_max_entries,
+            shared=shared_cache if shared_cache is not None and shared_cache.is_remote else None
+        ) if settings.intent_cache_enabled else None
+        if self.cache is not None:
+            self.cache.purge_stale_versions(self.prompt_version)
     
     def _setup_optimized_prompt(self):
         """最適化された簡潔プロンプト"""            
@@ -186,7 +347,7 @@ class OptimizedUserIntentExtractor:
 
 例：
 入力: "用途: 結婚祝い、相手: 友人、予算: 3000円〜5000円"
-出力: {"occasion":"wedding_celebration","target_relationship":"friend","budget_min":3000,"budget_max":5000,"keywords":["おしゃれ","お祝い"]}
+出力: {{"occasion":"wedding_celebration","target_relationship":"friend","budget_min":3000,"budget_max":5000,"keywords":["おしゃれ","お祝い"]}}
 
 予算の抽出規則:
 - "3000円〜5000円" → budget_min:3000, budget_max:5000
@@ -204,26 +365,51 @@ JSONのみを返してください。説明や前書きは不要です。
             ("user", "{user_input}")
         ])
     
+    async def extract_intent_tiered(self, user_input: str) -> Tuple[Dict[str, Any], str]:
+        """
+        段階的意図抽出
+        
+        1. ルールベース抽出（用途・予算・相手が明示されていれば信頼度が高い）
+        2. 信頼度が閾値未満の曖昧な入力のみ extract_intent（キャッシュ→LLM→ルールベースフォールバック）
+        
+        Returns:
+            (意図, 抽出段階 "rule" / "cache" / "llm" / "fallback")
+        """
+        intent, confidence = self.extract_intent_rules(user_input)
+        if confidence >= settings.intent_rule_confidence_threshold:
+            self._count_tier("rule")
+            logger.info(f"⚡ ルールベース意図抽出を採用 (confidence={confidence:.2f}): {intent}")
+            return intent, "rule"
+        
+        logger.info(f"ルールベース信頼度不足 (confidence={confidence:.2f})、LLM意図抽出へ")
+        return await self._extract_intent_with_tier(user_input)
+    
     async def extract_intent(self, user_input: str) -> Dict[str, Any]:
         """
         キャッシュ付き高速意図抽出
         """
-        # キャッシュ確認（一時的に無効化）
-        # cache_key = self.optimizer.get_cache_key(f"intent_{user_input}")
-        # cached_result = self.optimizer.get_cached(cache_key)
-        
-        # if cached_result:
-        #     logger.info(f"意図抽出キャッシュヒット: {user_input[:50]}...")
-        #     return cached_result
+        intent, _ = await self._extract_intent_with_tier(user_input)
+        return intent
+    
+    async def _extract_intent_with_tier(self, user_input: str) -> Tuple[Dict[str, Any], str]:
+        """キャッシュ付き意図抽出（どの段階で得られたかも返す）"""
+        # キャッシュ確認（正規化済み入力＋プロンプトバージョンで照合）
+        if self.cache is not None:
+            cached_result = self.cache.get(user_input, self.prompt_version)
+            if cached_result is not None:
+                logger.info(f"意図抽出キャッシュヒット: {user_input[:50]}...")
+                self._count_tier("cache")
+                return cached_result, "cache"
         
         try:
             start_time = time.time()
             
             logger.info(f"🔍 意図抽出開始: {user_input}")
             
-            response = await self.llm.ainvoke(
-                self.intent_prompt.format_messages(user_input=user_input)
-            )
+            with span("llm.intent_extraction"):
+                response = await self.llm.ainvoke(
+                    self.intent_prompt.format_messages(user_input=user_input)
+                )
             
             # 改善されたJSON解析
             content = response.content.strip()
@@ -256,40 +442,57 @@ JSONのみを返してください。説明や前書きは不要です。
             logger.info(f"✅ パース済み意図: {intent}")
             
             # デフォルト値補完
-            intent = self._normalize_intent(intent)
+            intent = {**self._get_default_intent(), **intent}
             
-            # キャッシュに保存（一時的に無効化）
-            # self.optimizer.set_cached(cache_key, intent)
+            # キャッシュに保存（LLM抽出に成功した場合のみ。フォールバック結果は保存しない）
+            if self.cache is not None:
+                self.cache.set(user_input, self.prompt_version, intent)
             
             elapsed = time.time() - start_time
             logger.info(f"意図抽出完了: {elapsed:.2f}s, {intent}")
             
-            return intent
+            self._count_tier("llm")
+            return intent, "llm"
             
         except json.JSONDecodeError as e:
             logger.warning(f"JSON解析エラー: {str(e)}、フォールバック使用")
-            fallback_intent = self._extract_intent_fallback(user_input)
-            return fallback_intent
             
         except ConnectionError as e:
             logger.error(f"LLM接続エラー: {str(e)}、フォールバック使用")
-            fallback_intent = self._extract_intent_fallback(user_input)
-            return fallback_intent
             
         except ValueError as e:
             logger.warning(f"意図データ変換エラー: {str(e)}、フォールバック使用")
-            fallback_intent = self._extract_intent_fallback(user_input)
-            return fallback_intent
             
         except Exception as e:
             logger.error(f"予期しないエラー ({type(e).__name__}): {str(e)}")
             import traceback
             logger.error(f"スタックトレース: {traceback.format_exc()}")
-            
-            # 簡易的な意図抽出フォールバック
-            fallback_intent = self._extract_intent_fallback(user_input)
-            logger.info(f"フォールバック意図抽出結果: {fallback_intent}")
-            return fallback_intent
+        
+        # 簡易的な意図抽出フォールバック
+        return self.extract_intent_fallback_tiered(user_input)
+    
+    def extract_intent_fallback_tiered(self, user_input: str) -> Tuple[Dict[str, Any], str]:
+        """ルールベースのフォールバック意図（LLM失敗時・時間予算超過時）"""
+        fallback_intent = self._extract_intent_fallback(user_input)
+        self._count_tier("fallback")
+        return fallback_intent, "fallback"
+    
+    @classmethod
+    def _count_tier(cls, tier: str):
+        with cls._tier_lock:
+            cls._tier_counts[tier] += 1
+    
+    @classmethod
+    def get_tier_stats(cls) -> Dict[str, Any]:
+        """抽出段階ごとの件数と割合"""
+        with cls._tier_lock:
+            counts = dict(cls._tier_counts)
+        total = sum(counts.values())
+        return {
+            "counts": counts,
+            "total": total,
+            "llm_skip_rate": round((counts["rule"] + counts["cache"]) / total, 4) if total else 0.0
+        }
     
     def _get_default_intent(self) -> Dict[str, Any]:
         """デフォルト意図（最小限）"""
@@ -303,62 +506,73 @@ JSONのみを返してください。説明や前書きは不要です。
             "urgency": "normal"
         }
     
-    def _extract_intent_fallback(self, user_input: str) -> Dict[str, Any]:
-        """簡易的な意図抽出（正規表現ベース）"""
+    def extract_intent_rules(self, user_input: str) -> Tuple[Dict[str, Any], float]:
+        """
+        ルールベース意図抽出（正規表現・キーワード）
+        
+        信頼度は明示された項目の重み（用途0.4・予算0.3・相手0.3）の合計。
+        用途・相手の候補が複数ある場合や、項目以外の自由記述が多い場合
+        （LLMならキーワード等を拾える入力）は減点する。
+        
+        Returns:
+            (意図, 信頼度 0.0〜1.0)
+        """
         import re
         
         intent = self._get_default_intent()
+        text = unicodedata.normalize("NFKC", user_input)
+        # 項目として解釈できた部分を除いた残りで自由記述量を測る
+        residue = text
+        confidence = 0.0
         
         # 用途の抽出（HAREGiftの新しいカテゴリに対応）
-        if "結婚祝い" in user_input:
-            intent["occasion"] = "wedding_celebration"
-        elif "出産祝い" in user_input:
-            intent["occasion"] = "birth_celebration"
-        elif "新築祝い" in user_input:
-            intent["occasion"] = "new_home_celebration"
-        elif "母の日" in user_input:
-            intent["occasion"] = "mothers_day"
-        elif "父の日" in user_input:
-            intent["occasion"] = "fathers_day"
-        elif "敬老の日" in user_input:
-            intent["occasion"] = "respect_for_aged_day"
+        occasions = [(phrase, value) for phrase, value in self.OCCASION_RULES if phrase in text]
+        if occasions:
+            intent["occasion"] = occasions[0][1]
+            confidence += 0.4 if len(occasions) == 1 else 0.1
+            for phrase, _ in occasions:
+                residue = residue.replace(phrase, " ")
         
         # 相手の抽出
-        if "上司" in user_input or "目上" in user_input:
-            intent["target_relationship"] = "boss"
-        elif "同僚" in user_input:
-            intent["target_relationship"] = "colleague"
-        elif "友人" in user_input:
-            intent["target_relationship"] = "friend"
-        elif "親族" in user_input or "家族" in user_input:
-            intent["target_relationship"] = "family"
+        relationships = [(phrases, value) for phrases, value in self.RELATIONSHIP_RULES if any(p in text for p in phrases)]
+        if relationships:
+            intent["target_relationship"] = relationships[0][1]
+            confidence += 0.3 if len(relationships) == 1 else 0.1
+            for phrases, _ in relationships:
+                for phrase in phrases:
+                    residue = residue.replace(phrase, " ")
         
         # 予算の抽出（正規表現）
-        budget_patterns = [
-            r"(\d+)円?〜(\d+)円?",  # 3000円〜5000円
-            r"(\d+)〜(\d+)円?",     # 3000〜5000円
-            r"予算:?\s*(\d+)円?〜(\d+)円?",  # 予算: 3000円〜5000円
-            r"(\d+)円?\s*から\s*(\d+)円?",  # 3000円から5000円
-            r"(\d+)\s*-\s*(\d+)円?",       # 3000-5000円
-        ]
-        
-        logger.info(f"🔍 予算抽出対象テキスト: '{user_input}'")
-        
-        for i, pattern in enumerate(budget_patterns):
-            match = re.search(pattern, user_input)
-            logger.info(f"  パターン{i+1} '{pattern}': {'マッチ' if match else 'なし'}")
-            if match:
-                budget_min = int(match.group(1))
-                budget_max = int(match.group(2))
-                intent["budget_min"] = budget_min
-                intent["budget_max"] = budget_max
-                logger.info(f"✅ 予算抽出成功: {budget_min}円〜{budget_max}円")
-                break
-        
-        if intent["budget_min"] is None:
-            logger.warning("❌ 予算抽出失敗")
+        for pattern, kind in self.BUDGET_RULES:
+            match = re.search(pattern, text)
+            if not match:
+                continue
+            if kind == "range":
+                intent["budget_min"] = int(match.group(1))
+                intent["budget_max"] = int(match.group(2))
+            elif kind == "max_man":
+                intent["budget_max"] = int(match.group(1)) * 10000
+            elif kind == "max":
+                intent["budget_max"] = int(match.group(1))
+            # kind == "none": 予算指定なしが明示されている
+            confidence += 0.3
+            residue = residue.replace(match.group(0), " ")
+            logger.debug(f"予算抽出: {intent['budget_min']}〜{intent['budget_max']}円 (pattern={pattern})")
+            break
         
-        logger.info(f"🔄 フォールバック意図抽出: {intent}")
+        # 項目ラベル・記号・数字を除いた自由記述が長い場合は減点
+        residue = re.sub(r"用途|相手|予算|関係性?|[\d\s\W_]", "", residue)
+        if len(residue) > self.RULE_RESIDUE_LIMIT:
+            confidence *= 0.6
+        
+        return intent, round(confidence, 2)
+    
+    def _extract_intent_fallback(self, user_input: str) -> Dict[str, Any]:
+        """簡易的な意図抽出（正規表現ベース）"""
+        intent, confidence = self.extract_intent_rules(user_input)
+        if intent["budget_min"] is None and intent["budget_max"] is None:
+            logger.warning("❌ 予算抽出失敗")
+        logger.info(f"🔄 フォールバック意図抽出: {intent} (confidence={confidence:.2f})")
         return intent
     
     async def get_fast_recommendation_with_intent(
@@ -462,6 +676,8 @@ class OptimizedLangChainRAGService:
         
         # パフォーマンス最適化コンポーネント
         self.optimizer = PerformanceOptimizer()
+        self.pool_controller = CandidatePoolController()
+        self.reranker = CandidateReranker()
         
         # 最適化されたLLM設定（APIキーが有効な場合のみ）
         if settings.is_ai_enabled():
@@ -481,41 +697,42 @@ class OptimizedLangChainRAGService:
         # 最適化された意図抽出器
         self.intent_extractor = OptimizedUserIntentExtractor(self.llm, self.optimizer)
         
-        # ベクトルストア（軽量版）
-        self.vector_store = None
+        # ベクトルストア（軽量版。版の差し替えに追従するため、参照は VectorStoreManager から都度取得）
         self.hybrid_engine = None
         
         # 初期化
         self._initialize_optimized_components()
     
+    @property
+    def vector_store(self) -> Optional[MmapVectorStore]:
+        """現在のベクトルストア（新しい版が読み込まれていれば差し替え後の版）"""
+        return VectorStoreManager.get_vector_store()
+    
+    def _hybrid_search_available(self) -> bool:
+        """ハイブリッド検索を使えるか（エンジンがあり、ベクトルストアの版が読み込まれている）"""
+        return self.hybrid_engine is not None and self.vector_store is not None
+    
     def _initialize_optimized_components(self):
         """最適化コンポーネントの初期化（シングルトンベクトルストア使用）"""
         try:
-            # シングルトンベクトルストア取得
-            self.vector_store = VectorStoreManager.get_vector_store()
-            
-            if self.vector_store:
-                logger.info("✅ 最適化ベクトルストア取得完了（シングルトン）")
-                
-                # 最適化ハイブリッドエンジン
-                self.hybrid_engine = HybridSearchEngine(
-                    meilisearch_service=self.meilisearch_service,
-                    vector_store=self.vector_store
-                )
-                # 検索重みを高速化向けに調整
-                self.hybrid_engine.search_weights = {
-                    "semantic_weight": 0.7,  # セマンティック重視
-                    "structured_weight": 0.3,
-                    "intent_boost": 0.15
-                }
-                logger.info("✅ 最適化ハイブリッドエンジン初期化完了")
-            else:
-                logger.warning("ベクトルストアが利用できません（AI機能制限モード）")
-                self.hybrid_engine = None
+            # 最適化ハイブリッドエンジン（検索のたびに現在の版を取得するため、起動時にベクトルストアが
+            # 無くても作成しておき、後から作成・差し替えられた版をそのまま使う）
+            self.hybrid_engine = HybridSearchEngine(
+                meilisearch_service=self.meilisearch_service,
+                vector_store_provider=VectorStoreManager.get_vector_store
+            )
+            # 検索重みを高速化向けに調整
+            self.hybrid_engine.search_weights = {
+                "semantic_weight": 0.7,  # セマンティック重視
+                "structured_weight": 0.3,
+                "intent_boost": 0.15
+            }
+            logger.info("✅ 最適化ハイブリッドエンジン初期化完了")
+            if self.vector_store is None:
+                logger.warning("ベクトルストアが利用できません（読み込まれるまでMeiliSearchのみで検索）")
             
         except Exception as e:
             logger.error(f"最適化コンポーネント初期化エラー: {str(e)}")
-            self.vector_store = None
             self.hybrid_engine = None
     
     async def get_fast_recommendation_with_intent(
@@ -523,16 +740,19 @@ class OptimizedLangChainRAGService:
         user_input: str,
         user_intent: Dict[str, Any],
         chat_history: List[Dict[str, str]] = None,
-        limit: int = 3
+        limit: int = 3,
+        budget: Optional[RequestBudget] = None
     ) -> Dict[str, Any]:
         """
         Phase 3: 構造化された意図データを使った高速推薦
         
         フロントエンドから構造化された意図データを受け取り、
         意図抽出ステップをスキップして直接検索・推薦を実行
+        AI応答・商品理由は時間予算の残りを締め切りとし、超過時は定型文で応答する
         """
         start_time = datetime.now()
         processing_steps = []
+        budget = budget or RequestBudget(settings.request_budget_seconds)
         
         try:
             logger.info(f"Phase 3: 構造化意図での高速推薦開始")
@@ -542,69 +762,32 @@ class OptimizedLangChainRAGService:
             normalized_intent = self._normalize_intent(user_intent)
             processing_steps.append(f"構造化意図データ受信・正規化完了")
             
-            # Step 2: 最適化ハイブリッド検索（ベクトルストア無しでも動作）
-            search_start = time.time()
-            if self.hybrid_engine:
-                hybrid_results, search_metadata = await self._fast_hybrid_search(
-                    query=user_input,
-                    user_intent=normalized_intent,
-                    limit=limit * 2  # より多くの候補を取得
-                )
-            else:
-                # フォールバック：MeiliSearchのみで検索
-                hybrid_results, search_metadata = await self._fallback_search(
-                    query=user_input,
-                    user_intent=normalized_intent,
-                    limit=limit * 2
-                )
-            search_time = time.time() - search_start
-            processing_steps.append(f"検索: {search_time:.2f}s")
-            
-            # dictをGiftItemオブジェクトに変換
-            from ..schemas.item import GiftItem
-            gift_items = []
-            for item in hybrid_results:
-                if isinstance(item, dict):
-                    try:
-                        gift_items.append(GiftItem(**item))
-                    except Exception as e:
-                        logger.warning(f"GiftItem変換エラー: {e}")
-                        continue
-                else:
-                    gift_items.append(item)
-            
-            hybrid_results = gift_items
-            logger.info(f"🔄 GiftItem変換完了: {len(hybrid_results)}件")
-            
-            # フォールバック検索を使用した場合は、既に完全処理済みのためスキップ
-            # （フォールバック検索内で: MeiliSearch検索→相手情報ランキング→件数制限まで完了）
-            if not (normalized_intent.get('relationship') or normalized_intent.get('gender') or normalized_intent.get('age_range')):
-                logger.info("相手情報なし: ランキングをスキップ")
-                # 予算フィルタのみ適用
-                if normalized_intent.get('budget_min') or normalized_intent.get('budget_max'):
-                    hybrid_results = self._apply_budget_filter(hybrid_results, normalized_intent)
-                    processing_steps.append(f"予算フィルタ適用: {len(hybrid_results)}件")
-            else:
-                logger.info("相手情報あり: フォールバック検索で既に完全処理済み（MeiliSearch→ランキング→件数制限）")
-                # フォールバック検索で既に全処理完了のため、何もしない
-            
-            # Step 4: 上位N件を選択
-            final_recommendations = hybrid_results[:limit]
+            # Step 2-4: 検索→GiftItem変換→予算フィルタ→上位N件
+            final_recommendations, search_metadata = await self._search_with_structured_intent(
+                user_input, normalized_intent, limit, processing_steps
+            )
             
             # Step 5: AI応答生成と個別商品理由生成
             response_start = time.time()
-            ai_response_task = asyncio.create_task(
-                self._generate_fast_response(user_input, normalized_intent, final_recommendations)
-            )
-            product_reasons_task = asyncio.create_task(
-                self._generate_product_reasons(final_recommendations, normalized_intent)
-            )
-            
-            ai_response, product_reasons = await asyncio.gather(
-                ai_response_task, product_reasons_task
-            )
+            with span("response_generation"):
+                ai_response_task = asyncio.create_task(budget.run(
+                    "advice",
+                    self._generate_fast_response(user_input, normalized_intent, final_recommendations),
+                    lambda: self._get_emergency_text(user_input, final_recommendations)
+                ))
+                product_reasons_task = asyncio.create_task(budget.run(
+                    "product_reasons",
+                    self._generate_product_reasons(final_recommendations, normalized_intent),
+                    lambda: self._get_template_product_reasons(final_recommendations, normalized_intent)
+                ))
+
+                ai_response, product_reasons = await asyncio.gather(
+                    ai_response_task, product_reasons_task
+                )
             response_time = time.time() - response_start
             processing_steps.append(f"AI応答生成: {response_time:.2f}s")
+            if budget.degraded:
+                processing_steps.append(f"時間予算超過によるフォールバック: {', '.join(budget.degraded_stages)}")
             
             # product_reasonsの内容をログ出力
             logger.info(f"📝 最終product_reasons: {product_reasons}")
@@ -626,9 +809,11 @@ class OptimizedLangChainRAGService:
                 "user_intent": normalized_intent,
                 "search_metadata": search_metadata,
                 "processing_steps": processing_steps,
+                "degraded_stages": list(budget.degraded_stages),
                 "performance": {
                     "total_endpoint_time_ms": total_time_ms,
-                    "optimization": "structured_intent"
+                    "optimization": "structured_intent",
+                    "latency_budget": budget.metadata()
                 },
                 "reasoning": f"構造化意図データを使用した高速推薦（{len(final_recommendations)}件）"
             }
@@ -640,6 +825,71 @@ class OptimizedLangChainRAGService:
             # フォールバック
             return await self.get_fast_recommendation(user_input, chat_history, limit)
     
+    async def _search_with_structured_intent(
+        self,
+        user_input: str,
+        normalized_intent: Dict[str, Any],
+        limit: int,
+        processing_steps: List[str]
+    ) -> Tuple[List[GiftItem], Dict[str, Any]]:
+        """構造化意図での検索（検索→GiftItem変換→予算フィルタ→上位N件）"""
+        cache_key = self._search_cache_key("structured", user_input, normalized_intent, limit)
+        cached = self._get_cached_search(cache_key, processing_steps)
+        if cached is not None:
+            return cached
+        
+        # Step 2: 最適化ハイブリッド検索（ベクトルストア無しでも動作）
+        search_start = time.time()
+        hybrid = self._hybrid_search_available()
+        with span("search", limit=limit * 2, hybrid=hybrid):
+            if hybrid:
+                hybrid_results, search_metadata = await self._fast_hybrid_search(
+                    query=user_input,
+                    user_intent=normalized_intent,
+                    limit=limit * 2  # より多くの候補を取得
+                )
+            else:
+                # フォールバック：MeiliSearchのみで検索
+                hybrid_results, search_metadata = await self._fallback_search(
+                    query=user_input,
+                    user_intent=normalized_intent,
+                    limit=limit * 2
+                )
+        search_time = time.time() - search_start
+        processing_steps.append(f"検索: {search_time:.2f}s")
+        
+        # dictをGiftItemオブジェクトに変換
+        from ..schemas.item import GiftItem
+        gift_items = []
+        for item in hybrid_results:
+            if isinstance(item, dict):
+                try:
+                    gift_items.append(GiftItem(**item))
+                except Exception as e:
+                    logger.warning(f"GiftItem変換エラー: {e}")
+                    continue
+            else:
+                gift_items.append(item)
+        
+        hybrid_results = gift_items
+        logger.info(f"🔄 GiftItem変換完了: {len(hybrid_results)}件")
+        
+        # フォールバック検索を使用した場合は、既に完全処理済みのためスキップ
+        # （フォールバック検索内で: MeiliSearch検索→相手情報ランキング→件数制限まで完了）
+        if not (normalized_intent.get('relationship') or normalized_intent.get('gender') or normalized_intent.get('age_range')):
+            logger.info("相手情報なし: ランキングをスキップ")
+            # 予算フィルタのみ適用
+            if normalized_intent.get('budget_min') or normalized_intent.get('budget_max'):
+                hybrid_results = self._apply_budget_filter(hybrid_results, normalized_intent)
+                processing_steps.append(f"予算フィルタ適用: {len(hybrid_results)}件")
+        else:
+            logger.info("相手情報あり: フォールバック検索で既に完全処理済み（MeiliSearch→ランキング→件数制限）")
+            # フォールバック検索で既に全処理完了のため、何もしない
+        
+        # Step 4: 上位N件を選択
+        self._set_cached_search(cache_key, hybrid_results[:limit], search_metadata)
+        return hybrid_results[:limit], search_metadata
+    
     def _normalize_intent(self, intent: Dict[str, Any]) -> Dict[str, Any]:
         """意図データ正規化（高速版）"""
         
@@ -715,25 +965,14 @@ class OptimizedLangChainRAGService:
                 search_query = query
                 logger.info(f"🔍 キーワード検索モード: '{query}'")
             
-            # SearchParamsを正しく設定（相手情報による再ランキングのため50件取得）
-            search_params = SearchParams(
-                q=search_query,  # 最適化されたクエリを使用
-                limit=50,  # 再ランキングのため50件取得
-                sort="review_count:desc"  # レビュー件数が多い順
-            )
-            
-            # occasionフィルタ
-            if user_intent.get('occasion'):
-                search_params.occasion = user_intent['occasion']
-                logger.info(f"📋 occasionフィルタ設定: {user_intent['occasion']}")
-                
-            # 予算フィルタ
-            if user_intent.get('budget_min'):
-                search_params.price_min = user_intent.get('budget_min')
-            if user_intent.get('budget_max'):
-                search_params.price_max = user_intent.get('budget_max')
-                
-            logger.info(f"💰 予算フィルタ設定: {search_params.price_min}〜{search_params.price_max}円")
+            # 相手情報の並べ替えをMeilisearchのソートで行える場合は、フィルタ後の全件から上位limit件だけ取得
+            engine_sort = self._engine_affinity_sort(user_intent)
+            if engine_sort:
+                pool_size = limit
+            else:
+                # 候補件数は意図の形ごとの統計から決定、初期値50件
+                pool_size = self.pool_controller.recommend(user_intent, limit, default=50)
+            search_params = self._meilisearch_params(search_query, user_intent, pool_size, engine_sort)
             
             # MeiliSearch検索実行
             search_response = self.meilisearch_service.search_items(search_params)
@@ -762,11 +1001,13 @@ class OptimizedLangChainRAGService:
                 else:
                     gift_items.append(result)
             
-            # 相手情報による再ランキング
-            if user_intent.get('relationship') or user_intent.get('gender') or user_intent.get('age_range'):
-                logger.info(f"👥 相手情報による再ランキング開始: {len(gift_items)}件")
-                gift_items = self._rank_by_recipient_info(gift_items, user_intent)
-                logger.info(f"✅ 相手情報による再ランキング完了: {len(gift_items)}件")
+            # 相手情報による再ランキング（エンジン側で並べ替え済みなら不要）
+            if engine_sort:
+                rerank_info = {"model": "engine_sort", "sort": engine_sort}
+            else:
+                candidates = gift_items
+                gift_items, rerank_info = self._rerank_candidates(gift_items, user_intent)
+                self._observe_candidate_pool(user_intent, limit, candidates, gift_items, search_response.total)
             
             # 最終的にlimit件数に絞り込み
             gift_items = gift_items[:limit]
@@ -782,12 +1023,14 @@ class OptimizedLangChainRAGService:
             metadata = {
                 "strategy": "meilisearch_only",
                 "total_hits": search_response.total,
+                "candidate_pool_size": pool_size,
                 "applied_filters": {
                     "occasion": search_params.occasion,
                     "price_min": search_params.price_min,
                     "price_max": search_params.price_max
                 },
-                "ranking_applied": bool(user_intent.get('relationship') or user_intent.get('gender') or user_intent.get('age_range'))
+                "ranking_applied": rerank_info is not None,
+                "reranker": rerank_info
             }
             
             logger.info(f"✅ フォールバック検索完了: {len(final_results)}件の商品を取得")
@@ -797,6 +1040,34 @@ class OptimizedLangChainRAGService:
             logger.error(f"フォールバック検索エラー: {str(e)}")
             return [], {"strategy": "emergency", "error": str(e)}
     
+    def _meilisearch_params(
+        self,
+        search_query: str,
+        user_intent: Dict[str, Any],
+        pool_size: int,
+        engine_sort: Optional[List[str]]
+    ) -> SearchParams:
+        """MeiliSearchのみの検索パラメータ（用途・予算はエンジン側でフィルタする）"""
+        search_params = SearchParams(
+            q=search_query,
+            limit=pool_size,
+            sort=engine_sort or "review_count:desc"  # 相手情報アフィニティ順、またはレビュー件数が多い順
+        )
+        
+        # occasionフィルタ
+        if user_intent.get('occasion'):
+            search_params.occasion = user_intent['occasion']
+            logger.info(f"📋 occasionフィルタ設定: {user_intent['occasion']}")
+            
+        # 予算フィルタ（エンジン側で絞るため、事後の予算フィルタで件数が減らない）
+        if user_intent.get('budget_min'):
+            search_params.price_min = user_intent.get('budget_min')
+        if user_intent.get('budget_max'):
+            search_params.price_max = user_intent.get('budget_max')
+            
+        logger.info(f"💰 予算フィルタ設定: {search_params.price_min}〜{search_params.price_max}円")
+        return search_params
+    
     def _apply_budget_filter(
         self,
         items: List[Dict[str, Any]],
@@ -862,9 +1133,12 @@ class OptimizedLangChainRAGService:
         Phase 3: 高速推薦メイン処理
         
         目標: 3-5秒以内での応答
+        リクエスト全体の時間予算（REQUEST_BUDGET_SECONDS）を各段の締め切りとして割り当て、
+        超過した段はルールベース意図・定型文に差し替える（degraded_stages に記録）
         """
         start_time = datetime.now()
         processing_steps = []
+        budget = RequestBudget(settings.request_budget_seconds)
         
         try:
             logger.info("Phase 3: 高速推薦開始")
@@ -876,84 +1150,280 @@ class OptimizedLangChainRAGService:
                     user_input=user_input,
                     user_intent=structured_intent,
                     chat_history=chat_history,
-                    limit=limit
+                    limit=limit,
+                    budget=budget
                 )
             else:
                 # Step 1: 意図抽出（高速並列実行）
                 intent_start = time.time()
-                user_intent = await self.intent_extractor.extract_intent(user_input)
+                with span("intent_extraction") as intent_span:
+                    user_intent, intent_tier = await budget.run(
+                        "intent_extraction",
+                        self.intent_extractor.extract_intent_tiered(user_input),
+                        lambda: self.intent_extractor.extract_intent_fallback_tiered(user_input),
+                        share=settings.intent_stage_budget_ratio
+                    )
+                    intent_span.set(tier=intent_tier)
                 intent_time = time.time() - intent_start
-                processing_steps.append(f"高速意図抽出: {intent_time:.2f}s")
+                processing_steps.append(f"高速意図抽出({intent_tier}): {intent_time:.2f}s")
 
-            # Step 2: ベクターストア初期化と検索を並列実行
-            if self.hybrid_engine:
-                search_start = time.time()
-                
-                # ベクターストア初期化と検索準備を並列実行
-                init_task = asyncio.create_task(self._ensure_vector_store_ready())
-                search_prep_task = asyncio.create_task(self._prepare_search_params(user_intent))
-                
-                # 初期化完了後、検索実行
-                await asyncio.gather(init_task, search_prep_task)
-                
-                # 検索実行
-                hybrid_results, search_metadata = await self._fast_hybrid_search(
-                    query=user_input,
-                    user_intent=user_intent,
-                    limit=limit
-                )
-                search_time = time.time() - search_start
-                processing_steps.append(f"並列ハイブリッド検索: {search_time:.2f}s")
-            if self.hybrid_engine:
-                search_start = time.time()
-                
-                
-                # 予算フィルタリングを強制適用（事後処理）
-                if user_intent.get('budget_min') or user_intent.get('budget_max'):
-                    hybrid_results = self._apply_budget_filter(hybrid_results, user_intent)
-                    processing_steps.append(f"予算フィルタ適用: {len(hybrid_results)}件")
-                
-                # Step 3: AI応答生成（並列化の準備）
-                response_start = time.time()
-                
-                # AI応答とメタデータ構築を並列実行
-                response_task = asyncio.create_task(self._generate_fast_response(
+            # ハイブリッドエンジンが利用できない場合のフォールバック
+            if not self.hybrid_engine:
+                return await self._emergency_response(user_input)
+            
+            # Step 2: ベクターストア初期化と検索（予算フィルタまで）
+            search_start = time.time()
+            hybrid_results, search_metadata = await self._search_with_extracted_intent(
+                user_input, user_intent, limit, processing_steps
+            )
+            search_time = time.time() - search_start
+            
+            # Step 3: AI応答生成（並列化の準備）
+            response_start = time.time()
+            
+            # AI応答とメタデータ構築を並列実行（AI応答は時間予算の残りが締め切り）
+            response_task = asyncio.create_task(budget.run(
+                "advice",
+                self._generate_fast_response(
                     user_input=user_input,
                     user_intent=user_intent,
                     recommended_products=hybrid_results
-                ))
-                
-                # メタデータ構築（並列で実行可能な部分）
-                metadata_task = asyncio.create_task(self._build_response_metadata(
-                    start_time, search_time, user_intent, search_metadata, processing_steps
-                ))
-                
-                # 両方の完了を待つ
+                ),
+                lambda: self._get_emergency_text(user_input, hybrid_results)
+            ))
+            
+            # メタデータ構築（並列で実行可能な部分）
+            metadata_task = asyncio.create_task(self._build_response_metadata(
+                start_time, search_time, user_intent, search_metadata, processing_steps
+            ))
+            
+            # 両方の完了を待つ
+            with span("response_generation"):
                 ai_response, base_metadata = await asyncio.gather(response_task, metadata_task)
-                
-                response_time = time.time() - response_start
-                processing_steps.append(f"高速応答生成: {response_time:.2f}s")
-                
-                # 最終レスポンス構築
-                base_metadata["performance"]["response_time_ms"] = response_time * 1000
-                
-                return {
-                    "ai_response": ai_response,
-                    "recommendations": hybrid_results,
-                    "product_reasons": {},  # フォールバック時は空の理由を追加
-                    "user_intent": user_intent,
-                    "intent_analysis": user_intent,  # フロントエンド互換性のため
-                    **base_metadata
-                }
             
-            else:
-                # ハイブリッドエンジンが利用できない場合のフォールバック
-                return await self._emergency_response(user_input)
+            response_time = time.time() - response_start
+            processing_steps.append(f"高速応答生成: {response_time:.2f}s")
+            
+            if budget.degraded:
+                processing_steps.append(f"時間予算超過によるフォールバック: {', '.join(budget.degraded_stages)}")
+            
+            # 最終レスポンス構築
+            base_metadata["performance"]["response_time_ms"] = response_time * 1000
+            base_metadata["performance"]["latency_budget"] = budget.metadata()
+            
+            return {
+                "ai_response": ai_response,
+                "recommendations": hybrid_results,
+                "product_reasons": {},  # フォールバック時は空の理由を追加
+                "user_intent": user_intent,
+                "intent_analysis": user_intent,  # フロントエンド互換性のため
+                "degraded_stages": list(budget.degraded_stages),
+                **base_metadata
+            }
                 
         except Exception as e:
             logger.error(f"高速推薦エラー: {str(e)}")
             return await self._emergency_response(user_input)
     
+    async def stream_fast_recommendation(
+        self,
+        user_input: str,
+        limit: int = 3,
+        structured_intent: Dict[str, Any] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        高速推薦のストリーミング版
+        
+        結果が確定した順にイベントを返し、検索完了時点で商品を表示できるようにする。
+        イベント順序:
+        1. intent: 意図（抽出段階付き）
+        2. products: 推薦商品と検索メタデータ（検索完了直後）
+        3. advice_delta / product_reason: アドバイス文の断片と商品理由（到着順に混在）
+        4. advice: アドバイス全文
+        5. done: 処理ステップとパフォーマンス指標
+        エラー時は error イベントを返して終了する。
+        
+        Yields:
+            {"event": イベント名, "data": JSON化可能なデータ}
+        """
+        start_time = time.time()
+        processing_steps = []
+        tasks: List[asyncio.Task] = []
+        
+        try:
+            # Step 1: 意図
+            with span("intent_extraction") as intent_span:
+                if structured_intent:
+                    user_intent, intent_tier = self._normalize_intent(structured_intent), "structured"
+                else:
+                    user_intent, intent_tier = await self.intent_extractor.extract_intent_tiered(user_input)
+                intent_span.set(tier=intent_tier)
+            processing_steps.append(f"意図抽出({intent_tier}): {time.time() - start_time:.2f}s")
+            yield {"event": "intent", "data": {"user_intent": user_intent, "tier": intent_tier}}
+            
+            # Step 2: 検索（完了次第、商品を返す）
+            if structured_intent:
+                products, search_metadata = await self._search_with_structured_intent(
+                    user_input, user_intent, limit, processing_steps
+                )
+            elif self.hybrid_engine:
+                products, search_metadata = await self._search_with_extracted_intent(
+                    user_input, user_intent, limit, processing_steps
+                )
+                products = products[:limit]
+            else:
+                products, search_metadata = [], {"strategy": "emergency"}
+            
+            # フォールバック経路ではdictが返ることがあるためGiftItemに揃える
+            gift_items = []
+            for item in products:
+                try:
+                    gift_items.append(item if isinstance(item, GiftItem) else GiftItem(**item))
+                except Exception as e:
+                    logger.warning(f"GiftItem変換エラー: {e}")
+            products = gift_items
+            time_to_products_ms = (time.time() - start_time) * 1000
+            yield {
+                "event": "products",
+                "data": {
+                    "recommendations": [p.model_dump() for p in products],
+                    "search_metadata": search_metadata,
+                    "time_to_products_ms": time_to_products_ms
+                }
+            }
+            
+            # Step 3: アドバイス文と商品理由を並行生成し、到着順に返す
+            response_start = time.time()
+            queue: asyncio.Queue = asyncio.Queue()
+            advice_parts: List[str] = []
+            
+            async def pump_advice():
+                if not products:
+                    advice_parts.append(self._get_emergency_text(user_input, products))
+                    await queue.put({"event": "advice_delta", "data": {"text": advice_parts[-1]}})
+                    return
+                async for chunk in self._stream_fast_response(user_input, user_intent, products):
+                    advice_parts.append(chunk)
+                    await queue.put({"event": "advice_delta", "data": {"text": chunk}})
+            
+            async def pump_reasons():
+                async for product_id, reason in self._iter_product_reasons(products, user_intent):
+                    await queue.put({"event": "product_reason", "data": {"product_id": product_id, "reason": reason}})
+            
+            async def run_generators():
+                try:
+                    await asyncio.gather(pump_advice(), pump_reasons())
+                finally:
+                    await queue.put(None)
+            
+            with span("response_generation", streaming=True):
+                tasks.append(asyncio.create_task(run_generators()))
+                while True:
+                    event = await queue.get()
+                    if event is None:
+                        break
+                    yield event
+                # 生成側の例外を伝播
+                await tasks[0]
+            
+            yield {"event": "advice", "data": {"text": "".join(advice_parts)}}
+            
+            processing_steps.append(f"ストリーミング応答生成: {time.time() - response_start:.2f}s")
+            yield {
+                "event": "done",
+                "data": {
+                    "processing_steps": processing_steps,
+                    "performance": {
+                        "time_to_products_ms": time_to_products_ms,
+                        "total_time_ms": (time.time() - start_time) * 1000,
+                        "optimization": "streaming"
+                    }
+                }
+            }
+            
+        except Exception as e:
+            logger.error(f"ストリーミング推薦エラー: {str(e)}")
+            yield {"event": "error", "data": {"detail": str(e)}}
+        
+        finally:
+            # クライアント切断時は生成中のLLM呼び出しを中断
+            for task in tasks:
+                task.cancel()
+    
+    async def _search_with_extracted_intent(
+        self,
+        user_input: str,
+        user_intent: Dict[str, Any],
+        limit: int,
+        processing_steps: List[str]
+    ) -> Tuple[List[GiftItem], Dict[str, Any]]:
+        """抽出した意図での検索（ベクターストア準備→ハイブリッド検索→予算フィルタ）"""
+        cache_key = self._search_cache_key("extracted", user_input, user_intent, limit)
+        cached = self._get_cached_search(cache_key, processing_steps)
+        if cached is not None:
+            return cached
+        
+        search_start = time.time()
+        
+        # ベクターストア初期化と検索準備を並列実行
+        init_task = asyncio.create_task(self._ensure_vector_store_ready())
+        search_prep_task = asyncio.create_task(self._prepare_search_params(user_intent))
+        
+        # 初期化完了後、検索実行
+        await asyncio.gather(init_task, search_prep_task)
+        
+        # 検索実行
+        with span("search", limit=limit):
+            hybrid_results, search_metadata = await self._fast_hybrid_search(
+                query=user_input,
+                user_intent=user_intent,
+                limit=limit
+            )
+        search_time = time.time() - search_start
+        processing_steps.append(f"並列ハイブリッド検索: {search_time:.2f}s")
+        
+        # 予算フィルタリングを強制適用（事後処理）
+        if user_intent.get('budget_min') or user_intent.get('budget_max'):
+            hybrid_results = self._apply_budget_filter(hybrid_results, user_intent)
+            processing_steps.append(f"予算フィルタ適用: {len(hybrid_results)}件")
+        
+        self._set_cached_search(cache_key, hybrid_results, search_metadata)
+        return hybrid_results, search_metadata
+    
+    def _search_cache_key(self, kind: str, user_input: str, user_intent: Dict[str, Any], limit: int) -> str:
+        """検索結果キャッシュのキー（入力・意図・件数が同じなら同じ結果）"""
+        return self.optimizer.get_cache_key({
+            "search": kind, "query": user_input, "intent": user_intent, "limit": limit
+        })
+    
+    def _get_cached_search(
+        self,
+        cache_key: str,
+        processing_steps: List[str]
+    ) -> Optional[Tuple[List[GiftItem], Dict[str, Any]]]:
+        """キャッシュ済みの検索結果（他ワーカーの結果も含む）を取得"""
+        if settings.search_result_cache_ttl_seconds <= 0:
+            return None
+        cached = self.optimizer.get_cached(cache_key)
+        if cached is None:
+            return None
+        try:
+            items = [GiftItem(**item) for item in cached["items"]]
+        except Exception as e:
+            logger.warning(f"検索結果キャッシュの復元エラー: {e}")
+            return None
+        processing_steps.append("検索: キャッシュヒット")
+        return items, {**cached["metadata"], "cache": "hit"}
+    
+    def _set_cached_search(self, cache_key: str, items: List[GiftItem], search_metadata: Dict[str, Any]):
+        """検索結果をキャッシュに保存（0件は一時的な障害の可能性があるため保存しない）"""
+        if settings.search_result_cache_ttl_seconds <= 0 or not items:
+            return
+        self.optimizer.set_cached(cache_key, {
+            "items": [item.model_dump() if isinstance(item, GiftItem) else item for item in items],
+            "metadata": search_metadata
+        }, ttl_seconds=settings.search_result_cache_ttl_seconds)
+    
     async def _build_response_metadata(self, start_time: datetime, search_time: float, 
                                        user_intent: Dict, search_metadata: Dict, 
                                        processing_steps: List[str]) -> Dict:
@@ -1001,37 +1471,37 @@ class OptimizedLangChainRAGService:
         """最適化ハイブリッド検索（フォールバック機能付き）"""
         try:
             logger.info(f"🔍 _fast_hybrid_search開始: query='{query}', limit={limit}")
-            logger.info(f"🔧 hybrid_engine利用可能: {self.hybrid_engine is not None}")
+            hybrid = self._hybrid_search_available()
+            logger.info(f"🔧 hybrid_engine利用可能: {hybrid}")
             
-            # HybridEngineが利用できない場合のフォールバック
-            if not self.hybrid_engine:
+            # HybridEngine・ベクトルストアが利用できない場合のフォールバック
+            if not hybrid:
                 logger.warning("HybridEngineが利用できません。MeiliSearchを直接使用")
                 
                 # MeiliSearchを直接使用
                 try:
                     logger.info("🔍 MeiliSearchで直接検索開始")
                     
-                    # MeiliSearchパラメータを構築（相手情報による再ランキングのため50件取得）
-                    from app.schemas.search import SearchParams
-                    search_params = SearchParams(
-                        query=query,
-                        limit=50,  # 再ランキングのため50件取得
-                        occasion=user_intent.get('occasion', ''),
-                        budget_min=user_intent.get('budget_min'),
-                        budget_max=user_intent.get('budget_max'),
-                        sort="review_count:desc"  # レビュー件数が多い順
-                    )
+                    # MeiliSearchパラメータを構築（エンジン側で相手情報順に並べられない場合は、
+                    # 候補件数を統計から決定（初期値50件）して再ランキングする）
+                    engine_sort = self._engine_affinity_sort(user_intent)
+                    pool_size = limit if engine_sort else self.pool_controller.recommend(user_intent, limit, default=50)
+                    # occasionがある場合は空クエリでフィルタ検索（_fallback_search と同じ）
+                    search_query = "" if user_intent.get('occasion') else query
+                    search_params = self._meilisearch_params(search_query, user_intent, pool_size, engine_sort)
                     
                     # MeiliSearchサービスで検索
                     search_response = self.meilisearch_service.search_items(search_params)
-                    gift_items = search_response.hits[:50]  # 最大50件取得
-                    logger.info(f"🎯 MeiliSearchから{len(gift_items)}件取得（レビュー件数順）")
+                    gift_items = search_response.hits[:pool_size]
+                    logger.info(f"🎯 MeiliSearchから{len(gift_items)}件取得（{'相手情報アフィニティ順' if engine_sort else 'レビュー件数順'}）")
                     
-                    # 相手情報による再ランキング
-                    if user_intent.get('relationship') or user_intent.get('gender') or user_intent.get('age_range'):
-                        logger.info(f"👥 相手情報による再ランキング開始: {len(gift_items)}件")
-                        gift_items = self._rank_by_recipient_info(gift_items, user_intent)
-                        logger.info(f"✅ 相手情報による再ランキング完了: {len(gift_items)}件")
+                    # 相手情報による再ランキング（エンジン側で並べ替え済みなら不要）
+                    if engine_sort:
+                        rerank_info = {"model": "engine_sort", "sort": engine_sort}
+                    else:
+                        candidates = gift_items
+                        gift_items, rerank_info = self._rerank_candidates(gift_items, user_intent)
+                        self._observe_candidate_pool(user_intent, limit, candidates, gift_items, search_response.total)
                     
                     # 最終的にlimit件数に絞り込み
                     gift_items = gift_items[:limit]
@@ -1039,7 +1509,8 @@ class OptimizedLangChainRAGService:
                     metadata = {
                         "search_method": "meilisearch_direct",
                         "total_results": len(gift_items),
-                        "fallback_reason": "hybrid_engine_unavailable"
+                        "fallback_reason": "hybrid_engine_unavailable",
+                        "reranker": rerank_info
                     }
                     
                     logger.info(f"MeiliSearch検索結果: {len(gift_items)}件")
@@ -1047,14 +1518,9 @@ class OptimizedLangChainRAGService:
                     
                 except Exception as e:
                     logger.error(f"MeiliSearch直接検索エラー: {str(e)}")
-                    # AIRecommendationServiceを最終フォールバック
-                    from .ai_recommendation_service import AIRecommendationService
-                    mock_service = AIRecommendationService()
-                    
-                    logger.info("🤖 AIRecommendationService.get_recommendationsを呼び出し中...")
-                    mock_recommendations = await mock_service.get_recommendations(query, limit)
-                    gift_items = mock_recommendations.get("recommendations", [])
-                    logger.info(f"🎯 AIRecommendationServiceから{len(gift_items)}件取得")
+                    # 起動時に読み込み済みの縮退モード推薦を最終フォールバック
+                    gift_items = await FallbackRecommender().recommend(query, limit)
+                    logger.info(f"🎯 縮退モード推薦から{len(gift_items)}件取得")
                     
                     metadata = {
                         "search_method": "ai_recommendation_mock",
@@ -1065,19 +1531,21 @@ class OptimizedLangChainRAGService:
                     logger.info(f"モック検索結果: {len(gift_items)}件")
                     return gift_items, metadata
             
-            # 検索範囲を制限（相手情報による再ランキングのため50件取得）
-            limited_limit = min(limit * 10, 50)  # 最大50件まで取得
+            # 検索範囲を制限（候補件数は意図の形ごとの統計から決定、初期値は最大50件）
+            pool_size = self.pool_controller.recommend(user_intent, limit, default=min(limit * 10, 50))
             
-            results, metadata = await self.hybrid_engine.hybrid_search(
-                query=query,
-                user_intent=user_intent,
-                limit=limited_limit,
-                semantic_threshold=0.6  # 閾値を下げて高速化
-            )
+            with span("hybrid_search", candidate_limit=pool_size):
+                results, metadata = await self.hybrid_engine.hybrid_search(
+                    query=query,
+                    user_intent=user_intent,
+                    limit=pool_size,
+                    semantic_threshold=0.6,  # 閾値を下げて高速化
+                    candidate_limit=pool_size
+                )
             
-            # RRF結果からGiftItemオブジェクトを抽出（50件まで）
+            # RRF結果からGiftItemオブジェクトを抽出
             gift_items = []
-            for result in results[:50]:  # 50件まで取得
+            for result in results[:pool_size]:
                 if isinstance(result, dict) and 'product' in result:
                     # RRF統合結果の場合
                     gift_items.append(result['product'])
@@ -1090,10 +1558,16 @@ class OptimizedLangChainRAGService:
             logger.info(f"ハイブリッド検索結果: {len(results)}件 → {len(gift_items)}件のGiftItem変換")
             
             # 相手情報による再ランキング
-            if user_intent.get('relationship') or user_intent.get('gender') or user_intent.get('age_range'):
-                logger.info(f"👥 相手情報による再ランキング開始: {len(gift_items)}件")
-                gift_items = self._rank_by_recipient_info(gift_items, user_intent)
-                logger.info(f"✅ 相手情報による再ランキング完了: {len(gift_items)}件")
+            candidates = gift_items
+            gift_items, rerank_info = self._rerank_candidates(gift_items, user_intent)
+            performance = metadata.get("performance", {})
+            self._observe_candidate_pool(
+                user_intent, limit, candidates, gift_items,
+                performance.get("structured_total_hits"),
+                fetched=performance.get("merged_count")  # 意図適合性フィルタで脱落した分も含める
+            )
+            
+            metadata["reranker"] = rerank_info
             
             # 最終的にlimit件数に絞り込み
             gift_items = gift_items[:limit]
@@ -1105,15 +1579,11 @@ class OptimizedLangChainRAGService:
             import traceback
             logger.error(f"スタックトレース: {traceback.format_exc()}")
             
-            # エラー時もAIRecommendationServiceフォールバック
-            logger.warning("エラーによりAIRecommendationServiceフォールバックを使用")
+            # エラー時も縮退モード推薦にフォールバック
+            logger.warning("エラーにより縮退モード推薦にフォールバック")
             
             try:
-                from .ai_recommendation_service import AIRecommendationService
-                mock_service = AIRecommendationService()
-                
-                mock_recommendations = await mock_service.get_recommendations(query, limit)
-                gift_items = mock_recommendations.get("recommendations", [])
+                gift_items = await FallbackRecommender().recommend(query, limit)
                 
                 metadata = {
                     "search_method": "ai_recommendation_fallback",
@@ -1134,34 +1604,97 @@ class OptimizedLangChainRAGService:
         user_intent: Dict[str, Any],
         recommended_products: List[GiftItem]
     ) -> str:
-        """高速AI応答生成（簡潔プロンプト版）"""
-        # キャッシュ確認
-        response_key = self.optimizer.get_cache_key(
-            f"response_{user_input}_{len(recommended_products)}"
-        )
-        cached_response = self.optimizer.get_cached(response_key)
+        """
+        高速AI応答生成（簡潔プロンプト版）
         
+        アドバイス文は相手プロフィール（用途・関係性・性別・年代）単位でキャッシュする。
+        ヒット時に文面がバリアント数に満たなければ、バックグラウンドで1件追加生成する。
+        """
+        bucket = profile_bucket(user_intent)
+        cached_response = self.advice_cache.get(bucket)
         if cached_response:
-            logger.info("AI応答キャッシュヒット")
+            logger.info(f"AI応答キャッシュヒット: {bucket}")
+            self._schedule_advice_fill(bucket)
             return cached_response
         
         try:
-            # 簡潔プロンプト
-            if recommended_products:
-                products_text = "\n".join([
-                    f"{i+1}. {p.title} - {p.price:,}円"
-                    for i, p in enumerate(recommended_products[:3])
-                ])
-            else:
-                products_text = "該当する商品が見つかりませんでした。"
-            
-            # 相手の特徴分析
-            relationship = user_intent.get('relationship', '不明')
-            gender = user_intent.get('gender', '不明')
-            age_range = user_intent.get('age_range', '不明')
-            occasion = user_intent.get('occasion', '不明')
+            result = await self._generate_advice_variant(bucket)
+            if result is None:
+                raise RuntimeError("LLMが利用できません")
+            return result
             
-            fast_prompt = f"""
+        except Exception as e:
+            logger.error(f"高速応答生成エラー: {str(e)}")
+            return self._get_emergency_text(user_input, recommended_products)
+    
+    @property
+    def advice_cache(self) -> AdviceCache:
+        """選び方アドバイスのキャッシュ（プロセス全体で共有）"""
+        return AdviceCache(
+            ttl_seconds=settings.advice_cache_ttl_seconds,
+            variants=settings.advice_cache_variants,
+            shared=get_shared_cache(settings.shared_cache_url)
+        )
+    
+    async def _generate_advice_variant(self, bucket: str) -> Optional[str]:
+        """プロフィールバケットのアドバイス文を1件生成してキャッシュに追加（LLM無しならNone）"""
+        if self.llm is None:
+            return None
+        with span("llm.advice", bucket=bucket):
+            response = await self.llm.ainvoke(self._build_advice_prompt(bucket_intent(bucket)))
+        self.advice_cache.add(bucket, response.content)
+        return response.content
+    
+    def _schedule_advice_fill(self, bucket: str):
+        """文面がバリアント数に満たないバケットの追加生成をバックグラウンドで開始"""
+        if self.llm is None or not self.advice_cache.claim_fill(bucket):
+            return
+        
+        async def fill():
+            try:
+                await self._generate_advice_variant(bucket)
+            except Exception as e:
+                logger.warning(f"アドバイス文の追加生成エラー {bucket}: {e}")
+            finally:
+                self.advice_cache.release_fill(bucket)
+        
+        task = asyncio.create_task(fill())
+        # 完了前にGCされないよう参照を保持
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    
+    async def prewarm_advice_cache(self, buckets: Optional[List[str]] = None) -> int:
+        """
+        主要な相手プロフィールのアドバイス文を事前生成（起動時にバックグラウンドで実行）
+        
+        Returns:
+            生成したバケット数
+        """
+        if self.llm is None:
+            return 0
+        targets = [b for b in (buckets or prewarm_buckets()) if not self.advice_cache.contains(b)]
+        semaphore = asyncio.Semaphore(max(settings.advice_prewarm_concurrency, 1))
+        
+        async def warm(bucket: str) -> bool:
+            async with semaphore:
+                try:
+                    return await self._generate_advice_variant(bucket) is not None
+                except Exception as e:
+                    logger.warning(f"アドバイス文の事前生成エラー {bucket}: {e}")
+                    return False
+        
+        results = await asyncio.gather(*(warm(b) for b in targets))
+        logger.info(f"✅ アドバイス文の事前生成完了: {sum(results)}/{len(targets)}件")
+        return sum(results)
+    
+    def _build_advice_prompt(self, user_intent: Dict[str, Any]) -> str:
+        """相手の特徴に基づく選び方アドバイスのプロンプト"""
+        relationship = user_intent.get('relationship', '不明')
+        gender = user_intent.get('gender', '不明')
+        age_range = user_intent.get('age_range', '不明')
+        occasion = user_intent.get('occasion', '不明')
+        
+        return f"""
 ハレの日ギフトアドバイザーとして、相手の特徴に基づく選び方をアドバイスしてください。
 
 相手の情報:
@@ -1174,47 +1707,275 @@ class OptimizedLangChainRAGService:
 1. この相手（{relationship}、{gender}、{age_range}）には、こんなタイプの商品を選ぶと良いというアドバイス
 2. 一言アドバイス（例：迷ったときは、相手が消耗品を好むかどうかを考えると選びやすいです）
 """
-            
-            response = await self.llm.ainvoke(fast_prompt)
-            result = response.content
-            
-            # キャッシュに保存
-            self.optimizer.set_cached(response_key, result)
-            
-            return result
-            
+    
+    async def _stream_fast_response(
+        self,
+        user_input: str,
+        user_intent: Dict[str, Any],
+        recommended_products: List[GiftItem]
+    ) -> AsyncIterator[str]:
+        """
+        高速AI応答をトークン単位で逐次生成（ストリーミング版）
+        
+        キャッシュヒット時は全文を1チャンクで返す。生成完了後はキャッシュに保存する。
+        """
+        bucket = profile_bucket(user_intent)
+        cached_response = self.advice_cache.get(bucket)
+        if cached_response:
+            logger.info(f"AI応答キャッシュヒット: {bucket}")
+            self._schedule_advice_fill(bucket)
+            yield cached_response
+            return
+        
+        parts = []
+        try:
+            with span("llm.advice", streaming=True):
+                async for chunk in self.llm.astream(self._build_advice_prompt(bucket_intent(bucket))):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield chunk.content
         except Exception as e:
-            logger.error(f"高速応答生成エラー: {str(e)}")
-            return self._get_emergency_text(user_input, recommended_products)
+            logger.error(f"高速応答ストリーミングエラー: {str(e)}")
+            if not parts:
+                yield self._get_emergency_text(user_input, recommended_products)
+            return
+        
+        self.advice_cache.add(bucket, "".join(parts))
     
     async def _generate_product_reasons(
         self,
         recommended_products: List[GiftItem],
         user_intent: Dict[str, Any]
     ) -> Dict[str, str]:
-        """各商品の選択理由を生成（80文字以内）"""
-        logger.info(f"🎨 商品理由生成開始: {len(recommended_products)}件の商品")
+        """
+        各商品の選択理由を生成（80文字以内）
+        
+        生成方式は PRODUCT_REASON_MODE で切り替える:
+        - batch: 全商品分を1回のLLM呼び出しでJSON（商品ID→理由）として取得
+        - parallel: 商品ごとのLLM呼び出しを同時実行数の上限付きで並行実行
+        - sequential: 商品ごとのLLM呼び出しを順番に実行（従来方式）
+        いずれの方式でも、取得・解析できなかった商品は関係性別の定型文で補う。
+        """
+        logger.info(f"🎨 商品理由生成開始: {len(recommended_products)}件の商品 (mode={settings.product_reason_mode})")
+        if not recommended_products:
+            return {}
+        
         try:
-            product_reasons = {}
-            
-            # 相手情報
             relationship = user_intent.get('relationship', '不明')
-            gender = user_intent.get('gender', '不明') 
-            age_range = user_intent.get('age_range', '不明')
-            occasion = user_intent.get('occasion', '不明')
+            logger.info(
+                f"🎨 相手情報: {relationship}, {user_intent.get('gender', '不明')}, "
+                f"{user_intent.get('age_range', '不明')}, 用途: {user_intent.get('occasion', '不明')}"
+            )
             
-            logger.info(f"🎨 相手情報: {relationship}, {gender}, {age_range}, 用途: {occasion}")
+            # 事前生成済みの理由を優先し、ミスした商品のみLLMで生成
+            generated = self._lookup_precomputed_reasons(recommended_products, user_intent)
+            missing = [p for p in recommended_products if p.id not in generated]
+            if not missing or self.llm is None:
+                pass
+            elif settings.product_reason_mode == "batch":
+                generated.update(await self._generate_product_reasons_batch(missing, user_intent))
+            else:
+                concurrency = settings.product_reason_concurrency if settings.product_reason_mode == "parallel" else 1
+                generated.update(await self._generate_product_reasons_parallel(missing, user_intent, concurrency))
             
-            for i, product in enumerate(recommended_products):
-                logger.info(f"🎨 商品#{i+1} 理由生成中: {product.id} - {product.title[:50]}...")
-                
-                reason_prompt = f"""
+            # 応答に含まれなかった商品はフォールバック理由で補完（商品順を維持）
+            product_reasons = {}
+            for product in recommended_products:
+                reason = generated.get(product.id)
+                if not reason:
+                    reason = self._get_fallback_product_reason(product, relationship)
+                    logger.info(f"🔄 フォールバック理由使用 {product.id}: {reason}")
+                product_reasons[product.id] = reason
+            
+            logger.info(f"🎨 商品理由生成完了: {len(product_reasons)}件の理由を生成")
+            return product_reasons
+            
+        except Exception as e:
+            logger.error(f"商品理由生成エラー: {str(e)}")
+            return {}
+    
+    def _get_template_product_reasons(
+        self,
+        products: List[GiftItem],
+        user_intent: Dict[str, Any]
+    ) -> Dict[str, str]:
+        """LLMを使わない商品理由（事前生成済みの理由、無ければ関係性別の定型文）"""
+        relationship = user_intent.get('relationship', '不明')
+        precomputed = self._lookup_precomputed_reasons(products, user_intent)
+        return {
+            product.id: precomputed.get(product.id) or self._get_fallback_product_reason(product, relationship)
+            for product in products
+        }
+    
+    def _lookup_precomputed_reasons(
+        self,
+        products: List[GiftItem],
+        user_intent: Dict[str, Any]
+    ) -> Dict[str, str]:
+        """事前生成済みの商品理由を取得（scripts/precompute_product_reasons.py の出力、ミスした商品は含まない）"""
+        if not settings.product_reason_store_path:
+            return {}
+        with span("product_reasons.precomputed", products=len(products)) as sp:
+            reasons = ProductReasonStore(settings.product_reason_store_path).lookup(products, user_intent)
+            sp.set(hits=len(reasons))
+        if reasons:
+            logger.info(f"📦 事前生成理由ヒット: {len(reasons)}/{len(products)}件")
+        return reasons
+    
+    async def _generate_product_reasons_batch(
+        self,
+        products: List[GiftItem],
+        user_intent: Dict[str, Any]
+    ) -> Dict[str, str]:
+        """全商品の理由を1回のLLM呼び出しで生成（JSON: 商品ID→理由）"""
+        batch_prompt = self._build_product_reasons_batch_prompt(products, user_intent)
+        try:
+            with span("llm.product_reasons_batch", products=len(products)):
+                response = await self.llm.ainvoke(batch_prompt)
+            parsed = self._parse_reason_map(response.content)
+        except Exception as e:
+            logger.warning(f"❌ 商品理由一括生成エラー: {e}")
+            return {}
+        
+        product_ids = {p.id for p in products}
+        reasons = {
+            str(product_id): str(reason).strip()[:150]
+            for product_id, reason in parsed.items()
+            if str(product_id) in product_ids and reason
+        }
+        logger.info(f"✅ 商品理由一括生成完了: {len(reasons)}/{len(products)}件")
+        return reasons
+    
+    @staticmethod
+    def _build_product_reasons_batch_prompt(products: List[GiftItem], user_intent: Dict[str, Any]) -> str:
+        """複数商品分の理由生成プロンプト（scripts/precompute_product_reasons.py でも使用）"""
+        products_text = "\n".join([
+            f"- ID: {p.id} / 商品: {p.title} / 価格: {p.price:,}円 / "
+            f"レビュー: {p.review_count}件（平均{(p.review_average or 0):.1f}点）"
+            for p in products
+        ])
+        return f"""
+以下の各商品がなぜ素晴らしい選択なのか、商品ごとに魅力的に説明してください（各80文字以内）。
+
+相手: {user_intent.get('relationship', '不明')}（{user_intent.get('gender', '不明')}、{user_intent.get('age_range', '不明')}）
+用途: {user_intent.get('occasion', '不明')}
+
+商品一覧:
+{products_text}
+
+各理由には以下を含めて具体的に：
+1. この商品の独特な魅力や特徴
+2. なぜこの相手に適しているのか
+3. 価格やレビューから見る価値
+4. 実際に贈った時の喜ばれるポイント
+
+※抽象的な表現や「選ばれました」「おすすめです」は使わず、この商品ならではの魅力を伝えてください。
+※商品IDをキー、理由を値とするJSONオブジェクトのみを返してください。説明や前書きは不要です。
+"""
+    
+    @staticmethod
+    def _parse_reason_map(content: str) -> Dict[str, Any]:
+        """LLM応答からJSONオブジェクトを抽出（コードブロック・前後の文章を除去）"""
+        content = content.strip()
+        start_idx = content.find('{')
+        end_idx = content.rfind('}') + 1
+        if start_idx < 0 or end_idx <= start_idx:
+            raise ValueError("JSONオブジェクトが見つかりません")
+        parsed = json.loads(content[start_idx:end_idx])
+        if not isinstance(parsed, dict):
+            raise ValueError("JSONオブジェクトではありません")
+        return parsed
+    
+    async def _generate_product_reasons_parallel(
+        self,
+        products: List[GiftItem],
+        user_intent: Dict[str, Any],
+        concurrency: int
+    ) -> Dict[str, str]:
+        """商品ごとの理由生成を同時実行数の上限付きで並行実行（失敗した商品は結果に含めない）"""
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        results = await asyncio.gather(*(
+            self._generate_single_product_reason(i, p, user_intent, semaphore)
+            for i, p in enumerate(products)
+        ))
+        return {product.id: reason for product, reason in zip(products, results) if reason}
+    
+    async def _generate_single_product_reason(
+        self,
+        index: int,
+        product: GiftItem,
+        user_intent: Dict[str, Any],
+        semaphore: asyncio.Semaphore
+    ) -> Optional[str]:
+        """1商品分の理由生成（失敗時はNone）"""
+        async with semaphore:
+            logger.info(f"🎨 商品#{index+1} 理由生成中: {product.id} - {product.title[:50]}...")
+            try:
+                with span("llm.product_reason", product_id=product.id):
+                    response = await self.llm.ainvoke(self._build_product_reason_prompt(product, user_intent))
+                generated_reason = response.content[:150]
+                logger.info(f"✅ 商品#{index+1} 理由生成完了: {generated_reason}")
+                return generated_reason
+            except Exception as e:
+                logger.warning(f"❌ 商品理由生成エラー {product.id}: {e}")
+                return None
+    
+    async def _iter_product_reasons(
+        self,
+        products: List[GiftItem],
+        user_intent: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """
+        商品理由を得られた順に返す（ストリーミング用）
+        
+        batch モードでは一括応答の到着後にまとめて、それ以外では商品ごとの完了順に返す。
+        取得できなかった商品は関係性別のフォールバック理由を返す。
+        """
+        relationship = user_intent.get('relationship', '不明')
+        
+        precomputed = self._lookup_precomputed_reasons(products, user_intent)
+        for product in products:
+            if product.id in precomputed:
+                yield product.id, precomputed[product.id]
+        products = [p for p in products if p.id not in precomputed]
+        if not products:
+            return
+        
+        if self.llm is None:
+            for product in products:
+                yield product.id, self._get_fallback_product_reason(product, relationship)
+            return
+        
+        if settings.product_reason_mode == "batch":
+            generated = await self._generate_product_reasons_batch(products, user_intent)
+            for product in products:
+                yield product.id, generated.get(product.id) or self._get_fallback_product_reason(product, relationship)
+            return
+        
+        concurrency = settings.product_reason_concurrency if settings.product_reason_mode == "parallel" else 1
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        
+        async def generate(index: int, product: GiftItem) -> Tuple[GiftItem, Optional[str]]:
+            return product, await self._generate_single_product_reason(index, product, user_intent, semaphore)
+        
+        tasks = [asyncio.create_task(generate(i, p)) for i, p in enumerate(products)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                product, reason = await next_done
+                yield product.id, reason or self._get_fallback_product_reason(product, relationship)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    def _build_product_reason_prompt(self, product: GiftItem, user_intent: Dict[str, Any]) -> str:
+        """1商品分の理由生成プロンプト"""
+        return f"""
 この商品がなぜ素晴らしい選択なのか、魅力的に説明してください（80文字以内）。
 
 商品: {product.title}
 価格: {product.price:,}円
-相手: {relationship}（{gender}、{age_range}）
-用途: {occasion}
+相手: {user_intent.get('relationship', '不明')}（{user_intent.get('gender', '不明')}、{user_intent.get('age_range', '不明')}）
+用途: {user_intent.get('occasion', '不明')}
 レビュー: {product.review_count}件（平均{product.review_average:.1f}点）
 
 以下を含めて具体的に：
@@ -1225,32 +1986,17 @@ class OptimizedLangChainRAGService:
 
 ※抽象的な表現や「選ばれました」「おすすめです」は使わず、この商品ならではの魅力を伝えてください。
 """
-                
-                try:
-                    response = await self.llm.ainvoke(reason_prompt)
-                    generated_reason = response.content[:150]
-                    product_reasons[product.id] = generated_reason
-                    logger.info(f"✅ 商品#{i+1} 理由生成完了: {generated_reason}")
-                except Exception as e:
-                    logger.warning(f"❌ 商品理由生成エラー {product.id}: {e}")
-                    # より魅力的なフォールバック理由
-                    fallback_reasons = {
-                        'boss': f"上司に敬意を示す上質な品で、{product.price:,}円の価格帯が適切。{product.review_count}件のレビュー（平均{product.review_average:.1f}点）が品質を保証し、目上の方への贈り物として安心して選べます。",
-                        'colleague': f"同僚との距離感を保ちつつ、センスの良さを表現できる商品。実用性があり、{product.review_count}件のレビューが示す高評価で、職場での関係性を良好に保てます。",
-                        'family': f"家族への愛情が伝わる心温まる商品。{product.review_average:.1f}点の高評価と{product.review_count}件のレビューが信頼性を証明し、大切な人に安心して贈れる逸品です。",
-                        'friend': f"親しい友人に喜ばれる、親近感のある素敵な商品。{product.price:,}円という手頃な価格で気負わず贈れ、{product.review_count}件の豊富なレビューが人気の証です。"
-                    }
-                    fallback_reason = fallback_reasons.get(relationship, 
-                        f"高品質で魅力的な商品。{product.review_count}件のレビューと平均{product.review_average:.1f}点の評価が示す通り、{product.price:,}円の価値に見合った満足度と喜びを提供します。")[:150]
-                    product_reasons[product.id] = fallback_reason
-                    logger.info(f"🔄 商品#{i+1} フォールバック理由使用: {fallback_reason}")
-            
-            logger.info(f"🎨 商品理由生成完了: {len(product_reasons)}件の理由を生成")
-            return product_reasons
-            
-        except Exception as e:
-            logger.error(f"商品理由生成エラー: {str(e)}")
-            return {}
+    
+    def _get_fallback_product_reason(self, product: GiftItem, relationship: str) -> str:
+        """関係性別のフォールバック理由"""
+        fallback_reasons = {
+            'boss': f"上司に敬意を示す上質な品で、{product.price:,}円の価格帯が適切。{product.review_count}件のレビュー（平均{product.review_average:.1f}点）が品質を保証し、目上の方への贈り物として安心して選べます。",
+            'colleague': f"同僚との距離感を保ちつつ、センスの良さを表現できる商品。実用性があり、{product.review_count}件のレビューが示す高評価で、職場での関係性を良好に保てます。",
+            'family': f"家族への愛情が伝わる心温まる商品。{product.review_average:.1f}点の高評価と{product.review_count}件のレビューが信頼性を証明し、大切な人に安心して贈れる逸品です。",
+            'friend': f"親しい友人に喜ばれる、親近感のある素敵な商品。{product.price:,}円という手頃な価格で気負わず贈れ、{product.review_count}件の豊富なレビューが人気の証です。"
+        }
+        return fallback_reasons.get(relationship,
+            f"高品質で魅力的な商品。{product.review_count}件のレビューと平均{product.review_average:.1f}点の評価が示す通り、{product.price:,}円の価値に見合った満足度と喜びを提供します。")[:150]
     
     async def _fallback_fast_search(
         self,
@@ -1334,90 +2080,96 @@ class OptimizedLangChainRAGService:
         logger.info(f"💰 予算フィルタ: {len(items)}件 → {len(filtered_items)}件 (範囲: {budget_min}〜{budget_max}円)")
         return filtered_items
     
-    def _rank_by_recipient_info(self, items: List[GiftItem], user_intent: Dict[str, Any]) -> List[GiftItem]:
+    def _observe_candidate_pool(
+        self,
+        user_intent: Dict[str, Any],
+        limit: int,
+        candidates: List[GiftItem],
+        ranked: List[GiftItem],
+        total_hits: Optional[int] = None,
+        fetched: Optional[int] = None
+    ):
         """
-        相手情報に基づく商品ランキング
+        候補プール統計を更新
+        
+        取得した候補のうち後段の予算フィルタを通過する件数と、再ランキング後の上位limit件が
+        元の候補列のどの深さにあったかを記録し、次回以降の取得件数決定に使う。
         
         Args:
-            items: GiftItemリスト
-            user_intent: ユーザー意図（relationship, gender, age_range含む）
+            fetched: 取得した候補数（検索エンジン内のフィルタで候補が減る場合はフィルタ前の件数。未指定なら候補数）
+        """
+        if not candidates:
+            return
+        
+        positions = {id(item): i for i, item in enumerate(candidates)}
+        depth = max((positions.get(id(item), 0) + 1 for item in ranked[:limit]), default=1)
+        survivors = len(self._apply_budget_filter(candidates, user_intent))
+        
+        self.pool_controller.observe(
+            user_intent,
+            limit=limit,
+            fetched=max(fetched or 0, len(candidates)),
+            survivors=survivors,
+            depth=depth,
+            total_hits=total_hits
+        )
+    
+    def _engine_affinity_sort(self, user_intent: Dict[str, Any]) -> Optional[List[str]]:
+        """
+        相手情報の並べ替えをMeilisearchのソートで行えるなら、そのソート指定を返す
+        
+        学習済みリランカーが無く、相手情報があり、インデックスに affinity_* のソート可能属性がある場合のみ。
+        それ以外はNone（従来の再ランキング）。順位はヒューリスティックの重み付き和ではなく、
+        重みの大きい群から順の辞書式になる（affinity_sort 参照）。
+        """
+        if not settings.recipient_affinity_sort_enabled or self.reranker.is_trained:
+            return None
+        sort = affinity_sort(user_intent)
+        if not sort or not self.meilisearch_service.supports_sort(sort):
+            return None
+        return sort
+    
+    def _rerank_candidates(
+        self,
+        items: List[GiftItem],
+        user_intent: Dict[str, Any]
+    ) -> Tuple[List[GiftItem], Optional[Dict[str, Any]]]:
+        """
+        候補の再ランキング（特徴量行列 × 学習済みモデルを一括スコアリング）
+        
+        学習済みモデルが無い場合は相手情報ヒューリスティックと同じ重みで動作し、
+        従来どおり相手情報（relationship, gender, age_range）がある場合のみ適用する。
+        
+        Args:
+            items: 一次検索順のGiftItemリスト
+            user_intent: ユーザー意図
             
         Returns:
-            ランキング適用後のGiftItemリスト
+            (ランキング適用後のGiftItemリスト, 検索メタデータ用のリランカー情報。未適用ならNone)
         """
         if not items:
-            return items
-            
-        relationship = user_intent.get('relationship', '')
-        gender = user_intent.get('gender', '')
-        age_range = user_intent.get('age_range', '')
-        
-        logger.info(f"🎯 相手情報ランキング開始: relationship='{relationship}', gender='{gender}', age_range='{age_range}'")
+            return items, None
+        if not self.reranker.is_trained and not self.pool_controller.has_recipient_info(user_intent):
+            return items, None
         
-        def calculate_recipient_score(item: GiftItem) -> float:
-            """商品に対する相手情報適合スコア算出"""
-            score = 0.0
-            
-            # 商品情報を小文字で取得（検索用）
-            title_lower = item.title.lower()
-            description_lower = item.description.lower() if item.description else ""
-            combined_text = f"{title_lower} {description_lower}"
-            
-            # 1. 関係性に基づくスコアリング
-            if relationship:
-                if '上司' in relationship or '目上' in relationship:
-                    # 上司・目上の方：高級、フォーマル、上品
-                    formal_keywords = ['高級', '上品', 'プレミアム', '老舗', '格式', 'のし', 'フォーマル', '贈答用']
-                    score += sum(2.0 for keyword in formal_keywords if keyword.lower() in combined_text)
-                    
-                elif '同僚' in relationship or '同等' in relationship:
-                    # 同僚・同等：気軽、おしゃれ、実用的
-                    casual_keywords = ['おしゃれ', '気軽', '実用的', 'カジュアル', 'トレンド', '人気']
-                    score += sum(1.5 for keyword in casual_keywords if keyword.lower() in combined_text)
-                    
-                elif '親族' in relationship or '家族' in relationship:
-                    # 親族・家族：心温まる、特別、記念
-                    family_keywords = ['心温まる', '特別', '記念', 'メモリアル', '思い出', '絆']
-                    score += sum(2.0 for keyword in family_keywords if keyword.lower() in combined_text)
-            
-            # 2. 性別に基づくスコアリング
-            if gender:
-                if '男性' in gender:
-                    male_keywords = ['男性', 'メンズ', '紳士', 'ビール', 'ウイスキー', 'ネクタイ', '革製品', '工具', 'スポーツ']
-                    score += sum(1.5 for keyword in male_keywords if keyword.lower() in combined_text)
-                    
-                elif '女性' in gender:
-                    female_keywords = ['女性', 'レディース', '婦人', '花', '化粧品', 'アクセサリー', 'スイーツ', '紅茶', '美容']
-                    score += sum(1.5 for keyword in female_keywords if keyword.lower() in combined_text)
-            
-            # 3. 年代に基づくスコアリング
-            if age_range:
-                if '20代' in age_range or '30代' in age_range:
-                    young_keywords = ['トレンド', 'おしゃれ', 'SNS', '可愛い', 'カジュアル', 'モダン']
-                    score += sum(1.5 for keyword in young_keywords if keyword.lower() in combined_text)
-                    
-                elif '60代' in age_range or '70代' in age_range:
-                    senior_keywords = ['健康', '高級', '伝統', '上品', '品格', '老舗', '和風', '格式']
-                    score += sum(1.5 for keyword in senior_keywords if keyword.lower() in combined_text)
-            
-            # 4. 基本品質スコア（レビュー評価と件数）
-            if hasattr(item, 'review_average') and item.review_average:
-                score += float(item.review_average) * 0.2  # レビュー評価の重み
-                
-            if hasattr(item, 'review_count') and item.review_count:
-                score += min(float(item.review_count) * 0.001, 1.0)  # レビュー件数の重み（上限1.0）
-            
-            return score
+        logger.info(f"👥 再ランキング開始: {len(items)}件 (model={self.reranker.model_source})")
+        query_id = uuid.uuid4().hex if self.reranker.feature_log_path else None
+        with span("rerank", candidates=len(items), model=self.reranker.model.kind):
+            ranked, scores = self.reranker.rerank(items, user_intent, query_id=query_id)
         
-        # スコアでソート（降順）
-        scored_items = [(item, calculate_recipient_score(item)) for item in items]
-        scored_items.sort(key=lambda x: x[1], reverse=True)
+        # プロファイリング時のみスコア内訳を記録
+        if is_profiling():
+            for rank, (item, score) in enumerate(zip(ranked, scores)):
+                record_scores(item.id, {"rerank_score": round(float(score), 4), "rerank_rank": rank})
         
         # デバッグログ
-        for i, (item, score) in enumerate(scored_items[:3]):
+        for i, (item, score) in enumerate(zip(ranked[:3], scores[:3])):
             logger.info(f"  ランキング #{i+1}: score={score:.2f}, title='{item.title[:50]}'")
         
-        return [item for item, score in scored_items]
+        rerank_info = {"model": self.reranker.model_source}
+        if query_id:
+            rerank_info["query_id"] = query_id
+        return ranked, rerank_info
     
     async def health_check(self) -> Dict[str, Any]:
         """ヘルスチェック（最適化版）"""
@@ -1425,6 +2177,13 @@ class OptimizedLangChainRAGService:
             "status": "healthy",
             "optimization": "phase3",
             "cache_size": len(self.optimizer.cache),
+            "cache_stats": self.optimizer.cache.get_stats(),
+            "candidate_pool_stats": self.pool_controller.snapshot(),
+            "reranker_model": self.reranker.model_source,
+            "intent_tier_stats": self.intent_extractor.get_tier_stats(),
+            "product_reason_store": ProductReasonStore(settings.product_reason_store_path).get_stats(),
+            "advice_cache_stats": self.advice_cache.get_stats(),
+            "intent_cache_stats": self.intent_extractor.cache.get_stats() if self.intent_extractor.cache else None,
             "hybrid_engine_ready": self.hybrid_engine is not None,
             "vector_store_ready": self.vector_store is not None
         }
\ No newline at end of file
@@ -0,0 +1,242 @@
+"""
+事前生成済み商品理由ストア
+
+このファイルの役割:
+- 相手プロフィール（用途・関係性・性別・年代）を有限個のバケットに正規化
+- scripts/precompute_product_reasons.py がバッチ生成した「商品×バケット」の理由を保存・参照
+- API側は理由生成の前にここを引き、ヒットした商品はLLMを呼ばない
+
+設計メモ:
+- 保存形式は (product_id, bucket) を主キーとする SQLite の WITHOUT ROWID テーブル（1ファイルのKVストア）
+- 理由のプロンプトは商品名・価格に依存するため、生成時の指紋を保存し、一致しない行は使わない
+- API側は読み取り専用で開く。ファイルが無い・壊れている場合は常にミス（＝従来どおりLLM生成）
+"""
+
+import hashlib
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+# 未指定扱いの値
+UNKNOWN = "unknown"
+_UNKNOWN_VALUES = {"", "不明", "unknown", "その他", "other", "none"}
+
+# ストアが無い場合に再オープンを試みる間隔（秒）
+REOPEN_INTERVAL_SECONDS = 60.0
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS product_reasons ("
+    " product_id TEXT NOT NULL,"
+    " bucket TEXT NOT NULL,"
+    " fingerprint TEXT NOT NULL,"
+    " reason TEXT NOT NULL,"
+    " created_at REAL NOT NULL,"
+    " PRIMARY KEY (product_id, bucket)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID",
+)
+
+
+def _bucket_value(value: Any) -> str:
+    """バケット用に1項目を正規化（未指定系の値は unknown に揃える）"""
+    if value is None:
+        return UNKNOWN
+    text = str(value).strip()
+    return UNKNOWN if text.lower() in _UNKNOWN_VALUES else text
+
+
+def profile_bucket(user_intent: Dict[str, Any]) -> str:
+    """
+    意図から相手プロフィールのバケットキーを生成
+
+    商品理由プロンプトが参照する4項目（用途・関係性・性別・年代）のみを使う。
+    関係性は正規化済み意図の relationship を優先し、無ければ target_relationship を使う。
+    """
+    relationship = user_intent.get("relationship") or user_intent.get("target_relationship")
+    return "|".join([
+        _bucket_value(user_intent.get("occasion")),
+        _bucket_value(relationship),
+        _bucket_value(user_intent.get("gender")),
+        _bucket_value(user_intent.get("age_range")),
+    ])
+
+
+def bucket_intent(bucket: str) -> Dict[str, Any]:
+    """バケットキーから理由生成用の意図を復元（unknown はプロンプト上「不明」と表示）"""
+    occasion, relationship, gender, age_range = [
+        "不明" if value == UNKNOWN else value for value in bucket.split("|")
+    ]
+    return {"occasion": occasion, "relationship": relationship, "gender": gender, "age_range": age_range}
+
+
+def product_fingerprint(title: str, price: Any) -> str:
+    """理由の前提となる商品情報（商品名・価格）の指紋"""
+    return hashlib.sha256(f"{title}\x1f{price}".encode("utf-8")).hexdigest()[:12]
+
+
+class ProductReasonStore:
+    """事前生成済み商品理由の参照（プロセス内シングルトン、読み取り専用）"""
+
+    _instance = None
+    _instance_lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """シングルトンパターンで1つのインスタンスのみ生成"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            path: ストア（SQLite）のパス。Noneなら常にミス
+        """
+        if hasattr(self, '_initialized'):
+            return
+
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = Lock()
+        self._last_open_attempt = 0.0
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "errors": 0}
+
+        self._initialized = True
+
+    def _ensure_open(self) -> Optional[sqlite3.Connection]:
+        """読み取り専用で開く（ファイルが無ければ一定間隔で再試行）"""
+        if self._conn is not None or not self.path:
+            return self._conn
+        now = time.monotonic()
+        if self._last_open_attempt and now - self._last_open_attempt < REOPEN_INTERVAL_SECONDS:
+            return None
+        self._last_open_attempt = now
+
+        if not Path(self.path).exists():
+            return None
+        try:
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            count = self._conn.execute("SELECT COUNT(*) FROM product_reasons").fetchone()[0]
+            logger.info(f"✅ 事前生成商品理由ストア読み込み: {self.path} ({count}件)")
+        except Exception as e:
+            logger.warning(f"事前生成商品理由ストアを開けません: {e}")
+            self._conn = None
+        return self._conn
+
+    def lookup(self, products: Iterable[Any], user_intent: Dict[str, Any]) -> Dict[str, str]:
+        """
+        商品群の事前生成理由を取得
+
+        Args:
+            products: GiftItem（id, title, price を持つオブジェクト）
+            user_intent: 意図（バケット算出に使用）
+
+        Returns:
+            商品ID → 理由（ヒットした商品のみ）
+        """
+        products = list(products)
+        if not products:
+            return {}
+
+        with self._lock:
+            conn = self._ensure_open()
+            if conn is None:
+                return {}
+
+            bucket = profile_bucket(user_intent)
+            placeholders = ",".join("?" * len(products))
+            try:
+                rows = conn.execute(
+                    f"SELECT product_id, fingerprint, reason FROM product_reasons"
+                    f" WHERE bucket = ? AND product_id IN ({placeholders})",
+                    [bucket, *[p.id for p in products]]
+                ).fetchall()
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.warning(f"事前生成商品理由の参照エラー: {e}")
+                return {}
+
+            stored = {product_id: (fingerprint, reason) for product_id, fingerprint, reason in rows}
+            reasons = {}
+            for product in products:
+                entry = stored.get(product.id)
+                if entry is None:
+                    self._stats["misses"] += 1
+                elif entry[0] != product_fingerprint(product.title, product.price):
+                    # 商品名・価格が変わった商品の理由は使わない
+                    self._stats["stale"] += 1
+                    self._stats["misses"] += 1
+                else:
+                    self._stats["hits"] += 1
+                    reasons[product.id] = entry[1]
+            return reasons
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率等のメトリクス"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["available"] = self._conn is not None
+        return stats
+
+    def close(self):
+        """接続を閉じる（次回参照時に開き直す）"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._last_open_attempt = 0.0
+
+
+class ProductReasonStoreWriter:
+    """バッチ生成ジョブ用の書き込みクライアント"""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def existing_keys(self) -> Set[Tuple[str, str, str]]:
+        """保存済みの (product_id, bucket, fingerprint)（再実行時のスキップ判定用）"""
+        return set(self._conn.execute("SELECT product_id, bucket, fingerprint FROM product_reasons"))
+
+    def put_many(self, rows: List[Tuple[str, str, str, str]]):
+        """(product_id, bucket, fingerprint, reason) をまとめて保存"""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO product_reasons (product_id, bucket, fingerprint, reason, created_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [(*row, now) for row in rows]
+        )
+        self._conn.commit()
+
+    def set_meta(self, key: str, value: str):
+        """生成条件（モデル名等）の記録"""
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        self._conn.commit()
+
+    def delete_products_not_in(self, product_ids: Set[str]) -> int:
+        """カタログから消えた商品の理由を削除"""
+        stored = {row[0] for row in self._conn.execute("SELECT DISTINCT product_id FROM product_reasons")}
+        removed = stored - set(product_ids)
+        if removed:
+            self._conn.executemany("DELETE FROM product_reasons WHERE product_id = ?", [(pid,) for pid in removed])
+            self._conn.commit()
+        return len(removed)
+
+    def close(self):
+        self._conn.close()
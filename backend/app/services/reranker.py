@@ -0,0 +1,413 @@
+"""
+学習済み軽量リランカー
+
+このファイルの役割:
+- 検索候補ごとの特徴量行列（検索順位・価格適合・レビュー統計・キーワード群ヒット・用途一致）を構築
+- ファイルから読み込んだ線形モデル／小規模決定木アンサンブルで全候補を一括スコアリング（NumPy）
+- モデル未設定時は従来の相手情報ヒューリスティックと同じ重みの線形モデルで動作
+
+モデルファイル（JSON）の形式:
+- 線形: {"type": "linear", "feature_names": [...], "weights": [...], "bias": 0.0}
+- 木:   {"type": "trees", "feature_names": [...], "base_score": 0.0,
+         "trees": [{"feature": [...], "threshold": [...], "left": [...], "right": [...], "value": [...]}]}
+  木は配列表現（left/right が -1 の節点が葉）。x[feature] <= threshold なら left へ進む。
+
+学習は scripts/train_reranker.py で、特徴量ログ（RERANKER_FEATURE_LOG_PATH）と
+クリック等のインタラクションログから行う。
+"""
+
+import json
+import math
+import asyncio
+import logging
+import uuid
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..schemas.item import GiftItem
+from ..utils.keyword_matcher import KeywordMatcher
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+
+# 相手情報キーワード群（関係性・性別・年代ごと）
+RECIPIENT_KEYWORD_GROUPS: Dict[str, List[str]] = {
+    "formal": ['高級', '上品', 'プレミアム', '老舗', '格式', 'のし', 'フォーマル', '贈答用'],
+    "casual": ['おしゃれ', '気軽', '実用的', 'カジュアル', 'トレンド', '人気'],
+    "family": ['心温まる', '特別', '記念', 'メモリアル', '思い出', '絆'],
+    "male": ['男性', 'メンズ', '紳士', 'ビール', 'ウイスキー', 'ネクタイ', '革製品', '工具', 'スポーツ'],
+    "female": ['女性', 'レディース', '婦人', '花', '化粧品', 'アクセサリー', 'スイーツ', '紅茶', '美容'],
+    "young": ['トレンド', 'おしゃれ', 'SNS', '可愛い', 'カジュアル', 'モダン'],
+    "senior": ['健康', '高級', '伝統', '上品', '品格', '老舗', '和風', '格式'],
+}
+RECIPIENT_KEYWORD_MATCHER = KeywordMatcher(RECIPIENT_KEYWORD_GROUPS)
+
+# キーワード群ごとのヒット数を投入時に計算して持たせるMeilisearch属性（ソート・フィルタ可能）
+AFFINITY_ATTRIBUTES: Dict[str, str] = {group: f"affinity_{group}" for group in RECIPIENT_KEYWORD_GROUPS}
+
+# 特徴量の列順（モデルファイルは名前で参照するため、追加は末尾でなくても互換性は保たれる）
+FEATURE_NAMES: Tuple[str, ...] = (
+    "retrieval_rr",         # 一次検索順位の逆数 1/(rank+1)
+    "retrieval_pos",        # 一次検索順位の相対位置 rank/n（0が先頭）
+    "price_fit",            # 予算適合度（範囲外0、中心1.0、端0.5、予算指定なし1.0）
+    "review_avg",           # レビュー平均/5
+    "review_count_log",     # log(件数+1)/log(100)（上限1.0）
+    "review_count_capped",  # 件数*0.001（上限1.0）
+    "occasion_match",       # 用途一致
+    "kw_formal",
+    "kw_casual",
+    "kw_family",
+    "kw_male",
+    "kw_female",
+    "kw_young",
+    "kw_senior",
+)
+_FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+# 相手情報ヒューリスティックの重み（モデル未設定時の線形モデル）
+HEURISTIC_WEIGHTS: Dict[str, float] = {
+    "kw_formal": 2.0,
+    "kw_casual": 1.5,
+    "kw_family": 2.0,
+    "kw_male": 1.5,
+    "kw_female": 1.5,
+    "kw_young": 1.5,
+    "kw_senior": 1.5,
+    "review_avg": 1.0,
+    "review_count_capped": 1.0,
+}
+
+
+def select_keyword_groups(user_intent: Dict[str, Any]) -> List[str]:
+    """相手情報（関係性・性別・年代）から有効なキーワード群を選択"""
+    relationship = user_intent.get('relationship') or ''
+    gender = user_intent.get('gender') or ''
+    age_range = user_intent.get('age_range') or ''
+
+    groups = []
+    if '上司' in relationship or '目上' in relationship:
+        groups.append("formal")
+    elif '同僚' in relationship or '同等' in relationship:
+        groups.append("casual")
+    elif '親族' in relationship or '家族' in relationship:
+        groups.append("family")
+
+    if '男性' in gender:
+        groups.append("male")
+    elif '女性' in gender:
+        groups.append("female")
+
+    if '20代' in age_range or '30代' in age_range:
+        groups.append("young")
+    elif '60代' in age_range or '70代' in age_range:
+        groups.append("senior")
+
+    return groups
+
+
+def compute_affinity(title: str, description: Optional[str]) -> Dict[str, int]:
+    """
+    商品の相手情報アフィニティ（キーワード群ごとのヒット数）
+
+    build_feature_matrix の kw_* 特徴量と同じ値。インデックス投入時に affinity_* 属性として保存する。
+    """
+    counts = RECIPIENT_KEYWORD_MATCHER.counts(f"{title} {description or ''}")
+    return {AFFINITY_ATTRIBUTES[group]: count for group, count in counts.items()}
+
+
+def affinity_sort(user_intent: Dict[str, Any]) -> List[str]:
+    """
+    相手情報の並べ替えをMeilisearchのソート指定で表す
+
+    ヒューリスティックの重みが大きいキーワード群の affinity_* から順に降順、同点はレビュー評価・件数の降順。
+    Meilisearchの複数キーのソートは辞書式のため、重み付き和のヒューリスティックとは順位が一致しない
+    （先頭の群が1件でもヒットした商品は、後続の群が何件ヒットした商品よりも上に来る）。
+    相手情報が無ければ空リスト。
+    """
+    groups = select_keyword_groups(user_intent)
+    if not groups:
+        return []
+    groups.sort(key=lambda group: -HEURISTIC_WEIGHTS[f"kw_{group}"])
+    return [f"{AFFINITY_ATTRIBUTES[group]}:desc" for group in groups] + ["review_average:desc", "review_count:desc"]
+
+
+def build_feature_matrix(items: Sequence[GiftItem], user_intent: Dict[str, Any]) -> np.ndarray:
+    """
+    候補ごとの特徴量行列を構築
+
+    Args:
+        items: 一次検索順に並んだ候補
+        user_intent: ユーザー意図
+
+    Returns:
+        shape (len(items), len(FEATURE_NAMES)) の float64 行列
+    """
+    n = len(items)
+    X = np.zeros((n, len(FEATURE_NAMES)), dtype=np.float64)
+    if n == 0:
+        return X
+
+    prices = np.fromiter((item.price or 0 for item in items), dtype=np.float64, count=n)
+    review_avg = np.fromiter((item.review_average or 0.0 for item in items), dtype=np.float64, count=n)
+    review_count = np.fromiter((item.review_count or 0 for item in items), dtype=np.float64, count=n)
+    ranks = np.arange(n, dtype=np.float64)
+
+    X[:, _FEATURE_INDEX["retrieval_rr"]] = 1.0 / (ranks + 1.0)
+    X[:, _FEATURE_INDEX["retrieval_pos"]] = ranks / n
+    X[:, _FEATURE_INDEX["price_fit"]] = _price_fit(
+        prices, user_intent.get('budget_min'), user_intent.get('budget_max')
+    )
+    X[:, _FEATURE_INDEX["review_avg"]] = review_avg / 5.0
+    X[:, _FEATURE_INDEX["review_count_log"]] = np.minimum(np.log1p(review_count) / math.log(100), 1.0)
+    X[:, _FEATURE_INDEX["review_count_capped"]] = np.minimum(review_count * 0.001, 1.0)
+
+    occasion = user_intent.get('occasion')
+    if occasion and occasion != 'unknown':
+        X[:, _FEATURE_INDEX["occasion_match"]] = [
+            1.0 if item.occasion == occasion or occasion in (item.occasions or []) else 0.0
+            for item in items
+        ]
+
+    groups = select_keyword_groups(user_intent)
+    if groups:
+        # 1候補につき1回の走査で全キーワード群のヒット数を求める
+        for row, item in enumerate(items):
+            counts = RECIPIENT_KEYWORD_MATCHER.counts(f"{item.title} {item.description or ''}")
+            for group in groups:
+                X[row, _FEATURE_INDEX[f"kw_{group}"]] = counts[group]
+
+    return X
+
+
+def _price_fit(prices: np.ndarray, budget_min: Optional[float], budget_max: Optional[float]) -> np.ndarray:
+    """HybridSearchEngine._price_compatibility_score のベクトル版"""
+    if not budget_min and not budget_max:
+        return np.ones_like(prices)
+
+    fit = np.ones_like(prices)
+    if budget_min and budget_max:
+        center = (budget_min + budget_max) / 2
+        half_width = (budget_max - budget_min) / 2
+        if half_width > 0:
+            fit = np.maximum(0.0, 1.0 - np.abs(prices - center) / half_width * 0.5)
+    if budget_min:
+        fit[prices < budget_min] = 0.0
+    if budget_max:
+        fit[prices > budget_max] = 0.0
+    return fit
+
+
+class LinearRerankModel:
+    """線形モデル: score = X·w + bias"""
+
+    kind = "linear"
+
+    def __init__(self, feature_names: Sequence[str], weights: Sequence[float], bias: float = 0.0):
+        if len(feature_names) != len(weights):
+            raise ValueError("feature_names と weights の長さが一致しません")
+        self.weights = np.zeros(len(FEATURE_NAMES), dtype=np.float64)
+        for name, weight in zip(feature_names, weights):
+            self.weights[_feature_column(name)] = weight
+        self.bias = float(bias)
+
+    def score(self, X: np.ndarray) -> np.ndarray:
+        return X @ self.weights + self.bias
+
+
+class TreeEnsembleRerankModel:
+    """決定木アンサンブル: score = base_score + Σ tree(x)（全候補を節点配列上で同時に降下）"""
+
+    kind = "trees"
+
+    def __init__(self, feature_names: Sequence[str], trees: List[Dict[str, List[float]]], base_score: float = 0.0):
+        columns = np.array([_feature_column(name) for name in feature_names], dtype=np.int64)
+        self.base_score = float(base_score)
+        self.trees = []
+        for tree in trees:
+            feature = np.asarray(tree["feature"], dtype=np.int64)
+            left = np.asarray(tree["left"], dtype=np.int64)
+            right = np.asarray(tree["right"], dtype=np.int64)
+            is_leaf = left < 0
+            self.trees.append({
+                # 葉の feature は任意値のため 0 列に寄せる（参照されても結果に影響しない）
+                "column": np.where(is_leaf, 0, columns[np.where(is_leaf, 0, feature)]),
+                "threshold": np.asarray(tree["threshold"], dtype=np.float64),
+                "left": left,
+                "right": right,
+                "is_leaf": is_leaf,
+                "value": np.asarray(tree["value"], dtype=np.float64),
+                "depth": _tree_depth(left, right),
+            })
+
+    def score(self, X: np.ndarray) -> np.ndarray:
+        n = X.shape[0]
+        rows = np.arange(n)
+        total = np.full(n, self.base_score, dtype=np.float64)
+        for tree in self.trees:
+            node = np.zeros(n, dtype=np.int64)
+            for _ in range(tree["depth"]):
+                go_left = X[rows, tree["column"][node]] <= tree["threshold"][node]
+                child = np.where(go_left, tree["left"][node], tree["right"][node])
+                node = np.where(tree["is_leaf"][node], node, child)
+            total += tree["value"][node]
+        return total
+
+
+def _feature_column(name: str) -> int:
+    if name not in _FEATURE_INDEX:
+        raise ValueError(f"未知の特徴量: {name}")
+    return _FEATURE_INDEX[name]
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    """配列表現の木の深さ（根から葉までの最大辺数）"""
+    depth = 0
+    frontier = [0]
+    while True:
+        children = [c for node in frontier for c in (left[node], right[node]) if c >= 0]
+        if not children:
+            return depth
+        depth += 1
+        frontier = children
+
+
+def heuristic_model() -> LinearRerankModel:
+    """相手情報ヒューリスティック（キーワード群ヒット×2.0/1.5＋レビュー加点）と同じ順位を返す線形モデル"""
+    return LinearRerankModel(
+        feature_names=list(HEURISTIC_WEIGHTS),
+        weights=list(HEURISTIC_WEIGHTS.values()),
+    )
+
+
+def load_model(path: str):
+    """モデルファイル（JSON）を読み込む"""
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+
+    kind = spec.get("type", "linear")
+    if kind == "linear":
+        return LinearRerankModel(spec["feature_names"], spec["weights"], spec.get("bias", 0.0))
+    if kind == "trees":
+        return TreeEnsembleRerankModel(spec["feature_names"], spec["trees"], spec.get("base_score", 0.0))
+    raise ValueError(f"未対応のモデル種別: {kind}")
+
+
+class CandidateReranker:
+    """候補リランカー（プロセス内シングルトン）"""
+
+    _instance = None
+    _instance_lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """シングルトンパターンで1つのインスタンスのみ生成"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, model_path: Optional[str] = None, feature_log_path: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            model_path: 学習済みモデルのパス（未指定時は設定値、どちらも無ければヒューリスティック）
+            feature_log_path: 特徴量ログの出力先（学習データ収集用、未指定時は設定値）
+        """
+        if hasattr(self, '_initialized'):
+            return
+
+        self.model_path = model_path or settings.reranker_model_path
+        self.feature_log_path = feature_log_path or settings.reranker_feature_log_path
+        self._log_lock = Lock()
+        # イベントループ上から依頼した特徴量ログの書き込み（完了まで参照を保持する）
+        self._pending_writes: set = set()
+        self.model = heuristic_model()
+        self.model_source = "heuristic"
+
+        if self.model_path:
+            try:
+                self.model = load_model(self.model_path)
+                self.model_source = self.model_path
+                logger.info(f"✅ リランカーモデル読み込み完了: {self.model_path} ({self.model.kind})")
+            except Exception as e:
+                logger.warning(f"リランカーモデル読み込み失敗（ヒューリスティックで継続）: {e}")
+
+        self._initialized = True
+
+    @property
+    def is_trained(self) -> bool:
+        """学習済みモデルが読み込まれているか"""
+        return self.model_source != "heuristic"
+
+    def rerank(
+        self,
+        items: List[GiftItem],
+        user_intent: Dict[str, Any],
+        query_id: Optional[str] = None
+    ) -> Tuple[List[GiftItem], np.ndarray]:
+        """
+        候補を再ランキング
+
+        Args:
+            items: 一次検索順に並んだ候補
+            user_intent: ユーザー意図
+            query_id: 特徴量ログとインタラクションログを突き合わせるためのID
+
+        Returns:
+            (並べ替え後の候補, 並べ替え後の順に対応するスコア)
+        """
+        if not items:
+            return items, np.zeros(0)
+
+        X = build_feature_matrix(items, user_intent)
+        scores = self.model.score(X)
+        # 同点（浮動小数誤差の範囲を含む）は一次検索順を維持
+        order = np.argsort(-np.round(scores, 9), kind="stable")
+
+        if self.feature_log_path:
+            self._log_features(query_id or uuid.uuid4().hex, items, X, order)
+
+        return [items[i] for i in order], scores[order]
+
+    def _log_features(self, query_id: str, items: List[GiftItem], X: np.ndarray, order: np.ndarray):
+        """
+        学習用に特徴量と提示順位をJSONLで追記
+
+        イベントループ上から呼ばれた場合、ファイルへの追記はスレッドで行う（リクエスト処理を待たせない）
+        """
+        shown_rank = np.empty(len(order), dtype=np.int64)
+        shown_rank[order] = np.arange(len(order))
+        lines = [
+            json.dumps({
+                "query_id": query_id,
+                "candidate_id": item.id,
+                "shown_rank": int(shown_rank[i]),
+                "features": dict(zip(FEATURE_NAMES, X[i].round(6).tolist())),
+            }, ensure_ascii=False)
+            for i, item in enumerate(items)
+        ]
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._append_feature_log(lines)
+            return
+        task = loop.create_task(asyncio.to_thread(self._append_feature_log, lines))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
+    def _append_feature_log(self, lines: List[str]):
+        """特徴量ログのファイルに追記（ブロッキングI/O）"""
+        try:
+            path = Path(self.feature_log_path)
+            with self._log_lock:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+        except Exception as e:
+            logger.warning(f"特徴量ログ書き込みエラー: {e}")
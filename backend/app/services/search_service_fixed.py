@@ -7,21 +7,31 @@ Meilisearch検索サービス（完全修正版）
 """
 
 import os
+import time
 import logging
-from typing import Dict, Any, List
+from threading import Lock
+from typing import Dict, Any, List, Sequence, Tuple
 import meilisearch
 from ..schemas import SearchParams, SearchResponse, GiftItem
 from ..core.config import settings
+from ..utils.profiling import span
 
 # ログ設定
 logger = logging.getLogger(__name__)
 
+# ソート可能属性の確認結果を使い回す時間（秒）
+SORTABLE_ATTRIBUTES_TTL_SECONDS = 300
+
 
 class MeilisearchService:
     """
     Meilisearchを使った検索機能を提供するサービスクラス
     """
     
+    # インデックス名 -> (ソート可能属性, 取得時刻)。インスタンスはリクエストごとに作られるためクラスで共有する
+    _sortable_cache: Dict[str, Tuple[frozenset, float]] = {}
+    _sortable_lock = Lock()
+    
     def __init__(self):
         """
         Meilisearchクライアントを初期化します
@@ -84,7 +94,7 @@ class MeilisearchService:
         
         # ソート設定
         if params.sort:
-            search_options["sort"] = [params.sort]
+            search_options["sort"] = list(params.sort) if isinstance(params.sort, list) else [params.sort]
             logger.info(f"🔍 Sort parameter: {params.sort}")
         
         logger.info(f"🔍 Final search options: {search_options}")
@@ -92,7 +102,10 @@ class MeilisearchService:
         
         # 検索実行
         try:
-            results = self.index.search(query, search_options)
+            with span("meilisearch.search", limit=params.limit, filtered=bool(filters)) as sp:
+                results = self.index.search(query, search_options)
+                sp.set(estimated_total_hits=results.get("estimatedTotalHits", 0),
+                       engine_ms=results.get("processingTimeMs", 0))
             logger.info(f"🔍 Search successful, totalHits: {results.get('estimatedTotalHits', 0)}")
             
         except Exception as e:
@@ -129,6 +142,34 @@ class MeilisearchService:
             offset=params.offset
         )
     
+    def get_sortable_attributes(self) -> frozenset:
+        """
+        インデックスのソート可能属性（一定時間キャッシュ）
+        
+        取得に失敗した場合は空集合を返す（同じくキャッシュし、毎リクエストの再試行を避ける）。
+        """
+        now = time.time()
+        cached = self._sortable_cache.get(self.index_name)
+        if cached and now - cached[1] < SORTABLE_ATTRIBUTES_TTL_SECONDS:
+            return cached[0]
+        
+        with self._sortable_lock:
+            cached = self._sortable_cache.get(self.index_name)
+            if cached and now - cached[1] < SORTABLE_ATTRIBUTES_TTL_SECONDS:
+                return cached[0]
+            try:
+                attributes = frozenset(self.index.get_sortable_attributes() or [])
+            except Exception as e:
+                logger.warning(f"ソート可能属性の取得に失敗しました: {e}")
+                attributes = frozenset()
+            self._sortable_cache[self.index_name] = (attributes, now)
+            return attributes
+    
+    def supports_sort(self, sort: Sequence[str]) -> bool:
+        """ソート指定（"属性:asc|desc" のリスト）の属性がすべてソート可能か"""
+        sortable = self.get_sortable_attributes()
+        return all(rule.split(":", 1)[0] in sortable for rule in sort)
+    
     def get_item_by_id(self, item_id: str) -> GiftItem:
         """
         商品IDで特定の商品を取得します
@@ -0,0 +1,682 @@
+"""
+ベクトルストアの永続化（pickle不使用・mmap読み込み）
+
+このファイルの役割:
+- 商品ベクトルと行ごとのメタデータを独自形式で保存・読み込み
+- 読み込みはベクトル本体を mmap で開くだけで、Pythonオブジェクトへの展開（unpickle）を行わない
+- LangChain の FAISS と同じ similarity_search_with_score を提供し、HybridSearchEngine からそのまま使える
+
+保存形式（ディレクトリ）:
+- vectors-<版>.npy: float32 の (件数, 次元) 行列。行番号がベクトルのIDになる
+- ann-<版>.faiss: ANN インデックス（flat 以外を選んだ場合のみ）
+- metadata.sqlite3: 行番号をキーにしたメタデータ（product_id, occasion, price, title）と、
+  埋め込み元テキストのハッシュ・削除フラグ、形式バージョン・版・次元・件数・埋め込みモデル名・
+  その版のベクトル／ANN インデックスのファイル名
+
+設計メモ:
+- vectors-<版>.npy は numpy の mmap で開き、検索は faiss.knn（総当たりのL2距離、IndexFlatL2 と同じ値）で行う。
+  ファイルの内容はOSのページキャッシュに載り、同じホストの全ワーカーで共有される
+  （FAISS 1.7 の IO_FLAG_MMAP は IVF の転置リストしか mmap しないため、フラットなベクトルは自前で持つ）
+- メタデータは検索結果の行だけを SQLite から引く（全件をメモリに載せない）
+- 旧形式（LangChain の save_local: index.faiss + index.pkl）は読み込まない。
+  scripts/export_vector_store.py で一度だけ変換する
+- 保存は版ごとに別名のファイルを書き、最後に metadata.sqlite3 を置き換えた時点で新しい版になる
+  （読み込み中のワーカーは古い版のファイルを開いたまま検索を続けられる。古いファイルは削除するが、
+  開いている mmap は参照が無くなるまで有効）
+- 近似最近傍（ANN）インデックス（HNSW / IVF-Flat / IVF-PQ / SQ8）を選んだ場合は ann-<版>.faiss を併せて保存し、
+  検索はそちらで行う（IVF は IO_FLAG_MMAP で転置リストを mmap する）。flat は従来どおり厳密検索
+- 論理削除された行は検索に入れない。ANN インデックスは有効な行だけで作り（IDは行番号）、
+  flat は論理削除行の距離を無限大にしてから上位を選ぶ。どちらも取得件数は k 件ちょうど
+- 日次更新（sync_vector_store）は product_id をキーに差分だけを反映する。
+  変更・削除された商品の行は削除フラグ（論理削除）を立てて検索結果から除き、
+  論理削除の割合が閾値を超えたら詰め直す（行番号を振り直す）
+"""
+
+import os
+import glob
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+from langchain_core.documents import Document
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 3
+# 読み込める形式（1 は削除フラグ・ハッシュ列が無い。全行を有効として扱う。1・2 はファイル名に版が無い）
+SUPPORTED_FORMAT_VERSIONS = (1, 2, 3)
+METADATA_FILE = "metadata.sqlite3"
+# 版の無い形式（1・2）のファイル名
+VECTORS_FILE = "vectors.npy"
+ANN_INDEX_FILE = "ann.faiss"
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# メタデータとして保持する列（行番号以外）
+METADATA_COLUMNS = ("product_id", "occasion", "price", "title")
+
+# SQLite の変数上限（古いバージョンは999）を超えないよう、IN 句は分割して引く
+_QUERY_CHUNK_SIZE = 500
+
+# インデックスの種類（flat は ANN インデックスを作らず faiss.knn で厳密検索）
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq8")
+
+# インデックス作成パラメータの既定値（nlist=None は件数から自動決定）
+DEFAULT_INDEX_PARAMS = {
+    "hnsw_m": 32,
+    "ef_construction": 80,
+    "nlist": None,
+    "pq_m": 16,
+    "pq_nbits": 8,
+    "train_size": 100_000,
+}
+
+
+def default_vector_store_path() -> str:
+    """既定のベクトルストアのディレクトリ（リポジトリ直下の data/vector_store）"""
+    return os.path.normpath(os.path.join(os.path.dirname(__file__), "../../../data/vector_store"))
+
+
+def has_vector_store(directory: str) -> bool:
+    """ディレクトリに新形式のベクトルストアがあるか"""
+    return os.path.exists(os.path.join(directory, METADATA_FILE))
+
+
+def store_signature(directory: str) -> Optional[Tuple[int, int, int]]:
+    """
+    保存されている版の識別子（metadata.sqlite3 の inode・更新時刻・サイズ。無ければNone）
+
+    保存のたびに metadata.sqlite3 が置き換わるため、開かずに版の変化を検出できる
+    """
+    try:
+        stat = os.stat(os.path.join(directory, METADATA_FILE))
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def has_legacy_vector_store(directory: str) -> bool:
+    """ディレクトリに旧形式（LangChain の save_local）のベクトルストアがあるか"""
+    return os.path.exists(os.path.join(directory, "index.pkl"))
+
+
+def auto_nlist(count: int) -> int:
+    """IVF のクラスタ数の目安（4√件数。1クラスタあたり学習点が39以上になる範囲に収める）"""
+    return max(1, min(int(4 * np.sqrt(count)), count // 39))
+
+
+def _base_index(index: Any) -> Any:
+    """IndexIDMap で包んだインデックスの中身（包んでいなければそのまま）"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def build_ann_index(
+    vectors: np.ndarray,
+    index_type: str,
+    index_params: Optional[Dict[str, Any]] = None,
+    ids: Optional[np.ndarray] = None,
+) -> Optional[Any]:
+    """
+    ANN インデックスを作成
+
+    Args:
+        vectors: (件数, 次元) の float32 ベクトル
+        index_type: INDEX_TYPES のいずれか
+        index_params: 作成パラメータ（DEFAULT_INDEX_PARAMS を上書き）
+        ids: ベクトルごとのID（検索結果のラベル）。未指定なら 0 からの連番
+
+    Returns:
+        faiss のインデックス。flat、または学習に必要な件数に足りない場合はNone（厳密検索）
+
+    Raises:
+        ValueError: 種類・パラメータが不正な場合
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"未対応のインデックス種類です: {index_type} (選択肢: {', '.join(INDEX_TYPES)})")
+    if index_type == "flat":
+        return None
+    if not FAISS_AVAILABLE:
+        raise RuntimeError("faiss がインストールされていません")
+
+    params = {**DEFAULT_INDEX_PARAMS, **(index_params or {})}
+    count, dimension = vectors.shape
+    nlist = int(params["nlist"] or auto_nlist(count))
+    if index_type == "hnsw":
+        factory = f"HNSW{int(params['hnsw_m'])}"
+    elif index_type == "ivf_flat":
+        factory = f"IVF{nlist},Flat"
+    elif index_type == "ivf_pq":
+        if dimension % int(params["pq_m"]) != 0:
+            raise ValueError(f"pq_m は次元の約数にしてください: 次元={dimension}, pq_m={params['pq_m']}")
+        factory = f"IVF{nlist},PQ{int(params['pq_m'])}x{int(params['pq_nbits'])}"
+    else:
+        factory = "SQ8"
+
+    # 学習に必要な件数（IVF はクラスタ数、PQ はコードブックの大きさ）に足りなければ厳密検索のままにする
+    required = nlist if index_type.startswith("ivf") else 1
+    if index_type == "ivf_pq":
+        required = max(required, 2 ** int(params["pq_nbits"]))
+    if count < required:
+        logger.warning(f"件数が少ないため {index_type} インデックスを作りません（{count} < {required}件）。厳密検索を使います")
+        return None
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    # IVF は転置リストにIDを持てる。HNSW / SQ8 は IndexIDMap で包んでIDを持たせる
+    if ids is not None and not index_type.startswith("ivf"):
+        factory = f"IDMap,{factory}"
+    index = faiss.index_factory(dimension, factory)
+    if index_type == "hnsw":
+        _base_index(index).hnsw.efConstruction = int(params["ef_construction"])
+    if not index.is_trained:
+        train_size = int(params["train_size"])
+        if count > train_size:
+            sample = np.sort(np.random.default_rng(0).choice(count, train_size, replace=False))
+            index.train(vectors[sample])
+        else:
+            index.train(vectors)
+    if ids is not None:
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype=np.int64))
+    else:
+        index.add(vectors)
+    logger.info(f"ANNインデックス作成: {factory} ({count} 件)")
+    return index
+
+
+def set_search_params(index: Any, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+    """ANN インデックスの検索パラメータを設定（該当しない種類では無視）"""
+    index = _base_index(index)
+    if ef_search and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(ef_search)
+    if nprobe and hasattr(index, "nprobe"):
+        index.nprobe = min(int(nprobe), index.nlist)
+
+
+def write_vector_store(
+    directory: str,
+    vectors: np.ndarray,
+    rows: Sequence[Dict[str, Any]],
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    index_type: str = "flat",
+    index_params: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    ベクトルとメタデータを保存
+
+    一時ファイルに書いてから置き換える。メタデータに件数を記録し、読み込み時にベクトルと突き合わせる。
+
+    Args:
+        directory: 保存先ディレクトリ
+        vectors: (件数, 次元) のベクトル
+        rows: 行ごとのメタデータ（product_id, occasion, price, title。差分更新用に content_hash, deleted も可）
+        embedding_model: ベクトル化に使った埋め込みモデル名（検索クエリも同じモデルでベクトル化する）
+        index_type: 検索に使うインデックスの種類（INDEX_TYPES。flat 以外は ANN インデックスも保存）
+        index_params: インデックス作成パラメータ（DEFAULT_INDEX_PARAMS を上書き）
+
+    Returns:
+        保存した件数
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(rows):
+        raise ValueError(f"ベクトルとメタデータの件数が一致しません: {vectors.shape} / {len(rows)}")
+    os.makedirs(directory, exist_ok=True)
+
+    # 版ごとに別名で書く（metadata.sqlite3 を置き換えるまで、読み込み側からは見えない）
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    vectors_file = f"vectors-{version}.npy"
+    metadata_path = os.path.join(directory, METADATA_FILE)
+    temp_metadata_path = f"{metadata_path}.tmp"
+
+    with open(os.path.join(directory, vectors_file), "wb") as f:
+        np.save(f, vectors)
+
+    # ANN インデックスは有効な行だけで作る（IDは行番号。論理削除行は検索に入らない）
+    live = np.array([not record.get("deleted") for record in rows], dtype=bool)
+    if live.all():
+        ann_index = build_ann_index(vectors, index_type, index_params)
+    else:
+        ann_index = build_ann_index(vectors[live], index_type, index_params, ids=np.flatnonzero(live))
+    ann_file = f"ann-{version}.faiss" if ann_index is not None else ""
+    if ann_index is not None:
+        faiss.write_index(ann_index, os.path.join(directory, ann_file))
+    built_index_type = index_type if ann_index is not None else "flat"
+
+    if os.path.exists(temp_metadata_path):
+        os.remove(temp_metadata_path)
+    conn = sqlite3.connect(temp_metadata_path)
+    try:
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE rows (row INTEGER PRIMARY KEY, product_id TEXT, occasion TEXT, price INTEGER, title TEXT, "
+            "content_hash TEXT, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.executemany(
+            "INSERT INTO rows (row, product_id, occasion, price, title, content_hash, deleted) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    row, record.get("product_id"), record.get("occasion"), record.get("price"), record.get("title"),
+                    record.get("content_hash"), 1 if record.get("deleted") else 0,
+                )
+                for row, record in enumerate(rows)
+            ),
+        )
+        conn.execute("CREATE INDEX rows_product_id ON rows (product_id)")
+        deleted_count = sum(1 for record in rows if record.get("deleted"))
+        conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+            ("format_version", str(FORMAT_VERSION)),
+            ("version", version),
+            ("vectors_file", vectors_file),
+            ("ann_file", ann_file),
+            ("count", str(len(vectors))),
+            ("deleted_count", str(deleted_count)),
+            ("dimension", str(vectors.shape[1])),
+            ("embedding_model", embedding_model),
+            ("index_type", built_index_type),
+            ("index_params", json.dumps({**DEFAULT_INDEX_PARAMS, **(index_params or {})}, sort_keys=True)),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    # metadata.sqlite3 の置き換えで新しい版に切り替わる
+    os.replace(temp_metadata_path, metadata_path)
+    _remove_stale_files(directory, keep={vectors_file, ann_file})
+    logger.info(
+        f"ベクトルストアを保存しました: {directory} "
+        f"(版 {version}, {len(vectors)} 件, {vectors.shape[1]} 次元, {built_index_type})"
+    )
+    return len(vectors)
+
+
+def _remove_stale_files(directory: str, keep: set):
+    """現在の版が参照しないベクトル／ANN インデックスのファイルを削除（開いている mmap はそのまま使える）"""
+    patterns = ("vectors-*.npy", "ann-*.faiss", VECTORS_FILE, ANN_INDEX_FILE)
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(directory, pattern)):
+            if os.path.basename(path) in keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"古いベクトルストアファイルを削除できません: {path} ({e})")
+
+
+class MmapVectorStore:
+    """mmap で開いたベクトルストア（読み取り専用）"""
+
+    def __init__(self, directory: str, embeddings: Optional[Any] = None):
+        """
+        ベクトルストアを開く
+
+        Args:
+            directory: ベクトルストアのディレクトリ
+            embeddings: 検索クエリのベクトル化に使う埋め込みモデル（embed_query を持つもの。
+                similarity_search_by_vector_with_score だけを使う場合は不要）
+
+        Raises:
+            ValueError: 形式・件数が不正な場合
+        """
+        if not FAISS_AVAILABLE:
+            raise RuntimeError("faiss がインストールされていません")
+
+        self.directory = directory
+        self.embeddings = embeddings
+        self._conn = sqlite3.connect(
+            f"file:{os.path.join(directory, METADATA_FILE)}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._conn_lock = Lock()
+        self.meta: Dict[str, str] = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        self.format_version = int(self.meta.get("format_version", 0))
+        if self.format_version not in SUPPORTED_FORMAT_VERSIONS:
+            raise ValueError(f"未対応のベクトルストア形式です: {self.meta.get('format_version')}")
+
+        self.vectors = np.load(os.path.join(directory, self.meta.get("vectors_file", VECTORS_FILE)), mmap_mode="r")
+        if self.vectors.dtype != np.float32 or self.vectors.ndim != 2:
+            raise ValueError(f"ベクトルの形式が不正です: {self.vectors.dtype} {self.vectors.shape}")
+        if len(self.vectors) != int(self.meta["count"]) or self.vectors.shape[1] != int(self.meta["dimension"]):
+            raise ValueError(
+                f"ベクトルとメタデータが一致しません: {self.vectors.shape} / "
+                f"count={self.meta['count']} dimension={self.meta['dimension']}"
+            )
+        # flat 検索で除外する論理削除行と、その検索に使う行ごとのノルムの2乗（論理削除が無ければNone）
+        self._deleted_mask: Optional[np.ndarray] = None
+        self._squared_norms: Optional[np.ndarray] = None
+        if self.deleted_count and self.format_version >= 2:
+            self._deleted_mask = np.zeros(len(self.vectors), dtype=bool)
+            deleted = self._conn.execute("SELECT row FROM rows WHERE deleted = 1").fetchall()
+            self._deleted_mask[[row for row, in deleted]] = True
+            self._squared_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        self.ann = self._load_ann_index()
+
+    def _load_ann_index(self) -> Optional[Any]:
+        """ANN インデックスを開く（無い・ベクトルと一致しない場合はNone＝厳密検索）"""
+        if self.index_type == "flat":
+            return None
+        path = os.path.join(self.directory, self.meta.get("ann_file", ANN_INDEX_FILE))
+        if not os.path.exists(path):
+            logger.warning(f"ANNインデックスが見つからないため厳密検索を使います: {path}")
+            return None
+        # IVF は転置リストを mmap（ページキャッシュを全ワーカーで共有）。HNSW / SQ8 はメモリに読み込む
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if self.index_type.startswith("ivf") else 0
+        index = faiss.read_index(path, flags)
+        # 有効な行だけで作ったインデックスのみ使う（論理削除行を含む古いインデックスは使わない）
+        if index.ntotal != self.live_count or index.d != self.dimension:
+            logger.warning(f"ANNインデックスがベクトルと一致しないため厳密検索を使います: {index.ntotal}件/{index.d}次元")
+            return None
+        return index
+
+    @property
+    def ntotal(self) -> int:
+        """登録されているベクトル数"""
+        return len(self.vectors)
+
+    @property
+    def dimension(self) -> int:
+        """ベクトルの次元"""
+        return self.vectors.shape[1]
+
+    @property
+    def embedding_model(self) -> str:
+        """ベクトル化に使った埋め込みモデル名"""
+        return self.meta.get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+
+    @property
+    def version(self) -> str:
+        """保存時の版（版の無い形式では空文字）"""
+        return self.meta.get("version", "")
+
+    @property
+    def index_type(self) -> str:
+        """保存時に作成したインデックスの種類（flat は厳密検索）"""
+        return self.meta.get("index_type", "flat")
+
+    def set_search_params(self, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+        """
+        ANN 検索のパラメータを設定（精度と速度のトレードオフ）
+
+        Args:
+            ef_search: HNSW の探索幅（大きいほど再現率が上がり遅くなる）
+            nprobe: IVF で調べるクラスタ数（同上）
+        """
+        if self.ann is not None:
+            set_search_params(self.ann, ef_search=ef_search, nprobe=nprobe)
+
+    @property
+    def deleted_count(self) -> int:
+        """論理削除された行数"""
+        return int(self.meta.get("deleted_count", 0))
+
+    @property
+    def live_count(self) -> int:
+        """検索対象の行数（論理削除を除く）"""
+        return self.ntotal - self.deleted_count
+
+    def get_rows(self, row_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """行番号 -> メタデータ（論理削除された行は含めない）"""
+        row_ids = [int(row) for row in row_ids]
+        live_filter = " AND deleted = 0" if self.format_version >= 2 else ""
+        found: Dict[int, Dict[str, Any]] = {}
+        with self._conn_lock:
+            for start in range(0, len(row_ids), _QUERY_CHUNK_SIZE):
+                chunk = row_ids[start:start + _QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                fetched = self._conn.execute(
+                    f"SELECT row, product_id, occasion, price, title FROM rows WHERE row IN ({placeholders}){live_filter}",
+                    chunk,
+                ).fetchall()
+                for row, *values in fetched:
+                    found[row] = dict(zip(METADATA_COLUMNS, values))
+        return found
+
+    def all_rows(self) -> List[Dict[str, Any]]:
+        """全行のメタデータ（行番号順。content_hash / deleted を含む。差分更新用）"""
+        extra_columns = "content_hash, deleted" if self.format_version >= 2 else "NULL, 0"
+        with self._conn_lock:
+            fetched = self._conn.execute(
+                f"SELECT product_id, occasion, price, title, {extra_columns} FROM rows ORDER BY row"
+            ).fetchall()
+        return [
+            {**dict(zip(METADATA_COLUMNS, values)), "content_hash": content_hash, "deleted": bool(deleted)}
+            for *values, content_hash, deleted in fetched
+        ]
+
+    def similarity_search_by_vector_with_score(self, embedding: Sequence[float], k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        ベクトルで近傍検索
+
+        Args:
+            embedding: クエリベクトル
+            k: 取得件数
+
+        Returns:
+            (Document, L2距離の2乗) のリスト（距離の昇順。flat は IndexFlatL2 と同じ値、
+            IVF-PQ / SQ8 は量子化後のベクトルとの距離）
+        """
+        k = min(k, self.live_count)
+        if k <= 0:
+            return []
+        # 論理削除された行は検索に入らない（ANN は有効な行だけで作成、flat は距離を無限大にして除く）
+        query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        if self.ann is not None:
+            distances, labels = self.ann.search(query, k)
+        elif self._deleted_mask is None:
+            distances, labels = faiss.knn(query, self.vectors, k)
+        else:
+            distances, labels = self._search_live_rows(query, k)
+        hits = [(int(row), float(distance)) for row, distance in zip(labels[0], distances[0]) if row >= 0]
+        rows = self.get_rows(row for row, _ in hits)
+        return [
+            (Document(page_content=rows[row].get("title") or "", metadata={"row": row, **rows[row]}), distance)
+            for row, distance in hits if row in rows
+        ]
+
+    def _search_live_rows(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """論理削除行を除いた厳密検索（faiss.knn と同じ形の (L2距離の2乗, 行番号) を返す）"""
+        # |x - q|^2 = |x|^2 - 2 x・q + |q|^2（|x|^2 は読み込み時に計算済み）
+        distances = self._squared_norms - 2 * (self.vectors @ query[0]) + float(query[0] @ query[0])
+        distances[self._deleted_mask] = np.inf
+        top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        top = top[np.argsort(distances[top], kind="stable")]
+        return distances[top].reshape(1, -1), top.reshape(1, -1)
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        テキストで近傍検索（LangChain の FAISS.similarity_search_with_score 互換）
+
+        Args:
+            query: 検索クエリ
+            k: 取得件数
+        """
+        if self.embeddings is None:
+            raise RuntimeError("埋め込みモデルが設定されていないため、テキストで検索できません")
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k)
+
+    def validate(self):
+        """
+        検索できる状態かを確認（読み込んだ版を差し替え前に検証する）
+
+        有効な行のベクトル自身で検索し、結果が返ることを確かめる（ANN インデックスも通る）
+
+        Raises:
+            ValueError: 有効な行が無い・検索結果が不正な場合
+        """
+        live_filter = " WHERE deleted = 0" if self.format_version >= 2 else ""
+        with self._conn_lock:
+            found = self._conn.execute(f"SELECT row FROM rows{live_filter} ORDER BY row LIMIT 1").fetchone()
+        if found is None:
+            raise ValueError("検索対象の行がありません")
+        results = self.similarity_search_by_vector_with_score(self.vectors[found[0]], k=1)
+        if not results or not np.isfinite(results[0][1]):
+            raise ValueError(f"検索結果が不正です: {results}")
+
+    def close(self):
+        """メタデータの接続を閉じる（ベクトルの mmap は参照が無くなった時点で解放される）"""
+        with self._conn_lock:
+            self._conn.close()
+
+
+def load_vector_store(directory: str, embeddings: Optional[Any] = None) -> Optional[MmapVectorStore]:
+    """
+    ベクトルストアを開く（無い・旧形式のみ・壊れている場合はNone）
+
+    Args:
+        directory: ベクトルストアのディレクトリ
+        embeddings: 検索クエリのベクトル化に使う埋め込みモデル
+    """
+    if not has_vector_store(directory):
+        if has_legacy_vector_store(directory):
+            logger.error(
+                f"旧形式（pickle）のベクトルストアは読み込みません: {directory} "
+                f"→ python scripts/export_vector_store.py で変換してください"
+            )
+        else:
+            logger.warning(f"ベクトルストアが見つかりません: {directory}")
+        return None
+    try:
+        store = MmapVectorStore(directory, embeddings)
+    except Exception as e:
+        logger.error(f"ベクトルストア読み込みエラー: {directory} ({e})")
+        return None
+    logger.info(
+        f"✅ ベクトルストアを開きました: {directory} "
+        f"({store.live_count} 件, 論理削除 {store.deleted_count} 件, {store.dimension} 次元, {store.index_type}, mmap)"
+    )
+    return store
+
+
+def content_hash(text: str) -> str:
+    """埋め込み元テキストのハッシュ（テキストが変わった商品だけを再ベクトル化する判定に使う）"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def sync_vector_store(
+    directory: str,
+    items: Sequence[Dict[str, Any]],
+    embed_documents: Callable[[List[str]], List[List[float]]],
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    batch_size: int = 100,
+    compact_ratio: float = 0.2,
+    index_type: str = "flat",
+    index_params: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    商品一覧に合わせてベクトルストアを差分更新（product_id をキーにする）
+
+    - 新しい商品: ベクトル化して末尾に追加
+    - テキストが変わった商品: 旧行を論理削除し、再ベクトル化して末尾に追加
+    - テキストが同じ商品: ベクトルはそのまま（価格などのメタデータだけ更新）
+    - 一覧から消えた商品: 論理削除
+    論理削除の割合が compact_ratio を超えたら、削除行を取り除いて行番号を振り直す。
+    埋め込みモデルが変わった場合は全件をベクトル化し直す。
+
+    Args:
+        directory: ベクトルストアのディレクトリ（無ければ新規作成）
+        items: 商品ごとの {"product_id", "text", "occasion", "price", "title"}（items が現在の全商品）
+        embed_documents: テキストのリストをベクトル化する関数（OpenAIEmbeddings.embed_documents など）
+        embedding_model: ベクトル化に使う埋め込みモデル名
+        batch_size: 1回の埋め込みAPI呼び出しで送る件数
+        compact_ratio: 詰め直しを行う論理削除行の割合
+        index_type: 検索に使うインデックスの種類（ANN インデックスは有効な行だけで毎回作り直す）
+        index_params: インデックス作成パラメータ
+
+    Returns:
+        更新結果（added, updated, deleted, unchanged, compacted, total, deleted_rows）
+    """
+    previous_rows: List[Dict[str, Any]] = []
+    previous_vectors: Optional[np.ndarray] = None
+    if has_vector_store(directory):
+        store = MmapVectorStore(directory)
+        try:
+            if store.embedding_model == embedding_model:
+                previous_rows = store.all_rows()
+                previous_vectors = store.vectors
+            else:
+                logger.info(f"埋め込みモデルが変わったため全件をベクトル化し直します: {store.embedding_model} → {embedding_model}")
+        finally:
+            store.close()
+
+    # product_id -> 有効な行番号（同じ商品の有効行は1つだけ）
+    live_rows = {
+        row["product_id"]: position
+        for position, row in enumerate(previous_rows)
+        if not row["deleted"] and row["product_id"] is not None
+    }
+
+    rows = [dict(row) for row in previous_rows]
+    pending: List[Tuple[Dict[str, Any], str]] = []
+    seen = set()
+    summary = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0, "compacted": False}
+    for item in items:
+        product_id = item["product_id"]
+        if product_id in seen:
+            continue
+        seen.add(product_id)
+        text_hash = content_hash(item["text"])
+        row_metadata = {
+            "product_id": product_id,
+            "occasion": item.get("occasion"),
+            "price": item.get("price"),
+            "title": item.get("title"),
+            "content_hash": text_hash,
+            "deleted": False,
+        }
+        position = live_rows.get(product_id)
+        if position is not None and rows[position]["content_hash"] == text_hash:
+            rows[position].update(row_metadata)
+            summary["unchanged"] += 1
+            continue
+        if position is not None:
+            rows[position]["deleted"] = True
+            summary["updated"] += 1
+        else:
+            summary["added"] += 1
+        pending.append((row_metadata, item["text"]))
+
+    for product_id, position in live_rows.items():
+        if product_id not in seen:
+            rows[position]["deleted"] = True
+            summary["deleted"] += 1
+
+    # 変更分だけをベクトル化
+    new_vectors: List[np.ndarray] = []
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        new_vectors.append(np.asarray(embed_documents([text for _, text in batch]), dtype=np.float32))
+        logger.info(f"ベクトル化: {min(start + batch_size, len(pending))}/{len(pending)}件完了")
+
+    parts = ([previous_vectors] if previous_vectors is not None else []) + new_vectors
+    if not parts:
+        raise ValueError("ベクトル化する商品がありません")
+    vectors = np.concatenate(parts) if len(parts) > 1 else parts[0]
+    rows.extend(row_metadata for row_metadata, _ in pending)
+
+    deleted_rows = sum(1 for row in rows if row["deleted"])
+    if rows and deleted_rows / len(rows) > compact_ratio:
+        keep = np.array([not row["deleted"] for row in rows], dtype=bool)
+        vectors = vectors[keep]
+        rows = [row for row in rows if not row["deleted"]]
+        summary["compacted"] = True
+        logger.info(f"ベクトルストアを詰め直しました: 論理削除 {deleted_rows}件を除去")
+        deleted_rows = 0
+
+    write_vector_store(
+        directory, vectors, rows, embedding_model=embedding_model, index_type=index_type, index_params=index_params
+    )
+    summary["total"] = len(rows) - deleted_rows
+    summary["deleted_rows"] = deleted_rows
+    return summary
@@ -214,4 +214,1035 @@ class TestProviderIntegration:
         assert hasattr(provider, 'search_items')
         assert hasattr(provider, 'get_item_by_id')
         assert hasattr(provider, 'health_check')
-        assert hasattr(provider, 'get_occasions')
\ No newline at end of file
+        assert hasattr(provider, 'get_occasions')
+
+class TestCandidatePoolController:
+    """候補プールサイズ制御のテストクラス"""
+    
+    @pytest.fixture
+    def controller(self):
+        from app.services.candidate_pool import CandidatePoolController
+        controller = CandidatePoolController()
+        controller.reset()
+        yield controller
+        controller.reset()
+    
+    def test_returns_default_until_warm(self, controller):
+        """観測数が足りない間は従来の既定値を返す"""
+        intent = {"occasion": "wedding_celebration"}
+        assert controller.recommend(intent, limit=3, default=50) == 50
+    
+    def test_broad_intent_shrinks_pool(self, controller):
+        """上位候補だけで決まる広い検索では取得件数が減る"""
+        intent = {"occasion": "wedding_celebration"}
+        for _ in range(10):
+            controller.observe(intent, limit=3, fetched=50, survivors=50, depth=3, total_hits=800)
+        assert controller.recommend(intent, limit=3, default=50) < 50
+    
+    def test_deep_rerank_grows_pool(self, controller):
+        """再ランキングで深い候補が選ばれる意図では取得件数が増える"""
+        broad = {"occasion": "wedding_celebration"}
+        deep = {"occasion": "wedding_celebration", "relationship": "boss"}
+        for _ in range(10):
+            controller.observe(broad, limit=3, fetched=50, survivors=50, depth=3, total_hits=800)
+            controller.observe(deep, limit=3, fetched=50, survivors=20, depth=40, total_hits=800)
+        assert controller.recommend(deep, limit=3, default=50) > controller.recommend(broad, limit=3, default=50)
+    
+    def test_pool_capped_by_total_hits(self, controller):
+        """総ヒット数が少ない意図ではそれ以上取得しない"""
+        intent = {"occasion": "mothers_day", "budget_max": 1000}
+        for _ in range(10):
+            controller.observe(intent, limit=3, fetched=8, survivors=8, depth=8, total_hits=8)
+        assert controller.recommend(intent, limit=3, default=50) <= 10
+    
+    def test_budget_filter_losses_grow_pool(self, controller):
+        """後段の予算フィルタで候補が脱落する意図では、生存率が下がり取得件数が増える"""
+        from app.schemas.item import GiftItem
+        from app.services.optimized_rag_service import OptimizedLangChainRAGService
+        
+        service = OptimizedLangChainRAGService.__new__(OptimizedLangChainRAGService)
+        service.pool_controller = controller
+        candidates = [
+            GiftItem(id=f"p{i}", title="タオル", price=3000 if i % 4 == 0 else 20000, image_url="", merchant="shop",
+                     source="rakuten", affiliate_url="", occasion="birthday", updated_at=0)
+            for i in range(40)
+        ]
+        intent = {"occasion": "birthday", "budget_max": 5000}
+        for _ in range(10):
+            service._observe_candidate_pool(intent, 3, candidates, candidates, total_hits=800)
+        
+        assert controller.snapshot()["o1g0p1r0"]["survival"] == 0.25
+        # 脱落が無い場合の取得件数（limit × 2）より多く取る
+        assert controller.recommend(intent, limit=3, default=50) > 3 * controller.base_factor
+
+
+class TestCandidateReranker:
+    """学習済みリランカーのテストクラス"""
+    
+    @staticmethod
+    def _item(item_id, title, price=3000, review_count=10, review_average=4.0):
+        from app.schemas.item import GiftItem
+        return GiftItem(
+            id=item_id, title=title, price=price, image_url="", merchant="shop",
+            source="rakuten", affiliate_url="", occasion="birthday", updated_at=0,
+            review_count=review_count, review_average=review_average
+        )
+    
+    def test_heuristic_prefers_keyword_group_hits(self):
+        """モデル未設定時は相手情報キーワードのヒット数で並ぶ（同点は一次検索順）"""
+        from app.services.reranker import CandidateReranker
+        reranker = CandidateReranker()
+        items = [self._item("a", "タオル"), self._item("b", "高級 老舗 タオル"), self._item("c", "タオル")]
+        ranked, scores = reranker.rerank(items, {"relationship": "上司・目上の方"})
+        assert [item.id for item in ranked] == ["b", "a", "c"]
+        assert scores[0] > scores[1]
+    
+    def test_feature_log_is_written_off_the_event_loop(self, tmp_path, monkeypatch):
+        """イベントループ上の再ランキングでは、特徴量ログの追記をスレッドに任せてすぐ戻る"""
+        import asyncio
+        import json
+        import threading
+        from app.services.reranker import CandidateReranker
+        
+        log_path = tmp_path / "features.jsonl"
+        reranker = object.__new__(CandidateReranker)  # シングルトンとは別のインスタンス
+        reranker.__init__(feature_log_path=str(log_path))
+        writers = []
+        append = reranker._append_feature_log
+        monkeypatch.setattr(reranker, "_append_feature_log", lambda lines: (writers.append(threading.current_thread()), append(lines)))
+        
+        async def run():
+            reranker.rerank([self._item("a", "タオル"), self._item("b", "高級タオル")], {"relationship": "上司"}, query_id="q1")
+            assert not log_path.exists()  # 書き込みはまだ終わっていない
+            await asyncio.gather(*reranker._pending_writes)
+        
+        asyncio.run(run())
+        rows = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+        assert [(row["candidate_id"], row["shown_rank"]) for row in rows] == [("a", 1), ("b", 0)]
+        assert writers and writers[0] is not threading.main_thread()
+    
+    def test_loads_linear_and_tree_models(self, tmp_path):
+        """線形モデル・決定木モデルをファイルから読み込み、一括でスコアリングできる"""
+        import json
+        from app.services.reranker import load_model, build_feature_matrix
+        items = [self._item("a", "x", price=1000), self._item("b", "x", price=5000)]
+        X = build_feature_matrix(items, {"budget_min": 3000, "budget_max": 7000})
+        
+        linear_path = tmp_path / "linear.json"
+        linear_path.write_text(json.dumps({"type": "linear", "feature_names": ["price_fit"], "weights": [2.0], "bias": 0.5}))
+        assert load_model(str(linear_path)).score(X).tolist() == [0.5, 2.5]
+        
+        tree_path = tmp_path / "trees.json"
+        tree_path.write_text(json.dumps({
+            "type": "trees", "feature_names": ["price_fit"], "base_score": 0.0,
+            "trees": [{"feature": [0, 0, 0], "threshold": [0.5, 0, 0], "left": [1, -1, -1], "right": [2, -1, -1], "value": [0, -1.0, 1.0]}]
+        }))
+        assert load_model(str(tree_path)).score(X).tolist() == [-1.0, 1.0]
+    
+    def test_index_time_affinity_matches_features(self):
+        """投入時の affinity_* はキーワード群特徴量と同じ値で、相手情報からソート指定を組み立てられる"""
+        from app.services.reranker import affinity_sort, build_feature_matrix, compute_affinity, _FEATURE_INDEX
+        item = self._item("a", "高級 老舗の紳士用ネクタイ")
+        intent = {"relationship": "上司・目上の方", "gender": "男性", "age_range": "60代"}
+        
+        affinity = compute_affinity(item.title, item.description)
+        X = build_feature_matrix([item], intent)
+        for group in ("formal", "male", "senior"):
+            assert affinity[f"affinity_{group}"] == X[0, _FEATURE_INDEX[f"kw_{group}"]]
+        assert affinity_sort(intent) == [
+            "affinity_formal:desc", "affinity_male:desc", "affinity_senior:desc",
+            "review_average:desc", "review_count:desc",
+        ]
+        assert affinity_sort({"relationship": "", "gender": "", "age_range": ""}) == []
+    
+    def test_engine_sort_is_lexicographic(self):
+        """エンジンのソートは重みの大きい群から辞書式で、重み付き和のヒューリスティックとは順位が異なる"""
+        from app.services.reranker import CandidateReranker, affinity_sort, compute_affinity
+        items = [self._item("a", "のし付きタオル"), self._item("b", "メンズ 紳士 ネクタイ 健康 伝統 和風")]
+        intent = {"relationship": "上司・目上の方", "gender": "男性", "age_range": "60代"}
+        
+        documents = [
+            {"id": item.id, "review_average": item.review_average, "review_count": item.review_count,
+             **compute_affinity(item.title, item.description)}
+            for item in items
+        ]
+        attributes = [spec.split(":")[0] for spec in affinity_sort(intent)]
+        engine_order = sorted(documents, key=lambda doc: tuple(-doc[attribute] for attribute in attributes))
+        
+        # formal=1 の a が、male=3・senior=3 の b より上に来る（ヒューリスティックでは 2.0 < 9.0 で b が上）
+        assert [doc["id"] for doc in engine_order] == ["a", "b"]
+        ranked, _ = CandidateReranker().rerank(items, intent)
+        assert [item.id for item in ranked] == ["b", "a"]
+    
+    def test_fallback_search_uses_engine_sort(self):
+        """インデックスが affinity_* に対応していれば、Meilisearchのソートに任せて再ランキングしない"""
+        import asyncio
+        from app.schemas.search import SearchResponse
+        from app.services.optimized_rag_service import OptimizedLangChainRAGService
+        from app.services.reranker import CandidateReranker
+        
+        service = OptimizedLangChainRAGService.__new__(OptimizedLangChainRAGService)
+        service.reranker = CandidateReranker()
+        service.pool_controller = Mock()
+        service.meilisearch_service = Mock()
+        service.meilisearch_service.supports_sort.return_value = True
+        service.meilisearch_service.search_items.return_value = SearchResponse(
+            total=2, hits=[self._item("a", "タオル"), self._item("b", "高級タオル")],
+            query="", processing_time_ms=1, limit=2, offset=0
+        )
+        intent = {"occasion": "wedding_celebration", "relationship": "上司・目上の方", "gender": "", "age_range": ""}
+        
+        results, metadata = asyncio.run(service._fallback_search("結婚祝い", intent, limit=2))
+        
+        params = service.meilisearch_service.search_items.call_args[0][0]
+        assert params.limit == 2
+        assert params.sort == ["affinity_formal:desc", "review_average:desc", "review_count:desc"]
+        assert [item["id"] for item in results] == ["a", "b"]  # エンジンの順序のまま
+        assert metadata["reranker"]["model"] == "engine_sort"
+        service.pool_controller.recommend.assert_not_called()
+    
+    def test_direct_search_filters_budget_in_engine(self):
+        """ハイブリッドエンジン無しの直接検索でも予算はMeilisearch側で絞り、事後の予算フィルタ後も limit 件残る"""
+        import asyncio
+        from app.schemas.search import SearchResponse
+        from app.services.optimized_rag_service import OptimizedLangChainRAGService
+        from app.services.reranker import CandidateReranker
+        
+        catalog = [self._item(f"p{price}", "タオル", price=price) for price in range(1000, 11000, 1000)]
+        
+        def search_items(params):
+            hits = [item for item in catalog
+                    if (params.price_min is None or item.price >= params.price_min)
+                    and (params.price_max is None or item.price <= params.price_max)]
+            return SearchResponse(total=len(hits), hits=hits[:params.limit], query=params.q or "",
+                                  processing_time_ms=1, limit=params.limit, offset=0)
+        
+        service = OptimizedLangChainRAGService.__new__(OptimizedLangChainRAGService)
+        service.hybrid_engine = None
+        service.reranker = CandidateReranker()
+        service.pool_controller = Mock()
+        service.meilisearch_service = Mock()
+        service.meilisearch_service.supports_sort.return_value = True
+        service.meilisearch_service.search_items.side_effect = search_items
+        intent = {"occasion": "", "relationship": "上司・目上の方", "budget_min": 5000, "budget_max": 8000}
+        
+        results, metadata = asyncio.run(service._fast_hybrid_search("タオル", intent, limit=3))
+        
+        params = service.meilisearch_service.search_items.call_args[0][0]
+        assert (params.q, params.price_min, params.price_max, params.limit) == ("タオル", 5000, 8000, 3)
+        assert metadata["reranker"]["model"] == "engine_sort"
+        assert [item.id for item in service._apply_budget_filter(results, intent)] == ["p5000", "p6000", "p7000"]
+
+
+class TestFallbackRecommender:
+    """縮退モード推薦のテストクラス"""
+    
+    def test_meilisearch_failure_uses_preloaded_fallback(self, tmp_path, monkeypatch):
+        """Meilisearch障害時は読み込み済みの縮退モード推薦を使い、サービスやデータを作り直さない"""
+        import asyncio
+        import json
+        from app.services import ai_recommendation_service
+        from app.services.ai_recommendation_service import FallbackRecommender, ProductDataLoader
+        from app.services.optimized_rag_service import OptimizedLangChainRAGService
+        
+        (tmp_path / "rakuten_uchiwai_products_20250101.json").write_text(json.dumps([
+            {"id": "towel", "title": "結婚祝い 今治タオル", "description": "タオル", "price": 3000,
+             "image_url": "", "merchant": "", "affiliate_url": "", "updated_at": 0},
+        ], ensure_ascii=False), encoding="utf-8")
+        monkeypatch.setattr(FallbackRecommender, "_instance", None)
+        recommender = FallbackRecommender()
+        recommender.service.data_loader = ProductDataLoader(data_dir=str(tmp_path))
+        assert recommender.preload()
+        
+        def fail(*args, **kwargs):
+            raise AssertionError("フォールバック時にサービスを生成した")
+        monkeypatch.setattr(ai_recommendation_service.AIRecommendationService, "__init__", fail)
+        monkeypatch.setattr(ProductDataLoader, "_read_snapshot", fail)
+        
+        service = OptimizedLangChainRAGService.__new__(OptimizedLangChainRAGService)
+        service.hybrid_engine = None
+        service.pool_controller = Mock()
+        service.pool_controller.recommend.return_value = 10
+        service.meilisearch_service = Mock()
+        service.meilisearch_service.supports_sort.return_value = False
+        service.meilisearch_service.search_items.side_effect = ConnectionError("meilisearch down")
+        
+        results, metadata = asyncio.run(service._fast_hybrid_search("結婚祝い", {"occasion": "wedding_celebration"}, limit=1))
+        
+        assert [item.id for item in results] == ["towel"]
+        assert metadata["search_method"] == "ai_recommendation_mock"
+
+
+class TestProductReasonGeneration:
+    """商品理由生成（一括／並行）のテストクラス"""
+    
+    class _FakeLLM:
+        def __init__(self, content):
+            self.content = content
+            self.calls = 0
+        
+        async def ainvoke(self, prompt):
+            self.calls += 1
+            return Mock(content=self.content)
+    
+    @staticmethod
+    def _service(llm):
+        from app.services.optimized_rag_service import OptimizedLangChainRAGService
+        service = OptimizedLangChainRAGService.__new__(OptimizedLangChainRAGService)
+        service.llm = llm
+        return service
+    
+    @staticmethod
+    def _products():
+        from app.schemas.item import GiftItem
+        return [
+            GiftItem(id=item_id, title=f"商品{item_id}", price=3000, image_url="", merchant="shop",
+                     source="rakuten", affiliate_url="", occasion="birthday", updated_at=0,
+                     review_count=10, review_average=4.5)
+            for item_id in ("p1", "p2")
+        ]
+    
+    def test_batch_mode_uses_single_call_and_fills_missing(self):
+        """一括モードは1回の呼び出しで取得し、欠けた商品は関係性別の定型文で補う"""
+        import asyncio
+        llm = self._FakeLLM('```json\n{"p1": "上品な包装で目上の方に最適"}\n```')
+        with patch("app.services.optimized_rag_service.settings.product_reason_mode", "batch"):
+            reasons = asyncio.run(self._service(llm)._generate_product_reasons(self._products(), {"relationship": "boss"}))
+        assert llm.calls == 1
+        assert reasons["p1"] == "上品な包装で目上の方に最適"
+        assert reasons["p2"].startswith("上司に敬意を示す")
+    
+    def test_parallel_mode_calls_per_product(self):
+        """並行モードは商品ごとに呼び出す"""
+        import asyncio
+        llm = self._FakeLLM("実用的で喜ばれる逸品")
+        with patch("app.services.optimized_rag_service.settings.product_reason_mode", "parallel"):
+            reasons = asyncio.run(self._service(llm)._generate_product_reasons(self._products(), {}))
+        assert llm.calls == 2
+        assert reasons == {"p1": "実用的で喜ばれる逸品", "p2": "実用的で喜ばれる逸品"}
+
+    def test_precomputed_reasons_skip_llm(self, tmp_path):
+        """事前生成済みの理由はLLMを呼ばずに返し、価格が変わった商品だけ生成する"""
+        import asyncio
+        from app.services.reason_store import (
+            ProductReasonStore, ProductReasonStoreWriter, product_fingerprint, profile_bucket
+        )
+
+        intent = {"occasion": "birthday", "relationship": "friend", "gender": "女性", "age_range": ""}
+        bucket = profile_bucket(intent)
+        assert bucket == "birthday|friend|女性|unknown"
+
+        path = str(tmp_path / "product_reasons.sqlite3")
+        writer = ProductReasonStoreWriter(path)
+        writer.put_many([
+            ("p1", bucket, product_fingerprint("商品p1", 3000), "事前生成の理由"),
+            ("p2", bucket, product_fingerprint("商品p2", 2500), "価格改定前の理由"),
+        ])
+        writer.close()
+
+        ProductReasonStore._instance = None
+        try:
+            llm = self._FakeLLM('{"p2": "新しく生成した理由"}')
+            with patch("app.services.optimized_rag_service.settings.product_reason_store_path", path), \
+                 patch("app.services.optimized_rag_service.settings.product_reason_mode", "batch"):
+                reasons = asyncio.run(self._service(llm)._generate_product_reasons(self._products(), intent))
+                stats = ProductReasonStore(path).get_stats()
+        finally:
+            ProductReasonStore._instance = None
+
+        assert llm.calls == 1
+        assert reasons == {"p1": "事前生成の理由", "p2": "新しく生成した理由"}
+        assert stats["hits"] == 1 and stats["stale"] == 1
+
+
+class TestIntentCache:
+    """意図抽出キャッシュのテストクラス"""
+    
+    @pytest.fixture
+    def cache_factory(self, tmp_path):
+        from app.services.intent_cache import IntentCache
+        
+        def create(max_entries=1024):
+            IntentCache._instance = None
+            return IntentCache(path=str(tmp_path / "intent_cache.sqlite3"), max_entries=max_entries)
+        
+        yield create
+        IntentCache._instance = None
+    
+    def test_normalized_inputs_share_entry(self, cache_factory):
+        """全角・空白・句読点の揺れは同じエントリに当たる"""
+        cache = cache_factory()
+        cache.set("用途: 結婚祝い、予算: 3000円〜5000円", "v1", {"occasion": "wedding_celebration"})
+        assert cache.get("用途：結婚祝い　予算 ３０００円～５０００円", "v1") == {"occasion": "wedding_celebration"}
+        assert cache.get("用途: 結婚祝い、予算: 3000円〜5000円", "v2") is None
+        stats = cache.get_stats()
+        assert stats["memory_hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+    
+    def test_budget_direction_is_kept_in_key(self, cache_factory):
+        """範囲記号の位置で下限・上限が変わる入力は別のエントリになる"""
+        from app.services.intent_cache import normalize_intent_input
+        assert normalize_intent_input("予算: 3000円〜") != normalize_intent_input("予算: 〜3000円")
+        assert normalize_intent_input("予算: 3000円～") == normalize_intent_input("予算 3000円 ~")
+        
+        cache = cache_factory()
+        cache.set("予算: 3000円〜", "v1", {"budget_min": 3000})
+        assert cache.get("予算: 〜3000円", "v1") is None
+    
+    def test_disk_tier_survives_restart_and_purges_old_versions(self, cache_factory):
+        """メモリ層から溢れた・再起動後のエントリはディスク層から復元され、旧バージョンは削除できる"""
+        cache = cache_factory(max_entries=1)
+        cache.set("母の日", "v1", {"occasion": "mothers_day"})
+        cache.set("父の日", "v1", {"occasion": "fathers_day"})
+        
+        restarted = cache_factory(max_entries=1)
+        assert restarted.get("母の日", "v1") == {"occasion": "mothers_day"}
+        assert restarted.get_stats()["disk_hits"] == 1
+        assert restarted.purge_stale_versions("v2") == 2
+
+
+class TestTieredIntentExtraction:
+    """段階的意図抽出のテストクラス"""
+    
+    @pytest.fixture
+    def extractor(self):
+        from app.services.optimized_rag_service import OptimizedUserIntentExtractor, PerformanceOptimizer
+        with patch("app.services.optimized_rag_service.settings.intent_cache_enabled", False):
+            yield OptimizedUserIntentExtractor(None, PerformanceOptimizer())
+    
+    def test_explicit_fields_skip_llm(self, extractor):
+        """用途・相手・予算が明示されていればLLMを呼ばずに確定する"""
+        import asyncio
+        intent, tier = asyncio.run(extractor.extract_intent_tiered("上司への出産祝い、予算：１万円以内"))
+        assert tier == "rule"
+        assert intent["occasion"] == "birth_celebration"
+        assert intent["target_relationship"] == "boss"
+        assert intent["budget_max"] == 10000
+    
+    def test_ambiguous_input_has_low_confidence(self, extractor):
+        """項目の欠落や自由記述の多い入力は信頼度が閾値未満になる"""
+        _, partial = extractor.extract_intent_rules("母の日のプレゼント")
+        _, free_text = extractor.extract_intent_rules("結婚祝い 同僚 3000〜5000円 お酒好きでおしゃれなものが良い")
+        assert partial < 0.9
+        assert free_text < 0.9
+
+
+class TestStreamingRecommendation:
+    """ストリーミング推薦のテストクラス"""
+    
+    def test_products_are_emitted_before_llm_output(self):
+        """商品イベントがアドバイス・商品理由より先に届き、最後にdoneで終わる"""
+        import asyncio
+        from app.schemas.item import GiftItem
+        from app.services.optimized_rag_service import OptimizedLangChainRAGService, PerformanceOptimizer
+        from app.services.advice_cache import AdviceCache
+        
+        products = [
+            GiftItem(id=item_id, title=f"商品{item_id}", price=3000, image_url="", merchant="shop",
+                     source="rakuten", affiliate_url="", occasion="birthday", updated_at=0,
+                     review_count=10, review_average=4.5)
+            for item_id in ("p1", "p2")
+        ]
+        
+        class FakeLLM:
+            async def astream(self, prompt):
+                for text in ("迷ったら", "消耗品を"):
+                    yield Mock(content=text)
+            
+            async def ainvoke(self, prompt):
+                return Mock(content='{"p1": "理由1", "p2": "理由2"}')
+        
+        service = OptimizedLangChainRAGService.__new__(OptimizedLangChainRAGService)
+        service.llm = FakeLLM()
+        service.optimizer = PerformanceOptimizer()
+        service.optimizer.clear_shared_cache()
+        AdviceCache().clear()
+        service.hybrid_engine = None
+        
+        async def fake_search(user_input, intent, limit, steps):
+            return products, {"strategy": "test"}
+        service._search_with_structured_intent = fake_search
+        
+        async def collect():
+            return [event async for event in service.stream_fast_recommendation(
+                "母の日", limit=2, structured_intent={"occasion": "母の日"}
+            )]
+        
+        with patch("app.services.optimized_rag_service.settings.product_reason_mode", "batch"):
+            events = asyncio.run(collect())
+        names = [event["event"] for event in events]
+        
+        assert names[:2] == ["intent", "products"]
+        assert names[-2:] == ["advice", "done"]
+        assert events[-2]["data"]["text"] == "迷ったら消耗品を"
+        reasons = {e["data"]["product_id"]: e["data"]["reason"] for e in events if e["event"] == "product_reason"}
+        assert reasons == {"p1": "理由1", "p2": "理由2"}
+
+
+class TestLatencyBudget:
+    """時間予算による劣化応答のテストクラス"""
+    
+    def test_slow_llm_degrades_to_templates(self):
+        """LLMが締め切りに間に合わない場合は定型文で応答し、劣化した段を返す"""
+        import asyncio
+        from app.schemas.item import GiftItem
+        from app.services.optimized_rag_service import OptimizedLangChainRAGService, PerformanceOptimizer
+        from app.services.advice_cache import AdviceCache
+        from app.utils.deadline import RequestBudget
+        
+        products = [
+            GiftItem(id="p1", title="商品p1", price=3000, image_url="", merchant="shop", source="rakuten",
+                     affiliate_url="", occasion="birthday", updated_at=0, review_count=10, review_average=4.5)
+        ]
+        
+        class SlowLLM:
+            async def ainvoke(self, prompt):
+                await asyncio.sleep(1.0)
+                return Mock(content="間に合わない応答")
+        
+        service = OptimizedLangChainRAGService.__new__(OptimizedLangChainRAGService)
+        service.llm = SlowLLM()
+        service.optimizer = PerformanceOptimizer()
+        service.optimizer.clear_shared_cache()
+        AdviceCache().clear()
+        
+        async def fake_search(user_input, intent, limit, steps):
+            return products, {"strategy": "test"}
+        service._search_with_structured_intent = fake_search
+        
+        result = asyncio.run(service.get_fast_recommendation_with_intent(
+            "誕生日", {"occasion": "誕生日", "relationship": "友人"}, budget=RequestBudget(0.1)
+        ))
+        
+        assert sorted(result["degraded_stages"]) == ["advice", "product_reasons"]
+        assert result["ai_response"] == service._get_emergency_text("誕生日", products)
+        assert result["product_reasons"]["p1"].startswith("親しい友人に喜ばれる")
+        assert result["performance"]["latency_budget"]["elapsed_ms"] < 500
+
+    def test_optimizer_cleanup_keeps_shared_tier(self, tmp_path):
+        """ワーカーの終了処理はプロセス内キャッシュだけを消し、他のワーカーが使う共有層は残す"""
+        from app.services.optimized_rag_service import PerformanceOptimizer
+        from app.utils.cache import TTLCache
+        from app.utils.shared_cache import SQLiteSharedCache, TieredCache
+        
+        optimizer = object.__new__(PerformanceOptimizer)  # シングルトンとは別のインスタンス
+        optimizer.cache = TieredCache(TTLCache(), SQLiteSharedCache(str(tmp_path / "shared.sqlite3")), namespace="optimizer")
+        optimizer._executor = None
+        optimizer.set_cached("search", [1, 2, 3], ttl_seconds=60)
+        
+        optimizer.cleanup()
+        assert "search" not in optimizer.cache.local
+        assert optimizer.cache.shared.get("optimizer:search") == [1, 2, 3]
+        
+        optimizer.clear_shared_cache()
+        assert optimizer.cache.shared.get("optimizer:search") is None
+
+
+class TestAdviceCache:
+    """選び方アドバイスキャッシュのテストクラス"""
+    
+    @pytest.fixture
+    def cache(self):
+        from app.services.advice_cache import AdviceCache
+        AdviceCache._instance = None
+        cache = AdviceCache(ttl_seconds=60, variants=2)
+        yield cache
+        AdviceCache._instance = None
+    
+    def test_same_profile_hits_regardless_of_wording(self, cache):
+        """入力の言い回しや商品件数が違っても、同じ相手プロフィールならLLMを呼ばない"""
+        import asyncio
+        from app.services.optimized_rag_service import OptimizedLangChainRAGService
+        
+        class FakeLLM:
+            calls = 0
+            
+            async def ainvoke(self, prompt):
+                FakeLLM.calls += 1
+                return Mock(content=f"アドバイス{FakeLLM.calls}")
+        
+        service = OptimizedLangChainRAGService.__new__(OptimizedLangChainRAGService)
+        service.llm = FakeLLM()
+        intent = {"occasion": "mothers_day", "relationship": "family", "gender": "女性", "age_range": "60代"}
+        
+        async def run():
+            first = await service._generate_fast_response("母の日に母へ", intent, [])
+            second = await service._generate_fast_response("母の日のプレゼント 60代の母", dict(intent), [None])
+            await asyncio.sleep(0)  # バックグラウンドの追加生成を完了させる
+            await asyncio.sleep(0)
+            return first, second
+        
+        first, second = asyncio.run(run())
+        assert first == second == "アドバイス1"
+        # 2回目はヒットし、バリアント補充のための追加生成が1回だけ走る
+        assert FakeLLM.calls == 2
+        assert cache.get_stats()["variants"] == 2
+        assert not cache.claim_fill("mothers_day|family|女性|60代")
+    
+    def test_expired_variants_are_dropped(self, cache):
+        """有効期限切れの文面は返さない"""
+        with patch("app.services.advice_cache.time.time", return_value=1000.0):
+            cache.add("birthday|friend|unknown|unknown", "古い文面")
+        with patch("app.services.advice_cache.time.time", return_value=1061.0):
+            assert cache.get("birthday|friend|unknown|unknown") is None
+
+
+class TestLLMCandidateSelection:
+    """AIRecommendationService のプロンプト前候補絞り込みのテストクラス"""
+    
+    @pytest.fixture
+    def loader(self, tmp_path):
+        import json
+        from app.services.ai_recommendation_service import ProductDataLoader
+        
+        filler = [
+            {"id": f"item_{i}", "title": f"タオルセット {i}", "description": "今治タオルの詰め合わせ" * 20,
+             "price": 3000, "occasion": "wedding_celebration"}
+            for i in range(40)
+        ]
+        products = filler + [
+            {"id": "flower_1", "title": "【送料無料】カーネーション 花束 母の日", "description": "<b>赤い</b>カーネーションの花束",
+             "price": 4000, "occasion": "mothers_day"},
+            {"id": "flower_2", "title": "カーネーション 花束 母の日", "description": "ピンクのカーネーション",
+             "price": 4200, "occasion": "mothers_day"},
+            {"id": "sweets_1", "title": "焼き菓子ギフト", "description": "母の日にも人気の焼き菓子",
+             "price": 2500, "occasion": "mothers_day"},
+        ]
+        (tmp_path / "rakuten_uchiwai_products_20250101.json").write_text(
+            json.dumps(products, ensure_ascii=False), encoding="utf-8"
+        )
+        return ProductDataLoader(data_dir=str(tmp_path))
+    
+    def test_selects_relevant_products_before_prompting(self, loader):
+        """関連商品とoccasion一致商品が先頭に来て、販促表記違いの重複は除かれる"""
+        selected = loader.select_products_for_llm("母の日にカーネーションの花束を贈りたい", max_products=3)
+        
+        ids = [product["id"] for product in selected]
+        assert ids[0] == "flower_1"
+        assert "flower_2" not in ids  # 【送料無料】を除くと同じ商品名
+        assert "sweets_1" in ids
+        assert len(ids) == 3
+    
+    def test_product_text_is_compacted_to_token_budget(self, loader):
+        """商品リストはHTML・販促表記を除いて1行に圧縮され、トークン予算内に収まる"""
+        from app.services.ai_recommendation_service import AIRecommendationService
+        from app.core.config import settings as app_settings
+        from app.utils.tokens import count_tokens
+        
+        service = AIRecommendationService.__new__(AIRecommendationService)
+        products = loader.get_products_for_llm(max_products=None)
+        
+        text = service._format_products_for_llm(products, token_budget=300)
+        lines = text.split("\n")
+        assert 1 <= len(lines) < len(products)
+        assert sum(count_tokens(line, app_settings.openai_model) for line in lines) <= 300
+        
+        flower = service._format_products_for_llm(products[-3:-2])
+        assert "<b>" not in flower and "送料無料" not in flower
+
+
+class TestProductDataLoader:
+    """ProductDataLoader の索引と再読み込みのテストクラス"""
+    
+    def test_indexes_and_picks_up_new_data_file(self, tmp_path, monkeypatch):
+        """ID・occasion・genre_groupで引け、新しいデータファイルは再起動無しで差し替わる"""
+        import json
+        import os
+        import time
+        from app.core.config import settings as app_settings
+        from app.services.ai_recommendation_service import ProductDataLoader
+        
+        def write(name, products, mtime):
+            path = tmp_path / name
+            path.write_text(json.dumps(products, ensure_ascii=False), encoding="utf-8")
+            os.utime(path, (mtime, mtime))
+        
+        write("rakuten_uchiwai_products_20250101.json", [
+            {"id": "a", "title": "母の日 カーネーション", "description": "花", "genre_group": "flower"},
+            {"id": "b", "title": "今治タオル", "description": "タオル", "occasion": "wedding_celebration", "genre_group": "home"},
+        ], 1_700_000_000)
+        monkeypatch.setattr(app_settings, "product_data_poll_seconds", 0.0)
+        
+        loader = ProductDataLoader(data_dir=str(tmp_path))
+        assert loader.get_product_by_id("b")["title"] == "今治タオル"
+        assert [p["id"] for p in loader.get_products_by_occasion("mothers_day")] == ["a"]
+        assert [p["id"] for p in loader.get_products_by_genre_group("home")] == ["b"]
+        # 同じディレクトリのローダーは読み込み済みのデータを共有する
+        assert ProductDataLoader(data_dir=str(tmp_path)).get_snapshot() is loader.get_snapshot()
+        
+        write("rakuten_uchiwai_products_20250102.json", [
+            {"id": "c", "title": "父の日 ビール", "description": "ビール", "genre_group": "drink"},
+        ], 1_700_086_400)
+        # 差し替えが終わるまでは読み込み済みのデータを返す
+        assert loader.get_product_by_id("b") is not None
+        
+        deadline = time.monotonic() + 5
+        while loader.get_product_by_id("c") is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert loader.get_product_by_id("c")["title"] == "父の日 ビール"
+        assert loader.get_product_by_id("b") is None
+        assert loader.get_data_file_info()["loaded_file"].endswith("20250102.json")
+    
+    def test_failed_data_file_is_not_reread_until_it_changes(self, tmp_path, monkeypatch):
+        """読み込みに失敗したデータファイルはリクエストごとに読み直さず、更新されたら再試行する"""
+        import json
+        import os
+        import time
+        from app.core.config import settings as app_settings
+        from app.services.ai_recommendation_service import ProductDataLoader
+        
+        def write(name, text, mtime):
+            path = tmp_path / name
+            path.write_text(text, encoding="utf-8")
+            os.utime(path, (mtime, mtime))
+        
+        def wait_until(condition):
+            deadline = time.monotonic() + 5
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.01)
+        
+        write("rakuten_uchiwai_products_20250101.json", json.dumps([
+            {"id": "a", "title": "母の日 カーネーション", "description": "花", "genre_group": "flower"},
+        ], ensure_ascii=False), 1_700_000_000)
+        monkeypatch.setattr(app_settings, "product_data_poll_seconds", 0.0)
+        
+        loader = ProductDataLoader(data_dir=str(tmp_path))
+        state = loader._state
+        assert loader.get_product_by_id("a") is not None
+        
+        reads = []
+        read_snapshot = ProductDataLoader._read_snapshot
+        
+        def counting_read(self, manifest):
+            reads.append(manifest)
+            return read_snapshot(self, manifest)
+        
+        monkeypatch.setattr(ProductDataLoader, "_read_snapshot", counting_read)
+        
+        write("rakuten_uchiwai_products_20250102.json", "[{\"id\": ", 1_700_086_400)
+        loader.get_snapshot()
+        wait_until(lambda: state.failed_manifest is not None and not state.reloading)
+        for _ in range(20):
+            assert loader.get_product_by_id("a") is not None
+        time.sleep(0.05)
+        assert len(reads) == 1
+        
+        # ファイルが書き直されたら再試行する
+        write("rakuten_uchiwai_products_20250102.json", json.dumps([
+            {"id": "c", "title": "父の日 ビール", "description": "ビール", "genre_group": "drink"},
+        ], ensure_ascii=False), 1_700_086_500)
+        wait_until(lambda: loader.get_product_by_id("c") is not None)
+        assert loader.get_product_by_id("c")["title"] == "父の日 ビール"
+        assert len(reads) == 2
+        assert state.failed_manifest is None
+
+
+    def test_reads_catalog_snapshot_when_fresh(self, tmp_path):
+        """元JSONと一致するカタログスナップショットがあれば、そちらから同じ結果を返す"""
+        import json
+        from app.services.ai_recommendation_service import ProductDataLoader
+        from app.utils.catalog_snapshot import snapshot_path_for, write_catalog_snapshot
+        
+        products = [
+            {"id": "a", "title": "母の日 カーネーション", "description": "花", "price": 4000},
+            {"id": "b", "title": "説明無し", "description": "", "price": 1000},
+            {"id": "c", "title": "今治タオル", "description": "タオル", "occasions": ["wedding_celebration"], "genre_group": "home"},
+        ]
+        json_path = tmp_path / "rakuten_uchiwai_products_20250101.json"
+        json_path.write_text(json.dumps(products, ensure_ascii=False), encoding="utf-8")
+        write_catalog_snapshot(products, snapshot_path_for(str(json_path)), source_path=str(json_path))
+        
+        loader = ProductDataLoader(data_dir=str(tmp_path))
+        assert loader.get_data_file_info()["catalog_snapshot"] is None
+        assert [p["id"] for p in loader.load_products_data()] == ["a", "c"]
+        assert loader.get_data_file_info()["catalog_snapshot"] is True
+        assert loader.get_product_by_id("c") == products[2]
+        assert loader.get_product_by_id("b") is None
+        assert [p["id"] for p in loader.get_products_by_occasion("wedding_celebration")] == ["c"]
+        assert [p["id"] for p in loader.select_products_for_llm("カーネーション", max_products=1)] == ["a"]
+
+
+class TestAsyncOpenAIRecommendation:
+    """AIRecommendationService の非同期OpenAI呼び出しのテストクラス"""
+    
+    def test_completion_wait_does_not_block_event_loop(self, tmp_path, monkeypatch):
+        """応答待ちの間も他のコルーチンが進み、同時リクエストは並行に処理される"""
+        import asyncio
+        import json
+        import time
+        import httpx
+        from app.core.config import settings as app_settings
+        from app.services.ai_recommendation_service import AIRecommendationService, ProductDataLoader
+        from app.services.openai_client import create_async_openai_client
+        
+        monkeypatch.setattr(app_settings, "openai_api_key", "test-key")
+        
+        products = [
+            {"id": f"item_{i}", "title": f"結婚祝い ペアグラス {i}", "description": "ギフト", "price": 3000}
+            for i in range(5)
+        ]
+        (tmp_path / "rakuten_uchiwai_products_20250101.json").write_text(
+            json.dumps(products, ensure_ascii=False), encoding="utf-8"
+        )
+        
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.2)  # LLMの応答待ちを模擬
+            content = json.dumps({"response": "おすすめです", "product_ids": ["item_0", "item_1"]})
+            return httpx.Response(200, json={
+                "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "test",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            })
+        
+        async def run():
+            client = create_async_openai_client(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+            service = AIRecommendationService(openai_client=client)
+            service.llm_available = True
+            service.data_loader = ProductDataLoader(data_dir=str(tmp_path))
+            service.data_loader.load_products_data()
+            # SDK の初回呼び出し時の遅延読み込みを計測から除く
+            await service.get_recommendations("結婚祝い", 2)
+            
+            ticks = 0
+            
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+            
+            ticker_task = asyncio.create_task(ticker())
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                service.get_recommendations("結婚祝いのグラス", 2),
+                service.get_recommendations("結婚祝いのペアグラス", 2),
+            )
+            elapsed = time.perf_counter() - started
+            ticker_task.cancel()
+            await client.close()
+            return results, elapsed, ticks
+        
+        results, elapsed, ticks = asyncio.run(run())
+        assert [item.id for item in results[0]["recommendations"]] == ["item_0", "item_1"]
+        assert elapsed < 0.35  # 直列なら0.4秒以上
+        assert ticks >= 10
+
+
+class TestVectorStore:
+    """ベクトルストア（pickle不使用・mmap読み込み）のテストクラス"""
+    
+    def test_search_matches_faiss_flat_index(self, tmp_path):
+        """mmap で開いたベクトルの検索結果が IndexFlatL2 と一致し、行のメタデータが付く"""
+        import faiss
+        import numpy as np
+        from app.services.vector_store import load_vector_store, write_vector_store
+        
+        rng = np.random.default_rng(0)
+        vectors = rng.random((200, 16), dtype=np.float32)
+        rows = [{"product_id": f"p{i}", "occasion": "wedding_celebration", "price": 1000 + i, "title": f"商品{i}"} for i in range(200)]
+        write_vector_store(str(tmp_path), vectors, rows, embedding_model="test-model")
+        
+        store = load_vector_store(str(tmp_path))
+        assert isinstance(store.vectors, np.memmap)
+        assert store.embedding_model == "test-model"
+        
+        index = faiss.IndexFlatL2(16)
+        index.add(vectors)
+        expected_distances, expected_rows = index.search(vectors[:1] + 0.01, 5)
+        results = store.similarity_search_by_vector_with_score(vectors[0] + 0.01, k=5)
+        assert [doc.metadata["row"] for doc, _ in results] == expected_rows[0].tolist()
+        assert np.allclose([score for _, score in results], expected_distances[0], rtol=1e-4)
+        assert results[0][0].metadata["product_id"] == "p0"
+        assert results[0][0].metadata["price"] == 1000
+    
+    def test_legacy_pickle_store_is_not_loaded(self, tmp_path):
+        """旧形式（index.pkl）しか無いディレクトリは読み込まない（unpickle しない）"""
+        from app.services.vector_store import load_vector_store
+        
+        (tmp_path / "index.faiss").write_bytes(b"")
+        (tmp_path / "index.pkl").write_bytes(b"not a pickle")
+        assert load_vector_store(str(tmp_path)) is None
+    
+    def test_sync_updates_by_product_id(self, tmp_path):
+        """差分更新: 変わった商品だけをベクトル化し、消えた商品は検索結果から除き、削除が多ければ詰め直す"""
+        import numpy as np
+        from app.services.vector_store import MmapVectorStore, sync_vector_store
+        
+        embedded = []
+        
+        def embed_documents(texts):
+            embedded.extend(texts)
+            return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+        
+        def items(texts):
+            return [{"product_id": pid, "text": text, "occasion": "birth_celebration", "price": 1000, "title": text} for pid, text in texts]
+        
+        directory = str(tmp_path)
+        first = sync_vector_store(directory, items([("a", "タオル"), ("b", "カタログギフト"), ("c", "お菓子")]), embed_documents, "test-model")
+        assert (first["added"], first["total"]) == (3, 3)
+        
+        embedded.clear()
+        second = sync_vector_store(
+            directory, items([("a", "タオル"), ("b", "カタログギフト 改訂"), ("d", "食器")]), embed_documents, "test-model", compact_ratio=0.5
+        )
+        assert embedded == ["カタログギフト 改訂", "食器"]
+        assert (second["added"], second["updated"], second["deleted"], second["unchanged"]) == (1, 1, 1, 1)
+        assert not second["compacted"]
+        
+        store = MmapVectorStore(directory)
+        assert (store.ntotal, store.deleted_count, store.live_count) == (5, 2, 3)
+        query = np.asarray(embed_documents(["お菓子"])[0])
+        results = store.similarity_search_by_vector_with_score(query, k=10)
+        assert sorted(doc.metadata["product_id"] for doc, _ in results) == ["a", "b", "d"]
+        assert {doc.metadata["product_id"]: doc.metadata["title"] for doc, _ in results}["b"] == "カタログギフト 改訂"
+        store.close()
+        
+        embedded.clear()
+        third = sync_vector_store(directory, items([("a", "タオル")]), embed_documents, "test-model", compact_ratio=0.5)
+        assert embedded == []
+        assert third["compacted"] and third["deleted"] == 2
+        store = MmapVectorStore(directory)
+        assert (store.ntotal, store.deleted_count) == (1, 0)
+        assert store.get_rows([0])[0]["product_id"] == "a"
+    
+    def test_ann_index_types(self, tmp_path):
+        """HNSW / IVF / SQ8 を設定で選べ、厳密検索と同じ上位を返す。件数が足りなければ厳密検索のまま"""
+        import numpy as np
+        from app.services.vector_store import MmapVectorStore, write_vector_store
+        
+        rng = np.random.default_rng(0)
+        vectors = rng.random((2000, 32), dtype=np.float32)
+        rows = [{"product_id": f"p{i}", "title": f"商品{i}"} for i in range(2000)]
+        for index_type in ("hnsw", "ivf_flat", "ivf_pq", "sq8"):
+            directory = str(tmp_path / index_type)
+            write_vector_store(directory, vectors, rows, index_type=index_type, index_params={"pq_m": 8, "pq_nbits": 4})
+            store = MmapVectorStore(directory)
+            assert store.index_type == index_type and store.ann is not None
+            store.set_search_params(ef_search=64, nprobe=store.ann.nlist if index_type.startswith("ivf") else None)
+            results = store.similarity_search_by_vector_with_score(vectors[7], k=3)
+            assert results[0][0].metadata["product_id"] == "p7"
+        
+        directory = str(tmp_path / "small")
+        write_vector_store(directory, vectors[:20], rows[:20], index_type="ivf_pq")
+        store = MmapVectorStore(directory)
+        assert store.index_type == "flat" and store.ann is None
+    
+    def test_deleted_rows_never_reach_search(self, tmp_path):
+        """論理削除行はANNインデックスに入らず、flat でも除かれ、有効な行の厳密検索と同じ k 件を返す"""
+        import faiss
+        import numpy as np
+        from app.services.vector_store import MmapVectorStore, write_vector_store
+        
+        rng = np.random.default_rng(0)
+        vectors = rng.random((2000, 32), dtype=np.float32)
+        rows = [{"product_id": f"p{i}", "title": f"商品{i}", "deleted": i % 5 == 0} for i in range(2000)]
+        live = np.array([not row["deleted"] for row in rows])
+        query = vectors[10] + 0.01  # 削除行のすぐ近く
+        _, expected = faiss.knn(query.reshape(1, -1), vectors[live], 5)
+        expected_rows = np.flatnonzero(live)[expected[0]].tolist()
+        
+        for index_type in ("flat", "hnsw", "ivf_flat"):
+            directory = str(tmp_path / index_type)
+            write_vector_store(directory, vectors, rows, index_type=index_type)
+            store = MmapVectorStore(directory)
+            assert store.ann is None if index_type == "flat" else store.ann.ntotal == store.live_count == 1600
+            store.set_search_params(ef_search=128, nprobe=store.ann.nlist if index_type.startswith("ivf") else None)
+            results = store.similarity_search_by_vector_with_score(query, k=5)
+            assert [doc.metadata["row"] for doc, _ in results] == expected_rows
+        
+        assert len(store.get_rows(range(2000))) == 1600  # IN 句は分割して引く
+    
+    def test_manager_hot_swaps_new_version(self, tmp_path, monkeypatch):
+        """新しい版はバックグラウンドで読み込んで差し替え、古い版は猶予時間まで使え、壊れた版には差し替えない"""
+        import glob
+        import numpy as np
+        import sqlite3
+        from app.core.config import settings as app_settings
+        from app.services.optimized_rag_service import VectorStoreManager
+        from app.services.vector_store import write_vector_store
+        
+        monkeypatch.setattr(app_settings, "openai_api_key", "sk-test")
+        monkeypatch.setattr(app_settings, "vector_store_path", str(tmp_path))
+        monkeypatch.setattr(app_settings, "vector_store_poll_seconds", 0.0)
+        monkeypatch.setattr(app_settings, "vector_store_release_grace_seconds", 60.0)
+        
+        def write(count):
+            vectors = np.eye(count, 8, dtype=np.float32)
+            write_vector_store(str(tmp_path), vectors, [{"product_id": f"p{i}"} for i in range(count)])
+        
+        def wait_reload():
+            if VectorStoreManager._reload_thread is not None:
+                VectorStoreManager._reload_thread.join(timeout=10)
+        
+        VectorStoreManager.cleanup()
+        try:
+            write(4)
+            old = VectorStoreManager.get_vector_store()
+            assert old.ntotal == 4
+            
+            write(6)
+            assert VectorStoreManager.get_vector_store() is old  # 読み込み中も古い版を返す
+            wait_reload()
+            current = VectorStoreManager.get_vector_store()
+            assert current.ntotal == 6 and current.version != old.version
+            # 古い版は猶予時間内なら検索できる（ファイルは削除済みでも mmap は有効）
+            assert old.similarity_search_by_vector_with_score(np.eye(1, 8, 2, dtype=np.float32)[0], k=1)[0][0].metadata["product_id"] == "p2"
+            
+            # ベクトルファイルの無い版は検証で弾かれ、今の版を使い続ける
+            write(7)
+            for path in glob.glob(str(tmp_path / "vectors-*.npy")):
+                os.remove(path)
+            VectorStoreManager.get_vector_store()
+            wait_reload()
+            assert VectorStoreManager.get_vector_store() is current
+            
+            monkeypatch.setattr(app_settings, "vector_store_release_grace_seconds", 0.0)
+            VectorStoreManager.get_vector_store()
+            with pytest.raises(sqlite3.ProgrammingError):
+                old.get_rows([0])
+        finally:
+            VectorStoreManager.cleanup()
+
+
+class TestEmbeddingCache:
+    """埋め込みキャッシュのテストクラス"""
+    
+    def test_update_embeds_only_uncached_texts(self, tmp_path, monkeypatch):
+        """95%が変わっていない日次更新・作り直しでは、埋め込みAPIに送るのは変わった5%だけ"""
+        import shutil
+        from app.core.config import settings as app_settings
+        from app.services.data_updater import DataUpdater
+        
+        class FakeEmbeddings:
+            model = "test-model"
+            
+            def __init__(self):
+                self.texts = []
+            
+            def embed_documents(self, texts):
+                self.texts.extend(texts)
+                return [[float(len(text)), float(sum(map(ord, text)) % 101)] for text in texts]
+        
+        monkeypatch.setattr(app_settings, "embedding_cache_path", str(tmp_path / "embeddings.sqlite3"))
+        embeddings = FakeEmbeddings()
+        updater = DataUpdater(vector_store_path=str(tmp_path / "store"), embeddings=embeddings)
+        records = [
+            {"id": f"item{i:04d}", "title": f"ギフト{i}", "price": 3000, "merchant": "ショップ", "occasion": "wedding_celebration"}
+            for i in range(100)
+        ]
+        assert updater.update_vector_store(records)["embedding_cache"]["embedded"] == 100
+        
+        for record in records[:5]:
+            record["title"] += " 新パッケージ"
+        
+        # ベクトルストアを消して作り直しても、キャッシュにあるテキストはAPIに送らない
+        shutil.rmtree(tmp_path / "store")
+        embeddings.texts.clear()
+        changes = DataUpdater(vector_store_path=str(tmp_path / "store"), embeddings=embeddings).update_vector_store(records)
+        assert changes["added"] == 100
+        assert len(embeddings.texts) == 5
+        assert changes["embedding_cache"]["hits"] == 95
+        
+        # モデルが変わればキャッシュは使わない
+        embeddings.model = "other-model"
+        embeddings.texts.clear()
+        DataUpdater(vector_store_path=str(tmp_path / "store"), embeddings=embeddings).update_vector_store(records)
+        assert len(embeddings.texts) == 100
@@ -0,0 +1,431 @@
+"""
+ユーティリティのテスト
+
+このファイルの役割:
+- app/utils 配下の共通部品（プロファイリング等）の単体テスト
+- 外部サービスに依存しないため、単独で実行可能
+"""
+import asyncio
+import socketserver
+import threading
+import time
+
+import pytest
+
+from app.utils.profiling import (
+    profiling_session,
+    span,
+    record_scores,
+    is_profiling,
+)
+from app.utils.deadline import RequestBudget
+from app.utils.cache import TTLCache, make_cache_key
+from app.utils.keyword_matcher import KeywordMatcher
+from app.utils.catalog_snapshot import (
+    CatalogRecords,
+    CatalogSnapshot,
+    open_fresh_catalog,
+    snapshot_path_for,
+    write_catalog_snapshot,
+)
+from app.utils.shared_cache import (
+    RedisSharedCache,
+    SharedCacheBackend,
+    SQLiteSharedCache,
+    TieredCache,
+    create_shared_cache,
+)
+from app.utils.rate_limit import AsyncRateLimiter
+
+
+class TestProfiling:
+    """リクエストプロファイリングのテストクラス"""
+
+    def test_span_is_noop_when_disabled(self):
+        """セッション外ではspanは共有no-opとなり記録されない"""
+        assert not is_profiling()
+        with span("search", limit=10) as sp:
+            sp.set(hits=3)
+        assert span("a") is span("b")
+        record_scores("item-1", {"score": 1.0})  # 例外にならないこと
+
+    def test_nested_spans_build_tree(self):
+        """入れ子のspanがタイミングツリーになる"""
+        with profiling_session("req") as profiler:
+            with span("search", limit=10):
+                with span("meilisearch.search"):
+                    pass
+            with span("response_generation"):
+                pass
+            record_scores("item-1", {"structured_score": 0.8})
+            record_scores("item-1", {"recipient_rank": 0})
+
+        result = profiler.to_dict()
+        timings = result["timings"]
+        assert timings["name"] == "req"
+        assert [c["name"] for c in timings["children"]] == ["search", "response_generation"]
+        assert timings["children"][0]["attrs"] == {"limit": 10}
+        assert timings["children"][0]["children"][0]["name"] == "meilisearch.search"
+        assert result["candidate_scores"] == {
+            "item-1": {"structured_score": 0.8, "recipient_rank": 0}
+        }
+        assert not is_profiling()
+
+    def test_spans_follow_async_tasks(self):
+        """gatherで分岐したタスクのspanも親spanの子になる"""
+        async def child(name):
+            with span(name):
+                await asyncio.sleep(0)
+
+        async def run():
+            with profiling_session() as profiler:
+                with span("parallel"):
+                    await asyncio.gather(child("a"), child("b"))
+            return profiler
+
+        profiler = asyncio.run(run())
+        parallel = profiler.to_dict()["timings"]["children"][0]
+        assert sorted(c["name"] for c in parallel["children"]) == ["a", "b"]
+
+    def test_span_records_error(self):
+        """例外発生時はspanにエラー種別が残る"""
+        with profiling_session() as profiler:
+            try:
+                with span("llm.advice"):
+                    raise TimeoutError()
+            except TimeoutError:
+                pass
+        assert profiler.to_dict()["timings"]["children"][0]["attrs"]["error"] == "TimeoutError"
+
+
+class TestRequestBudget:
+    """リクエスト時間予算のテストクラス"""
+
+    def test_stage_over_deadline_returns_fallback(self):
+        """締め切りを超えた段は中断されフォールバック値になり、段名が記録される"""
+        async def slow():
+            await asyncio.sleep(1.0)
+            return "llm"
+
+        async def fast():
+            return "llm"
+
+        async def run(budget):
+            slow_result = await budget.run("advice", slow(), lambda: "template", share=0.5)
+            fast_result = await budget.run("product_reasons", fast(), lambda: "template")
+            return slow_result, fast_result
+
+        budget = RequestBudget(0.1)
+        assert asyncio.run(run(budget)) == ("template", "llm")
+        assert budget.metadata()["degraded_stages"] == ["advice"]
+        assert budget.metadata()["elapsed_ms"] < 500
+
+    def test_unlimited_budget_never_times_out(self):
+        """予算0は無制限"""
+        budget = RequestBudget(0)
+        assert budget.stage_timeout() is None
+        assert asyncio.run(budget.run("advice", asyncio.sleep(0.01, result="llm"), lambda: "template")) == "llm"
+        assert not budget.degraded
+
+
+class TestTTLCache:
+    """LRU＋TTLキャッシュのテストクラス"""
+
+    def test_lru_eviction_keeps_recently_used(self):
+        """件数上限を超えたら最も使われていないエントリから追い出す"""
+        cache = TTLCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert "b" not in cache
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_per_entry_ttl(self):
+        """エントリごとの有効期限が切れたら取得できない"""
+        now = [0.0]
+        cache = TTLCache(ttl_seconds=10, clock=lambda: now[0])
+        cache.set("default", "x")
+        cache.set("short", "y", ttl_seconds=1)
+        now[0] = 5.0
+        assert cache.get("short") is None
+        assert cache.get("default") == "x"
+        now[0] = 11.0
+        assert cache.purge_expired() == 1
+        stats = cache.get_stats()
+        assert stats["expirations"] == 2 and stats["entries"] == 0
+
+    def test_byte_limit(self):
+        """値の合計サイズが上限を超えたら追い出し、バイト数を正しく戻す"""
+        cache = TTLCache(max_entries=100, max_bytes=100, sizeof=len)
+        cache.set("a", "x" * 60)
+        cache.set("b", "y" * 60)
+        assert "a" not in cache
+        cache.set("b", "z" * 10)
+        assert cache.get_stats()["bytes"] == 10
+        cache.set("huge", "w" * 101)
+        assert "huge" not in cache
+
+    def test_cache_key_ignores_dict_order(self):
+        """辞書のキー順が違っても同じキーになる"""
+        assert make_cache_key({"a": 1, "b": [1, 2]}) == make_cache_key({"b": [1, 2], "a": 1})
+        assert make_cache_key({"a": 1}) != make_cache_key({"a": 2})
+
+
+class _RedisStandIn(socketserver.ThreadingTCPServer):
+    """テスト用のRedisプロトコル互換サーバー（PING/GET/SET PX/PTTL/DEL/SCAN のみ）"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        self.store = {}
+        super().__init__(("127.0.0.1", 0), _RedisStandInHandler)
+
+
+class _RedisStandInHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def write_bulk(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        else:
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            if command == b"PING":
+                self.wfile.write(b"+PONG\r\n")
+            elif command == b"GET":
+                value, expires_at = store.get(args[1], (None, None))
+                if expires_at is not None and expires_at <= time.time():
+                    value = None
+                self.write_bulk(value)
+            elif command == b"SET":
+                expires_at = time.time() + int(args[4]) / 1000 if len(args) > 3 and args[3].upper() == b"PX" else None
+                store[args[1]] = (args[2], expires_at)
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"PTTL":
+                value, expires_at = store.get(args[1], (None, None))
+                if value is None or (expires_at is not None and expires_at <= time.time()):
+                    self.wfile.write(b":-2\r\n")
+                elif expires_at is None:
+                    self.wfile.write(b":-1\r\n")
+                else:
+                    self.wfile.write(b":%d\r\n" % int((expires_at - time.time()) * 1000))
+            elif command == b"DEL":
+                removed = sum(store.pop(key, None) is not None for key in args[1:])
+                self.wfile.write(b":%d\r\n" % removed)
+            elif command == b"SCAN":
+                prefix = args[3][:-1]
+                keys = [key for key in store if key.startswith(prefix)]
+                self.wfile.write(b"*2\r\n")
+                self.write_bulk(b"0")
+                self.wfile.write(b"*%d\r\n" % len(keys))
+                for key in keys:
+                    self.write_bulk(key)
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+class TestSharedCache:
+    """ワーカー間共有キャッシュのテストクラス"""
+
+    @pytest.fixture
+    def redis_server(self):
+        server = _RedisStandIn()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    def test_sqlite_tier_is_shared_between_workers(self, tmp_path):
+        """別プロセス相当の2つのキャッシュが同じSQLiteファイルを介して値を共有する"""
+        path = str(tmp_path / "shared.sqlite3")
+        worker_a = TieredCache(TTLCache(), SQLiteSharedCache(path), namespace="optimizer")
+        worker_b = TieredCache(TTLCache(), SQLiteSharedCache(path), namespace="optimizer")
+
+        worker_a.set("advice", {"text": "迷ったら消耗品", "items": [1, 2]}, ttl_seconds=60)
+        assert worker_b.get("advice") == {"text": "迷ったら消耗品", "items": [1, 2]}
+        assert "advice" in worker_b.local  # 共有層から取得した値はプロセス内に昇格する
+
+        worker_a.set("expired", "x", ttl_seconds=-1)
+        assert worker_b.get("expired") is None
+
+        worker_a.clear()
+        assert worker_b.shared.get("optimizer:advice") is None
+
+    def test_promotion_keeps_shared_expiry(self, tmp_path):
+        """共有層から昇格した値は、共有層での残り時間を過ぎたらプロセス内でも期限切れになる"""
+        path = str(tmp_path / "shared.sqlite3")
+        now = [1000.0]
+        worker_a = TieredCache(TTLCache(ttl_seconds=1800), SQLiteSharedCache(path), namespace="optimizer")
+        worker_b = TieredCache(TTLCache(ttl_seconds=1800, clock=lambda: now[0]), SQLiteSharedCache(path), namespace="optimizer")
+
+        worker_a.set("search", [1, 2], ttl_seconds=300)
+        assert worker_b.get("search") == [1, 2]
+        now[0] += 301  # プロセス内の既定TTL（30分）ではなく、共有層の残り（約300秒）で切れる
+        assert "search" not in worker_b.local
+
+    def test_redis_backend_against_stand_in(self, redis_server):
+        """Redisプロトコルで保存・取得・期限・名前空間削除ができる"""
+        host, port = redis_server.server_address
+        cache = create_shared_cache(f"redis://{host}:{port}/0")
+        assert isinstance(cache, RedisSharedCache) and cache.ping()
+
+        cache.set("advice:a", ["文面", 1.5], ttl_seconds=60)
+        cache.set("advice:b", "short", ttl_seconds=0.001)
+        cache.set("intent:c", {"occasion": "birthday"})
+        time.sleep(0.01)
+        assert cache.get("advice:a") == ["文面", 1.5]
+        value, remaining = cache.get_with_ttl("advice:a")
+        assert value == ["文面", 1.5] and 0 < remaining <= 60
+        assert cache.get_with_ttl("intent:c") == ({"occasion": "birthday"}, None)
+        assert cache.get("advice:b") is None
+
+        cache.clear("advice:")
+        assert cache.get("advice:a") is None
+        assert cache.get("intent:c") == {"occasion": "birthday"}
+        assert cache.get_stats()["errors"] == 0
+
+    def test_redis_outage_degrades_to_miss(self):
+        """共有層に接続できない場合はミス扱いで処理を続ける"""
+        cache = RedisSharedCache(host="127.0.0.1", port=1, timeout_seconds=0.05)
+        tiered = TieredCache(TTLCache(), cache, namespace="optimizer")
+        tiered.set("key", "value")
+        assert tiered.get("key") == "value"  # プロセス内層は有効
+        assert cache.get("optimizer:key") is None
+        assert cache.get_stats()["errors"] >= 1
+
+    def test_backend_requires_all_operations(self):
+        """操作を実装していない共有キャッシュ層は生成時に弾かれる"""
+        class GetOnlyCache(SharedCacheBackend):
+            def get_with_ttl(self, key):
+                return None, None
+
+        with pytest.raises(TypeError):
+            SharedCacheBackend()
+        with pytest.raises(TypeError):
+            GetOnlyCache()
+
+
+class TestKeywordMatcher:
+    """キーワード群一括照合のテストクラス"""
+
+    GROUPS = {
+        "wedding": ["結婚", "結婚祝い", "ブライダル"],
+        "mothers_day": ["母の日", "母", "Mother"],
+        "formal": ["高級", "のし"],
+        "senior": ["高級", "伝統"],
+    }
+
+    def test_overlapping_and_shared_keywords(self):
+        """重なり合うキーワード・複数の群に属するキーワードもすべて1回の走査で拾う"""
+        matcher = KeywordMatcher(self.GROUPS)
+
+        text = "【高級】結婚祝いに MOTHER 母の日ギフト"
+        assert matcher.find(text) == {
+            "wedding": ["結婚", "結婚祝い"],
+            "mothers_day": ["母の日", "母", "Mother"],
+            "formal": ["高級"],
+            "senior": ["高級"],
+        }
+        assert matcher.counts(text) == {"wedding": 2, "mothers_day": 3, "formal": 1, "senior": 1}
+        assert matcher.match_groups("伝統の母子手帳ケース") == ["mothers_day", "senior"]
+        assert matcher.match_groups("関係ない文章") == []
+
+    def test_matches_naive_loop(self):
+        """従来の in 判定ループと同じヒット数になる"""
+        import random
+
+        matcher = KeywordMatcher(self.GROUPS)
+        rng = random.Random(0)
+        pieces = [kw for kws in self.GROUPS.values() for kw in kws] + ["の", "婚", "祝", "高", "ギフト", " "]
+        for _ in range(200):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+            expected = {
+                group: sum(1 for kw in kws if kw.lower() in text.lower()) for group, kws in self.GROUPS.items()
+            }
+            assert matcher.counts(text) == expected
+
+
+class TestCatalogSnapshot:
+    """カタログスナップショットのテストクラス"""
+
+    PRODUCTS = [
+        {"id": "rakuten_b", "title": "今治タオル", "description": "タオル", "price": 3000, "review_average": 4.5,
+         "occasions": ["wedding_celebration", "birth_celebration"], "tags": [1, 2]},
+        {"id": "rakuten_a", "title": "カーネーション", "description": "", "price": "4000", "review_average": 0,
+         "occasions": [], "updated_at": "2025-01-01T00:00:00"},
+        {"title": "ID無し", "description": "説明", "affinity_male": 0.5},
+    ]
+
+    def test_round_trip_and_lookup(self, tmp_path):
+        """固定列・型の合わない値・列に無いキーとも元の値のまま読み戻せ、IDで引ける"""
+        import json
+
+        json_path = tmp_path / "products.json"
+        json_path.write_text(json.dumps(self.PRODUCTS, ensure_ascii=False), encoding="utf-8")
+        write_catalog_snapshot(self.PRODUCTS, snapshot_path_for(str(json_path)), source_path=str(json_path))
+
+        catalog = open_fresh_catalog(str(json_path))
+        assert list(CatalogRecords(catalog)) == self.PRODUCTS
+        assert catalog.find_index("rakuten_a") == 1
+        assert catalog.find_index("rakuten_c") is None
+        assert catalog.value("price", 1) == "4000"
+
+        valid = CatalogRecords(catalog, catalog.nonempty_indices("title", "description"))
+        assert [record["title"] for record in valid] == ["今治タオル", "ID無し"]
+        assert valid.find_position("rakuten_a") is None
+        assert list(valid.values("occasions")) == [["wedding_celebration", "birth_celebration"], None]
+
+    def test_stale_snapshot_is_ignored(self, tmp_path):
+        """元JSONが更新されたらスナップショットは使わない"""
+        import json
+        import os
+
+        json_path = tmp_path / "products.json"
+        json_path.write_text(json.dumps(self.PRODUCTS[:1], ensure_ascii=False), encoding="utf-8")
+        write_catalog_snapshot(self.PRODUCTS[:1], snapshot_path_for(str(json_path)), source_path=str(json_path))
+        assert isinstance(open_fresh_catalog(str(json_path)), CatalogSnapshot)
+
+        json_path.write_text(json.dumps(self.PRODUCTS, ensure_ascii=False), encoding="utf-8")
+        os.utime(json_path, ns=(0, 0))
+        assert open_fresh_catalog(str(json_path)) is None
+
+
+class TestAsyncRateLimiter:
+    """レート制限のテストクラス"""
+    
+    def test_waits_for_token_budget(self):
+        """1分ぶんの枠を使い切ると、補充されるまで待つ（リクエスト数・トークン数とも）"""
+        async def run(limiter, sizes):
+            started = time.perf_counter()
+            for tokens in sizes:
+                await limiter.acquire(tokens)
+            return time.perf_counter() - started
+        
+        # 6000トークン/分 = 100トークン/秒。最初の6000は即座に通り、次の50は約0.5秒待つ
+        limiter = AsyncRateLimiter(tokens_per_minute=6000)
+        assert asyncio.run(run(limiter, [6000])) < 0.1
+        assert 0.4 < asyncio.run(run(limiter, [50])) < 1.0
+        
+        # 600リクエスト/分 = 10リクエスト/秒
+        limiter = AsyncRateLimiter(requests_per_minute=600)
+        assert 0.15 < asyncio.run(run(limiter, [0] * 602)) < 0.6
+        assert limiter.get_stats()["waited_seconds"] > 0
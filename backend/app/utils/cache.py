@@ -0,0 +1,186 @@
+"""
+スレッドセーフなLRU＋TTLキャッシュ
+
+このファイルの役割:
+- サービス層のメモリキャッシュの共通部品（エントリ数・バイト数上限付きLRU、エントリ単位のTTL）
+- ヒット・ミス・追い出し・期限切れの件数を集計
+- 入力データから安定したキャッシュキーを生成
+
+設計メモ:
+- 取得・保存・追い出しはいずれもO(1)（OrderedDict の末尾移動と先頭削除のみ）
+- 期限切れは参照時に判定して捨てる。保存時にはLRU先頭の期限切れエントリも併せて捨てる
+- コルーチンとスレッドプールの両方から触られる前提で、全操作をロックで保護する
+"""
+
+import hashlib
+import json
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires_at: Optional[float]
+    size: int
+
+
+def estimate_size(value: Any) -> int:
+    """
+    値のおおよそのメモリサイズ（バイト）
+
+    文字列・バイト列はそのまま、辞書・リスト等は1階層分の要素サイズを合計する。
+    厳密さより一定時間で計算できることを優先する。
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+def make_cache_key(data: Any) -> str:
+    """
+    任意のデータから安定したキャッシュキーを生成
+
+    辞書はキー順に依存しないようJSON（sort_keys）で正規化してからハッシュ化する。
+    """
+    try:
+        canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        canonical = repr(data)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class TTLCache:
+    """エントリ数・バイト数上限付きのLRU＋TTLキャッシュ"""
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = estimate_size,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初期化
+
+        Args:
+            max_entries: 最大エントリ数
+            ttl_seconds: 既定の有効期限（秒）。Noneなら期限なし
+            max_bytes: 値の合計サイズの上限（バイト）。Noneなら無制限
+            sizeof: 値のサイズ見積もり関数
+            clock: 時刻関数（テスト用に差し替え可能）
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "stores": 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """値を取得（無い・期限切れなら default）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            if entry.expires_at is not None and entry.expires_at <= self._clock():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """
+        値を保存
+
+        Args:
+            ttl_seconds: このエントリの有効期限（秒）。Noneなら既定値
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        size = self._sizeof(value)
+        with self._lock:
+            now = self._clock()
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # 単体で上限を超える値は保存しない
+                self._stats["evictions"] += 1
+                return
+            self._entries[key] = _Entry(value, now + ttl if ttl is not None else None, size)
+            self._bytes += size
+            self._stats["stores"] += 1
+            self._evict(now)
+
+    def delete(self, key: Hashable) -> bool:
+        """値を削除（存在した場合True）"""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self):
+        """全エントリを削除（統計は保持）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def purge_expired(self) -> int:
+        """期限切れエントリを全件走査して削除（定期メンテナンス用、O(n)）"""
+        with self._lock:
+            now = self._clock()
+            expired = [k for k, e in self._entries.items() if e.expires_at is not None and e.expires_at <= now]
+            for key in expired:
+                self._remove(key)
+            self._stats["expirations"] += len(expired)
+            return len(expired)
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self, now: float):
+        """上限を超えている間LRU先頭から追い出す（先頭が期限切れなら件数上限内でも捨てる）"""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at is not None and entry.expires_at <= now:
+                self._remove(key)
+                self._stats["expirations"] += 1
+            elif len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._remove(key)
+                self._stats["evictions"] += 1
+            else:
+                break
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry.expires_at is None or entry.expires_at > self._clock())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率・追い出し件数等のメトリクス"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
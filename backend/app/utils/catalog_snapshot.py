@@ -0,0 +1,400 @@
+"""
+商品カタログのバイナリスナップショット
+
+このファイルの役割:
+- 楽天商品JSON（受け渡し用の形式）と同じ内容を、列指向のコンパクトなバイナリファイル（*.catalog）に書き出す
+- 読み込み側は mmap で開き、数値列・文字列オフセットは numpy でゼロコピー参照する
+- 商品レコード（dict）はアクセスされた時点で1件ずつ組み立てる（全件をPythonオブジェクトにしない）
+
+ファイル形式（リトルエンディアン）:
+    MAGIC(8) | ヘッダー長(u64) | ヘッダーJSON（8バイト境界までパディング） | データ領域
+    - ヘッダーJSON: 件数・元JSONの (ファイル名, 更新時刻ns, サイズ)・各列のデータ領域内オフセット
+    - 数値列: int64 / float64 の配列（件数分）
+    - 文字列列: uint32（4GiB以上なら uint64）のオフセット配列（件数+1）と UTF-8 の連結文字列
+    - 文字列リスト列: 要素を \\x1f で連結した文字列列
+    - present: 固定列ごとに値が有るかのビットマスク（uint32、件数分）
+    - extra: 固定列に無いキー・型の合わない値をまとめたJSON文字列列
+    - id_order: id 昇順に並べたレコード番号（uint32、二分探索用）
+
+使用例:
+    write_catalog_snapshot(products, "rakuten_uchiwai_products_20250101.catalog", source_path="...json")
+    catalog = open_fresh_catalog("rakuten_uchiwai_products_20250101.json")  # 元JSONと一致しなければNone
+    records = CatalogRecords(catalog)
+    records[0]["title"]
+    catalog.find_index("rakuten_xxx")
+
+設計メモ:
+- 元JSONの更新時刻・サイズをヘッダーに記録し、一致する場合だけ使う（古いスナップショットは無視してJSONを読む）
+- 書き込みは一時ファイルへ書いてから置き換えるため、読み込み側が書きかけのファイルを開くことはない
+- numpy 配列が mmap を参照するため、スナップショットは明示的に閉じずGCに任せる
+"""
+
+import os
+import json
+import mmap
+import logging
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GCATLG01"
+VERSION = 1
+SNAPSHOT_SUFFIX = ".catalog"
+
+INT_COLUMNS = ("price", "updated_at", "review_count")
+FLOAT_COLUMNS = ("review_average",)
+STRING_COLUMNS = (
+    "id", "title", "description", "image_url", "merchant", "source", "url", "affiliate_url",
+    "occasion", "genre_group", "genre_name", "shop_code", "item_code", "catch_copy",
+    "category_group", "search_keyword",
+)
+STRING_LIST_COLUMNS = ("occasions",)
+FIXED_COLUMNS = INT_COLUMNS + FLOAT_COLUMNS + STRING_COLUMNS + STRING_LIST_COLUMNS
+
+_LIST_SEPARATOR = "\x1f"
+_INT64_RANGE = (-(1 << 63), (1 << 63) - 1)
+
+
+def snapshot_path_for(json_path: str) -> str:
+    """元JSONに対応するスナップショットのパス（拡張子を .catalog に置き換える）"""
+    return os.path.splitext(str(json_path))[0] + SNAPSHOT_SUFFIX
+
+
+def _fits_column(column: str, value: Any) -> bool:
+    """値が固定列の型に収まるか（収まらなければ extra に入れて元の値を保つ）"""
+    if column in INT_COLUMNS:
+        return type(value) is int and _INT64_RANGE[0] <= value <= _INT64_RANGE[1]
+    if column in FLOAT_COLUMNS:
+        return type(value) is float
+    if column in STRING_COLUMNS:
+        return isinstance(value, str)
+    return (
+        isinstance(value, list) and len(value) > 0
+        and all(isinstance(item, str) and item and _LIST_SEPARATOR not in item for item in value)
+    )
+
+
+def _pad(size: int) -> int:
+    """8バイト境界までのパディング長"""
+    return -size % 8
+
+
+def write_catalog_snapshot(
+    products: Iterable[Dict[str, Any]],
+    path: str,
+    source_path: Optional[str] = None,
+) -> int:
+    """
+    商品データをスナップショットとして書き出す
+
+    Args:
+        products: 商品データ
+        path: 出力先（*.catalog）
+        source_path: 元JSONのパス（指定すると更新時刻・サイズを記録し、読み込み時の鮮度確認に使う）
+
+    Returns:
+        書き出した件数
+    """
+    products = list(products)
+    count = len(products)
+    present = np.zeros(count, dtype="<u4")
+    numbers: Dict[str, np.ndarray] = {}
+    for column in INT_COLUMNS:
+        numbers[column] = np.zeros(count, dtype="<i8")
+    for column in FLOAT_COLUMNS:
+        numbers[column] = np.zeros(count, dtype="<f8")
+    strings: Dict[str, List[bytes]] = {column: [b""] * count for column in (*STRING_COLUMNS, *STRING_LIST_COLUMNS, "extra")}
+
+    for index, product in enumerate(products):
+        extra = {}
+        for key, value in product.items():
+            if key in FIXED_COLUMNS and _fits_column(key, value):
+                present[index] |= 1 << FIXED_COLUMNS.index(key)
+                if key in numbers:
+                    numbers[key][index] = value
+                elif key in STRING_LIST_COLUMNS:
+                    strings[key][index] = _LIST_SEPARATOR.join(value).encode("utf-8")
+                else:
+                    strings[key][index] = value.encode("utf-8")
+            else:
+                extra[key] = value
+        if extra:
+            strings["extra"][index] = json.dumps(extra, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    id_bit = 1 << FIXED_COLUMNS.index("id")
+    ids = [(strings["id"][index], index) for index in range(count) if present[index] & id_bit]
+    id_order = np.array([index for _, index in sorted(ids)], dtype="<u4")
+
+    # データ領域の各セクションを並べ、ヘッダーにオフセットを記録
+    sections: List[bytes] = []
+    position = 0
+
+    def add_section(data: bytes) -> Dict[str, int]:
+        nonlocal position
+        sections.append(data + b"\0" * _pad(len(data)))
+        spec = {"offset": position, "length": len(data)}
+        position += len(data) + _pad(len(data))
+        return spec
+
+    columns: Dict[str, Dict[str, Any]] = {}
+    for column, values in numbers.items():
+        columns[column] = {"kind": "int" if column in INT_COLUMNS else "float", **add_section(values.tobytes())}
+    for column, values in strings.items():
+        # 連結文字列が4GiB未満なら uint32 のオフセットで足りる
+        offset_dtype = "<u4" if sum(len(value) for value in values) < (1 << 32) else "<u8"
+        offsets = np.zeros(count + 1, dtype=offset_dtype)
+        np.cumsum([len(value) for value in values], out=offsets[1:])
+        columns[column] = {
+            "kind": "str_list" if column in STRING_LIST_COLUMNS else "str",
+            "offset_dtype": offset_dtype,
+            "offsets": add_section(offsets.tobytes()),
+            "blob": add_section(b"".join(values)),
+        }
+
+    source = None
+    if source_path is not None:
+        stat = os.stat(source_path)
+        source = {"name": os.path.basename(str(source_path)), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    header = json.dumps({
+        "version": VERSION,
+        "count": count,
+        "source": source,
+        "fixed_columns": list(FIXED_COLUMNS),
+        "columns": columns,
+        "present": add_section(present.tobytes()),
+        "id_order": add_section(id_order.tobytes()),
+    }, ensure_ascii=False).encode("utf-8")
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.array([len(header)], dtype="<u8").tobytes())
+        f.write(header + b"\0" * _pad(len(MAGIC) + 8 + len(header)))
+        for section in sections:
+            f.write(section)
+    os.replace(temp_path, path)
+    logger.info(f"カタログスナップショットを書き出しました: {path} ({count} 件)")
+    return count
+
+
+class CatalogSnapshot:
+    """mmap したスナップショットへの読み取り専用アクセス"""
+
+    def __init__(self, path: str):
+        """
+        スナップショットを開く
+
+        Args:
+            path: スナップショットのパス
+
+        Raises:
+            ValueError: 形式が不正な場合
+        """
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"カタログスナップショットではありません: {self.path}")
+        header_length = int(np.frombuffer(self._buffer, dtype="<u8", count=1, offset=len(MAGIC))[0])
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(self._buffer[header_start:header_start + header_length]).decode("utf-8"))
+        if header.get("version") != VERSION:
+            raise ValueError(f"未対応のスナップショット形式です: version={header.get('version')}")
+
+        self.count: int = header["count"]
+        self.source: Optional[Dict[str, Any]] = header.get("source")
+        self._base = header_start + header_length + _pad(header_start + header_length)
+        self._fixed_columns: Tuple[str, ...] = tuple(header["fixed_columns"])
+        self._kinds: Dict[str, str] = {}
+        self._numbers: Dict[str, np.ndarray] = {}
+        self._offsets: Dict[str, np.ndarray] = {}
+        self._blobs: Dict[str, Tuple[int, int]] = {}
+        for column, spec in header["columns"].items():
+            self._kinds[column] = spec["kind"]
+            if spec["kind"] in ("int", "float"):
+                self._numbers[column] = self._array(spec, "<i8" if spec["kind"] == "int" else "<f8")
+            else:
+                self._offsets[column] = self._array(spec["offsets"], spec["offset_dtype"])
+                self._blobs[column] = (self._base + spec["blob"]["offset"], spec["blob"]["length"])
+        self._present = self._array(header["present"], "<u4")
+        self._id_order = self._array(header["id_order"], "<u4")
+
+    def _array(self, spec: Dict[str, int], dtype: str) -> np.ndarray:
+        """データ領域のセクションを numpy 配列として参照（コピーしない）"""
+        itemsize = np.dtype(dtype).itemsize
+        return np.frombuffer(self._buffer, dtype=dtype, count=spec["length"] // itemsize, offset=self._base + spec["offset"])
+
+    def __len__(self) -> int:
+        return self.count
+
+    def has_value(self, column: str, index: int) -> bool:
+        """index番目のレコードに固定列 column の値が有るか"""
+        return bool(self._present[index] & (1 << self._fixed_columns.index(column)))
+
+    def _string(self, column: str, index: int) -> str:
+        start, end = self._offsets[column][index], self._offsets[column][index + 1]
+        blob_start = self._blobs[column][0]
+        return self._buffer[blob_start + int(start):blob_start + int(end)].decode("utf-8")
+
+    def value(self, column: str, index: int, default: Any = None) -> Any:
+        """
+        index番目のレコードの値（固定列は列から、それ以外は extra から取り出す）
+
+        Args:
+            column: キー名
+            index: レコード番号
+            default: 値が無い場合の既定値
+        """
+        if column in self._fixed_columns and self.has_value(column, index):
+            kind = self._kinds[column]
+            if kind == "int":
+                return int(self._numbers[column][index])
+            if kind == "float":
+                return float(self._numbers[column][index])
+            text = self._string(column, index)
+            return text.split(_LIST_SEPARATOR) if kind == "str_list" else text
+        if self._offsets["extra"][index] != self._offsets["extra"][index + 1]:
+            return json.loads(self._string("extra", index)).get(column, default)
+        return default
+
+    def string_lengths(self, column: str) -> np.ndarray:
+        """文字列列の各レコードのバイト長（値が無ければ0）"""
+        return np.diff(self._offsets[column])
+
+    def nonempty_indices(self, *columns: str) -> np.ndarray:
+        """指定した文字列列がすべて空でないレコード番号（昇順）"""
+        mask = np.ones(self.count, dtype=bool)
+        for column in columns:
+            mask &= self.string_lengths(column) > 0
+        return np.flatnonzero(mask)
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """index番目のレコードを dict として組み立てる"""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        present = int(self._present[index])
+        record: Dict[str, Any] = {}
+        for bit, column in enumerate(self._fixed_columns):
+            if present & (1 << bit):
+                record[column] = self.value(column, index)
+        if self._offsets["extra"][index] != self._offsets["extra"][index + 1]:
+            record.update(json.loads(self._string("extra", index)))
+        return record
+
+    def find_index(self, product_id: str) -> Optional[int]:
+        """商品IDのレコード番号（id_order の二分探索。見つからなければNone）"""
+        target = product_id.encode("utf-8")
+        blob_start = self._blobs["id"][0]
+        offsets = self._offsets["id"]
+        low, high = 0, len(self._id_order)
+        while low < high:
+            middle = (low + high) // 2
+            index = int(self._id_order[middle])
+            key = self._buffer[blob_start + int(offsets[index]):blob_start + int(offsets[index + 1])]
+            if key < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._id_order):
+            index = int(self._id_order[low])
+            if self._buffer[blob_start + int(offsets[index]):blob_start + int(offsets[index + 1])] == target:
+                return index
+        return None
+
+    def is_fresh_for(self, source_path: str) -> bool:
+        """元JSONの更新時刻・サイズがスナップショット作成時と一致するか"""
+        if not self.source:
+            return False
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return False
+        return (
+            self.source.get("name") == os.path.basename(str(source_path))
+            and self.source.get("mtime_ns") == stat.st_mtime_ns
+            and self.source.get("size") == stat.st_size
+        )
+
+
+class CatalogRecords(Sequence):
+    """
+    スナップショットのレコード列（要素アクセス時に dict を組み立てる）
+
+    indices（昇順のレコード番号）を指定すると、その番号だけを並べた部分列として振る舞う。
+    """
+
+    def __init__(self, catalog: CatalogSnapshot, indices: Optional[np.ndarray] = None):
+        self.catalog = catalog
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices) if self.indices is not None else len(self.catalog)
+
+    def _position(self, position: int) -> int:
+        """部分列の位置 -> スナップショットのレコード番号"""
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return int(self.indices[position]) if self.indices is not None else position
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            indices = self.indices if self.indices is not None else np.arange(len(self.catalog), dtype=np.int64)
+            return CatalogRecords(self.catalog, indices[position])
+        return self.catalog.record(self._position(position))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def values(self, column: str, default: Any = None) -> Iterator[Any]:
+        """全レコードの1列分の値（dict を組み立てずに取り出す）"""
+        for position in range(len(self)):
+            yield self.catalog.value(column, self._position(position), default)
+
+    def find_position(self, product_id: str) -> Optional[int]:
+        """商品IDの部分列内の位置（見つからなければNone）"""
+        index = self.catalog.find_index(product_id)
+        if index is None:
+            return None
+        if self.indices is None:
+            return index
+        position = int(np.searchsorted(self.indices, index))
+        return position if position < len(self.indices) and self.indices[position] == index else None
+
+
+def field_values(records: Sequence, column: str, default: Any = None) -> Iterable[Any]:
+    """
+    レコード列の1列分の値
+
+    CatalogRecords なら dict を組み立てずに取り出し、dict のリストならそのまま get する。
+    """
+    if isinstance(records, CatalogRecords):
+        return records.values(column, default)
+    return (record.get(column, default) for record in records)
+
+
+def open_fresh_catalog(json_path: str) -> Optional[CatalogSnapshot]:
+    """
+    元JSONに対応する最新のスナップショットを開く
+
+    スナップショットが無い・元JSONより古い・壊れている場合はNone（呼び出し側はJSONを読む）。
+    """
+    path = snapshot_path_for(json_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        catalog = CatalogSnapshot(path)
+    except Exception as e:
+        logger.warning(f"カタログスナップショットを開けないためJSONを読み込みます: {path} ({e})")
+        return None
+    if not catalog.is_fresh_for(json_path):
+        logger.info(f"カタログスナップショットが元JSONと一致しないためJSONを読み込みます: {path}")
+        return None
+    return catalog
@@ -0,0 +1,91 @@
+"""
+リクエスト単位の時間予算（レイテンシバジェット）
+
+このファイルの役割:
+- 1リクエスト全体の持ち時間を管理し、各処理段に締め切りを割り当てる
+- 締め切りを超えた段は中断してフォールバック値に差し替え、劣化した段を記録する
+
+使用例:
+    budget = RequestBudget(3.0)
+    intent = await budget.run("intent_extraction", extract(), lambda: rule_intent, share=0.3)
+    text = await budget.run("advice", generate(), lambda: template_text)
+    budget.metadata()  # {"budget_ms": 3000.0, "elapsed_ms": ..., "degraded_stages": [...]}
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RequestBudget:
+    """1リクエストの時間予算"""
+
+    def __init__(self, total_seconds: Optional[float]):
+        """
+        初期化
+
+        Args:
+            total_seconds: リクエスト全体の持ち時間（秒）。None・0以下なら無制限
+        """
+        self.total_seconds = total_seconds if total_seconds and total_seconds > 0 else None
+        self.started_at = time.monotonic()
+        self.degraded_stages: List[str] = []
+
+    def elapsed(self) -> float:
+        """開始からの経過時間（秒）"""
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> Optional[float]:
+        """残り時間（秒）。無制限ならNone"""
+        if self.total_seconds is None:
+            return None
+        return max(self.total_seconds - self.elapsed(), 0.0)
+
+    def stage_timeout(self, share: float = 1.0) -> Optional[float]:
+        """
+        処理段の締め切りまでの時間
+
+        予算全体に対する割合 share と残り時間の小さい方。無制限ならNone。
+        """
+        if self.total_seconds is None:
+            return None
+        return min(self.total_seconds * share, self.remaining())
+
+    async def run(
+        self,
+        stage: str,
+        awaitable: Awaitable[T],
+        fallback: Callable[[], T],
+        share: float = 1.0
+    ) -> T:
+        """
+        処理段を締め切り付きで実行
+
+        締め切りを超えた場合は処理を中断し、fallback() の値を返す（段名を劣化として記録）。
+        処理自体の例外はそのまま送出する。
+        """
+        timeout = self.stage_timeout(share)
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            self.degraded_stages.append(stage)
+            logger.warning(f"⏱️ 時間予算超過のためフォールバック: {stage} (締め切り {timeout:.2f}s)")
+            return fallback()
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.degraded_stages)
+
+    def metadata(self) -> Dict[str, Any]:
+        """レスポンスに含める予算の消費状況"""
+        return {
+            "budget_ms": self.total_seconds * 1000 if self.total_seconds is not None else None,
+            "elapsed_ms": round(self.elapsed() * 1000, 1),
+            "degraded_stages": list(self.degraded_stages),
+        }
@@ -4,8 +4,10 @@ HTTP通信関連のユーティリティ関数
 このファイルの役割:
 - API呼び出し時の共通処理
 - パラメータ構築、エラーハンドリング
+- ストリーミング応答（Server-Sent Events）の整形
 """
 
+import json
 from typing import Dict, Any, Optional
 
 
@@ -64,4 +66,23 @@ def format_api_error(error_type: str, message: str, status_code: Optional[int] =
         'message': error_messages.get(error_type, error_messages['unknown']),
         'detail': message,
         'status_code': status_code
-    }
\ No newline at end of file
+    }
+
+def format_sse_event(event: str, data: Any) -> str:
+    """
+    Server-Sent Events の1イベント分の文字列を生成
+    
+    Args:
+        event: イベント名
+        data: JSON化可能なデータ
+        
+    Returns:
+        "event: ...\\ndata: ...\\n\\n" 形式の文字列
+        
+    使用例:
+        >>> format_sse_event("advice_delta", {"text": "こんにちは"})
+        'event: advice_delta\\ndata: {"text": "こんにちは"}\\n\\n'
+    """
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    # data 行に改行を含めない（JSONは改行をエスケープ済み）
+    return f"event: {event}\ndata: {payload}\n\n"
@@ -0,0 +1,163 @@
+"""
+キーワード群の一括照合（Aho-Corasick）
+
+このファイルの役割:
+- 複数のキーワード群（用途・ジャンル・相手情報等）を1つのオートマトンにまとめて一度だけ構築
+- テキストを1回走査するだけで、群ごとにヒットしたキーワードを返す
+
+使用例:
+    matcher = KeywordMatcher({"mothers_day": ["母の日", "カーネーション"], "fathers_day": ["父の日"]})
+    matcher.find("母の日のカーネーション")    # {"mothers_day": ["母の日", "カーネーション"]}
+    matcher.counts("母の日のカーネーション")  # {"mothers_day": 2}
+    matcher.match_groups("父の日ギフト")      # ["fathers_day"]
+
+設計メモ:
+- 大文字小文字は区別しない（キーワードは構築時に、テキストは照合時に1度だけ小文字化）
+- 失敗遷移を展開済みの遷移表（DFA）を持つため、走査は1文字あたり辞書参照1回
+- 同じキーワードが複数の群に属してもよい（「高級」が formal と senior の両方でヒットする等）
+- ヒット数は「テキストに含まれる異なるキーワードの数」（同じキーワードの繰り返しは数えない）
+- キーワードに現れない文字ではオートマトンが必ず初期状態に戻るため、
+  正規表現でキーワード構成文字の連続部分だけを切り出してから走査する
+- pyahocorasick（C実装）がインストールされていればそちらで走査する。
+  純Python実装はキーワード数が多い（100語超程度）ほど従来の in 判定ループより有利になる
+  （scripts/benchmark_keyword_matcher.py で計測）
+- 構築後は読み取り専用のため、スレッド間で共有してよい
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Set, Tuple
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+class KeywordMatcher:
+    """複数のキーワード群を1つのAho-Corasickオートマトンで照合する"""
+
+    def __init__(self, groups: Mapping[str, Iterable[str]]):
+        """
+        初期化（オートマトンの構築）
+
+        Args:
+            groups: 群名 -> キーワードのリスト（群の順序は match_groups の返却順になる）
+        """
+        self.group_names: Tuple[str, ...] = tuple(groups)
+        # キーワード（小文字化済み）ごとの ID と、元の表記・所属する群
+        self._keywords: List[str] = []
+        self._keyword_groups: List[List[Tuple[str, str]]] = []
+        keyword_ids: Dict[str, int] = {}
+        for group, keywords in groups.items():
+            for keyword in keywords:
+                lowered = keyword.lower()
+                if not lowered:
+                    continue
+                if lowered not in keyword_ids:
+                    keyword_ids[lowered] = len(self._keywords)
+                    self._keywords.append(lowered)
+                    self._keyword_groups.append([])
+                entry = (group, keyword)
+                if entry not in self._keyword_groups[keyword_ids[lowered]]:
+                    self._keyword_groups[keyword_ids[lowered]].append(entry)
+
+        self._transitions, self._outputs = self._build(self._keywords)
+        alphabet = sorted({ch for keyword in self._keywords for ch in keyword})
+        self._runs = re.compile("[" + "".join(re.escape(ch) for ch in alphabet) + "]+") if alphabet else None
+
+        self._automaton = None
+        if AHOCORASICK_AVAILABLE and self._keywords:
+            self._automaton = ahocorasick.Automaton()
+            for keyword_id, keyword in enumerate(self._keywords):
+                self._automaton.add_word(keyword, keyword_id)
+            self._automaton.make_automaton()
+
+    @property
+    def backend(self) -> str:
+        """走査に使う実装（"pyahocorasick" / "python"）"""
+        return "pyahocorasick" if self._automaton is not None else "python"
+
+    @staticmethod
+    def _build(keywords: List[str]) -> Tuple[List[Dict[str, int]], List[Tuple[int, ...]]]:
+        """トライを構築し、失敗遷移を展開した遷移表と各状態の出力（キーワードID）を作る"""
+        transitions: List[Dict[str, int]] = [{}]
+        outputs: List[Tuple[int, ...]] = [()]
+        for keyword_id, keyword in enumerate(keywords):
+            state = 0
+            for ch in keyword:
+                next_state = transitions[state].get(ch)
+                if next_state is None:
+                    next_state = len(transitions)
+                    transitions.append({})
+                    outputs.append(())
+                    transitions[state][ch] = next_state
+                state = next_state
+            outputs[state] += (keyword_id,)
+
+        # 幅優先で失敗遷移を求める。浅い状態から順に処理するため、
+        # 失敗先の遷移表は展開済みで、そのまま自分の遷移表に取り込める
+        goto = [dict(edges) for edges in transitions]
+        failure = [0] * len(transitions)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = failure[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = failure[fallback]
+                target = goto[fallback].get(ch, 0)
+                failure[next_state] = target if target != next_state else 0
+                outputs[next_state] += outputs[failure[next_state]]
+            for ch, next_state in transitions[failure[state]].items():
+                transitions[state].setdefault(ch, next_state)
+        return transitions, outputs
+
+    def _scan(self, text: str) -> Set[int]:
+        """テキストを1回走査し、含まれるキーワードIDの集合を返す"""
+        if self._automaton is not None:
+            return {keyword_id for _, keyword_id in self._automaton.iter(text.lower())}
+        if self._runs is None:
+            return set()
+
+        transitions = self._transitions
+        outputs = self._outputs
+        hits: Set[int] = set()
+        for run in self._runs.findall(text.lower()):
+            state = 0
+            for ch in run:
+                state = transitions[state].get(ch, 0)
+                if outputs[state]:
+                    hits.update(outputs[state])
+        return hits
+
+    def find(self, text: str) -> Dict[str, List[str]]:
+        """
+        群ごとにヒットしたキーワード（定義時の表記）
+
+        ヒットの無い群は含めない。
+        """
+        matched: Dict[str, List[str]] = {}
+        for keyword_id in sorted(self._scan(text)):
+            for group, keyword in self._keyword_groups[keyword_id]:
+                matched.setdefault(group, []).append(keyword)
+        return matched
+
+    def counts(self, text: str) -> Dict[str, int]:
+        """群ごとのヒットしたキーワード数（全群を含み、ヒット無しは0）"""
+        counts = dict.fromkeys(self.group_names, 0)
+        for keyword_id in self._scan(text):
+            for group, _ in self._keyword_groups[keyword_id]:
+                counts[group] += 1
+        return counts
+
+    def match_groups(self, text: str) -> List[str]:
+        """ヒットのあった群名（群の定義順）"""
+        matched = {group for keyword_id in self._scan(text) for group, _ in self._keyword_groups[keyword_id]}
+        return [group for group in self.group_names if group in matched]
+
+    def __len__(self) -> int:
+        """登録されている異なるキーワード数"""
+        return len(self._keywords)
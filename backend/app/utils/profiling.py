@@ -0,0 +1,170 @@
+"""
+リクエスト単位のプロファイリングユーティリティ
+
+このファイルの役割:
+- 処理ステージごとの所要時間を span（入れ子の計測区間）として記録
+- 候補商品ごとのスコア内訳（score breakdown）を記録
+- デバッグヘッダー付きリクエストのときだけ有効化（通常時はほぼゼロコスト）
+
+使用例:
+    with profiling_session() as profiler:
+        with span("search", limit=10):
+            ...
+            record_scores(item.id, {"structured": 0.8})
+    profiler.to_dict()
+
+設計メモ:
+- 現在のプロファイラ・spanは contextvars で保持するため、
+  asyncio.create_task / gather で分岐したタスクにも親spanが引き継がれる
+- プロファイリング無効時の span() は共有の no-op オブジェクトを返すだけで、
+  文字列生成・時刻取得は一切行わない
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Span:
+    """計測区間（入れ子可能）"""
+
+    __slots__ = ("name", "attrs", "children", "start", "end")
+
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.children: List["Span"] = []
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    def set(self, **attrs: Any) -> None:
+        """属性を追加"""
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        """JSON化可能な辞書に変換（originはルートspanの開始時刻）"""
+        node: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3),
+        }
+        if self.attrs:
+            node["attrs"] = self.attrs
+        if self.children:
+            node["children"] = [child.to_dict(origin) for child in self.children]
+        return node
+
+
+class _NoopSpan:
+    """プロファイリング無効時に返す何もしないspan"""
+
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class RequestProfiler:
+    """1リクエスト分の計測結果を保持するプロファイラ"""
+
+    def __init__(self, name: str = "request"):
+        self.root = Span(name)
+        self.candidate_scores: Dict[str, Dict[str, Any]] = {}
+
+    def record_scores(self, candidate_id: str, breakdown: Dict[str, Any]) -> None:
+        """候補商品のスコア内訳を記録（同一IDは項目をマージ）"""
+        self.candidate_scores.setdefault(str(candidate_id), {}).update(breakdown)
+
+    def finish(self) -> None:
+        if self.root.end is None:
+            self.root.end = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """レスポンス埋め込み用の辞書を生成"""
+        return {
+            "timings": self.root.to_dict(self.root.start),
+            "candidate_scores": self.candidate_scores,
+        }
+
+
+_current_profiler: ContextVar[Optional[RequestProfiler]] = ContextVar("current_profiler", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def is_profiling() -> bool:
+    """現在のコンテキストでプロファイリングが有効か"""
+    return _current_profiler.get() is not None
+
+
+def get_profiler() -> Optional[RequestProfiler]:
+    """現在のプロファイラを取得（無効時はNone）"""
+    return _current_profiler.get()
+
+
+@contextmanager
+def profiling_session(name: str = "request") -> Iterator[RequestProfiler]:
+    """
+    プロファイリングを有効化するセッション
+
+    with ブロック内で呼ばれた span() / record_scores() がこのプロファイラに記録される。
+    """
+    profiler = RequestProfiler(name)
+    profiler_token = _current_profiler.set(profiler)
+    span_token = _current_span.set(profiler.root)
+    try:
+        yield profiler
+    finally:
+        profiler.finish()
+        _current_span.reset(span_token)
+        _current_profiler.reset(profiler_token)
+
+
+@contextmanager
+def _active_span(name: str, attrs: Dict[str, Any]) -> Iterator[Span]:
+    parent = _current_span.get()
+    node = Span(name, attrs)
+    if parent is not None:
+        parent.children.append(node)
+    token = _current_span.set(node)
+    try:
+        yield node
+    except BaseException as e:
+        node.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        node.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def span(name: str, **attrs: Any):
+    """
+    計測区間を開始する
+
+    プロファイリング無効時は no-op を返すため、ホットパスで常用して良い。
+    属性値に重い計算を渡す場合は、is_profiling() で事前に分岐すること。
+    """
+    if _current_profiler.get() is None:
+        return _NOOP_SPAN
+    return _active_span(name, attrs)
+
+
+def record_scores(candidate_id: Any, breakdown: Dict[str, Any]) -> None:
+    """候補商品のスコア内訳を記録（プロファイリング無効時は何もしない）"""
+    profiler = _current_profiler.get()
+    if profiler is not None:
+        profiler.record_scores(candidate_id, breakdown)
@@ -0,0 +1,97 @@
+"""
+API呼び出しのレート制限（1分あたりのリクエスト数・トークン数）
+
+このファイルの役割:
+- OpenAI 等のレート上限（RPM / TPM）を超えないよう、呼び出し前に待つ
+- 並列に呼び出す複数のタスクで1つのリミッターを共有し、上限いっぱいまで使い切る
+
+使用例:
+    limiter = AsyncRateLimiter(requests_per_minute=3000, tokens_per_minute=1_000_000)
+    await limiter.acquire(tokens=count_tokens(text))
+    response = await client.embeddings.create(...)
+
+設計メモ:
+- リクエスト数・トークン数それぞれのトークンバケット。容量は1分ぶんで、経過時間に比例して補充する
+- 待ちは到着順（ロックを持ったまま待つので、後から来たタスクが追い越さない）
+- 上限を超える大きさの1回分は、容量いっぱいまで溜まった時点で通す（バケットは負になり、その分後続が待つ）
+"""
+
+import asyncio
+import time
+from typing import Callable, Dict, Optional
+
+
+class AsyncRateLimiter:
+    """1分あたりのリクエスト数・トークン数の上限を守るリミッター"""
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初期化
+
+        Args:
+            requests_per_minute: 1分あたりのリクエスト数上限（Noneなら無制限）
+            tokens_per_minute: 1分あたりのトークン数上限（Noneなら無制限）
+            clock: 単調増加する時計（秒）
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated_at = clock()
+        self._lock = asyncio.Lock()
+        self._waited_seconds = 0.0
+
+    def _refill(self):
+        """経過時間ぶんをバケットに補充"""
+        now = self._clock()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _wait_seconds(self, tokens: int) -> float:
+        """今の残量で tokens ぶん通すまでに待つ時間（0なら今すぐ通せる）"""
+        wait = 0.0
+        if self.requests_per_minute and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute:
+            needed = min(tokens, self.tokens_per_minute)
+            if self._tokens < needed:
+                wait = max(wait, (needed - self._tokens) * 60 / self.tokens_per_minute)
+        return wait
+
+    async def acquire(self, tokens: int = 0):
+        """
+        1リクエスト（tokens トークン）ぶんの枠を確保する（上限に達していれば空くまで待つ）
+
+        Args:
+            tokens: このリクエストで消費するトークン数
+        """
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = self._wait_seconds(tokens)
+                if wait <= 0:
+                    break
+                self._waited_seconds += wait
+                await asyncio.sleep(wait)
+            if self.requests_per_minute:
+                self._requests -= 1
+            if self.tokens_per_minute:
+                self._tokens -= tokens
+
+    def get_stats(self) -> Dict[str, float]:
+        """現在の残量と累計の待ち時間"""
+        return {
+            "requests_available": round(self._requests, 2) if self.requests_per_minute else float("inf"),
+            "tokens_available": round(self._tokens, 2) if self.tokens_per_minute else float("inf"),
+            "waited_seconds": round(self._waited_seconds, 3),
+        }
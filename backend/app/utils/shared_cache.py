@@ -0,0 +1,427 @@
+"""
+ワーカープロセス間で共有するキャッシュ層
+
+このファイルの役割:
+- 同一ホストの複数ワーカー（gunicorn/uvicorn）で共有する第2層キャッシュ
+  - SQLiteSharedCache: ローカルファイルのSQLite（WALモード）。追加のサーバー不要
+  - RedisSharedCache: Redisプロトコル（RESP）のサーバー。複数ホストでの共有にも使える
+- プロセス内キャッシュ（TTLCache）と組み合わせた2段キャッシュ TieredCache
+
+設計メモ:
+- 値はJSONで保存する（pickleは使わない。共有ストアの内容がコード実行に繋がらないように）
+  JSONにできない値は str() で文字列化される点に注意（呼び出し側で model_dump 等をしておく）
+- 共有層の障害時はミス扱いにしてプロセス内キャッシュのみで動作を継続する
+- 共有層の操作は同期I/O。ローカルのSQLite・Redisなら1操作あたり数十〜数百マイクロ秒の想定
+"""
+
+import json
+import logging
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from .cache import TTLCache
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+# 共有層の障害後、再接続を試みるまでの間隔（秒）
+RECONNECT_INTERVAL_SECONDS = 5.0
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class SharedCacheBackend(ABC):
+    """共有キャッシュ層の抽象基底クラス（SQLite・Redis 等の実装を差し替え可能にする）"""
+
+    # ホストを跨いで共有されるか（Falseなら同一ホストのワーカー間のみ）
+    is_remote = False
+
+    def __init__(self):
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+        self._stats_lock = Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_with_ttl(key)[0]
+
+    @abstractmethod
+    def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        """
+        値と残りの有効期限（秒）を取得
+
+        Returns:
+            (値, 残り秒数)。無い・期限切れなら (None, None)、期限なしなら残り秒数は None
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        """値を保存（ttl_seconds が None なら期限なし）"""
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        """キーを削除"""
+        pass
+
+    @abstractmethod
+    def clear(self, prefix: str = ""):
+        """prefix で始まるキーを削除"""
+        pass
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = type(self).__name__
+        return stats
+
+
+class SQLiteSharedCache(SharedCacheBackend):
+    """SQLite（WALモード）による同一ホスト内の共有キャッシュ"""
+
+    # 保存何回ごとに期限切れ行を掃除するか
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, timeout_seconds: float = 0.2):
+        super().__init__()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = Lock()
+        self._sets_since_purge = 0
+        self._conn = sqlite3.connect(path, timeout=timeout_seconds, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL)"
+        )
+        self._conn.commit()
+
+    def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM shared_cache WHERE key = ?", (key,)
+                ).fetchone()
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"共有キャッシュ読み込みエラー: {e}")
+            return None, None
+        remaining = row[1] - time.time() if row is not None and row[1] is not None else None
+        if row is None or (remaining is not None and remaining <= 0):
+            self._count("misses")
+            return None, None
+        self._count("hits")
+        return json.loads(row[0]), remaining
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO shared_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, _dumps(value), expires_at)
+                )
+                self._sets_since_purge += 1
+                if self._sets_since_purge >= self.PURGE_EVERY:
+                    self._sets_since_purge = 0
+                    self._conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (time.time(),))
+                self._conn.commit()
+            self._count("stores")
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"共有キャッシュ書き込みエラー: {e}")
+
+    def delete(self, key: str):
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM shared_cache WHERE key = ?", (key,))
+                self._conn.commit()
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"共有キャッシュ削除エラー: {e}")
+
+    def clear(self, prefix: str = ""):
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            self._conn.commit()
+
+
+class RedisProtocolError(Exception):
+    """Redisサーバーがエラー応答を返した"""
+
+
+class RedisSharedCache(SharedCacheBackend):
+    """Redisプロトコル（RESP2）による共有キャッシュ（依存ライブラリ無しの最小クライアント）"""
+
+    is_remote = True
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout_seconds: float = 0.2):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout_seconds = timeout_seconds
+        self._lock = Lock()
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._down_until = 0.0
+
+    # --- 接続・プロトコル ---
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout_seconds)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._reader = sock.makefile("rb")
+        if self.password:
+            self._execute("AUTH", self.password)
+        if self.db:
+            self._execute("SELECT", str(self.db))
+
+    def _disconnect(self):
+        for closable in (self._reader, self._sock):
+            try:
+                if closable is not None:
+                    closable.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    @staticmethod
+    def _encode_command(args: Tuple[Any, ...]) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(f"${len(data)}\r\n".encode())
+            parts.append(data)
+            parts.append(b"\r\n")
+        return b"".join(parts)
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Redisサーバーとの接続が切れました")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode()
+        if prefix == b"-":
+            raise RedisProtocolError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"不正なRESP応答: {line!r}")
+
+    def _execute(self, *args: Any) -> Any:
+        self._sock.sendall(self._encode_command(args))
+        return self._read_reply()
+
+    def _call(self, *args: Any) -> Any:
+        """
+        コマンドを実行（接続が無ければ接続する）
+
+        接続障害時は RECONNECT_INTERVAL_SECONDS の間は共有層を使わずに例外を送出する
+        """
+        return self._call_pipeline([args])[0]
+
+    def _call_pipeline(self, commands: List[Tuple[Any, ...]]) -> List[Any]:
+        """複数のコマンドを1回の送信で実行し、応答を順に返す（往復は1回）"""
+        with self._lock:
+            if time.monotonic() < self._down_until:
+                raise ConnectionError("Redis共有キャッシュは一時停止中です")
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(b"".join(self._encode_command(args) for args in commands))
+                return [self._read_reply() for _ in commands]
+            except (OSError, ConnectionError) as e:
+                self._disconnect()
+                self._down_until = time.monotonic() + RECONNECT_INTERVAL_SECONDS
+                raise ConnectionError(str(e)) from e
+
+    # --- キャッシュ操作 ---
+
+    def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        try:
+            data, ttl_ms = self._call_pipeline([("GET", key), ("PTTL", key)])
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Redis共有キャッシュ読み込みエラー: {e}")
+            return None, None
+        # PTTL: 期限なしは -1、GET と PTTL の間に期限切れになった場合は -2
+        if data is None or ttl_ms == -2:
+            self._count("misses")
+            return None, None
+        self._count("hits")
+        return json.loads(data), (ttl_ms / 1000 if ttl_ms >= 0 else None)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        args: List[Any] = ["SET", key, _dumps(value)]
+        if ttl_seconds is not None:
+            args += ["PX", max(int(ttl_seconds * 1000), 1)]
+        try:
+            self._call(*args)
+            self._count("stores")
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Redis共有キャッシュ書き込みエラー: {e}")
+
+    def delete(self, key: str):
+        try:
+            self._call("DEL", key)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Redis共有キャッシュ削除エラー: {e}")
+
+    def clear(self, prefix: str = ""):
+        cursor = b"0"
+        while True:
+            cursor, keys = self._call("SCAN", cursor, "MATCH", f"{prefix}*", "COUNT", 500)
+            if keys:
+                self._call("DEL", *keys)
+            if cursor in (b"0", 0, "0"):
+                break
+
+    def ping(self) -> bool:
+        try:
+            return self._call("PING") == "PONG"
+        except Exception:
+            return False
+
+
+def create_shared_cache(url: Optional[str]) -> Optional[SharedCacheBackend]:
+    """
+    URLから共有キャッシュ層を生成
+
+    - sqlite:///data/cache/shared_cache.sqlite3 （相対パス）/ sqlite:////var/cache/app.sqlite3 （絶対パス）
+    - redis://[:password@]host:port/db
+    - None・空文字なら共有層なし
+    """
+    if not url:
+        return None
+    parsed = urlparse(url)
+    try:
+        if parsed.scheme == "sqlite":
+            path = url[len("sqlite:///"):]
+            return SQLiteSharedCache(path)
+        if parsed.scheme == "redis":
+            return RedisSharedCache(
+                host=parsed.hostname or "localhost",
+                port=parsed.port or 6379,
+                db=int(parsed.path.lstrip("/") or 0),
+                password=parsed.password
+            )
+    except Exception as e:
+        logger.warning(f"共有キャッシュを初期化できません（プロセス内キャッシュのみで継続）: {e}")
+        return None
+    logger.warning(f"未対応の共有キャッシュURLです: {url}")
+    return None
+
+
+_shared_caches: Dict[str, Optional[SharedCacheBackend]] = {}
+_shared_caches_lock = Lock()
+
+
+def get_shared_cache(url: Optional[str]) -> Optional[SharedCacheBackend]:
+    """URLごとに1つの共有キャッシュ層を返す（プロセス内で再利用）"""
+    if not url:
+        return None
+    with _shared_caches_lock:
+        if url not in _shared_caches:
+            _shared_caches[url] = create_shared_cache(url)
+        return _shared_caches[url]
+
+
+class TieredCache:
+    """
+    プロセス内キャッシュ（TTLCache）＋共有キャッシュ層の2段キャッシュ
+
+    TTLCache と同じ get / set / delete / clear インターフェースを持つ。
+    プロセス内でミスした値は共有層から取得してプロセス内に昇格させる。
+    昇格時の有効期限は共有層での残り時間（プロセス内の既定TTLが短ければそちら）にする。
+    """
+
+    def __init__(self, local: TTLCache, shared: Optional[SharedCacheBackend], namespace: str):
+        self.local = local
+        self.shared = shared
+        self.namespace = namespace
+
+    def _shared_key(self, key: Any) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        if self.shared is None:
+            return default
+        value, remaining = self.shared.get_with_ttl(self._shared_key(key))
+        if value is None:
+            return default
+        ttl = self.local.ttl_seconds
+        if remaining is not None:
+            ttl = remaining if ttl is None else min(ttl, remaining)
+        self.local.set(key, value, ttl)
+        return value
+
+    def set(self, key: Any, value: Any, ttl_seconds: Optional[float] = None):
+        self.local.set(key, value, ttl_seconds)
+        if self.shared is not None:
+            ttl = self.local.ttl_seconds if ttl_seconds is None else ttl_seconds
+            self.shared.set(self._shared_key(key), value, ttl)
+
+    def delete(self, key: Any):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self._shared_key(key))
+
+    def clear(self):
+        """
+        プロセス内キャッシュと、共有層のこの名前空間を削除（管理操作）
+
+        全ワーカーに影響するため、終了処理ではプロセス内キャッシュ（self.local）だけを消すこと
+        """
+        self.local.clear()
+        if self.shared is not None:
+            try:
+                self.shared.clear(f"{self.namespace}:")
+            except Exception as e:
+                logger.warning(f"共有キャッシュクリアエラー: {e}")
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.local
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.local.get_stats()
+        if self.shared is not None:
+            stats["shared"] = self.shared.get_stats()
+        return stats
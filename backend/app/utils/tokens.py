@@ -0,0 +1,74 @@
+"""
+LLMプロンプトのトークン数計測
+
+このファイルの役割:
+- tiktoken でプロンプト文字列のトークン数を数える（トークン予算の判定に使う）
+
+設計メモ:
+- tiktoken のエンコーディングは初回にBPEファイルを取得するため、オフライン環境では失敗しうる。
+  失敗は1度だけ記録し、以降は文字種ベースの概算（日本語1文字≒1トークン、ASCII 4文字≒1トークン）で数える
+- エンコーディングはモデル名ごとに1度だけ生成して使い回す
+"""
+
+import logging
+from threading import Lock
+from typing import Any, Dict, Optional
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+
+_encodings: Dict[str, Any] = {}
+_encodings_lock = Lock()
+
+
+def _get_encoding(model: Optional[str]) -> Optional[Any]:
+    """モデルに対応するエンコーディング（利用できなければNone）"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    name = model or DEFAULT_ENCODING
+    if name in _encodings:
+        return _encodings[name]
+    with _encodings_lock:
+        if name not in _encodings:
+            try:
+                try:
+                    encoding = tiktoken.encoding_for_model(name) if model else tiktoken.get_encoding(name)
+                except KeyError:
+                    # 未知のモデル名は既定のエンコーディングで数える
+                    encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            except Exception as e:
+                logger.warning(f"tiktokenエンコーディングを読み込めないため概算で数えます: {e}")
+                encoding = None
+            _encodings[name] = encoding
+    return _encodings[name]
+
+
+def estimate_tokens(text: str) -> int:
+    """文字種ベースのトークン数概算"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    トークン数を数える
+
+    Args:
+        text: 対象文字列
+        model: モデル名（Noneなら cl100k_base）
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text))
+
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+キーワード照合のベンチマークスクリプト
+
+このファイルの役割:
+- 商品カタログ規模のテキスト集合に対し、従来の「キーワードごとに in 判定」するループと
+  KeywordMatcher（Aho-Corasick、1回の走査）の処理時間を比較
+- 両者の照合結果が全件一致することを確認（不一致があれば失敗終了）
+
+対象のキーワード群:
+- recipient: リランカーの相手情報キーワード群（app/services/reranker.py）
+- occasion_index: Meilisearch投入時の用途推定（scripts/index_meili_products.py）
+- multi_category: 再インデックス時の用途＋ジャンル推定（scripts/reindex_with_multi_categories.py）
+
+実行方法:
+python scripts/benchmark_keyword_matcher.py
+python scripts/benchmark_keyword_matcher.py --file scripts/data/rakuten_uchiwai_products_20251030_233859.json
+python scripts/benchmark_keyword_matcher.py --size 20000 --repeat 5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from typing import Callable, Dict, List, Sequence
+
+# backendディレクトリをパスに追加
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(backend_dir)
+
+from app.services.reranker import RECIPIENT_KEYWORD_GROUPS
+from app.utils.keyword_matcher import KeywordMatcher
+from index_meili_products import OCCASION_TEXT_KEYWORDS
+from reindex_with_multi_categories import MultiCategoryProcessor
+
+# 合成コーパスのつなぎ文字（商品説明に頻出する文字種）
+FILLER_CHARS = (
+    "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+    "アイウエオカキクケコサシスセソタチツテトナニヌネノ商品ギフト送料無料贈物内祝返人気詰合箱入"
+    "0123456789gmlcm（）・、。"
+)
+
+
+def load_corpus(path: str) -> List[str]:
+    """楽天商品JSONからタイトル＋説明文のテキスト集合を作る"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    products = data['products'] if isinstance(data, dict) and 'products' in data else data
+    return [f"{p.get('title', '')} {p.get('description', '')}" for p in products if p.get('title')]
+
+
+def synthesize_corpus(size: int, length: int, keywords: Sequence[str], keyword_rate: float, seed: int) -> List[str]:
+    """キーワードを一定割合で含む合成テキスト集合を作る"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        parts = []
+        total = 0
+        while total < length:
+            if rng.random() < keyword_rate:
+                part = rng.choice(keywords)
+            else:
+                part = ''.join(rng.choice(FILLER_CHARS) for _ in range(rng.randint(2, 8)))
+            parts.append(part)
+            total += len(part)
+        corpus.append(''.join(parts))
+    return corpus
+
+
+def naive_counts(groups: Dict[str, List[str]]) -> Callable[[str], Dict[str, int]]:
+    """従来実装と同じ照合（テキストを小文字化し、キーワードごとに in 判定）"""
+    def count(text: str) -> Dict[str, int]:
+        text = text.lower()
+        return {group: sum(1 for keyword in keywords if keyword.lower() in text) for group, keywords in groups.items()}
+    return count
+
+
+def time_per_text(func: Callable[[str], object], corpus: List[str], repeat: int) -> float:
+    """1テキストあたりの処理時間（マイクロ秒、repeat回の最良値）"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in corpus:
+            func(text)
+        best = min(best, time.perf_counter() - started)
+    return best / len(corpus) * 1e6
+
+
+def run_benchmark(name: str, groups: Dict[str, List[str]], corpus: List[str], repeat: int) -> bool:
+    """1つのキーワード群セットについて計測し、結果の一致を確認"""
+    started = time.perf_counter()
+    matcher = KeywordMatcher(groups)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    naive = naive_counts(groups)
+    mismatches = sum(1 for text in corpus if naive(text) != matcher.counts(text))
+
+    naive_us = time_per_text(naive, corpus, repeat)
+    matcher_us = time_per_text(matcher.counts, corpus, repeat)
+
+    print(f"\n🔎 {name}: {len(groups)}群 / {len(matcher)}キーワード (構築 {build_ms:.1f}ms, 実装 {matcher.backend})")
+    print(f"  従来ループ     : {naive_us:8.1f} µs/件  ({naive_us * len(corpus) / 1e6:.2f}s / {len(corpus):,}件)")
+    print(f"  KeywordMatcher : {matcher_us:8.1f} µs/件  ({matcher_us * len(corpus) / 1e6:.2f}s / {len(corpus):,}件)")
+    print(f"  速度比         : {naive_us / matcher_us:.2f}x")
+    if mismatches:
+        print(f"  ❌ 照合結果の不一致: {mismatches}件")
+    else:
+        print("  ✅ 照合結果は全件一致")
+    return mismatches == 0
+
+
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(
+        description='キーワード照合（従来ループ vs Aho-Corasick）のベンチマーク',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python scripts/benchmark_keyword_matcher.py
+  python scripts/benchmark_keyword_matcher.py --file scripts/data/rakuten_uchiwai_products_20251030_233859.json
+  python scripts/benchmark_keyword_matcher.py --size 20000 --length 1000
+        """
+    )
+    parser.add_argument('--file', type=str, default=None, help='商品データファイル（楽天JSON）。未指定なら合成コーパス')
+    parser.add_argument('--size', type=int, default=10000, help='合成コーパスの件数（デフォルト: 10000）')
+    parser.add_argument('--length', type=int, default=600, help='合成テキストの文字数（デフォルト: 600）')
+    parser.add_argument('--keyword-rate', type=float, default=0.05, help='合成テキストに混ぜるキーワードの割合（デフォルト: 0.05）')
+    parser.add_argument('--repeat', type=int, default=3, help='計測の繰り返し回数（デフォルト: 3）')
+    parser.add_argument('--seed', type=int, default=0, help='合成コーパスの乱数シード')
+    return parser.parse_args()
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_arguments()
+
+    processor = MultiCategoryProcessor()
+    benchmarks = {
+        "recipient": RECIPIENT_KEYWORD_GROUPS,
+        "occasion_index": OCCASION_TEXT_KEYWORDS,
+        "multi_category": {**processor.occasion_keywords, **processor.genre_keywords},
+    }
+
+    if args.file:
+        corpus = load_corpus(args.file)
+        print(f"📄 コーパス: {args.file} ({len(corpus):,}件)")
+    else:
+        keywords = sorted({keyword for groups in benchmarks.values() for words in groups.values() for keyword in words})
+        corpus = synthesize_corpus(args.size, args.length, keywords, args.keyword_rate, args.seed)
+        print(f"🧪 合成コーパス: {len(corpus):,}件 × 約{args.length}文字 (キーワード割合 {args.keyword_rate})")
+
+    if not corpus:
+        print("❌ コーパスが空です")
+        return False
+
+    success = True
+    for name, groups in benchmarks.items():
+        success = run_benchmark(name, groups, corpus, args.repeat) and success
+    return success
+
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
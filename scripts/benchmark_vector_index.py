@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+ベクトル検索インデックスのベンチマークスクリプト
+
+このファイルの役割:
+- 厳密検索（flat）と近似最近傍インデックス（HNSW / IVF-Flat / IVF-PQ / SQ8）を同じベクトル集合で作成し、
+  recall@k（厳密検索の上位k件との一致率）・1クエリあたりの p50 / p99 レイテンシ・インデックスのメモリ・作成時間を比較
+- 検索パラメータ（HNSW の efSearch、IVF の nprobe）を振って、精度と速度のトレードオフを一覧にする
+- 結果を見て、デプロイごとに VECTOR_INDEX_TYPE / VECTOR_INDEX_EF_SEARCH / VECTOR_INDEX_NPROBE 等を決める
+
+ベクトル集合:
+- 合成: クラスタ構造を持つ正規分布（--size, --dim, --clusters）
+- 実データ: ベクトルストアのディレクトリ（--store。現在の版の vectors-<版>.npy を mmap で読む）
+クエリは集合から抜き出した行に小さなノイズを足したもの（「既存商品に近い問い合わせ」を模擬）
+
+実行方法:
+python scripts/benchmark_vector_index.py                                   # 合成 20,000件 × 1536次元
+python scripts/benchmark_vector_index.py --size 100000 --dim 768 --index-types hnsw,ivf_flat
+python scripts/benchmark_vector_index.py --store data/vector_store --ef-search 32,64,128 --nprobe 8,16,32
+"""
+
+import os
+import sys
+import time
+import argparse
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# backendディレクトリをパスに追加
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(backend_dir)
+
+import faiss
+
+from app.services.vector_store import INDEX_TYPES, MmapVectorStore, auto_nlist, build_ann_index, set_search_params
+
+
+def synthesize_vectors(size: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """クラスタ構造を持つ合成ベクトル（埋め込みベクトルと同様に正規化）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    assignments = rng.integers(0, clusters, size)
+    vectors = centers[assignments] + 0.5 * rng.standard_normal((size, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """集合から抜き出した行にノイズを足したクエリ"""
+    rng = np.random.default_rng(seed + 1)
+    picked = vectors[rng.choice(len(vectors), min(count, len(vectors)), replace=False)]
+    queries = picked + noise * rng.standard_normal(picked.shape, dtype=np.float32) / np.sqrt(vectors.shape[1])
+    return np.ascontiguousarray(queries, dtype=np.float32)
+
+
+def measure_latencies(search, queries: np.ndarray) -> List[float]:
+    """1クエリずつ検索したときのレイテンシ（ミリ秒）。APIと同じく1件ずつ投げる"""
+    search(queries[:1])  # ウォームアップ
+    latencies = []
+    for i in range(len(queries)):
+        started = time.perf_counter()
+        search(queries[i:i + 1])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def recall_at_k(labels: np.ndarray, truth: np.ndarray) -> float:
+    """厳密検索の上位k件のうち、近似検索の上位k件に含まれた割合の平均"""
+    k = truth.shape[1]
+    return float(np.mean([len(set(found) & set(expected)) / k for found, expected in zip(labels, truth)]))
+
+
+def print_row(name: str, param: str, recall: float, latencies: List[float], memory_mb: float, build_s: Optional[float]):
+    """結果を1行表示"""
+    build = f"{build_s:7.1f}s" if build_s is not None else "      -"
+    print(
+        f"  {name:<9} {param:<14} recall {recall:6.3f}  "
+        f"p50 {np.percentile(latencies, 50):7.3f}ms  p99 {np.percentile(latencies, 99):7.3f}ms  "
+        f"メモリ {memory_mb:8.1f}MB  作成 {build}"
+    )
+
+
+def run_benchmark(vectors: np.ndarray, queries: np.ndarray, args) -> bool:
+    """全インデックス種類・検索パラメータについて計測"""
+    k = args.k
+    truth = faiss.knn(queries, vectors, k)[1]
+    index_params: Dict[str, Optional[int]] = {
+        "hnsw_m": args.hnsw_m,
+        "ef_construction": args.ef_construction,
+        "nlist": args.nlist,
+        "pq_m": args.pq_m,
+        "pq_nbits": args.pq_nbits,
+    }
+    print(f"\n📊 recall@{k} / クエリ {len(queries):,}件 (1件ずつ, スレッド {faiss.omp_get_max_threads()})"
+          f" / IVFクラスタ数 {args.nlist or auto_nlist(len(vectors))}")
+
+    for index_type in args.index_types:
+        if index_type == "flat":
+            latencies = measure_latencies(lambda q: faiss.knn(q, vectors, k), queries)
+            print_row("flat", "exact", 1.0, latencies, vectors.nbytes / 1024 / 1024, None)
+            continue
+
+        started = time.perf_counter()
+        index = build_ann_index(vectors, index_type, index_params)
+        build_s = time.perf_counter() - started
+        if index is None:
+            print(f"  {index_type:<9} スキップ（件数が学習に足りません）")
+            continue
+        memory_mb = faiss.serialize_index(index).nbytes / 1024 / 1024
+
+        if index_type == "hnsw":
+            sweep = [("efSearch", value, {"ef_search": value}) for value in args.ef_search]
+        elif index_type.startswith("ivf"):
+            sweep = [("nprobe", value, {"nprobe": value}) for value in args.nprobe]
+        else:
+            sweep = [("-", "", {})]
+
+        for label, value, search_params in sweep:
+            set_search_params(index, **search_params)
+            labels = index.search(queries, k)[1]
+            latencies = measure_latencies(lambda q: index.search(q, k), queries)
+            print_row(index_type, f"{label}={value}" if value != "" else label, recall_at_k(labels, truth), latencies, memory_mb, build_s)
+            build_s = None
+    return True
+
+
+def parse_int_list(value: str) -> List[int]:
+    """カンマ区切りの整数リスト"""
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(
+        description='ベクトル検索インデックス（flat / HNSW / IVF-Flat / IVF-PQ / SQ8）のベンチマーク',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python scripts/benchmark_vector_index.py
+  python scripts/benchmark_vector_index.py --size 100000 --dim 768 --index-types hnsw,ivf_flat
+  python scripts/benchmark_vector_index.py --store data/vector_store --ef-search 32,64,128 --nprobe 8,16,32
+        """
+    )
+    parser.add_argument('--store', type=str, default=None, help='ベクトルストアのディレクトリ（未指定なら合成ベクトル）')
+    parser.add_argument('--size', type=int, default=20000, help='合成ベクトルの件数（デフォルト: 20000）')
+    parser.add_argument('--dim', type=int, default=1536, help='合成ベクトルの次元（デフォルト: 1536）')
+    parser.add_argument('--clusters', type=int, default=200, help='合成ベクトルのクラスタ数（デフォルト: 200）')
+    parser.add_argument('--queries', type=int, default=500, help='クエリ数（デフォルト: 500）')
+    parser.add_argument('--noise', type=float, default=0.5, help='クエリに足すノイズの大きさ（デフォルト: 0.5）')
+    parser.add_argument('--k', type=int, default=10, help='取得件数（デフォルト: 10）')
+    parser.add_argument('--index-types', type=lambda v: [t.strip() for t in v.split(',') if t.strip()],
+                        default=list(INDEX_TYPES), help=f'計測するインデックス（デフォルト: {",".join(INDEX_TYPES)}）')
+    parser.add_argument('--ef-search', type=parse_int_list, default=[16, 32, 64, 128], help='HNSWのefSearch（デフォルト: 16,32,64,128）')
+    parser.add_argument('--nprobe', type=parse_int_list, default=[1, 4, 16, 64], help='IVFのnprobe（デフォルト: 1,4,16,64）')
+    parser.add_argument('--hnsw-m', type=int, default=32, help='HNSWの隣接数（デフォルト: 32）')
+    parser.add_argument('--ef-construction', type=int, default=80, help='HNSWの作成時探索幅（デフォルト: 80）')
+    parser.add_argument('--nlist', type=int, default=None, help='IVFのクラスタ数（デフォルト: 4√件数）')
+    parser.add_argument('--pq-m', type=int, default=16, help='IVF-PQの分割数（デフォルト: 16）')
+    parser.add_argument('--pq-nbits', type=int, default=8, help='IVF-PQの符号ビット数（デフォルト: 8）')
+    parser.add_argument('--threads', type=int, default=None, help='faissのスレッド数（デフォルト: faissの既定）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    return parser.parse_args()
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_arguments()
+
+    unknown = [index_type for index_type in args.index_types if index_type not in INDEX_TYPES]
+    if unknown:
+        print(f"❌ 未対応のインデックス種類: {', '.join(unknown)} (選択肢: {', '.join(INDEX_TYPES)})")
+        return False
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    if args.store:
+        try:
+            store = MmapVectorStore(args.store)
+        except Exception as e:
+            print(f"❌ ベクトルストアを開けません: {args.store} ({e})")
+            return False
+        vectors = np.ascontiguousarray(store.vectors)
+        print(f"📄 ベクトルストア: {args.store} ({len(vectors):,}件 × {vectors.shape[1]}次元, 現在 {store.index_type})")
+    else:
+        vectors = synthesize_vectors(args.size, args.dim, args.clusters, args.seed)
+        print(f"🧪 合成ベクトル: {len(vectors):,}件 × {args.dim}次元 ({args.clusters}クラスタ)")
+
+    queries = make_queries(vectors, args.queries, args.noise, args.seed)
+    try:
+        return run_benchmark(vectors, queries, args)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
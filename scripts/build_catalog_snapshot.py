@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+商品カタログのバイナリスナップショット作成スクリプト
+
+このファイルの役割:
+- 楽天商品JSONから、同じ場所・同じ名前の *.catalog（列指向・mmap可能なバイナリ）を作成
+- バックエンド（ProductDataLoader / DataUpdater）は元JSONと一致する *.catalog があれば、
+  JSONを解析せずにそちらを読む。JSONは受け渡し用の形式としてそのまま残す
+- --compare でJSON読み込みとスナップショット読み込みの時間・メモリを比較
+
+実行方法:
+python scripts/build_catalog_snapshot.py                  # scripts/data の最新 rakuten_uchiwai_products_*.json
+python scripts/build_catalog_snapshot.py --all            # scripts/data の全JSON
+python scripts/build_catalog_snapshot.py --file scripts/data/rakuten_uchiwai_products_20251030_233859.json --compare
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import tracemalloc
+from typing import List
+
+# backendディレクトリをパスに追加
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(backend_dir)
+
+from app.utils.catalog_snapshot import CatalogRecords, CatalogSnapshot, snapshot_path_for, write_catalog_snapshot
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def load_products(path: str) -> List[dict]:
+    """楽天商品JSONを読み込む（リスト形式・{"products": [...]} 形式の両方に対応）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return data['products'] if 'products' in data else [data]
+    return data
+
+
+def build_snapshot(json_path: str) -> bool:
+    """1ファイル分のスナップショットを作成し、全件が元JSONと一致することを確認"""
+    products = load_products(json_path)
+    output_path = snapshot_path_for(json_path)
+    write_catalog_snapshot(products, output_path, source_path=json_path)
+
+    records = CatalogRecords(CatalogSnapshot(output_path))
+    mismatches = sum(1 for original, restored in zip(products, records) if original != restored)
+    json_mb = os.path.getsize(json_path) / 1024 / 1024
+    catalog_mb = os.path.getsize(output_path) / 1024 / 1024
+    print(f"✅ {os.path.basename(output_path)}: {len(records):,}件 ({json_mb:.1f}MB → {catalog_mb:.1f}MB)")
+    if mismatches or len(records) != len(products):
+        print(f"❌ 元JSONと一致しないレコード: {mismatches}件")
+        return False
+    return True
+
+
+def compare_loading(json_path: str):
+    """JSON読み込みとスナップショット読み込みの時間・メモリを比較"""
+    def measure(load):
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = load()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, elapsed_ms, current / 1024 / 1024, peak / 1024 / 1024
+
+    products, json_ms, json_mb, json_peak_mb = measure(lambda: load_products(json_path))
+    records, catalog_ms, catalog_mb, catalog_peak_mb = measure(lambda: CatalogRecords(CatalogSnapshot(snapshot_path_for(json_path))))
+
+    print(f"\n📊 読み込み比較 ({len(products):,}件)")
+    print(f"  JSON      : {json_ms:8.1f}ms / 保持 {json_mb:7.1f}MB (ピーク {json_peak_mb:7.1f}MB)")
+    print(f"  スナップショット: {catalog_ms:8.1f}ms / 保持 {catalog_mb:7.1f}MB (ピーク {catalog_peak_mb:7.1f}MB)  ※ファイル本体はmmap（ページキャッシュを共有）")
+    del products, records
+
+
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(
+        description='楽天商品JSONからカタログスナップショット（*.catalog）を作成',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python scripts/build_catalog_snapshot.py
+  python scripts/build_catalog_snapshot.py --all
+  python scripts/build_catalog_snapshot.py --file scripts/data/rakuten_uchiwai_products_20251030_233859.json --compare
+        """
+    )
+    parser.add_argument('--file', type=str, default=None, help='対象の商品データファイル（未指定ならデータディレクトリの最新ファイル）')
+    parser.add_argument('--data-dir', type=str, default=DEFAULT_DATA_DIR, help='データディレクトリ（デフォルト: scripts/data）')
+    parser.add_argument('--all', action='store_true', help='データディレクトリの全 rakuten_uchiwai_products_*.json を対象にする')
+    parser.add_argument('--compare', action='store_true', help='JSONとスナップショットの読み込み時間・メモリを比較')
+    return parser.parse_args()
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_arguments()
+
+    if args.file:
+        targets = [args.file]
+    else:
+        targets = sorted(glob.glob(os.path.join(args.data_dir, 'rakuten_uchiwai_products_*.json')), key=os.path.getmtime)
+        if not args.all:
+            targets = targets[-1:]
+    if not targets:
+        print(f"❌ 商品データファイルが見つかりません: {args.data_dir}")
+        return False
+
+    success = True
+    for json_path in targets:
+        try:
+            success = build_snapshot(json_path) and success
+            if args.compare:
+                compare_loading(json_path)
+        except Exception as e:
+            print(f"❌ スナップショット作成エラー: {json_path} - {e}")
+            success = False
+    return success
+
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+ベクトルストア作成スクリプト（全件作り直し）
+
+このファイルの役割:
+- 最新の楽天商品データ（カタログスナップショットがあればそちら）から商品を1件ずつ読み、
+  バックエンドが読み込むベクトルストア（data/vector_store）を作成
+- 埋め込みAPIはバッチを並列に呼び出し、1分あたりのリクエスト数（--rpm）・トークン数（--tpm）の上限いっぱいまで使う
+- 埋め込み済みのバッチはその都度埋め込みキャッシュ（チェックポイント）に書くため、中断しても再実行すれば続きから再開する
+- 最後に全件を書き出して metadata.sqlite3 を置き換える（稼働中のバックエンドは次回の確認時に新しい版へ差し替える）
+
+日次の差分更新は DataUpdater.update_vector_store が行う。このスクリプトは初回作成・埋め込みモデルの変更・
+インデックス種類の変更など、全件を作り直すときに使う（テキストが同じ商品は埋め込みキャッシュから再利用する）
+
+実行方法:
+python scripts/build_vector_store.py                                 # scripts/data の最新データ → data/vector_store
+python scripts/build_vector_store.py --rpm 5000 --tpm 5000000 --concurrency 16
+python scripts/build_vector_store.py --index-type hnsw --output data/vector_store
+python scripts/build_vector_store.py --limit 1000 --output /tmp/vector_store  # 先頭1000件で試験（--limit には稼働中以外の --output が必須）
+OPENAI_BASE_URL=http://127.0.0.1:8081/v1 OPENAI_API_KEY=fake python scripts/build_vector_store.py --output /tmp/vector_store  # 疑似サーバーで試験
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+# backendディレクトリをパスに追加
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(backend_dir)
+
+from app.core.config import settings
+from app.services.ai_recommendation_service import ProductDataLoader
+from app.services.data_updater import DataUpdater, vector_store_item
+from app.services.embedding_cache import EmbeddingCache
+from app.services.openai_client import create_async_openai_client
+from app.services.vector_store import (
+    DEFAULT_EMBEDDING_MODEL,
+    INDEX_TYPES,
+    content_hash,
+    default_vector_store_path,
+    write_vector_store,
+)
+from app.utils.catalog_snapshot import CatalogRecords, open_fresh_catalog
+from app.utils.rate_limit import AsyncRateLimiter
+from app.utils.tokens import count_tokens
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DEFAULT_CHECKPOINT = 'data/cache/embeddings.sqlite3'
+
+# キャッシュを引く・ベクトルを書き出すときの1回あたりの件数
+LOOKUP_CHUNK_SIZE = 1000
+
+
+def iter_records(path: str) -> Iterable[Dict[str, Any]]:
+    """商品レコードを1件ずつ返す（カタログスナップショットがあればJSONを解析しない）"""
+    catalog = open_fresh_catalog(path)
+    if catalog is not None:
+        yield from CatalogRecords(catalog)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    yield from (data['products'] if isinstance(data, dict) and 'products' in data else data)
+
+
+def collect_items(path: str, limit: int = 0) -> List[Dict[str, Any]]:
+    """有効な商品だけをベクトルストアの1件に変換（同じ商品IDは最初の1件）"""
+    validator = DataUpdater(data_dir=os.path.dirname(path))
+    items: List[Dict[str, Any]] = []
+    seen = set()
+    invalid = 0
+    for record in iter_records(path):
+        is_valid, _ = validator.validate_record(record)
+        if not is_valid:
+            invalid += 1
+            continue
+        if record['id'] in seen:
+            continue
+        seen.add(record['id'])
+        items.append(vector_store_item(record))
+        if limit and len(items) >= limit:
+            break
+    print(f"📄 商品: 有効 {len(items):,}件 / 無効 {invalid:,}件")
+    return items
+
+
+def find_pending_texts(cache: EmbeddingCache, model: str, items: List[Dict[str, Any]]) -> List[str]:
+    """埋め込みキャッシュに無いテキスト（重複なし）"""
+    texts = list(dict.fromkeys(item['text'] for item in items))
+    pending = []
+    for start in range(0, len(texts), LOOKUP_CHUNK_SIZE):
+        chunk = texts[start:start + LOOKUP_CHUNK_SIZE]
+        cached = cache.get_many(model, chunk)
+        pending.extend(text for text in chunk if text not in cached)
+    return pending
+
+
+async def embed_pending_texts(texts: List[str], cache: EmbeddingCache, model: str, args) -> int:
+    """
+    キャッシュに無いテキストを並列のバッチでベクトル化し、バッチごとにキャッシュへ書く
+
+    Returns:
+        失敗したバッチ数
+    """
+    batches = [texts[i:i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+    queue: asyncio.Queue = asyncio.Queue()
+    for batch in batches:
+        queue.put_nowait(batch)
+
+    # 再試行はこのスクリプトで行う（SDKの再試行はレート制限の枠を取らずに投げ直すため無効にする）
+    client = create_async_openai_client(max_retries=0)
+    limiter = AsyncRateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    progress = {"done": 0, "failed": 0, "texts": 0, "tokens": 0}
+    started = time.perf_counter()
+
+    async def embed_batch(batch: List[str]) -> bool:
+        tokens = sum(count_tokens(text) for text in batch)
+        for attempt in range(args.max_attempts):
+            await limiter.acquire(tokens)
+            try:
+                response = await client.embeddings.create(model=model, input=batch)
+                vectors = [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
+                # チェックポイント（中断しても、ここまでのバッチは再実行時にキャッシュから使う）
+                cache.put_many(model, batch, vectors)
+                progress["tokens"] += tokens
+                return True
+            except Exception as e:
+                wait = min(2 ** attempt, 60)
+                print(f"⚠️ 埋め込みエラー（{attempt + 1}/{args.max_attempts}回目, {wait}秒後に再試行）: {e}")
+                await asyncio.sleep(wait)
+        return False
+
+    async def worker():
+        while not queue.empty():
+            batch = queue.get_nowait()
+            if await embed_batch(batch):
+                progress["done"] += 1
+                progress["texts"] += len(batch)
+            else:
+                progress["failed"] += 1
+            finished = progress["done"] + progress["failed"]
+            if finished % args.progress_every == 0 or finished == len(batches):
+                elapsed = time.perf_counter() - started
+                print(
+                    f"  {finished:,}/{len(batches):,}バッチ ({progress['texts']:,}件, "
+                    f"{progress['texts'] / elapsed * 60:,.0f}件/分, {progress['tokens'] / elapsed * 60:,.0f}トークン/分)"
+                )
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+    finally:
+        await client.close()
+
+    stats = limiter.get_stats()
+    print(f"⏱️ 埋め込み: {time.perf_counter() - started:.1f}秒 (レート制限の待ち {stats['waited_seconds']:.1f}秒)")
+    return progress["failed"]
+
+
+def write_store(items: List[Dict[str, Any]], cache: EmbeddingCache, model: str, output: str, args) -> int:
+    """キャッシュからベクトルを集めてベクトルストアを書き出す（ベクトルは一時ファイル経由でメモリに全件載せない）"""
+    first = cache.get_many(model, [items[0]['text']])[items[0]['text']]
+    os.makedirs(output, exist_ok=True)
+    temp_path = os.path.join(output, 'build-vectors.tmp.npy')
+    vectors = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.float32, shape=(len(items), len(first)))
+    try:
+        for start in range(0, len(items), LOOKUP_CHUNK_SIZE):
+            chunk = items[start:start + LOOKUP_CHUNK_SIZE]
+            cached = cache.get_many(model, [item['text'] for item in chunk])
+            vectors[start:start + len(chunk)] = np.stack([cached[item['text']] for item in chunk])
+        rows = [
+            {
+                'product_id': item['product_id'],
+                'occasion': item['occasion'],
+                'price': item['price'],
+                'title': item['title'],
+                'content_hash': content_hash(item['text']),
+            }
+            for item in items
+        ]
+        return write_vector_store(
+            output, vectors, rows,
+            embedding_model=model,
+            index_type=args.index_type,
+            index_params=settings.get_vector_index_params(),
+        )
+    finally:
+        del vectors
+        os.remove(temp_path)
+
+
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(
+        description='商品データからベクトルストアを作成（並列埋め込み・レート制限・チェックポイント付き）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python scripts/build_vector_store.py
+  python scripts/build_vector_store.py --rpm 5000 --tpm 5000000 --concurrency 16
+  python scripts/build_vector_store.py --index-type hnsw --output data/vector_store
+        """
+    )
+    parser.add_argument('--file', type=str, default=None, help='商品データファイル（未指定ならデータディレクトリの最新ファイル）')
+    parser.add_argument('--data-dir', type=str, default=DEFAULT_DATA_DIR, help='データディレクトリ（デフォルト: scripts/data）')
+    parser.add_argument('--output', type=str, default=None,
+                        help='出力先ディレクトリ（デフォルト: VECTOR_STORE_PATH または data/vector_store。--limit 指定時は必須）')
+    parser.add_argument('--checkpoint', type=str, default=settings.embedding_cache_path or DEFAULT_CHECKPOINT,
+                        help='埋め込みキャッシュ（チェックポイント）のパス（デフォルト: EMBEDDING_CACHE_PATH）')
+    parser.add_argument('--model', type=str, default=DEFAULT_EMBEDDING_MODEL, help=f'埋め込みモデル（デフォルト: {DEFAULT_EMBEDDING_MODEL}）')
+    parser.add_argument('--index-type', type=str, choices=INDEX_TYPES, default=settings.vector_index_type,
+                        help='インデックスの種類（デフォルト: VECTOR_INDEX_TYPE）')
+    parser.add_argument('--batch-size', type=int, default=100, help='1リクエストあたりのテキスト数（デフォルト: 100）')
+    parser.add_argument('--concurrency', type=int, default=8, help='同時に投げるリクエスト数（デフォルト: 8）')
+    parser.add_argument('--rpm', type=float, default=3000, help='1分あたりのリクエスト数上限（デフォルト: 3000）')
+    parser.add_argument('--tpm', type=float, default=1_000_000, help='1分あたりのトークン数上限（デフォルト: 1000000）')
+    parser.add_argument('--max-attempts', type=int, default=5, help='1バッチあたりの試行回数（デフォルト: 5）')
+    parser.add_argument('--progress-every', type=int, default=10, help='進捗を表示するバッチ間隔（デフォルト: 10）')
+    parser.add_argument('--limit', type=int, default=0,
+                        help='先頭から指定件数だけ作成（試験用、0なら全件）。稼働中のベクトルストア以外の --output が必要')
+    return parser.parse_args()
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_arguments()
+
+    live_path = settings.vector_store_path or default_vector_store_path()
+    if args.limit:
+        # 一部だけのストアで稼働中のベクトルストアを置き換えないよう、試験用の出力先を明示させる
+        if args.output is None:
+            print("❌ --limit を指定する場合は --output で試験用の出力先を指定してください")
+            return False
+        if os.path.realpath(args.output) == os.path.realpath(live_path):
+            print(f"❌ --limit 指定時は稼働中のベクトルストア（{live_path}）に書き出せません")
+            return False
+    args.output = args.output or live_path
+
+    if not settings.is_ai_enabled():
+        print("❌ OPENAI_API_KEY が設定されていません")
+        return False
+
+    try:
+        data_file = args.file or ProductDataLoader(args.data_dir).get_latest_data_file()
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return False
+    print(f"📂 データファイル: {data_file}")
+
+    items = collect_items(data_file, args.limit)
+    if not items:
+        print("❌ 有効な商品がありません")
+        return False
+
+    cache = EmbeddingCache(args.checkpoint)
+    try:
+        pending = find_pending_texts(cache, args.model, items)
+        print(f"🧮 埋め込み: キャッシュ済み {len(items) - len(pending):,}件 / 未処理 {len(pending):,}件 ({args.model})")
+        if pending:
+            failed = asyncio.run(embed_pending_texts(pending, cache, args.model, args))
+            if failed:
+                print(f"❌ 埋め込みに失敗したバッチ: {failed}件。再実行すると未処理分から再開します（ベクトルストアは未更新）")
+                return False
+
+        count = write_store(items, cache, args.model, args.output, args)
+        print(f"✅ ベクトルストア作成完了: {args.output} ({count:,}件, {args.index_type})")
+        return True
+    except Exception as e:
+        print(f"❌ ベクトルストア作成エラー: {e}")
+        return False
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+段階的意図抽出のオフライン評価スクリプト
+
+このファイルの役割:
+- クエリログの各入力に対し、ルールベース抽出（第1段）の結果と信頼度を算出
+- LLM抽出結果（ログに含まれるもの、または --call-llm で取得）と項目ごとに比較
+- 信頼度閾値ごとの「LLMを省略できる割合」と「省略した場合の一致率」を表示
+  → INTENT_RULE_CONFIDENCE_THRESHOLD の決定に使う
+
+入力形式（JSONL）:
+- {"query": "用途: 結婚祝い、相手: 友人、予算: 3000円〜5000円", "llm_intent": {...}}
+  llm_intent が無い行は --call-llm 指定時のみLLMで抽出する（OPENAI_API_KEY が必要）
+- JSONでない行はクエリ文字列そのものとして扱う
+
+実行方法:
+python scripts/eval_intent_tiers.py --log logs/intent_queries.jsonl
+python scripts/eval_intent_tiers.py --log logs/intent_queries.jsonl --call-llm --output logs/intent_eval.json
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# backendディレクトリをパスに追加
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(backend_dir)
+
+from app.core.config import settings
+from app.services.optimized_rag_service import OptimizedUserIntentExtractor, PerformanceOptimizer
+
+# 比較対象の項目
+COMPARED_FIELDS = ["occasion", "target_relationship", "budget_min", "budget_max"]
+
+# 閾値スイープ
+THRESHOLDS = [0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+
+def load_queries(path: Path) -> List[Dict[str, Any]]:
+    """クエリログを読み込む"""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                if isinstance(record, str):
+                    record = {"query": record}
+            except json.JSONDecodeError:
+                record = {"query": line}
+            if record.get("query"):
+                records.append(record)
+    return records
+
+
+def normalize_value(value: Any) -> Any:
+    """比較用に未指定値を揃える"""
+    if value in (None, "", "unknown", "other"):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def compare(rule_intent: Dict[str, Any], llm_intent: Dict[str, Any]) -> Dict[str, bool]:
+    """項目ごとの一致判定"""
+    return {
+        field: normalize_value(rule_intent.get(field)) == normalize_value(llm_intent.get(field))
+        for field in COMPARED_FIELDS
+    }
+
+
+async def evaluate(records: List[Dict[str, Any]], call_llm: bool) -> List[Dict[str, Any]]:
+    """各クエリのルールベース抽出とLLM抽出を比較"""
+    llm = None
+    if call_llm:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(
+            model_name=settings.openai_model,
+            temperature=0.1,
+            max_tokens=800,
+            api_key=settings.openai_api_key
+        )
+    extractor = OptimizedUserIntentExtractor(llm, PerformanceOptimizer())
+
+    results = []
+    for record in records:
+        query = record["query"]
+        rule_intent, confidence = extractor.extract_intent_rules(query)
+
+        llm_intent = record.get("llm_intent")
+        if llm_intent is None and call_llm:
+            llm_intent, tier = await extractor._extract_intent_with_tier(query)
+            if tier == "fallback":
+                llm_intent = None  # LLM失敗時はルールベース結果なので比較に使わない
+
+        result = {"query": query, "confidence": confidence, "rule_intent": rule_intent}
+        if llm_intent is not None:
+            result["llm_intent"] = llm_intent
+            result["matches"] = compare(rule_intent, llm_intent)
+        results.append(result)
+    return results
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """閾値ごとの省略率と一致率を集計"""
+    compared = [r for r in results if "matches" in r]
+    sweep = []
+    for threshold in THRESHOLDS:
+        accepted = [r for r in compared if r["confidence"] >= threshold]
+        exact = [r for r in accepted if all(r["matches"].values())]
+        sweep.append({
+            "threshold": threshold,
+            "llm_skip_rate": round(sum(r["confidence"] >= threshold for r in results) / len(results), 4) if results else 0.0,
+            "accepted": len(accepted),
+            "exact_match_rate": round(len(exact) / len(accepted), 4) if accepted else None,
+            "field_match_rate": {
+                field: round(sum(r["matches"][field] for r in accepted) / len(accepted), 4) if accepted else None
+                for field in COMPARED_FIELDS
+            },
+        })
+    return {
+        "queries": len(results),
+        "compared_with_llm": len(compared),
+        "current_threshold": settings.intent_rule_confidence_threshold,
+        "sweep": sweep,
+    }
+
+
+def print_report(summary: Dict[str, Any], results: List[Dict[str, Any]], show_mismatches: int):
+    """評価結果を表示"""
+    print(f"クエリ数: {summary['queries']}（LLM結果と比較: {summary['compared_with_llm']}件）")
+    print(f"現在の閾値: {summary['current_threshold']}")
+    print()
+    print(f"{'閾値':>6} {'LLM省略率':>10} {'採用件数':>8} {'完全一致率':>10}  " + " ".join(f"{f:>20}" for f in COMPARED_FIELDS))
+    for row in summary["sweep"]:
+        exact = "-" if row["exact_match_rate"] is None else f"{row['exact_match_rate']:.3f}"
+        fields = " ".join(
+            f"{'-' if row['field_match_rate'][f] is None else format(row['field_match_rate'][f], '.3f'):>20}"
+            for f in COMPARED_FIELDS
+        )
+        print(f"{row['threshold']:>6.2f} {row['llm_skip_rate']:>10.3f} {row['accepted']:>8} {exact:>10}  {fields}")
+
+    threshold = summary["current_threshold"]
+    mismatches = [
+        r for r in results
+        if "matches" in r and r["confidence"] >= threshold and not all(r["matches"].values())
+    ]
+    if mismatches and show_mismatches:
+        print()
+        print(f"現在の閾値で採用されるがLLMと不一致のクエリ（{len(mismatches)}件中 最大{show_mismatches}件）:")
+        for r in mismatches[:show_mismatches]:
+            diff = {
+                f: (r["rule_intent"].get(f), r["llm_intent"].get(f))
+                for f, ok in r["matches"].items() if not ok
+            }
+            print(f"  [{r['confidence']:.2f}] {r['query']} → {diff}")
+
+
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(
+        description='ルールベース意図抽出とLLM意図抽出をクエリログ上で比較',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python scripts/eval_intent_tiers.py --log logs/intent_queries.jsonl
+  python scripts/eval_intent_tiers.py --log logs/intent_queries.jsonl --call-llm --output logs/intent_eval.json
+        """
+    )
+    parser.add_argument('--log', type=str, required=True, help='クエリログ（JSONL）')
+    parser.add_argument('--call-llm', action='store_true', help='llm_intent が無い行をLLMで抽出する')
+    parser.add_argument('--output', type=str, default=None, help='クエリごとの評価結果を書き出すJSONファイル')
+    parser.add_argument('--show-mismatches', type=int, default=20, help='表示する不一致クエリの最大件数')
+    return parser.parse_args()
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_arguments()
+
+    records = load_queries(Path(args.log))
+    if not records:
+        print("クエリがありません")
+        return False
+
+    results = asyncio.run(evaluate(records, args.call_llm))
+    summary = summarize(results)
+    print_report(summary, results, args.show_mismatches)
+
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({"summary": summary, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n評価結果を出力: {output}")
+    return True
+
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
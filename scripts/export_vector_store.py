@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+旧形式ベクトルストアの変換スクリプト
+
+このファイルの役割:
+- LangChain の FAISS.save_local で保存したベクトルストア（index.faiss + index.pkl）を、
+  バックエンドが読み込む独自形式（vectors-<版>.npy + metadata.sqlite3）に変換
+- 変換後のバックエンドは pickle を読まず、ベクトル本体を mmap で開くだけになる
+
+注意:
+- index.pkl の読み込みには pickle を使う。自分たちで作成したファイルに対してのみ、この変換時に1度だけ実行すること
+
+実行方法:
+python scripts/export_vector_store.py                                   # data/vector_store をその場で変換
+python scripts/export_vector_store.py --source data/vector_store --output data/vector_store_v2
+python scripts/export_vector_store.py --remove-legacy                   # 変換後に index.faiss / index.pkl を削除
+"""
+
+import os
+import sys
+import pickle
+import argparse
+from typing import Any, Dict, List
+
+# backendディレクトリをパスに追加
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(backend_dir)
+
+import faiss
+
+from app.services.vector_store import (
+    DEFAULT_EMBEDDING_MODEL,
+    MmapVectorStore,
+    content_hash,
+    default_vector_store_path,
+    write_vector_store,
+)
+
+
+def to_row(metadata: Dict[str, Any], page_content: str) -> Dict[str, Any]:
+    """
+    LangChain の Document のメタデータから行メタデータを作る（商品IDは product_id → id の順に探す）
+
+    page_content は埋め込み元テキストなので、そのハッシュを残しておくと
+    次回の差分更新でテキストが同じ商品を再ベクトル化せずに済む
+    """
+    try:
+        price = int(metadata.get('price')) if metadata.get('price') is not None else None
+    except (TypeError, ValueError):
+        price = None
+    return {
+        'product_id': metadata.get('product_id') or metadata.get('id'),
+        'occasion': metadata.get('occasion'),
+        'price': price,
+        'title': metadata.get('title') or page_content,
+        'content_hash': content_hash(page_content) if page_content else None,
+    }
+
+
+def export_legacy_store(source: str, output: str, embedding_model: str) -> int:
+    """旧形式を読み込み、独自形式で書き出す"""
+    index = faiss.read_index(os.path.join(source, 'index.faiss'))
+    vectors = index.reconstruct_n(0, index.ntotal)
+
+    with open(os.path.join(source, 'index.pkl'), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    rows: List[Dict[str, Any]] = []
+    missing = 0
+    for row in range(index.ntotal):
+        doc = docstore.search(index_to_docstore_id[row])
+        if isinstance(doc, str):
+            # 見つからない場合、InMemoryDocstore はエラーメッセージの文字列を返す
+            missing += 1
+            rows.append(to_row({}, ''))
+        else:
+            rows.append(to_row(doc.metadata or {}, doc.page_content))
+    if missing:
+        print(f"⚠️ ドキュメントの見つからない行: {missing}件（メタデータ無しで変換）")
+
+    return write_vector_store(output, vectors, rows, embedding_model=embedding_model)
+
+
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(
+        description='旧形式（LangChainのpickle）のベクトルストアを独自形式に変換',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python scripts/export_vector_store.py
+  python scripts/export_vector_store.py --source data/vector_store --output data/vector_store_v2
+  python scripts/export_vector_store.py --remove-legacy
+        """
+    )
+    parser.add_argument('--source', type=str, default=default_vector_store_path(), help='旧形式のディレクトリ（デフォルト: data/vector_store）')
+    parser.add_argument('--output', type=str, default=None, help='出力先ディレクトリ（デフォルト: --source と同じ）')
+    parser.add_argument('--embedding-model', type=str, default=DEFAULT_EMBEDDING_MODEL,
+                        help=f'旧形式の作成に使った埋め込みモデル（デフォルト: {DEFAULT_EMBEDDING_MODEL}）')
+    parser.add_argument('--remove-legacy', action='store_true', help='変換後に旧形式のファイル（index.faiss / index.pkl）を削除')
+    return parser.parse_args()
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_arguments()
+    output = args.output or args.source
+
+    if not os.path.exists(os.path.join(args.source, 'index.pkl')):
+        print(f"❌ 旧形式のベクトルストアが見つかりません: {args.source}")
+        return False
+
+    try:
+        count = export_legacy_store(args.source, output, args.embedding_model)
+        store = MmapVectorStore(output)
+        print(f"✅ 変換完了: {output} ({count:,}件, {store.dimension}次元)")
+    except Exception as e:
+        print(f"❌ 変換エラー: {e}")
+        return False
+
+    if args.remove_legacy:
+        for name in ('index.faiss', 'index.pkl'):
+            path = os.path.join(args.source, name)
+            if os.path.exists(path):
+                os.remove(path)
+                print(f"🗑️ 削除: {path}")
+    return True
+
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+OpenAI API 疑似サーバー（負荷試験用）
+
+このファイルの役割:
+- OpenAI互換の /v1/chat/completions をローカルで提供し、ネットワーク・APIキー無しで
+  /ai/recommend 等のLLM経路を負荷試験できるようにする
+- /v1/embeddings も提供（テキストのハッシュから決まるベクトル）。scripts/build_vector_store.py の試験に使う
+- 応答までの遅延（平均＋ゆらぎ）を指定して、実際のLLMの待ち時間を模擬する
+- 応答本文は AIRecommendationService が期待するJSON形式。プロンプト中の「ID: xxx」から
+  先頭の商品を指定件数ぶん選んで返す
+
+実行方法:
+1. 疑似サーバーを起動: python scripts/fake_openai_server.py --port 8081 --latency-ms 1500
+2. バックエンドを疑似サーバー向けに起動:
+   OPENAI_BASE_URL=http://127.0.0.1:8081/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+3. /ai/recommend に負荷をかける（応答遅延中も他のリクエストが処理されることを確認）
+4. ベクトルストア作成の試験:
+   OPENAI_BASE_URL=http://127.0.0.1:8081/v1 OPENAI_API_KEY=fake python scripts/build_vector_store.py --output /tmp/vector_store
+"""
+
+import re
+import json
+import time
+import hashlib
+import uuid
+import random
+import asyncio
+import argparse
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import FastAPI, Request
+import uvicorn
+
+_ID_PATTERN = re.compile(r"ID:\s*(\S+)")
+_COUNT_PATTERN = re.compile(r"最適な(\d+)つ")
+
+
+def build_completion_content(messages: List[Dict[str, Any]]) -> str:
+    """プロンプトから商品IDを拾い、AIRecommendationService 形式のJSON文字列を作る"""
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    count_match = _COUNT_PATTERN.search(prompt)
+    count = int(count_match.group(1)) if count_match else 3
+    product_ids = list(dict.fromkeys(_ID_PATTERN.findall(prompt)))[:count]
+    return json.dumps({
+        "response": "疑似サーバーによるおすすめです。",
+        "product_ids": product_ids,
+        "reasoning": "疑似サーバーはプロンプト先頭の商品を選びます。",
+    }, ensure_ascii=False)
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    """テキストのハッシュから決まる正規化済みベクトル（同じテキストなら常に同じ）"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def create_app(latency_ms: float, jitter_ms: float, embedding_dim: int = 1536) -> FastAPI:
+    """疑似サーバーのアプリケーションを生成"""
+    app = FastAPI(title="Fake OpenAI API")
+    stats = {"requests": 0, "embedding_requests": 0, "embedding_inputs": 0}
+
+    async def chat_completions(request: Request) -> Dict[str, Any]:
+        body = await request.json()
+        stats["requests"] += 1
+        delay = max(latency_ms + random.uniform(-jitter_ms, jitter_ms), 0.0) / 1000
+        await asyncio.sleep(delay)
+
+        messages = body.get("messages", [])
+        content = build_completion_content(messages)
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+        return {
+            "id": f"chatcmpl-fake-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            # トークン数は文字数からの概算
+            "usage": {
+                "prompt_tokens": prompt_chars,
+                "completion_tokens": len(content),
+                "total_tokens": prompt_chars + len(content),
+            },
+        }
+
+    async def embeddings(request: Request) -> Dict[str, Any]:
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        stats["embedding_requests"] += 1
+        stats["embedding_inputs"] += len(inputs)
+        await asyncio.sleep(max(latency_ms + random.uniform(-jitter_ms, jitter_ms), 0.0) / 1000)
+
+        # トークン数は文字数からの概算
+        tokens = sum(len(str(text)) for text in inputs)
+        return {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(str(text), embedding_dim)}
+                for i, text in enumerate(inputs)
+            ],
+            "model": body.get("model", "fake-embedding-model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    # base_url の末尾に /v1 を付けても付けなくても動くよう両方で受ける
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/v1/embeddings", embeddings, methods=["POST"])
+    app.add_api_route("/embeddings", embeddings, methods=["POST"])
+
+    @app.get("/stats")
+    async def get_stats() -> Dict[str, Any]:
+        return {**stats, "latency_ms": latency_ms, "jitter_ms": jitter_ms}
+
+    return app
+
+
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(
+        description='OpenAI API 疑似サーバー（負荷試験用）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python scripts/fake_openai_server.py
+  python scripts/fake_openai_server.py --port 8081 --latency-ms 3000 --jitter-ms 500
+        """
+    )
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='待ち受けホスト（デフォルト: 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8081, help='待ち受けポート（デフォルト: 8081）')
+    parser.add_argument('--latency-ms', type=float, default=1500, help='応答までの平均遅延（ミリ秒、デフォルト: 1500）')
+    parser.add_argument('--jitter-ms', type=float, default=300, help='遅延のゆらぎ幅（ミリ秒、デフォルト: 300）')
+    parser.add_argument('--embedding-dim', type=int, default=1536, help='/v1/embeddings が返すベクトルの次元（デフォルト: 1536）')
+    return parser.parse_args()
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_arguments()
+    print(f"🧪 OpenAI疑似サーバー起動: http://{args.host}:{args.port}/v1 (遅延 {args.latency_ms}±{args.jitter_ms}ms)")
+    print(f"   バックエンド側: OPENAI_BASE_URL=http://{args.host}:{args.port}/v1 OPENAI_API_KEY=fake")
+    uvicorn.run(create_app(args.latency_ms, args.jitter_ms, args.embedding_dim), host=args.host, port=args.port, log_level="warning")
+    return True
+
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
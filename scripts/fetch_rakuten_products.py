@@ -11,9 +11,16 @@ import time
 from datetime import datetime
 from typing import Dict, List, Any
 import random
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 
+# backendディレクトリをパスに追加
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(backend_dir)
+
+from app.utils.catalog_snapshot import snapshot_path_for, write_catalog_snapshot
+
 # 環境変数読み込み（プロジェクトルートの.envファイル）
 load_dotenv(Path(__file__).parent.parent / '.env')
 
@@ -344,6 +351,7 @@ class RakutenProductFetcher:
         """
         商品データをJSONファイルに保存
         新しいフォルダ構造: sources/rakuten/ に保存
+        同じ場所にバックエンド読み込み用のカタログスナップショット（*.catalog）も書き出す
         """
         # 新しいフォルダ構造: sources/rakuten/に保存
         base_dir = os.path.dirname(__file__)
@@ -357,6 +365,10 @@ class RakutenProductFetcher:
         
         print(f"データを保存しました: {filepath}")
         print(f"ファイルサイズ: {os.path.getsize(filepath) / 1024 / 1024:.2f} MB")
+        
+        catalog_path = snapshot_path_for(filepath)
+        write_catalog_snapshot(products, catalog_path, source_path=filepath)
+        print(f"カタログスナップショットを保存しました: {catalog_path} ({os.path.getsize(catalog_path) / 1024 / 1024:.2f} MB)")
 
 def main():
     # 設定ファイルから値を読み込み
@@ -27,6 +27,7 @@ python scripts/index_meili_products.py --source amazon --file data/amazon_produc
 """
 
 import os
+import sys
 import json
 import logging
 import argparse
@@ -39,6 +40,12 @@ import requests
 # 環境変数読み込み（プロジェクトルートの.envファイル）
 load_dotenv(Path(__file__).parent.parent / '.env')
 
+# パスを追加してbackendモジュールを使用可能にする
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from app.services.reranker import AFFINITY_ATTRIBUTES, compute_affinity
+from app.utils.keyword_matcher import KeywordMatcher
+
 
 def setup_logging() -> logging.Logger:
     """
@@ -104,12 +111,25 @@ def load_meilisearch_settings() -> Dict[str, Any]:
             with open(settings_file, 'r', encoding='utf-8') as f:
                 settings_data = json.load(f)
                 # 新しい形式：JSONファイルが直接設定オブジェクト
-                return settings_data
+                return with_affinity_attributes(settings_data)
         else:
-            return default_settings
+            return with_affinity_attributes(default_settings)
     except Exception as e:
         logging.getLogger(__name__).warning(f"設定ファイルの読み込みに失敗しました（デフォルト設定を使用）: {e}")
-        return default_settings
+        return with_affinity_attributes(default_settings)
+
+
+def with_affinity_attributes(settings_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    相手情報アフィニティ属性（affinity_*）をソート・フィルタ可能属性に追加します
+    
+    検索時に相手情報に応じた並べ替えをMeilisearchのソートで行うために必要です。
+    """
+    for key in ('sortableAttributes', 'filterableAttributes'):
+        attributes = list(settings_data.get(key) or [])
+        attributes += [name for name in AFFINITY_ATTRIBUTES.values() if name not in attributes]
+        settings_data[key] = attributes
+    return settings_data
 
 
 def load_product_data(file_path: Path, source: str) -> List[Dict[str, Any]]:
@@ -143,67 +163,46 @@ def load_product_data(file_path: Path, source: str) -> List[Dict[str, Any]]:
         raise ValueError(f"Unsupported data source: {source}")
 
 
-def detect_occasions_from_text(title: str, description: str) -> List[str]:
-    """
-    商品タイトルと説明文から複数のカテゴリを推測します
-    """
-    text = (title + " " + description).lower()
-    detected_occasions = []
-    
+# 商品タイトル・説明文から推測する用途カテゴリのキーワード（定義順が occasions の並び順）
+OCCASION_TEXT_KEYWORDS = {
     # 結婚祝い関連
-    wedding_keywords = [
+    "wedding_celebration": [
         "結婚祝", "結婚祝い", "結婚お祝い", "結婚式", "ブライダル", 
         "ウェディング", "結婚記念", "新郎新婦", "新婚", "入籍"
-    ]
-    
+    ],
     # 出産祝い関連
-    baby_keywords = [
+    "birth_celebration": [
         "出産祝", "出産祝い", "出産お祝い", "新生児", "新生児用品", 
         "ベビー", "ベビー用品", "赤ちゃん", "はじめて", "出産神"
-    ]
-    
+    ],
     # 新築祝い関連
-    new_home_keywords = [
+    "new_home_celebration": [
         "新築祝", "新築祝い", "新居", "引越し", "引っ越し", "新住所", 
         "マイホーム", "一戸建て", "新生活"
-    ]
-    
+    ],
     # 母の日関連
-    mothers_day_keywords = [
+    "mothers_day": [
         "母の日", "お母さん", "ママ", "母親", "母"
-    ]
-    
+    ],
     # 父の日関連
-    fathers_day_keywords = [
+    "fathers_day": [
         "父の日", "お父さん", "パパ", "父親", "父"
-    ]
-    
+    ],
     # 敬老の日関連
-    respect_aged_keywords = [
+    "respect_for_aged_day": [
         "敬老の日", "敬老", "おじいちゃん", "おばあちゃん", "祖父", "祖母", 
         "お年寄り", "シニア", "高齢", "祖父母"
-    ]
-    
-    # 各カテゴリをチェック（複数ヒット可能）
-    wedding_match = any(keyword in text for keyword in wedding_keywords)
-    baby_match = any(keyword in text for keyword in baby_keywords)
-    new_home_match = any(keyword in text for keyword in new_home_keywords)
-    mothers_day_match = any(keyword in text for keyword in mothers_day_keywords)
-    fathers_day_match = any(keyword in text for keyword in fathers_day_keywords)
-    respect_aged_match = any(keyword in text for keyword in respect_aged_keywords)
-    
-    if wedding_match:
-        detected_occasions.append("wedding_celebration")
-    if baby_match:
-        detected_occasions.append("birth_celebration")
-    if new_home_match:
-        detected_occasions.append("new_home_celebration")
-    if mothers_day_match:
-        detected_occasions.append("mothers_day")
-    if fathers_day_match:
-        detected_occasions.append("fathers_day")
-    if respect_aged_match:
-        detected_occasions.append("respect_for_aged_day")
+    ],
+}
+OCCASION_TEXT_MATCHER = KeywordMatcher(OCCASION_TEXT_KEYWORDS)
+
+
+def detect_occasions_from_text(title: str, description: str) -> List[str]:
+    """
+    商品タイトルと説明文から複数のカテゴリを推測します
+    """
+    # 全カテゴリのキーワードを1回の走査で照合（複数ヒット可能）
+    detected_occasions = OCCASION_TEXT_MATCHER.match_groups(title + " " + description)
     
     # マッチしなかった場合はunknown
     if not detected_occasions:
@@ -319,7 +318,9 @@ def normalize_rakuten_data(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             'shop_code': item.get('shop_code', ''),
             'item_code': item.get('item_code', ''),
             'catch_copy': item.get('catch_copy', ''),
-            'tags': item.get('tags', [])
+            'tags': item.get('tags', []),
+            # 相手情報アフィニティ（キーワード群ごとのヒット数、affinity_formal 等）
+            **compute_affinity(title, description)
         }
         normalized_items.append(normalized_item)
     
@@ -104,6 +104,11 @@ def cleanup_old_files(keep_count: int = 3, dry_run: bool = False, auto_confirm:
             file_path.unlink()
             print(f"[OK] 削除: {file_path.name}")
             deleted_count += 1
+            # 対応するカタログスナップショットも削除
+            catalog_path = file_path.with_suffix('.catalog')
+            if catalog_path.exists():
+                catalog_path.unlink()
+                print(f"[OK] 削除: {catalog_path.name}")
         except Exception as e:
             print(f"[ERROR] 削除エラー: {file_path.name} - {e}")
     
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+商品理由の事前一括生成スクリプト
+
+このファイルの役割:
+- 商品データ（楽天JSON）の各商品 × 相手プロフィールのバケット（用途・関係性・性別・年代）について
+  おすすめ理由をLLMで一括生成
+- 同時実行数の上限付きで、1回のLLM呼び出しに複数商品をまとめて生成
+- 結果をバックエンドの PRODUCT_REASON_STORE_PATH（SQLiteのKVストア）に保存
+  → API側は理由生成の前にこのストアを引き、ヒットした商品はLLMを呼ばない
+
+再実行時の動作:
+- 保存済みで商品名・価格が変わっていない (商品, バケット) はスキップ（中断しても続きから再開できる）
+- --prune でカタログから消えた商品の理由を削除
+
+バケットの組み合わせ:
+- 用途: 各商品の occasions（Meilisearch投入時と同じ推定ロジック）
+- 関係性・性別・年代: フロントエンドの選択肢（--relationships 等で変更可、unknown は未選択）
+
+実行方法:
+python scripts/precompute_product_reasons.py --file scripts/data/rakuten_uchiwai_products_20251030_233859.json --dry-run
+python scripts/precompute_product_reasons.py --file scripts/data/rakuten_uchiwai_products_20251030_233859.json --output backend/data/cache/product_reasons.sqlite3
+"""
+
+import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+# backendディレクトリをパスに追加
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.append(backend_dir)
+
+from app.core.config import settings
+from app.services.optimized_rag_service import OptimizedLangChainRAGService
+from app.services.reason_store import (
+    ProductReasonStoreWriter, UNKNOWN, bucket_intent, product_fingerprint, profile_bucket
+)
+from index_meili_products import normalize_rakuten_data
+
+# 相手プロフィールの既定値（フロントエンドの選択肢。「上司・目上の方」はAPI側で boss に正規化される）
+DEFAULT_RELATIONSHIPS = ["boss", "同僚・同等関係", "友人・知人", "親族・家族", "取引先・顧客", "近所・地域の方", UNKNOWN]
+DEFAULT_GENDERS = ["男性", "女性", UNKNOWN]
+DEFAULT_AGE_RANGES = ["20代", "30代", "40代", "50代", "60代", "70代以上", UNKNOWN]
+
+
+def setup_logging() -> logging.Logger:
+    """
+    ログ出力の設定を行います
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    return logging.getLogger(__name__)
+
+
+def load_products(path: Path) -> List[SimpleNamespace]:
+    """商品データを読み込み、Meilisearch投入時と同じIDと用途リストに揃える"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('products', [])
+
+    products = []
+    for item in normalize_rakuten_data(data):
+        if not item.get('title'):
+            continue
+        occasions = [o for o in (item.get('occasions') or [item.get('occasion')]) if o and o != 'unknown']
+        products.append(SimpleNamespace(
+            id=item['id'],
+            title=item['title'],
+            price=int(item.get('price') or 0),
+            review_count=item.get('review_count') or 0,
+            review_average=float(item.get('review_average') or 0.0),
+            occasions=occasions or [UNKNOWN],
+        ))
+    return products
+
+
+def plan_jobs(
+    products: List[SimpleNamespace],
+    relationships: List[str],
+    genders: List[str],
+    age_ranges: List[str],
+    existing: set,
+    batch_size: int
+) -> Tuple[List[Tuple[str, List[SimpleNamespace]]], int]:
+    """
+    生成ジョブ（バケット, 商品チャンク）を作成
+
+    Returns:
+        (ジョブ一覧, 保存済みでスキップした件数)
+    """
+    by_bucket: Dict[str, List[SimpleNamespace]] = {}
+    skipped = 0
+    for product in products:
+        fingerprint = product_fingerprint(product.title, product.price)
+        for occasion in product.occasions:
+            for relationship in relationships:
+                for gender in genders:
+                    for age_range in age_ranges:
+                        bucket = profile_bucket({
+                            "occasion": occasion, "relationship": relationship,
+                            "gender": gender, "age_range": age_range
+                        })
+                        if (product.id, bucket, fingerprint) in existing:
+                            skipped += 1
+                            continue
+                        by_bucket.setdefault(bucket, []).append(product)
+
+    jobs = []
+    for bucket, bucket_products in by_bucket.items():
+        for start in range(0, len(bucket_products), batch_size):
+            jobs.append((bucket, bucket_products[start:start + batch_size]))
+    return jobs, skipped
+
+
+async def run_jobs(
+    jobs: List[Tuple[str, List[SimpleNamespace]]],
+    writer: ProductReasonStoreWriter,
+    concurrency: int,
+    logger: logging.Logger
+) -> Dict[str, int]:
+    """同時実行数の上限付きでジョブを実行し、完了したチャンクから順に保存"""
+    from langchain_openai import ChatOpenAI
+    llm = ChatOpenAI(
+        model_name=settings.openai_model,
+        temperature=0.1,
+        max_tokens=800,
+        api_key=settings.openai_api_key
+    )
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    stats = {"calls": 0, "failed_calls": 0, "stored": 0, "missing": 0}
+
+    async def run(bucket: str, products: List[SimpleNamespace]):
+        prompt = OptimizedLangChainRAGService._build_product_reasons_batch_prompt(products, bucket_intent(bucket))
+        async with semaphore:
+            try:
+                response = await llm.ainvoke(prompt)
+                parsed = OptimizedLangChainRAGService._parse_reason_map(response.content)
+            except Exception as e:
+                stats["failed_calls"] += 1
+                logger.warning(f"生成失敗 bucket={bucket} ({len(products)}件): {e}")
+                return
+            finally:
+                stats["calls"] += 1
+
+        rows = []
+        for product in products:
+            reason = parsed.get(product.id)
+            if not reason:
+                stats["missing"] += 1
+                continue
+            rows.append((product.id, bucket, product_fingerprint(product.title, product.price), str(reason).strip()[:150]))
+        writer.put_many(rows)
+        stats["stored"] += len(rows)
+        if stats["calls"] % 50 == 0:
+            logger.info(f"進捗: {stats['calls']}/{len(jobs)}呼び出し, 保存 {stats['stored']}件")
+
+    await asyncio.gather(*(run(bucket, products) for bucket, products in jobs))
+    return stats
+
+
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(
+        description='商品×相手プロフィールごとのおすすめ理由を事前生成',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python scripts/precompute_product_reasons.py --file scripts/data/rakuten_uchiwai_products_20251030_233859.json --dry-run
+  python scripts/precompute_product_reasons.py --file scripts/data/rakuten_uchiwai_products_20251030_233859.json --concurrency 4
+  python scripts/precompute_product_reasons.py --file scripts/data/rakuten_uchiwai_products_20251030_233859.json --genders unknown --age-ranges unknown
+        """
+    )
+    parser.add_argument('--file', type=str, required=True, help='商品データファイル（楽天JSON）')
+    parser.add_argument('--output', type=str, default=None,
+                        help='出力ストア（デフォルト: backend/ 配下の PRODUCT_REASON_STORE_PATH）')
+    parser.add_argument('--relationships', nargs='+', default=DEFAULT_RELATIONSHIPS, help='関係性の一覧')
+    parser.add_argument('--genders', nargs='+', default=DEFAULT_GENDERS, help='性別の一覧')
+    parser.add_argument('--age-ranges', nargs='+', default=DEFAULT_AGE_RANGES, help='年代の一覧')
+    parser.add_argument('--batch-size', type=int, default=8, help='1回のLLM呼び出しでまとめる商品数（デフォルト: 8）')
+    parser.add_argument('--concurrency', type=int, default=4, help='LLM呼び出しの同時実行数（デフォルト: 4）')
+    parser.add_argument('--limit-products', type=int, default=None, help='処理する商品数の上限（試験実行用）')
+    parser.add_argument('--prune', action='store_true', help='商品データに無い商品の理由を削除')
+    parser.add_argument('--dry-run', action='store_true', help='生成件数とLLM呼び出し回数の見積もりのみ表示')
+    return parser.parse_args()
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_arguments()
+    logger = setup_logging()
+
+    output = args.output or settings.product_reason_store_path
+    if not output:
+        logger.error("出力先が指定されていません（--output または PRODUCT_REASON_STORE_PATH）")
+        return False
+    if not os.path.isabs(output) and args.output is None:
+        output = os.path.join(backend_dir, output)
+
+    products = load_products(Path(args.file))
+    if args.limit_products:
+        products = products[:args.limit_products]
+    if not products:
+        logger.error("商品がありません")
+        return False
+
+    writer = ProductReasonStoreWriter(output)
+    try:
+        if args.prune:
+            removed = writer.delete_products_not_in({p.id for p in products})
+            logger.info(f"カタログに無い商品の理由を削除: {removed}商品")
+
+        jobs, skipped = plan_jobs(
+            products, args.relationships, args.genders, args.age_ranges,
+            writer.existing_keys(), max(args.batch_size, 1)
+        )
+        pending = sum(len(chunk) for _, chunk in jobs)
+        logger.info(f"商品: {len(products)}件, 生成対象: {pending}件（保存済みスキップ: {skipped}件）, LLM呼び出し: {len(jobs)}回")
+        if args.dry_run or not jobs:
+            return True
+
+        stats = asyncio.run(run_jobs(jobs, writer, args.concurrency, logger))
+        writer.set_meta("model", settings.openai_model)
+        writer.set_meta("generated_at", datetime.now().isoformat())
+        logger.info(f"完了: {stats}（出力: {output}）")
+        return stats["failed_calls"] < stats["calls"]
+    finally:
+        writer.close()
+
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
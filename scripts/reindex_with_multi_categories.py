@@ -17,6 +17,7 @@
 追加処理:
 - occasions配列: 商品タイトルから複数用途を判定
 - genre_group: 商品タイトルからジャンル分類
+- affinity_*: 相手情報キーワード群ごとのヒット数（affinity_formal 等、ソート・フィルタ用）
 """
 
 import os
@@ -32,6 +33,8 @@ backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
 sys.path.append(backend_dir)
 
 from app.services.search_service_fixed import MeilisearchService
+from app.services.reranker import compute_affinity
+from app.utils.keyword_matcher import KeywordMatcher
 
 
 class MultiCategoryProcessor:
@@ -104,10 +107,13 @@ class MultiCategoryProcessor:
                 'プリザーブド', 'ドライフラワー', '胡蝶蘭', 'バラ'
             ]
         }
+        
+        # キーワード群はオートマトンに一度だけ変換し、商品ごとに1回の走査で照合する
+        self.occasion_matcher = KeywordMatcher(self.occasion_keywords)
+        self.genre_matcher = KeywordMatcher(self.genre_keywords)
     
     def detect_additional_occasions(self, title: str, description: str = "", current_occasion: str = "") -> Set[str]:
         """商品タイトルと説明から追加の用途を推定"""
-        text = (title + " " + description).lower()
         occasions = set()
         
         # 現在のoccasionは必ず含める
@@ -115,26 +121,19 @@ class MultiCategoryProcessor:
             occasions.add(current_occasion)
         
         # 追加の用途を検索
-        for occasion, keywords in self.occasion_keywords.items():
-            for keyword in keywords:
-                if keyword.lower() in text:
-                    occasions.add(occasion)
-                    break
+        occasions.update(self.occasion_matcher.match_groups(title + " " + description))
         
         return occasions
     
     def classify_genre(self, title: str, description: str = "") -> str:
         """商品タイトルと説明からジャンルを推定"""
-        text = (title + " " + description).lower()
-        genre_scores = {}
+        matched = self.genre_matcher.find(title + " " + description)
         
-        for genre, keywords in self.genre_keywords.items():
-            score = 0
-            for keyword in keywords:
-                if keyword.lower() in text:
-                    # より具体的なキーワードほど高得点
-                    score += len(keyword)
-            genre_scores[genre] = score
+        # より具体的なキーワードほど高得点
+        genre_scores = {
+            genre: sum(len(keyword) for keyword in matched.get(genre, []))
+            for genre in self.genre_keywords
+        }
         
         # 最高得点のジャンルを返す
         if genre_scores and max(genre_scores.values()) > 0:
@@ -171,6 +170,8 @@ class MultiCategoryProcessor:
             processed_product = product.copy()
             processed_product['occasions'] = list(occasions)
             processed_product['genre_group'] = genre_group
+            # 相手情報アフィニティ（検索時にMeilisearchのソートで相手情報順に並べるため）
+            processed_product.update(compute_affinity(product['title'], description))
             
             # occasions配列にoccasionが含まれていない場合は追加
             if current_occasion and current_occasion not in processed_product['occasions']:
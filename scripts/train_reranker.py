@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+リランカーの重み学習スクリプト
+
+このファイルの役割:
+- バックエンドが出力した特徴量ログ（RERANKER_FEATURE_LOG_PATH）とインタラクションログを結合
+- ロジスティック回帰（L2正則化、NumPyの勾配降下）で線形モデルの重みを推定
+- バックエンドの RERANKER_MODEL_PATH で読み込める JSON モデルを出力
+
+入力形式:
+- 特徴量ログ（JSONL）: {"query_id", "candidate_id", "shown_rank", "features": {名前: 値}}
+  行に "label" があればそれを正解ラベルとして使用
+- インタラクションログ（JSONL、任意）: {"query_id", "candidate_id", "event": "click"|"purchase"|...}
+  または {"query_id", "candidate_id", "label": 0/1}
+  search_metadata.reranker.query_id をフロントエンドからイベントと一緒に送る想定
+
+実行方法:
+python scripts/train_reranker.py --features logs/reranker_features.jsonl --interactions logs/clicks.jsonl --output data/reranker_model.json
+"""
+
+import json
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 正例として扱うイベント種別
+POSITIVE_EVENTS = {"click", "add_to_cart", "purchase"}
+
+
+def setup_logging() -> logging.Logger:
+    """
+    ログ出力の設定を行います
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    return logging.getLogger(__name__)
+
+
+def load_jsonl(path: Path) -> List[Dict]:
+    """JSONLファイルを読み込む（壊れた行はスキップ）"""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def load_labels(path: Optional[Path]) -> Dict[Tuple[str, str], float]:
+    """インタラクションログから (query_id, candidate_id) → ラベル の辞書を作成"""
+    labels: Dict[Tuple[str, str], float] = {}
+    if path is None:
+        return labels
+
+    for record in load_jsonl(path):
+        key = (record.get("query_id"), str(record.get("candidate_id")))
+        if "label" in record:
+            label = float(record["label"])
+        else:
+            label = 1.0 if record.get("event") in POSITIVE_EVENTS else 0.0
+        labels[key] = max(labels.get(key, 0.0), label)
+    return labels
+
+
+def build_dataset(
+    feature_records: List[Dict],
+    labels: Dict[Tuple[str, str], float],
+    max_shown_rank: Optional[int]
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    学習データを構築
+
+    インタラクションのあったクエリの候補だけを使う（提示されていない・見られていない
+    クエリを負例として大量に混ぜないため）。max_shown_rank 以降の候補はユーザーの目に
+    触れていない可能性が高いので除外する。
+    """
+    feature_names = sorted({name for record in feature_records for name in record.get("features", {})})
+    column = {name: i for i, name in enumerate(feature_names)}
+
+    labeled_queries = {query_id for query_id, _ in labels}
+    rows, targets = [], []
+    for record in feature_records:
+        query_id = record.get("query_id")
+        key = (query_id, str(record.get("candidate_id")))
+        if "label" in record:
+            label = float(record["label"])
+        elif query_id in labeled_queries:
+            label = labels.get(key, 0.0)
+        else:
+            continue
+        if max_shown_rank is not None and record.get("shown_rank", 0) >= max_shown_rank:
+            continue
+
+        row = np.zeros(len(feature_names))
+        for name, value in record["features"].items():
+            row[column[name]] = value
+        rows.append(row)
+        targets.append(label)
+
+    if not rows:
+        return np.zeros((0, len(feature_names))), np.zeros(0), feature_names
+    return np.vstack(rows), np.asarray(targets), feature_names
+
+
+def fit_logistic(
+    X: np.ndarray,
+    y: np.ndarray,
+    l2: float = 1e-3,
+    learning_rate: float = 0.5,
+    epochs: int = 2000
+) -> Tuple[np.ndarray, float]:
+    """
+    L2正則化ロジスティック回帰（フルバッチ勾配降下）
+
+    特徴量は標準化して学習し、出力時に元のスケールへ戻す。
+
+    Returns:
+        (元スケールの重み, バイアス)
+    """
+    mean = X.mean(axis=0)
+    std = X.std(axis=0)
+    std[std == 0] = 1.0
+    Z = (X - mean) / std
+
+    n, d = Z.shape
+    w = np.zeros(d)
+    b = 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(Z @ w + b)))
+        error = p - y
+        w -= learning_rate * (Z.T @ error / n + l2 * w)
+        b -= learning_rate * error.mean()
+
+    weights = w / std
+    bias = b - float(np.sum(w * mean / std))
+    return weights, bias
+
+
+def evaluate(X: np.ndarray, y: np.ndarray, weights: np.ndarray, bias: float) -> Dict[str, float]:
+    """学習データ上の対数損失と正解率"""
+    p = 1.0 / (1.0 + np.exp(-(X @ weights + bias)))
+    p = np.clip(p, 1e-9, 1 - 1e-9)
+    return {
+        "log_loss": float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))),
+        "accuracy": float(np.mean((p >= 0.5) == (y >= 0.5))),
+        "positive_rate": float(y.mean()),
+    }
+
+
+def parse_arguments():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(
+        description='リランカーの重みを特徴量ログとインタラクションログから学習',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python scripts/train_reranker.py --features logs/reranker_features.jsonl --interactions logs/clicks.jsonl --output data/reranker_model.json
+        """
+    )
+    parser.add_argument('--features', type=str, required=True, help='特徴量ログ（JSONL）')
+    parser.add_argument('--interactions', type=str, default=None, help='インタラクションログ（JSONL）')
+    parser.add_argument('--output', type=str, required=True, help='出力するモデルファイル（JSON）')
+    parser.add_argument('--l2', type=float, default=1e-3, help='L2正則化係数（デフォルト: 0.001）')
+    parser.add_argument('--epochs', type=int, default=2000, help='勾配降下の反復回数（デフォルト: 2000）')
+    parser.add_argument('--max-shown-rank', type=int, default=10,
+                        help='学習に使う提示順位の上限（デフォルト: 10、0で無制限）')
+    return parser.parse_args()
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_arguments()
+    logger = setup_logging()
+
+    feature_records = load_jsonl(Path(args.features))
+    labels = load_labels(Path(args.interactions) if args.interactions else None)
+    logger.info(f"特徴量ログ: {len(feature_records)}行, インタラクション: {len(labels)}件")
+
+    X, y, feature_names = build_dataset(feature_records, labels, args.max_shown_rank or None)
+    if len(y) == 0 or y.min() == y.max():
+        logger.error("学習データに正例・負例の両方が必要です")
+        return False
+
+    weights, bias = fit_logistic(X, y, l2=args.l2, epochs=args.epochs)
+    metrics = evaluate(X, y, weights, bias)
+    logger.info(f"学習完了: {len(y)}サンプル, {metrics}")
+
+    model = {
+        "type": "linear",
+        "feature_names": feature_names,
+        "weights": [round(float(w), 6) for w in weights],
+        "bias": round(bias, 6),
+        "trained_at": datetime.now().isoformat(),
+        "samples": int(len(y)),
+        "metrics": metrics,
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(model, f, ensure_ascii=False, indent=2)
+    logger.info(f"モデル出力: {output}")
+
+    for name, weight in sorted(zip(feature_names, weights), key=lambda x: -abs(x[1])):
+        logger.info(f"  {name}: {weight:+.4f}")
+    return True
+
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)